@@ -25,14 +25,15 @@ import sys
 # Example Usage:
 # compile_and_run_c()  # Compiles and runs the C program with the specified source files.
 def compile_and_run_c():
-    source_files = ["generated_code.c", "draw.c", "handle.c", "newcursor.c"] # List of source files to compile.
+    source_files = ["generated_code.c", "draw.c", "geometry.c", "handle.c", "newcursor.c", "sprite.c", "drawlist.c", "batch.c", "raster.c", "simulation.c", "spatial.c", "camera.c", "group.c"] # List of source files to compile.
+    optimization_flags = ["-O2", "-fvect-cost-model=cheap"] # Lets gcc vectorize the batch loops of batch.c.
     binary_file = "exe"  # Name of the output executable file.
     sdl_directory = "./SDL" # Directory containing SDL library and related files.
     
     try:
 
         # Step 1: Construct the compilation command using GCC.
-        compile_command = ["gcc", "-o", binary_file] + source_files + ["-lSDL2", "-lm"]
+        compile_command = ["gcc"] + optimization_flags + ["-o", binary_file] + source_files + ["-lSDL2", "-lm", "-pthread"]
         print(f"Compilation of the generated code ...")
 
         # Step 2: Execute the compilation command in the specified directory.
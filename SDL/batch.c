@@ -0,0 +1,154 @@
+#include "batch.h"
+#include "config.h"
+#include "newcursor.h"
+#include <math.h>
+
+
+// ======================================================
+// BATCH ANIMATION UPDATES
+// ======================================================
+
+// This section contains the per-frame updates of the animation modes, applied to every cursor
+// of the pool in one call. Each function is a single loop over the contiguous arrays of
+// `CursorPool` (and the per-cursor state of the animation), written so that the compiler can
+// vectorize it at `-O2`/`-O3`:
+// - no function call in the loop body, in particular no `cos`/`sin` per cursor;
+// - no branch: hidden cursors, and cursors placed by their group (see group.c), are left
+//   unchanged with a select or a multiplication by their flag;
+// - no modulo: angles are wrapped with a comparison;
+// - `restrict` pointers, so the compiler knows the arrays do not overlap.
+//
+// Functions in this section:
+// - prepareSnailBatch: Computes the starting point of each cursor on its circular path.
+// - updateSnailBatch: Moves the cursors along their circular paths (`animateDrawingsnail`).
+// - updateBounceBatch: Moves the cursors and bounces them off the screen edges (`animateDrawingbond`).
+// - rotateBatch: Rotates the cursors (all modes).
+//
+// The same functions animate the root groups of group.c, whose arrays have the same layout.
+
+
+// Function to compute the starting point of each cursor on its circular path.
+//
+// This function fills the cosine and sine of the starting angle of every cursor for
+// `updateSnailBatch`. The cursors are distributed evenly around the circle, cursor `i`
+// starting at the angle `i * 2 * PI / count`.
+//
+// Parameters:
+// - double* start_cos: Receives the cosine of the starting angle of each cursor.
+// - double* start_sin: Receives the sine of the starting angle of each cursor.
+// - int count: The number of cursors.
+//
+// Notes:
+// - This is the only place calling `cos`/`sin` per cursor, once when the animation starts.
+void prepareSnailBatch(double* start_cos, double* start_sin, int count) {
+    for (int i = 0; i < count; i++) {
+        double angle = i * (2 * M_PI / count);
+        start_cos[i] = cos(angle);
+        start_sin[i] = sin(angle);
+    }
+}
+
+
+// Function to move the cursors along their circular paths.
+//
+// This function places each visible cursor on the circle of radius `radius` centered on its base
+// position, at its starting angle plus `phase`.
+//
+// Parameters:
+// - int* x, int* y: The positions of the cursors (`cursor_pool.x` and `cursor_pool.y`).
+// - const Uint8* flags: The flags of the cursors; only the visible cursors outside groups
+//   (`CURSOR_VISIBLE` without `CURSOR_GROUPED`) move.
+// - const int* base_x, const int* base_y: The centers of the circular paths.
+// - const double* start_cos, const double* start_sin: The values filled by `prepareSnailBatch`.
+// - int count: The number of cursors.
+// - int radius: The radius of the circular paths.
+// - double phase: The angle (in radians) travelled by every cursor since the start.
+//
+// Implementation Details:
+// - All the cursors advance by the same angle, so `cos(start + phase)` and `sin(start + phase)`
+//   are obtained from the angle sum identities with the cosine and sine of `phase`, computed once
+//   per call, instead of calling `cos`/`sin` for each cursor.
+// - The position is truncated like `int anim_x = base_x[i] + radius * cos(angles[i])`.
+//
+// Example Usage:
+// updateSnailBatch(cursor_pool.x, cursor_pool.y, cursor_pool.flags, base_x, base_y,
+//                  start_cos, start_sin, cursor_pool.count, 50, phase);
+void updateSnailBatch(int* restrict x, int* restrict y, const Uint8* restrict flags,
+                      const int* restrict base_x, const int* restrict base_y,
+                      const double* restrict start_cos, const double* restrict start_sin,
+                      int count, int radius, double phase) {
+    double phase_cos = cos(phase);
+    double phase_sin = sin(phase);
+
+    for (int i = 0; i < count; i++) {
+        double offset_x = radius * (start_cos[i] * phase_cos - start_sin[i] * phase_sin);
+        double offset_y = radius * (start_sin[i] * phase_cos + start_cos[i] * phase_sin);
+        int new_x = (int)(base_x[i] + offset_x);
+        int new_y = (int)(base_y[i] + offset_y);
+        int animated = (flags[i] & (CURSOR_VISIBLE | CURSOR_GROUPED)) == CURSOR_VISIBLE;
+        x[i] += animated * (new_x - x[i]);
+        y[i] += animated * (new_y - y[i]);
+    }
+}
+
+
+// Function to move the cursors by their speed and bounce them off the screen edges.
+//
+// Parameters:
+// - int* x, int* y: The positions of the cursors (`cursor_pool.x` and `cursor_pool.y`).
+// - int* dx, int* dy: The speeds of the cursors, reversed when they reach an edge.
+// - const Uint8* flags: The flags of the cursors; only the visible cursors outside groups
+//   (`CURSOR_VISIBLE` without `CURSOR_GROUPED`) move.
+// - int count: The number of cursors.
+// - int width, int height: The size of the area the cursors bounce in.
+//
+// Implementation Details:
+// - As in the original loop, the speed is reversed first when the cursor is on or past an edge,
+//   then added to the position.
+//
+// Example Usage:
+// updateBounceBatch(cursor_pool.x, cursor_pool.y, dx, dy, cursor_pool.flags, cursor_pool.count,
+//                   SCREEN_WIDTH, SCREEN_HEIGHT);
+void updateBounceBatch(int* restrict x, int* restrict y, int* restrict dx, int* restrict dy,
+                       const Uint8* restrict flags, int count, int width, int height) {
+    for (int i = 0; i < count; i++) {
+        int animated = (flags[i] & (CURSOR_VISIBLE | CURSOR_GROUPED)) == CURSOR_VISIBLE;
+        int bounce_x = animated & ((x[i] <= 0) | (x[i] >= width));
+        int bounce_y = animated & ((y[i] <= 0) | (y[i] >= height));
+        dx[i] -= 2 * bounce_x * dx[i];
+        dy[i] -= 2 * bounce_y * dy[i];
+        x[i] += animated * dx[i];
+        y[i] += animated * dy[i];
+    }
+}
+
+
+// Function to rotate the cursors, keeping their angles in [0, 360).
+//
+// Parameters:
+// - int* angle: The angles of the cursors (`cursor_pool.angle`), in [0, 360).
+// - const Uint8* flags: The flags of the cursors; only the visible cursors outside groups
+//   rotate.
+// - int count: The number of cursors.
+// - int delta: The angle (in degrees) added to each cursor.
+//
+// Implementation Details:
+// - `delta` is reduced to (-360, 360) once, so the new angle is in (-360, 720) and a single
+//   comparison in each direction wraps it back, without a modulo per cursor.
+//
+// Notes:
+// - For angles in [0, 360), as kept by every pooled function, the result is the same as
+//   `rotatePooledCursor` and `rotatePooledCursor2`, so this function serves all the modes.
+//
+// Example Usage:
+// rotateBatch(cursor_pool.angle, cursor_pool.flags, cursor_pool.count, 10);
+void rotateBatch(int* restrict angle, const Uint8* restrict flags, int count, int delta) {
+    delta %= 360;
+
+    for (int i = 0; i < count; i++) {
+        int rotated = angle[i] + delta;
+        rotated = rotated >= 360 ? rotated - 360 : rotated;
+        rotated = rotated < 0 ? rotated + 360 : rotated;
+        angle[i] = ((flags[i] & (CURSOR_VISIBLE | CURSOR_GROUPED)) == CURSOR_VISIBLE) ? rotated : angle[i];
+    }
+}
@@ -0,0 +1,15 @@
+#ifndef BATCH_H
+#define BATCH_H
+
+#include <SDL2/SDL.h>
+
+void prepareSnailBatch(double* start_cos, double* start_sin, int count);
+void updateSnailBatch(int* restrict x, int* restrict y, const Uint8* restrict flags,
+                      const int* restrict base_x, const int* restrict base_y,
+                      const double* restrict start_cos, const double* restrict start_sin,
+                      int count, int radius, double phase);
+void updateBounceBatch(int* restrict x, int* restrict y, int* restrict dx, int* restrict dy,
+                       const Uint8* restrict flags, int count, int width, int height);
+void rotateBatch(int* restrict angle, const Uint8* restrict flags, int count, int delta);
+
+#endif
@@ -0,0 +1,186 @@
+#include "batch.h"
+#include "config.h"
+#include "newcursor.h"
+#include <stdio.h>
+#include <stdlib.h>
+#include <time.h>
+
+
+// ======================================================
+// ANIMATION MICROBENCHMARK
+// ======================================================
+
+// This program measures how many cursors per second the animation modes update, without
+// opening a window or drawing anything. Each mode is run twice on the same cursors:
+// - per cursor: the loop the generated code used before the batch functions, one cursor at a
+//   time with `cos`/`sin` and `rotatePooledCursor`;
+// - batch: the functions of batch.c, over the whole pool.
+// The positions and angles reached by both versions are compared at the end.
+//
+// Build and run (from the SDL directory):
+// gcc -O2 -fvect-cost-model=cheap -o benchmark benchmark.c batch.c newcursor.c -lm
+// ./benchmark [number of cursors] [number of frames]
+//
+// Functions in this section:
+// - fillPool: Creates the cursors of the benchmark.
+// - runSnail, runBounce, runDisco: Run a mode for a number of frames.
+// - main: Times the modes and prints the results.
+
+
+#define BENCHMARK_RADIUS 50  // Radius of the snail paths, as in the generated code.
+
+
+// Function to create `count` cursors spread over the screen, one in eight hidden.
+static void fillPool(CursorPool* pool, int count) {
+    SDL_Color red = {255, 0, 0, 255};
+    for (int i = 0; i < count; i++) {
+        initPooledCursor(pool, i, (i * 37) % SCREEN_WIDTH, (i * 53) % SCREEN_HEIGHT, red, 1, i % 8 != 0);
+    }
+}
+
+
+// Function to run the snail mode for `frames` frames.
+static void runSnail(CursorPool* pool, int frames, int batch) {
+    int count = pool->count;
+    int* base_x = malloc(count * sizeof(int));
+    int* base_y = malloc(count * sizeof(int));
+    double* angles = malloc(count * sizeof(double));
+    double* start_cos = malloc(count * sizeof(double));
+    double* start_sin = malloc(count * sizeof(double));
+    for (int i = 0; i < count; i++) {
+        base_x[i] = pool->x[i];
+        base_y[i] = pool->y[i];
+        angles[i] = i * (2 * M_PI / count);
+    }
+    prepareSnailBatch(start_cos, start_sin, count);
+
+    for (int frame = 0; frame < frames; frame++) {
+        if (batch) {
+            updateSnailBatch(pool->x, pool->y, pool->flags, base_x, base_y, start_cos, start_sin,
+                             count, BENCHMARK_RADIUS, frame * 0.05);
+            rotateBatch(pool->angle, pool->flags, count, 10);
+            continue;
+        }
+        for (int i = 0; i < count; i++) {
+            if (pool->flags[i] & CURSOR_VISIBLE) {
+                pool->x[i] = base_x[i] + BENCHMARK_RADIUS * cos(angles[i]);
+                pool->y[i] = base_y[i] + BENCHMARK_RADIUS * sin(angles[i]);
+                rotatePooledCursor(pool, i, 10);
+            }
+            angles[i] += 0.05;
+        }
+    }
+
+    free(base_x);
+    free(base_y);
+    free(angles);
+    free(start_cos);
+    free(start_sin);
+}
+
+
+// Function to run the bounce mode for `frames` frames.
+static void runBounce(CursorPool* pool, int frames, int batch) {
+    int count = pool->count;
+    int* dx = malloc(count * sizeof(int));
+    int* dy = malloc(count * sizeof(int));
+    for (int i = 0; i < count; i++) {
+        dx[i] = (i % 2 == 0) ? 5 : -5;
+        dy[i] = (i % 2 == 0) ? 5 : -5;
+    }
+
+    for (int frame = 0; frame < frames; frame++) {
+        if (batch) {
+            updateBounceBatch(pool->x, pool->y, dx, dy, pool->flags, count, SCREEN_WIDTH, SCREEN_HEIGHT);
+            rotateBatch(pool->angle, pool->flags, count, 10);
+            continue;
+        }
+        for (int i = 0; i < count; i++) {
+            if (pool->flags[i] & CURSOR_VISIBLE) {
+                if (pool->x[i] <= 0 || pool->x[i] >= SCREEN_WIDTH) dx[i] = -dx[i];
+                if (pool->y[i] <= 0 || pool->y[i] >= SCREEN_HEIGHT) dy[i] = -dy[i];
+                pool->x[i] += dx[i];
+                pool->y[i] += dy[i];
+                rotatePooledCursor(pool, i, 10);
+            }
+        }
+    }
+
+    free(dx);
+    free(dy);
+}
+
+
+// Function to run the disco mode (`animateRotation2`) for `frames` frames.
+static void runDisco(CursorPool* pool, int frames, int batch) {
+    int count = pool->count;
+    for (int frame = 0; frame < frames; frame++) {
+        if (batch) {
+            rotateBatch(pool->angle, pool->flags, count, 10);
+            continue;
+        }
+        for (int i = 0; i < count; i++) {
+            if (pool->flags[i] & CURSOR_VISIBLE) {
+                rotatePooledCursor2(pool, i, 10);
+            }
+        }
+    }
+}
+
+
+// Function to time a mode on fresh cursors.
+//
+// Returns:
+// - double: The number of cursors updated per second.
+static double timeMode(void (*run)(CursorPool*, int, int), CursorPool* pool, int count, int frames, int batch) {
+    freeCursorPool(pool);
+    fillPool(pool, count);
+
+    clock_t start = clock();
+    run(pool, frames, batch);
+    double seconds = (double)(clock() - start) / CLOCKS_PER_SEC;
+    if (seconds <= 0) {
+        seconds = 1.0 / CLOCKS_PER_SEC;
+    }
+    return (double)count * frames / seconds;
+}
+
+
+// Function to count the cursors whose position or angle differ between two pools.
+static int countDifferences(const CursorPool* a, const CursorPool* b) {
+    int differences = 0;
+    for (int i = 0; i < a->count; i++) {
+        if (a->x[i] != b->x[i] || a->y[i] != b->y[i] || a->angle[i] != b->angle[i]) {
+            differences++;
+        }
+    }
+    return differences;
+}
+
+
+int main(int argc, char* argv[]) {
+    int count = argc > 1 ? atoi(argv[1]) : 100000;
+    int frames = argc > 2 ? atoi(argv[2]) : 200;
+    if (count <= 0 || frames <= 0) {
+        printf("Usage: %s [number of cursors] [number of frames]\n", argv[0]);
+        return 1;
+    }
+
+    const char* names[] = {"snail", "bounce", "disco"};
+    void (*modes[])(CursorPool*, int, int) = {runSnail, runBounce, runDisco};
+
+    CursorPool reference = {0};
+    CursorPool batch = {0};
+    printf("%d cursors, %d frames\n", count, frames);
+    printf("%-8s %20s %20s %8s %12s\n", "mode", "per cursor (c/s)", "batch (c/s)", "speedup", "differences");
+    for (int m = 0; m < 3; m++) {
+        double per_cursor = timeMode(modes[m], &reference, count, frames, 0);
+        double batched = timeMode(modes[m], &batch, count, frames, 1);
+        printf("%-8s %20.0f %20.0f %7.1fx %12d\n", names[m], per_cursor, batched,
+               batched / per_cursor, countDifferences(&reference, &batch));
+    }
+
+    freeCursorPool(&reference);
+    freeCursorPool(&batch);
+    return 0;
+}
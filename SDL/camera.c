@@ -0,0 +1,512 @@
+#include "camera.h"
+#include "config.h"
+#include "drawlist.h"
+#include <math.h>
+#include <stdlib.h>
+#include <SDL2/SDL.h>
+
+
+// ======================================================
+// CAMERA
+// ======================================================
+
+// This section contains the camera through which the scene is seen. Cursor positions are world
+// coordinates: the scene is no longer limited to the window, and the user pans and zooms the
+// view instead of moving the shapes.
+//
+// - `camera` is moved by the event handlers on the simulation thread, and travels to the render
+//   thread with each cursor snapshot (see simulation.c).
+// - The render thread draws with the camera of the snapshot (`setViewCamera`): each pooled shape
+//   is moved to screen coordinates by `applyViewCamera` when it is queued, so the draw list, the
+//   caches and the rasterizer work in screen pixels as before.
+// - With the default camera (position (0, 0), zoom 1), world and screen coordinates are equal.
+//
+// Functions in this section:
+// - panCamera: Moves a camera by a number of screen pixels.
+// - zoomCamera: Zooms a camera in or out around a point of the window.
+// - screenToWorld: Converts a position in the window to world coordinates.
+// - setViewCamera: Sets the camera used to draw the current frame.
+// - setViewScale: Sets the render scale of the frames.
+// - applyViewCamera: Moves a cursor from world to screen coordinates.
+
+
+Camera camera = {0.0f, 0.0f, 1.0f};
+static Camera view_camera = {0.0f, 0.0f, 1.0f};  // Camera of the snapshot being drawn.
+static float view_scale = 1.0f;                  // Frame pixels per window pixel (render scaling).
+
+
+// Function to move a camera by a number of screen pixels.
+//
+// Parameters:
+// - Camera* view: The camera to move.
+// - int dx, int dy: The movement in screen pixels (positive values show what is right or below).
+//
+// Example Usage:
+// panCamera(&camera, -event.motion.xrel, -event.motion.yrel); // Drag the scene with the mouse
+void panCamera(Camera* view, int dx, int dy) {
+    view->x += dx / view->zoom;
+    view->y += dy / view->zoom;
+}
+
+
+// Function to zoom a camera in or out around a point of the window.
+//
+// Parameters:
+// - Camera* view: The camera to zoom.
+// - int screen_x, int screen_y: The point of the window that stays in place, usually the mouse.
+// - int zoomIn: Non-zero to zoom in (by `CAMERA_ZOOM_STEP`), zero to zoom out.
+//
+// Notes:
+// - The zoom stays between `CAMERA_MIN_ZOOM` and `CAMERA_MAX_ZOOM`.
+void zoomCamera(Camera* view, int screen_x, int screen_y, int zoomIn) {
+    float world_x = view->x + screen_x / view->zoom;
+    float world_y = view->y + screen_y / view->zoom;
+
+    float zoom = zoomIn ? view->zoom * CAMERA_ZOOM_STEP : view->zoom / CAMERA_ZOOM_STEP;
+    if (zoom < CAMERA_MIN_ZOOM) {
+        zoom = CAMERA_MIN_ZOOM;
+    }
+    if (zoom > CAMERA_MAX_ZOOM) {
+        zoom = CAMERA_MAX_ZOOM;
+    }
+
+    // Keep the world point under (screen_x, screen_y) in place.
+    view->zoom = zoom;
+    view->x = world_x - screen_x / zoom;
+    view->y = world_y - screen_y / zoom;
+}
+
+
+// Function to convert a position in the window to world coordinates.
+//
+// Parameters:
+// - const Camera* view: The camera.
+// - int screen_x, int screen_y: The position in the window, for instance of a mouse click.
+// - int* world_x, int* world_y: Receive the world coordinates.
+void screenToWorld(const Camera* view, int screen_x, int screen_y, int* world_x, int* world_y) {
+    *world_x = (int)floorf(view->x + screen_x / view->zoom);
+    *world_y = (int)floorf(view->y + screen_y / view->zoom);
+}
+
+
+// Function to set the camera used to draw the current frame (render thread).
+void setViewCamera(const Camera* view) {
+    view_camera = *view;
+}
+
+
+// Function to set the render scale of the frames (render thread).
+//
+// Parameters:
+// - float scale: The size of the frame relative to the window (1.0 = full resolution). The
+//   shapes are drawn this much smaller, and the frame is stretched back to the window.
+//
+// Notes:
+// - Only the drawing is scaled: the view shows the same part of the world, and the mouse
+//   positions stay in window pixels.
+void setViewScale(float scale) {
+    view_scale = scale;
+}
+
+
+// Function to move a cursor from world to screen coordinates, with the camera of the frame.
+//
+// Implementation Details:
+// - The position is moved and multiplied by the zoom, and the zoom is applied to the scale, so
+//   the shapes keep their proportions. The thickness is zoomed too, but stays at least 1 pixel.
+// - The render scale (`setViewScale`) multiplies the zoom.
+void applyViewCamera(Cursor* cursor) {
+    const Camera* view = &view_camera;
+    float zoom = view->zoom * view_scale;
+    cursor->x = (int)floorf((cursor->x - view->x) * zoom + 0.5f);
+    cursor->y = (int)floorf((cursor->y - view->y) * zoom + 0.5f);
+    if (zoom != 1.0f) {
+        cursor->scale *= zoom;
+        int thickness = (int)(cursor->thickness * zoom + 0.5f);
+        cursor->thickness = thickness < 1 ? 1 : thickness;
+    }
+}
+
+
+// ======================================================
+// QUADTREE VIEW CULLING
+// ======================================================
+
+// This section only queues the shapes that can appear in the window. The world bounds of the
+// shapes of the script are stored in a quadtree: each shape sits in the smallest node that fully
+// contains it, and a leaf holding more than `QUADTREE_NODE_CAPACITY` shapes is split in four.
+// A frame only visits the nodes intersecting the view, so shapes far from the window cost
+// nothing to draw.
+//
+// The tree follows the cursors incrementally: each frame, the cursors whose position, angle,
+// scale, thickness or visibility changed since the last frame have their shapes moved in the
+// tree. When a large part of the cursors changed (animations), the tree is rebuilt instead.
+//
+// Functions in this section:
+// - queueVisibleShapes: Queues the shapes of the script intersecting the view, in drawing order.
+// - clearViewCulling: Frees the quadtree.
+
+
+// A node of the quadtree.
+typedef struct {
+    SDL_Rect area;        // World square covered by the node.
+    int children;         // Index of the first of the four children, -1 for a leaf.
+    int depth;            // Depth of the node, 0 for the root.
+    int* shapes;          // Shapes stored in the node (indices in the script table).
+    int count;
+    int capacity;
+} QuadNode;
+
+// The place of a shape in the quadtree.
+typedef struct {
+    int node;             // Node storing the shape, -1 when the shape is not in the tree (hidden).
+    int slot;             // Position of the shape in the node's `shapes` array.
+    SDL_Rect bounds;      // World bounds of the shape.
+} QuadItem;
+
+static QuadNode* quad_nodes = NULL;
+static int quad_node_count = 0;
+static int quad_node_allocated = 0;   // Nodes whose `shapes` array can be reused.
+static int quad_node_capacity = 0;
+
+static QuadItem* quad_items = NULL;
+static const ScriptShape* tree_shapes = NULL;  // Script table the tree was built for.
+static int tree_shape_count = 0;
+static CursorPool tree_cursors = {0};          // State of the cursors when their shapes were inserted.
+static int tree_built = 0;
+
+static int* cursor_first_shape = NULL;  // First shape of each cursor, -1 if none.
+static int* shape_next = NULL;          // Next shape of the same cursor, -1 for the last one.
+static int cursor_link_count = 0;
+
+static int* visible_shapes = NULL;      // Shapes found in the view by the last query.
+static int* changed_cursors = NULL;     // Cursors that changed since the last frame.
+
+
+// Function to append a new empty node to the tree and return its index.
+static int newQuadNode(SDL_Rect area, int depth) {
+    if (quad_node_count == quad_node_capacity) {
+        quad_node_capacity = quad_node_capacity ? quad_node_capacity * 2 : 64;
+        quad_nodes = realloc(quad_nodes, quad_node_capacity * sizeof(QuadNode));
+    }
+    int index = quad_node_count++;
+    QuadNode* node = &quad_nodes[index];
+    if (index >= quad_node_allocated) {
+        node->shapes = NULL;
+        node->capacity = 0;
+        quad_node_allocated = index + 1;
+    }
+    node->area = area;
+    node->children = -1;
+    node->depth = depth;
+    node->count = 0;
+    return index;
+}
+
+
+// Function to check whether a rectangle lies entirely inside another one.
+static int rectInside(const SDL_Rect* inner, const SDL_Rect* outer) {
+    return inner->x >= outer->x && inner->y >= outer->y
+        && inner->x + inner->w <= outer->x + outer->w && inner->y + inner->h <= outer->y + outer->h;
+}
+
+
+// Function to store a shape in a node.
+static void addToNode(int node_index, int shape) {
+    QuadNode* node = &quad_nodes[node_index];
+    if (node->count == node->capacity) {
+        node->capacity = node->capacity ? node->capacity * 2 : 8;
+        node->shapes = realloc(node->shapes, node->capacity * sizeof(int));
+    }
+    quad_items[shape].node = node_index;
+    quad_items[shape].slot = node->count;
+    node->shapes[node->count++] = shape;
+}
+
+
+// Function to take a shape out of the tree.
+static void removeFromTree(int shape) {
+    QuadItem* item = &quad_items[shape];
+    if (item->node < 0) {
+        return;
+    }
+    QuadNode* node = &quad_nodes[item->node];
+    int last = node->shapes[--node->count];
+    node->shapes[item->slot] = last;
+    quad_items[last].slot = item->slot;
+    item->node = -1;
+}
+
+
+// Function to return the child of a node that fully contains a rectangle, or -1.
+static int childContaining(int node_index, const SDL_Rect* bounds) {
+    int first = quad_nodes[node_index].children;
+    for (int c = 0; c < 4; c++) {
+        if (rectInside(bounds, &quad_nodes[first + c].area)) {
+            return first + c;
+        }
+    }
+    return -1;
+}
+
+
+// Function to split a leaf in four and move down the shapes that fit in a child.
+static void splitNode(int node_index) {
+    SDL_Rect area = quad_nodes[node_index].area;
+    int depth = quad_nodes[node_index].depth + 1;
+    int half_w = area.w / 2;
+    int half_h = area.h / 2;
+
+    SDL_Rect quarters[4] = {
+        {area.x, area.y, half_w, half_h},
+        {area.x + half_w, area.y, area.w - half_w, half_h},
+        {area.x, area.y + half_h, half_w, area.h - half_h},
+        {area.x + half_w, area.y + half_h, area.w - half_w, area.h - half_h}
+    };
+    int first = newQuadNode(quarters[0], depth);
+    for (int c = 1; c < 4; c++) {
+        newQuadNode(quarters[c], depth);
+    }
+    quad_nodes[node_index].children = first;
+
+    QuadNode* node = &quad_nodes[node_index];
+    for (int i = 0; i < node->count;) {
+        int shape = node->shapes[i];
+        int child = childContaining(node_index, &quad_items[shape].bounds);
+        if (child < 0) {
+            i++;
+            continue;
+        }
+        removeFromTree(shape);  // Moves the last shape of the node to slot i.
+        addToNode(child, shape);
+        node = &quad_nodes[node_index];
+    }
+}
+
+
+// Function to insert a shape, whose bounds are set, in the deepest node containing it.
+//
+// Notes:
+// - Shapes outside the root's area (cursors moved beyond the scene of the last rebuild) are
+//   kept in the root, whose shapes are always tested.
+static void insertIntoTree(int shape) {
+    const SDL_Rect* bounds = &quad_items[shape].bounds;
+    int node = 0;
+    if (rectInside(bounds, &quad_nodes[0].area)) {
+        while (quad_nodes[node].children >= 0) {
+            int child = childContaining(node, bounds);
+            if (child < 0) {
+                break;
+            }
+            node = child;
+        }
+    }
+    addToNode(node, shape);
+
+    if (quad_nodes[node].children < 0 && quad_nodes[node].count > QUADTREE_NODE_CAPACITY
+        && quad_nodes[node].depth < QUADTREE_MAX_DEPTH) {
+        splitNode(node);
+    }
+}
+
+
+// Function to compute the world bounds of a shape, as the draw list computes its screen bounds.
+static SDL_Rect scriptShapeBounds(const CursorPool* pool, const ScriptShape* shape) {
+    int i = shape->index;
+    return getShapeBounds(shape->form, (int)(shape->size * pool->scale[i]), pool->thickness[i],
+                          pool->x[i], pool->y[i], pool->angle[i]);
+}
+
+
+// Function to link each cursor to its shapes, for a new script table.
+static void linkCursorShapes(const CursorPool* pool, const ScriptShape* shapes, int count) {
+    free(cursor_first_shape);
+    free(shape_next);
+    free(quad_items);
+    free(visible_shapes);
+    cursor_link_count = pool->count;
+    cursor_first_shape = malloc((pool->count > 0 ? pool->count : 1) * sizeof(int));
+    shape_next = malloc(count * sizeof(int));
+    quad_items = malloc(count * sizeof(QuadItem));
+    visible_shapes = malloc(count * sizeof(int));
+    for (int i = 0; i < pool->count; i++) {
+        cursor_first_shape[i] = -1;
+    }
+    for (int s = count - 1; s >= 0; s--) {
+        shape_next[s] = cursor_first_shape[shapes[s].index];
+        cursor_first_shape[shapes[s].index] = s;
+    }
+    tree_shapes = shapes;
+    tree_shape_count = count;
+}
+
+
+// Function to rebuild the whole tree from the current cursors.
+static void rebuildTree(const CursorPool* pool, const ScriptShape* shapes, int count) {
+    if (shapes != tree_shapes || count != tree_shape_count || pool->count != cursor_link_count) {
+        linkCursorShapes(pool, shapes, count);
+        free(changed_cursors);
+        changed_cursors = malloc((pool->count > 0 ? pool->count : 1) * sizeof(int));
+    }
+
+    // The root is the square containing every visible shape.
+    SDL_Rect scene = {0, 0, 0, 0};
+    for (int s = 0; s < count; s++) {
+        quad_items[s].node = -1;
+        if (pool->flags[shapes[s].index] & CURSOR_VISIBLE) {
+            quad_items[s].bounds = scriptShapeBounds(pool, &shapes[s]);
+            if (scene.w == 0) {
+                scene = quad_items[s].bounds;
+            } else {
+                SDL_UnionRect(&scene, &quad_items[s].bounds, &scene);
+            }
+        }
+    }
+    int side = scene.w > scene.h ? scene.w : scene.h;
+    scene.w = scene.h = side > 0 ? side : 1;
+
+    quad_node_count = 0;
+    newQuadNode(scene, 0);
+    for (int s = 0; s < count; s++) {
+        if (pool->flags[shapes[s].index] & CURSOR_VISIBLE) {
+            insertIntoTree(s);
+        }
+    }
+
+    copyCursorPool(&tree_cursors, pool);
+    tree_built = 1;
+}
+
+
+// Function to move the shapes of the cursors that changed since the last frame.
+static void updateTree(const CursorPool* pool, const ScriptShape* shapes, int count) {
+    if (!tree_built || shapes != tree_shapes || count != tree_shape_count || pool->count != tree_cursors.count) {
+        rebuildTree(pool, shapes, count);
+        return;
+    }
+
+    int changed = 0;
+    for (int i = 0; i < pool->count; i++) {
+        if (pool->x[i] != tree_cursors.x[i] || pool->y[i] != tree_cursors.y[i]
+            || pool->angle[i] != tree_cursors.angle[i] || pool->scale[i] != tree_cursors.scale[i]
+            || pool->thickness[i] != tree_cursors.thickness[i] || pool->flags[i] != tree_cursors.flags[i]) {
+            changed_cursors[changed++] = i;
+        }
+    }
+    if (changed > pool->count / 4) {
+        rebuildTree(pool, shapes, count);  // Cheaper than moving most of the shapes one by one.
+        return;
+    }
+
+    for (int c = 0; c < changed; c++) {
+        int i = changed_cursors[c];
+        tree_cursors.x[i] = pool->x[i];
+        tree_cursors.y[i] = pool->y[i];
+        tree_cursors.angle[i] = pool->angle[i];
+        tree_cursors.scale[i] = pool->scale[i];
+        tree_cursors.thickness[i] = pool->thickness[i];
+        tree_cursors.flags[i] = pool->flags[i];
+        for (int s = cursor_first_shape[i]; s >= 0; s = shape_next[s]) {
+            removeFromTree(s);
+            if (pool->flags[i] & CURSOR_VISIBLE) {
+                quad_items[s].bounds = scriptShapeBounds(pool, &shapes[s]);
+                insertIntoTree(s);
+            }
+        }
+    }
+}
+
+
+// Function to compare two shape indices, for `qsort`.
+static int compareShapes(const void* a, const void* b) {
+    return *(const int*)a - *(const int*)b;
+}
+
+
+// Function to queue the shapes of the script intersecting the view, in drawing order.
+//
+// Parameters:
+// - SDL_Renderer* renderer: The renderer, passed to `queuePooledDraw`.
+// - const CursorPool* pool: The cursors drawn (the snapshot of the frame).
+// - const ScriptShape* shapes: The shapes of the script, in drawing order.
+// - int count: The number of shapes.
+//
+// Implementation Details:
+// 1. The tree is brought up to date with the cursors (see `updateTree`).
+// 2. The nodes intersecting the world rectangle seen by the camera (with a margin for the
+//    rounding and the minimum thickness) are visited, and their shapes intersecting it collected.
+// 3. The collected shapes are sorted back into drawing order and queued.
+//
+// Notes:
+// - With `VIEW_CULLING_ENABLED` set to 0, every shape is queued.
+//
+// Example Usage:
+// queueVisibleShapes(renderer, pool, script_shapes, 3);
+void queueVisibleShapes(SDL_Renderer* renderer, const CursorPool* pool, const ScriptShape* shapes, int count) {
+    if (!VIEW_CULLING_ENABLED) {
+        for (int s = 0; s < count; s++) {
+            queuePooledDraw(renderer, shapes[s].form, pool, shapes[s].index, shapes[s].size,
+                            shapes[s].start_angle, shapes[s].end_angle);
+        }
+        return;
+    }
+
+    updateTree(pool, shapes, count);
+
+    float margin = 2.0f / view_camera.zoom + 2.0f;
+    SDL_Rect view = {
+        (int)floorf(view_camera.x - margin),
+        (int)floorf(view_camera.y - margin),
+        (int)ceilf(SCREEN_WIDTH / view_camera.zoom + 2 * margin) + 1,
+        (int)ceilf(SCREEN_HEIGHT / view_camera.zoom + 2 * margin) + 1
+    };
+
+    int visible_count = 0;
+    int stack[4 * (QUADTREE_MAX_DEPTH + 1)];
+    int stack_size = 0;
+    stack[stack_size++] = 0;
+    while (stack_size > 0) {
+        const QuadNode* node = &quad_nodes[stack[--stack_size]];
+        for (int i = 0; i < node->count; i++) {
+            if (SDL_HasIntersection(&quad_items[node->shapes[i]].bounds, &view)) {
+                visible_shapes[visible_count++] = node->shapes[i];
+            }
+        }
+        for (int c = 0; node->children >= 0 && c < 4; c++) {
+            if (SDL_HasIntersection(&quad_nodes[node->children + c].area, &view)) {
+                stack[stack_size++] = node->children + c;
+            }
+        }
+    }
+
+    qsort(visible_shapes, visible_count, sizeof(int), compareShapes);
+    for (int v = 0; v < visible_count; v++) {
+        const ScriptShape* shape = &shapes[visible_shapes[v]];
+        queuePooledDraw(renderer, shape->form, pool, shape->index, shape->size, shape->start_angle, shape->end_angle);
+    }
+}
+
+
+// Function to free the quadtree.
+//
+// Notes:
+// - Call it before leaving the program.
+void clearViewCulling() {
+    for (int i = 0; i < quad_node_allocated; i++) {
+        free(quad_nodes[i].shapes);
+    }
+    free(quad_nodes);
+    free(quad_items);
+    free(cursor_first_shape);
+    free(shape_next);
+    free(visible_shapes);
+    free(changed_cursors);
+    freeCursorPool(&tree_cursors);
+    quad_nodes = NULL;
+    quad_items = NULL;
+    cursor_first_shape = shape_next = visible_shapes = changed_cursors = NULL;
+    quad_node_count = quad_node_allocated = quad_node_capacity = 0;
+    tree_shapes = NULL;
+    tree_shape_count = cursor_link_count = 0;
+    tree_built = 0;
+}
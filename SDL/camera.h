@@ -0,0 +1,34 @@
+#ifndef CAMERA_H
+#define CAMERA_H
+
+#include <SDL2/SDL.h>
+#include "geometry.h"
+#include "newcursor.h"
+
+typedef struct {
+    float x, y;           // World position shown at the top-left corner of the window.
+    float zoom;           // Screen pixels per world unit (1.0 = no zoom, >1.0 = closer).
+} Camera;
+
+// A shape of the script, as queued by `queuePooledDraw`.
+typedef struct {
+    ShapeForm form;       // The shape to draw.
+    int index;            // The index of the cursor drawing it in the pool.
+    int size;             // The size of the shape before scaling (farthest vertex of a path).
+    int start_angle;      // The start angle (arcs), or the index of the path (paths).
+    int end_angle;        // The end angle (arcs only).
+} ScriptShape;
+
+extern Camera camera;  // The camera moved by the user (simulation thread).
+
+void panCamera(Camera* view, int dx, int dy);
+void zoomCamera(Camera* view, int screen_x, int screen_y, int zoomIn);
+void screenToWorld(const Camera* view, int screen_x, int screen_y, int* world_x, int* world_y);
+void setViewCamera(const Camera* view);
+void setViewScale(float scale);
+void applyViewCamera(Cursor* cursor);
+
+void queueVisibleShapes(SDL_Renderer* renderer, const CursorPool* pool, const ScriptShape* shapes, int count);
+void clearViewCulling();
+
+#endif
@@ -5,9 +5,57 @@
 #define SCREEN_WIDTH 800  // Width of the SDL window in pixels.
 #define SCREEN_HEIGHT 600 // Height of the SDL window in pixels.
 
+// Geometry Cache
+#define GEOMETRY_CACHE_SIZE 32 // Number of tessellated shapes kept in the LRU geometry cache.
+
+// Sprite Cache
+#define SPRITE_CACHE_SIZE 64   // Number of pre-rendered shape textures kept in the LRU sprite cache.
+
+// Draw List
+#define DRAW_LIST_CAPACITY 1024 // Initial number of draw commands of the list (doubled when full), and of a part given to the software rasterizer.
+#define DRAW_STATS_LOG 0        // Set to 1 to print the draw statistics of every frame.
+#define LAYER_CACHE_ENABLED 1   // Set to 0 to redraw every shape each frame instead of caching unchanged shapes.
+#define DIRTY_RECTS_ENABLED 1   // Set to 0 to rebuild the whole frame instead of only the regions that changed.
+#define DIRTY_RECT_MAX 16       // Maximum number of separate regions redrawn in a frame before they are merged.
+#define DRAW_GRID_CELL_SIZE 32  // Width and height in pixels of the cells used to find the overlapping shapes of a flush.
+
+// Software Rasterizer
+#define SOFTWARE_RASTER_ENABLED 0 // Set to 1 to rasterize the shapes on several threads instead of with the SDL renderer.
+#define RASTER_THREADS 4          // Number of threads rasterizing a frame, the main thread included.
+#define RASTER_TILE_SIZE 64       // Width and height in pixels of the screen tiles shared between the threads.
+
+// Selection
+#define SPATIAL_CELL_SIZE 64       // Width and height in pixels of the cells of the selection grid.
+#define SPATIAL_HASH_BUCKETS 4096  // Number of buckets the cells are hashed into (power of two).
+
+// Camera
+#define CAMERA_MIN_ZOOM 0.1f      // Smallest zoom of the view (whole world seen from far).
+#define CAMERA_MAX_ZOOM 10.0f     // Largest zoom of the view.
+#define CAMERA_ZOOM_STEP 1.1f     // Zoom factor applied by one step of the mouse wheel.
+#define CAMERA_PAN_STEP 40        // Screen pixels the view moves when an arrow key is pressed.
+#define VIEW_CULLING_ENABLED 1    // Set to 0 to queue every shape instead of only those in the view.
+#define QUADTREE_NODE_CAPACITY 16 // Number of shapes a quadtree leaf holds before it is split.
+#define QUADTREE_MAX_DEPTH 12     // Maximum depth of the quadtree.
+
+// Simulation Thread
+#define SIMULATION_EVENT_QUEUE 256 // Maximum number of events waiting for the simulation thread.
+#define SIMULATION_EVENT_WAIT 5    // Milliseconds the render thread waits for a new snapshot before polling the events again.
+#define EVENT_STATS_LOG 0          // Set to 1 to print the number of events received and merged when the program ends.
+
+// Render Scaling
+#define RENDER_SCALE 1.0f          // Size of the drawn frames relative to the window (0.5 = a quarter of the pixels, stretched).
+#define RENDER_SCALE_AUTO 0        // Set to 1 to adapt the render scale to the drawing time of the frames.
+#define RENDER_TARGET_FRAME_MS 33  // Drawing time per frame the automatic render scale aims for, in milliseconds.
+#define RENDER_SCALE_MIN 0.25f     // Smallest render scale.
+#define RENDER_SCALE_STEP 0.125f   // Change of the automatic render scale at a time.
+#define RENDER_SCALE_FRAMES 10     // Number of frames measured before the automatic render scale changes.
+
 // Mathematical Constants
 #ifndef M_PI
 #define M_PI 3.14159265358979323846 // Defines the value of PI if not already defined.
 #endif
+#ifndef M_SQRT2
+#define M_SQRT2 1.41421356237309504880 // Defines the square root of 2 if not already defined.
+#endif
 
 #endif // CONFIG_H
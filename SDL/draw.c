@@ -1,5 +1,8 @@
 #include "draw.h"
 #include "config.h"
+#include "geometry.h"
+#include "sprite.h"
+#include "drawlist.h"
 #include <math.h>
 #include <SDL2/SDL.h>
 
@@ -9,7 +12,7 @@
 // ======================================================
 
 // This section contains functions responsible for rendering different shapes
-// (lines, squares, circles, arcs, etc.) on the screen. These shapes are drawn
+// (lines, squares, circles, arcs, paths, etc.) on the screen. These shapes are drawn
 // based on the attributes of the `Cursor` object, such as position, scale, color,
 // thickness, and rotation.
 //
@@ -20,6 +23,12 @@
 // - drawCircle: Draws the outline of a circle with configurable thickness.
 // - drawFilledCircle: Draws a filled circle centered at the cursor's position.
 // - drawArc: Draws a partial circle (arc) with configurable start and end angles.
+// - drawPath: Draws a polyline through the vertices of a path with a single batched call.
+//
+// The point-based shapes (filled square, circle, filled circle, arc) take their points from
+// the geometry cache (see geometry.c), so only the cursor's rotation and translation are
+// computed each frame. Circles, filled circles and filled squares are first tried as
+// pre-rendered sprites (see sprite.c), copied to the screen as a single texture.
 
 
 // Function to draw a line with a specified Cursor object.
@@ -56,7 +65,7 @@ void drawLine(SDL_Renderer* renderer, Cursor* cursor, int length) {
         int y_end = y_start + scaled_length * sin(rad_angle);
 
         // Set the drawing color based on the cursor's RGBA values.
-        SDL_SetRenderDrawColor(renderer, cursor->color.r, cursor->color.g, cursor->color.b, cursor->color.a);
+        setDrawColor(renderer, cursor->color);
 
         // Draw parallel lines to simulate thickness.
         for (int offset = -cursor->thickness / 2; offset <= cursor->thickness / 2; offset++) {
@@ -88,7 +97,7 @@ void drawLine(SDL_Renderer* renderer, Cursor* cursor, int length) {
 // - The square is defined by its four corners, calculated relative to the cursor's center (`x`, `y`).
 // - Each corner is rotated around the cursor's center using the cursor's `angle`.
 // - The square's thickness is simulated by drawing multiple lines around its edges.
-// - The color of the square is set using `SDL_SetRenderDrawColor`.
+// - The color of the square is set using `setDrawColor`, which skips the call when the color is already set.
 //
 // Notes:
 // - The square's rotation is calculated using trigonometric functions (`cos` and `sin`).
@@ -126,7 +135,7 @@ void drawSquare(SDL_Renderer* renderer, Cursor* cursor, int size) {
             int rotated_y4 = (int)(x4 * sin(rad_angle) + y4 * cos(rad_angle)) + cursor->y + offset;
 
             // Set the color for drawing.
-            SDL_SetRenderDrawColor(renderer, cursor->color.r, cursor->color.g, cursor->color.b, cursor->color.a);
+            setDrawColor(renderer, cursor->color);
 
             // Draw the four edges of the square.
             SDL_RenderDrawLine(renderer, rotated_x1, rotated_y1, rotated_x2, rotated_y2); // Top edge
@@ -153,8 +162,10 @@ void drawSquare(SDL_Renderer* renderer, Cursor* cursor, int size) {
 //
 // Implementation Details:
 // - The square is drawn by filling in each pixel within its bounds, rotated around the cursor's center.
-// - Each pixel is rotated individually using the cursor's `angle` to account for rotation.
-// - The color is set using `SDL_SetRenderDrawColor`.
+// - The pixels are taken from the geometry cache and rotated using the cursor's `angle`.
+// - When the renderer supports target textures, the square is instead copied from a cached
+//   sprite with `SDL_RenderCopyEx`, which applies the rotation.
+// - The color is set using `setDrawColor`, which skips the call when the color is already set.
 //
 // Notes:
 // - The rotation is calculated using trigonometric functions (`cos` and `sin`).
@@ -166,23 +177,18 @@ void drawSquare(SDL_Renderer* renderer, Cursor* cursor, int size) {
 void drawFilledSquare(SDL_Renderer* renderer, Cursor* cursor, int size) {
     if(cursor->visible){
         int scaled_size = (int)(size * cursor->scale);  // Adjust size based on the cursor's scale.
-        int half_size = scaled_size / 2;
-        float rad_angle = cursor->angle * M_PI / 180.0; // Convert the angle to radians.
 
-        // Set the color for the filled square.
-        SDL_SetRenderDrawColor(renderer, cursor->color.r, cursor->color.g, cursor->color.b, cursor->color.a);
-
-        // Loop through all pixels within the bounds of the square.
-        for (int y = -half_size - cursor->thickness / 2; y <= half_size + cursor->thickness / 2; y++) {
-            for (int x = -half_size - cursor->thickness / 2; x <= half_size + cursor->thickness / 2; x++) {
-                // Rotate the pixel around the center of the square.
-                int rotated_x = (int)(x * cos(rad_angle) - y * sin(rad_angle));
-                int rotated_y = (int)(x * sin(rad_angle) + y * cos(rad_angle));
-
-                // Draw the rotated pixel at the cursor's position.
-                SDL_RenderDrawPoint(renderer, cursor->x + rotated_x, cursor->y + rotated_y);
-            }
+        // Copy the pre-rendered square, rotated by the cursor's angle, when sprites are available.
+        if (drawSprite(renderer, FORM_FILLED_SQUARE, scaled_size, cursor->thickness, cursor->color, cursor->x, cursor->y, cursor->angle)) {
+            return;
         }
+
+        // Set the color for the filled square.
+        setDrawColor(renderer, cursor->color);
+
+        // Rotate the cached pixels of the square around the cursor's position and draw them.
+        const ShapeGeometry* geometry = getShapeGeometry(FORM_FILLED_SQUARE, scaled_size, cursor->thickness, 0, 0);
+        renderShapeGeometry(renderer, geometry, cursor->x, cursor->y, cursor->angle);
     }
 }
 
@@ -204,7 +210,9 @@ void drawFilledSquare(SDL_Renderer* renderer, Cursor* cursor, int size) {
 //     x = r * cos(angle)
 //     y = r * sin(angle)
 // - Multiple concentric circles are drawn to simulate the thickness.
-// - The `color` is set using `SDL_SetRenderDrawColor`.
+// - The points are computed once per radius and thickness by the geometry cache.
+// - When the renderer supports target textures, the circle is copied from a cached sprite.
+// - The `color` is set using `setDrawColor`, which skips the call when the color is already set.
 //
 // Notes:
 // - Ensure the `cursor->thickness` is positive; otherwise, no circle will be drawn.
@@ -217,18 +225,17 @@ void drawCircle(SDL_Renderer* renderer, Cursor* cursor, int radius) {
     if(cursor->visible){
         int scaled_radius = (int)(radius * cursor->scale); // Adjust radius based on the cursor's scale.
 
+        // Copy the pre-rendered circle when sprites are available.
+        if (drawSprite(renderer, FORM_CIRCLE, scaled_radius, cursor->thickness, cursor->color, cursor->x, cursor->y, 0)) {
+            return;
+        }
+
         // Set the color for the circle's outline.
-        SDL_SetRenderDrawColor(renderer, cursor->color.r, cursor->color.g, cursor->color.b, cursor->color.a);
+        setDrawColor(renderer, cursor->color);
 
-        // Loop through each layer of thickness.
-        for (int offset = 0; offset < cursor->thickness; offset++) {
-            // Loop through 360 degrees to calculate and draw the circle points.
-            for (int angle = 0; angle < 360; angle++) {
-                int x = cursor->x + (scaled_radius + offset) * cos(angle * M_PI / 180.0); // x-coordinate of the point
-                int y = cursor->y + (scaled_radius + offset) * sin(angle * M_PI / 180.0); // y-coordinate of the point
-                SDL_RenderDrawPoint(renderer, x, y); // Draw the point on the renderer
-            }
-        }
+        // Draw the cached concentric circles (one per layer of thickness) at the cursor's position.
+        const ShapeGeometry* geometry = getShapeGeometry(FORM_CIRCLE, scaled_radius, cursor->thickness, 0, 0);
+        renderShapeGeometry(renderer, geometry, cursor->x, cursor->y, 0);
     }
 }
 
@@ -249,7 +256,10 @@ void drawCircle(SDL_Renderer* renderer, Cursor* cursor, int radius) {
 // - The filled circle is drawn by iterating over all points within the bounding box of the circle.
 // - For each point, the distance from the circle's center is calculated. If the distance
 //   is less than or equal to the circle's radius, the point is drawn.
-// - The `color` is set using `SDL_SetRenderDrawColor`.
+// - The points inside the circle are computed once per radius by the geometry cache.
+// - When the renderer supports target textures, the disc is copied from a cached sprite,
+//   and the cursor's `angle` is ignored since it does not change the disc.
+// - The `color` is set using `setDrawColor`, which skips the call when the color is already set.
 //
 // Notes:
 // - Ensure the `cursor->thickness` is positive, as it affects the extent of the filled area.
@@ -261,25 +271,18 @@ void drawCircle(SDL_Renderer* renderer, Cursor* cursor, int radius) {
 void drawFilledCircle(SDL_Renderer* renderer, Cursor* cursor, int radius) {
     if(cursor->visible){
         int scaled_radius = (int)(radius * cursor->scale); // Adjust radius based on the cursor's scale.
-        float rad_angle = cursor->angle * M_PI / 180.0;    // Convert the angle to radians.
 
-        // Set the color for the filled circle.
-        SDL_SetRenderDrawColor(renderer, cursor->color.r, cursor->color.g, cursor->color.b, cursor->color.a);
-
-        // Iterate through all pixels within the bounding box of the circle.
-        for (int y = -scaled_radius; y <= scaled_radius; y++) {
-            for (int x = -scaled_radius; x <= scaled_radius; x++) {
-                // Check if the point is within the circle's radius.
-                if (x * x + y * y <= scaled_radius * scaled_radius) {
-                    // Apply rotation to the point.
-                    int rotated_x = (int)(x * cos(rad_angle) - y * sin(rad_angle));
-                    int rotated_y = (int)(x * sin(rad_angle) + y * cos(rad_angle));
-
-                    // Draw the point on the renderer.
-                    SDL_RenderDrawPoint(renderer, cursor->x + rotated_x, cursor->y + rotated_y);
-                }
-            }
+        // Copy the pre-rendered disc when sprites are available (its look does not depend on the angle).
+        if (drawSprite(renderer, FORM_FILLED_CIRCLE, scaled_radius, cursor->thickness, cursor->color, cursor->x, cursor->y, 0)) {
+            return;
         }
+
+        // Set the color for the filled circle.
+        setDrawColor(renderer, cursor->color);
+
+        // Rotate the cached pixels of the disc around the cursor's position and draw them.
+        const ShapeGeometry* geometry = getShapeGeometry(FORM_FILLED_CIRCLE, scaled_radius, cursor->thickness, 0, 0);
+        renderShapeGeometry(renderer, geometry, cursor->x, cursor->y, cursor->angle);
     }
 }
 
@@ -306,6 +309,7 @@ void drawFilledCircle(SDL_Renderer* renderer, Cursor* cursor, int radius) {
 // - The angles are iterated between `startAngle` and `endAngle` to draw the arc segment.
 // - Rotation is applied using the cursor's `angle`, and thickness is simulated by drawing
 //   multiple concentric arcs.
+// - The unrotated points are computed once per radius, thickness and angles by the geometry cache.
 //
 // Notes:
 // - Ensure the `startAngle` is less than or equal to `endAngle` for correct rendering.
@@ -317,26 +321,44 @@ void drawFilledCircle(SDL_Renderer* renderer, Cursor* cursor, int radius) {
 void drawArc(SDL_Renderer* renderer, Cursor* cursor, int radius, int startAngle, int endAngle) {
     if(cursor->visible){
         int scaled_radius = (int)(radius * cursor->scale); // Adjust radius based on the cursor's scale.
-        float rad_angle = cursor->angle * M_PI / 180.0;    // Convert the cursor's angle to radians.
 
         // Set the color for the arc.
-        SDL_SetRenderDrawColor(renderer, cursor->color.r, cursor->color.g, cursor->color.b, cursor->color.a);
+        setDrawColor(renderer, cursor->color);
 
-        // Draw concentric arcs to simulate thickness.
-        for (int offset = 0; offset < cursor->thickness; offset++) {
-            // Iterate through the angles between startAngle and endAngle.
-            for (float angle = startAngle; angle <= endAngle; angle += 0.1) {
-                // Calculate the point on the arc using the parametric equations.
-                int x = (scaled_radius + offset) * cos(angle * M_PI / 180.0);
-                int y = (scaled_radius + offset) * sin(angle * M_PI / 180.0);
-
-                // Apply rotation to the point.
-                int rotated_x = (int)(x * cos(rad_angle) - y * sin(rad_angle));
-                int rotated_y = (int)(x * sin(rad_angle) + y * cos(rad_angle));
-
-                // Draw the rotated point on the renderer.
-                SDL_RenderDrawPoint(renderer, cursor->x + rotated_x, cursor->y + rotated_y);
-            }
-        }
+        // Rotate the cached concentric arcs (one per layer of thickness) and draw them.
+        const ShapeGeometry* geometry = getShapeGeometry(FORM_ARC, scaled_radius, cursor->thickness, startAngle, endAngle);
+        renderShapeGeometry(renderer, geometry, cursor->x, cursor->y, cursor->angle);
     }
-}
\ No newline at end of file
+}
+
+// Function to draw a path (polyline) using a Cursor object.
+//
+// This function draws the connected segments between the vertices of a path, placed relative
+// to the cursor's current position (`x`, `y`). The vertices are scaled by the cursor's `scale`
+// attribute and rotated by its `angle`, and the path uses the cursor's `color` and `thickness`.
+//
+// Parameters:
+// - SDL_Renderer* renderer: The SDL renderer used to draw the path.
+// - Cursor* cursor: A pointer to the Cursor object that provides position, color,
+//   thickness, scale, and rotation for the path.
+// - int path: The index of the path in the table set by `setShapePaths` (see geometry.c).
+//
+// Implementation Details:
+// - The whole path is sent with one `SDL_RenderDrawLines` call instead of one call per segment.
+// - Thickness is simulated by drawing parallel polylines, offset like the lines of `drawLine`
+//   and joined with miters at the inner vertices.
+//
+// Notes:
+// - An unknown path, or a path with fewer than two vertices, draws nothing.
+//
+// Example Usage:
+// Cursor cursor = createCursor(300, 300, {255, 255, 0, 255}, 1, 1);
+// drawPath(renderer, &cursor, 0); // Draws the first path of the script at (300, 300).
+void drawPath(SDL_Renderer* renderer, Cursor* cursor, int path) {
+    if(cursor->visible){
+        // Set the color once for the whole path.
+        setDrawColor(renderer, cursor->color);
+
+        renderShapePath(renderer, getShapePath(path), cursor->scale, cursor->thickness, cursor->x, cursor->y, cursor->angle);
+    }
+}
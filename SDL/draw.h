@@ -9,5 +9,6 @@ void drawFilledSquare(SDL_Renderer* renderer, Cursor* cursor, int size);
 void drawCircle(SDL_Renderer* renderer, Cursor* cursor, int radius);
 void drawFilledCircle(SDL_Renderer* renderer, Cursor* cursor, int radius);
 void drawArc(SDL_Renderer* renderer, Cursor* cursor, int radius, int startAngle, int endAngle);
+void drawPath(SDL_Renderer* renderer, Cursor* cursor, int path);
 
 #endif
@@ -0,0 +1,920 @@
+#include "drawlist.h"
+#include "camera.h"
+#include "config.h"
+#include "draw.h"
+#include "raster.h"
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <SDL2/SDL.h>
+
+
+// ======================================================
+// RENDER STATE
+// ======================================================
+
+// This section keeps track of the drawing color currently set on the renderer, so that
+// drawing several shapes of the same color only calls `SDL_SetRenderDrawColor` once.
+//
+// Functions in this section:
+// - setDrawColor: Sets the drawing color, skipping the call if it is already set.
+// - invalidateDrawColor: Forgets the tracked color after the renderer was changed directly.
+
+
+static SDL_Renderer* color_renderer = NULL; // Renderer whose color is tracked, NULL if unknown.
+static SDL_Color current_color;              // Color last sent to `color_renderer`.
+static DrawStats draw_stats;                 // Statistics of the current frame.
+
+
+// Function to pack an `SDL_Color` into a single integer.
+static Uint32 packColor(SDL_Color color) {
+    return ((Uint32)color.r << 24) | ((Uint32)color.g << 16) | ((Uint32)color.b << 8) | color.a;
+}
+
+
+// Function to set the drawing color of the renderer.
+//
+// This function replaces direct calls to `SDL_SetRenderDrawColor` in the drawing functions.
+// The call is skipped when the renderer already uses this color, and each call that reaches
+// SDL is counted in the draw statistics.
+//
+// Parameters:
+// - SDL_Renderer* renderer: The renderer whose color is set.
+// - SDL_Color color: The new drawing color.
+//
+// Notes:
+// - Code that calls `SDL_SetRenderDrawColor` directly (for example to clear the screen) must
+//   call `invalidateDrawColor` afterwards.
+//
+// Example Usage:
+// setDrawColor(renderer, cursor->color);
+void setDrawColor(SDL_Renderer* renderer, SDL_Color color) {
+    if (color_renderer == renderer && current_color.r == color.r && current_color.g == color.g
+        && current_color.b == color.b && current_color.a == color.a) {
+        return;
+    }
+    SDL_SetRenderDrawColor(renderer, color.r, color.g, color.b, color.a);
+    color_renderer = renderer;
+    current_color = color;
+    draw_stats.color_changes++;
+}
+
+
+// Function to forget the tracked drawing color.
+//
+// The next call to `setDrawColor` will always reach `SDL_SetRenderDrawColor`.
+void invalidateDrawColor() {
+    color_renderer = NULL;
+}
+
+
+// ======================================================
+// DRAW LIST
+// ======================================================
+
+// This section contains the draw list used by the generated frame loops. Instead of drawing
+// each shape immediately in script order, the frame queues its shapes and flushes them at the
+// end. The flush groups the shapes by color (and by form inside a color), so the drawing
+// color is set once per group. A shape is only moved before an earlier shape of another color
+// when their bounding rectangles do not overlap, so the picture is the same as in script order.
+// The overlapping shapes are found through a grid of the screen, so a flush costs about the
+// number of shapes times the number of shapes sharing their cells, not the number of pairs.
+//
+// Functions in this section:
+// - beginDrawFrame: Starts a new frame and resets the draw statistics.
+// - setDrawFrameSize: Sets the part of the render target the frames are drawn into.
+// - queueDraw: Adds a shape to the draw list.
+// - queuePooledDraw: Adds a shape drawn by a pooled cursor to the draw list.
+// - flushDrawList: Draws every queued shape, grouped by color.
+// - getDrawStats: Returns the statistics of the current frame.
+//
+// Unchanged shapes are served from the layer cache, and only the regions of the screen that
+// changed are redrawn (see the LAYER CACHE AND DIRTY RECTANGLES section).
+
+
+#define DRAW_GRID_X ((SCREEN_WIDTH + DRAW_GRID_CELL_SIZE - 1) / DRAW_GRID_CELL_SIZE)
+#define DRAW_GRID_Y ((SCREEN_HEIGHT + DRAW_GRID_CELL_SIZE - 1) / DRAW_GRID_CELL_SIZE)
+#define DRAW_GRID_CELLS (DRAW_GRID_X * DRAW_GRID_Y)
+#define FORM_COUNT (FORM_PATH + 1)
+
+// Cells of the overlap grid covered by the bounds of a command.
+typedef struct {
+    int left, top;      // First cell.
+    int right, bottom;  // Last cell, `right < left` if the command is in no cell.
+} CellRange;
+
+// The draw list and the arrays indexed by its commands, grown together (see `growDrawList`).
+static DrawCommand* draw_list = NULL;
+static int draw_list_count = 0;
+static int draw_list_capacity = 0;
+static int* draw_done = NULL;     // 1 once the command has been drawn during a flush.
+static int* draw_blockers = NULL; // Number of earlier, overlapping commands of another color still to draw.
+static int* draw_selected = NULL; // 1 if the command is drawn by the current flush.
+
+// Overlap grid and ready queues of `drawSelectedCommands`.
+static const SDL_Rect screen_area = {0, 0, SCREEN_WIDTH, SCREEN_HEIGHT};
+static CellRange* draw_cells = NULL;        // Cells covered by each command.
+static int grid_start[DRAW_GRID_CELLS + 1]; // First entry of each cell in `grid_bins`.
+static int* grid_bins = NULL;               // Commands of each cell, cell after cell, in script order.
+static int grid_bin_capacity = 0;
+static int* color_slots = NULL;             // Number + 1 of each color in `color_values`, 0 if free (2 slots per command).
+static Uint32* color_values = NULL;         // The distinct colors of the flush.
+static int* draw_color_number = NULL;       // Number of the color of each command.
+static int* draw_ready_next = NULL;         // Next command of the same ready queue, -1 for the last one.
+static int* ready_first = NULL;             // First ready command of each color and form, -1 if none (`FORM_COUNT` per command).
+static int* ready_last = NULL;              // Last ready command of each color and form.
+
+static Uint32 last_queued_color = 0;
+static int has_queued_color = 0;
+
+// Layer cache and dirty rectangles (see the LAYER CACHE AND DIRTY RECTANGLES section).
+static SDL_Texture* layer_texture = NULL;          // Screen-sized texture holding the unchanged shapes.
+static SDL_Texture* back_texture = NULL;           // Screen-sized texture holding the last complete frame.
+static SDL_Renderer* layer_renderer = NULL;        // Renderer owning `layer_texture` and `back_texture`.
+static int back_valid = 0;                         // 1 once `back_texture` holds a complete frame.
+static int layer_unsupported = 0;                  // Set when the renderer cannot render to textures.
+static SDL_Color background_color = {0, 0, 0, 255}; // Color the frame was cleared with.
+static SDL_Rect frame_area = {0, 0, SCREEN_WIDTH, SCREEN_HEIGHT}; // Part of the render target the frames use.
+static SDL_Rect dirty_rects[DIRTY_RECT_MAX];       // Regions of the screen to redraw this frame.
+static int dirty_count = 0;
+static DrawCommand* previous_list = NULL;          // Commands of the previous frame.
+static int previous_count = -1;                    // Number of commands of the previous frame, -1 if unknown.
+static int* draw_static = NULL;                    // 1 if the command is the same as in the previous frame.
+static int* draw_in_layer = NULL;                  // 1 if the command is drawn in the layer texture.
+static int* draw_in_region = NULL;                 // 1 if the command is redrawn inside the current dirty rectangle.
+
+static int flushIncremental(SDL_Renderer* renderer);
+
+
+// Function to start a new frame.
+//
+// This function resets the per-frame draw statistics and forgets the tracked color, since the
+// frame starts by clearing the screen with `SDL_SetRenderDrawColor`.
+//
+// Parameters:
+// - SDL_Renderer* renderer: The renderer, whose current drawing color is taken as the background.
+//   NULL in headless mode (software rasterizer only), where the background stays the same.
+//
+// Notes:
+// - Call it right after clearing the screen: dirty rectangles are cleared with the same color.
+// - When `DRAW_STATS_LOG` is set in config.h, the statistics of the previous frame are printed.
+void beginDrawFrame(SDL_Renderer* renderer) {
+    if (DRAW_STATS_LOG && draw_stats.commands > 0) {
+        printf("Draw stats: %d commands, %d drawn (%d layer rebuilds, %d dirty rects, %d pixels), %d batches, %d color changes (%d in script order)\n",
+               draw_stats.commands, draw_stats.drawn_commands, draw_stats.layer_rebuilds, draw_stats.dirty_rects,
+               draw_stats.dirty_area, draw_stats.batches, draw_stats.color_changes, draw_stats.script_order_changes);
+    }
+    if (renderer != NULL) {
+        SDL_GetRenderDrawColor(renderer, &background_color.r, &background_color.g, &background_color.b, &background_color.a);
+    }
+    if (SOFTWARE_RASTER_ENABLED) {
+        beginRasterFrame(background_color);
+    }
+    draw_stats.commands = 0;
+    draw_stats.batches = 0;
+    draw_stats.color_changes = 0;
+    draw_stats.script_order_changes = 0;
+    draw_stats.drawn_commands = 0;
+    draw_stats.layer_rebuilds = 0;
+    draw_stats.dirty_rects = 0;
+    draw_stats.dirty_area = 0;
+    has_queued_color = 0;
+    invalidateDrawColor();
+}
+
+
+// Function to set the part of the render target the frames are drawn into.
+//
+// Parameters:
+// - int width, int height: The size of the frame, in pixels from the top-left corner of the
+//   target. `SCREEN_WIDTH` and `SCREEN_HEIGHT` by default.
+//
+// Implementation Details:
+// - The layer and back textures keep the size of the screen, but only the frame is cleared,
+//   redrawn and copied, so a smaller frame costs fewer pixels to fill.
+// - Changing the size redraws the next frame completely.
+//
+// Notes:
+// - Used by the render scaling of simulation.c: the scene is drawn smaller, then stretched to
+//   the window.
+void setDrawFrameSize(int width, int height) {
+    width = width < 1 ? 1 : (width > SCREEN_WIDTH ? SCREEN_WIDTH : width);
+    height = height < 1 ? 1 : (height > SCREEN_HEIGHT ? SCREEN_HEIGHT : height);
+    if (width == frame_area.w && height == frame_area.h) {
+        return;
+    }
+    frame_area.w = width;
+    frame_area.h = height;
+    back_valid = 0;
+    if (SOFTWARE_RASTER_ENABLED) {
+        setRasterFrameSize(width, height);
+    }
+}
+
+
+// Function to resize an array, stopping the program if memory runs out, like the cursor pool.
+static void* resizeDrawArray(void* array, int capacity, size_t element_size) {
+    array = realloc(array, capacity * element_size);
+    if (array == NULL) {
+        printf("Draw list allocation error for %d elements\n", capacity);
+        exit(1);
+    }
+    return array;
+}
+
+
+// Function to grow an array so that it holds at least `needed` elements.
+static void* reserveDrawArray(void* array, int* capacity, int needed, size_t element_size) {
+    if (needed <= *capacity) {
+        return array;
+    }
+    int new_capacity = *capacity ? *capacity : 1024;
+    while (new_capacity < needed) {
+        new_capacity *= 2;
+    }
+    *capacity = new_capacity;
+    return resizeDrawArray(array, new_capacity, element_size);
+}
+
+
+// Function to double the capacity of the draw list, and of the arrays indexed by its commands.
+//
+// Notes:
+// - The list starts with `DRAW_LIST_CAPACITY` commands (see config.h) and keeps its largest
+//   size, so a frame is always flushed at once and can be compared with the previous one.
+static void growDrawList() {
+    int capacity = draw_list_capacity ? 2 * draw_list_capacity : DRAW_LIST_CAPACITY;
+    draw_list = resizeDrawArray(draw_list, capacity, sizeof(DrawCommand));
+    draw_done = resizeDrawArray(draw_done, capacity, sizeof(int));
+    draw_blockers = resizeDrawArray(draw_blockers, capacity, sizeof(int));
+    draw_selected = resizeDrawArray(draw_selected, capacity, sizeof(int));
+    draw_cells = resizeDrawArray(draw_cells, capacity, sizeof(CellRange));
+    color_slots = resizeDrawArray(color_slots, 2 * capacity, sizeof(int));
+    color_values = resizeDrawArray(color_values, capacity, sizeof(Uint32));
+    draw_color_number = resizeDrawArray(draw_color_number, capacity, sizeof(int));
+    draw_ready_next = resizeDrawArray(draw_ready_next, capacity, sizeof(int));
+    ready_first = resizeDrawArray(ready_first, capacity * FORM_COUNT, sizeof(int));
+    ready_last = resizeDrawArray(ready_last, capacity * FORM_COUNT, sizeof(int));
+    previous_list = resizeDrawArray(previous_list, capacity, sizeof(DrawCommand));
+    draw_static = resizeDrawArray(draw_static, capacity, sizeof(int));
+    draw_in_layer = resizeDrawArray(draw_in_layer, capacity, sizeof(int));
+    draw_in_region = resizeDrawArray(draw_in_region, capacity, sizeof(int));
+    for (int i = draw_list_capacity; i < capacity; i++) {
+        draw_in_layer[i] = 0;
+    }
+    draw_list_capacity = capacity;
+}
+
+
+// Function to add a shape to the draw list.
+//
+// Parameters:
+// - SDL_Renderer* renderer: The renderer the shape will be drawn with.
+// - ShapeForm form: The shape to draw.
+// - Cursor* cursor: The cursor drawing the shape. Its current state is copied.
+// - int size: The length, side length or radius of the shape before scaling.
+// - int startAngle, int endAngle: The angles of the arc in degrees (pass 0 for other forms).
+//
+// Notes:
+// - Shapes of hidden cursors are not queued.
+// - The list grows when it is full, so the whole frame is flushed at once.
+//
+// Example Usage:
+// queueDraw(renderer, FORM_CIRCLE, &cursor1, 50, 0, 0);
+void queueDraw(SDL_Renderer* renderer, ShapeForm form, Cursor* cursor, int size, int startAngle, int endAngle) {
+    if (!cursor->visible) {
+        return;
+    }
+    if (draw_list_count == draw_list_capacity) {
+        growDrawList();
+    }
+
+    DrawCommand* command = &draw_list[draw_list_count++];
+    command->form = form;
+    command->cursor = *cursor;
+    command->size = size;
+    command->start_angle = startAngle;
+    command->end_angle = endAngle;
+    command->color = packColor(cursor->color);
+    command->bounds = getShapeBounds(form, (int)(size * cursor->scale), cursor->thickness, cursor->x, cursor->y, cursor->angle);
+
+    // Count the color changes drawing in script order would need, for comparison.
+    if (!has_queued_color || command->color != last_queued_color) {
+        draw_stats.script_order_changes++;
+        last_queued_color = command->color;
+        has_queued_color = 1;
+    }
+}
+
+
+// Function to add a shape drawn by a pooled cursor to the draw list.
+//
+// Parameters:
+// - SDL_Renderer* renderer: The renderer the shape will be drawn with.
+// - ShapeForm form: The shape to draw.
+// - const CursorPool* pool, int index: The cursor drawing the shape (see newcursor.c).
+// - int size, int startAngle, int endAngle: As for `queueDraw`.
+//
+// Notes:
+// - The cursor's position is in world coordinates: it is moved to the screen with the camera
+//   of the frame (see `applyViewCamera` in camera.c).
+//
+// Example Usage:
+// queuePooledDraw(renderer, FORM_CIRCLE, &cursor_pool, 0, 50, 0, 0);
+void queuePooledDraw(SDL_Renderer* renderer, ShapeForm form, const CursorPool* pool, int index, int size, int startAngle, int endAngle) {
+    if (!(pool->flags[index] & CURSOR_VISIBLE)) {
+        return;
+    }
+    Cursor cursor = loadPooledCursor(pool, index);
+    applyViewCamera(&cursor);
+    queueDraw(renderer, form, &cursor, size, startAngle, endAngle);
+}
+
+
+// Function to draw a single queued command.
+static void drawCommand(SDL_Renderer* renderer, DrawCommand* command) {
+    Cursor* cursor = &command->cursor;
+    switch (command->form) {
+        case FORM_LINE:
+            drawLine(renderer, cursor, command->size);
+            break;
+        case FORM_SQUARE:
+            drawSquare(renderer, cursor, command->size);
+            break;
+        case FORM_FILLED_SQUARE:
+            drawFilledSquare(renderer, cursor, command->size);
+            break;
+        case FORM_CIRCLE:
+            drawCircle(renderer, cursor, command->size);
+            break;
+        case FORM_FILLED_CIRCLE:
+            drawFilledCircle(renderer, cursor, command->size);
+            break;
+        case FORM_ARC:
+            drawArc(renderer, cursor, command->size, command->start_angle, command->end_angle);
+            break;
+        case FORM_PATH:
+            drawPath(renderer, cursor, command->start_angle);
+            break;
+    }
+}
+
+
+// Function to bin commands into the cells of the overlap grid covered by their bounds.
+//
+// Parameters:
+// - const int* selected: For each queued command, 1 if it must be binned, 0 to leave it out.
+//   NULL bins every command.
+//
+// Implementation Details:
+// - Counting sort, like the tiles of raster.c: the commands of each cell stay in script order.
+// - Only the part of the bounds inside the screen is binned: two shapes overlapping outside the
+//   render target draw no common pixel, so their order does not matter.
+static void binCommands(const int* selected) {
+    int count = draw_list_count;
+    int cell_fill[DRAW_GRID_CELLS];
+
+    memset(grid_start, 0, sizeof(grid_start));
+    for (int i = 0; i < count; i++) {
+        CellRange* cells = &draw_cells[i];
+        SDL_Rect bounds;
+        if ((selected != NULL && !selected[i]) || !SDL_IntersectRect(&draw_list[i].bounds, &screen_area, &bounds)) {
+            cells->left = 1;
+            cells->right = 0; // In no cell.
+            cells->top = cells->bottom = 0;
+            continue;
+        }
+        cells->left = bounds.x / DRAW_GRID_CELL_SIZE;
+        cells->right = (bounds.x + bounds.w - 1) / DRAW_GRID_CELL_SIZE;
+        cells->top = bounds.y / DRAW_GRID_CELL_SIZE;
+        cells->bottom = (bounds.y + bounds.h - 1) / DRAW_GRID_CELL_SIZE;
+        for (int y = cells->top; y <= cells->bottom; y++) {
+            for (int x = cells->left; x <= cells->right; x++) {
+                grid_start[y * DRAW_GRID_X + x + 1]++;
+            }
+        }
+    }
+    for (int c = 0; c < DRAW_GRID_CELLS; c++) {
+        grid_start[c + 1] += grid_start[c];
+    }
+
+    grid_bins = reserveDrawArray(grid_bins, &grid_bin_capacity, grid_start[DRAW_GRID_CELLS], sizeof(int));
+    memcpy(cell_fill, grid_start, sizeof(cell_fill));
+    for (int i = 0; i < count; i++) {
+        const CellRange* cells = &draw_cells[i];
+        for (int y = cells->top; y <= cells->bottom; y++) {
+            for (int x = cells->left; x <= cells->right; x++) {
+                grid_bins[cell_fill[y * DRAW_GRID_X + x]++] = i;
+            }
+        }
+    }
+}
+
+
+// Function to check whether two binned commands overlap on the screen, from one of their cells.
+//
+// Two commands sharing several cells are met once in each of them; only the cell holding the
+// top-left corner of their overlap answers 1, so each pair is counted once.
+static int overlapsInCell(const SDL_Rect* a, const SDL_Rect* b, int cell) {
+    SDL_Rect overlap;
+    if (!SDL_IntersectRect(a, b, &overlap) || !SDL_IntersectRect(&overlap, &screen_area, &overlap)) {
+        return 0;
+    }
+    return (overlap.y / DRAW_GRID_CELL_SIZE) * DRAW_GRID_X + overlap.x / DRAW_GRID_CELL_SIZE == cell;
+}
+
+
+// Function to number the distinct colors of the selected commands.
+//
+// Returns:
+// - int: The number of colors. `draw_color_number` holds the number of each selected command.
+static int numberColors(const int* selected) {
+    int color_count = 0;
+    unsigned int slot_count = 2 * draw_list_capacity;
+    memset(color_slots, 0, slot_count * sizeof(int));
+    for (int i = 0; i < draw_list_count; i++) {
+        if (!selected[i]) {
+            continue;
+        }
+        Uint32 color = draw_list[i].color;
+        unsigned int slot = (color * 2654435761u) % slot_count;
+        while (color_slots[slot] != 0 && color_values[color_slots[slot] - 1] != color) {
+            slot = (slot + 1) % slot_count;
+        }
+        if (color_slots[slot] == 0) {
+            color_values[color_count] = color;
+            color_slots[slot] = ++color_count;
+        }
+        draw_color_number[i] = color_slots[slot] - 1;
+    }
+    return color_count;
+}
+
+
+// Function to add a command that can be drawn to the queue of its color and form.
+static void pushReady(int index) {
+    int queue = draw_color_number[index] * FORM_COUNT + draw_list[index].form;
+    draw_ready_next[index] = -1;
+    if (ready_first[queue] < 0) {
+        ready_first[queue] = index;
+    } else {
+        draw_ready_next[ready_last[queue]] = index;
+    }
+    ready_last[queue] = index;
+}
+
+
+// Function to take the first ready command of a color, of the given form if possible.
+//
+// Returns:
+// - int: The index of the command, or -1 if no command of the color is ready.
+//
+// Notes:
+// - A command starting a batch is drawn without leaving its queue: it is skipped here.
+static int popReady(int color_number, ShapeForm form) {
+    for (int f = -1; f < FORM_COUNT; f++) {
+        int queue = color_number * FORM_COUNT + (f < 0 ? (int)form : f);
+        while (ready_first[queue] >= 0 && draw_done[ready_first[queue]]) {
+            ready_first[queue] = draw_ready_next[ready_first[queue]];
+        }
+        if (ready_first[queue] >= 0) {
+            int index = ready_first[queue];
+            ready_first[queue] = draw_ready_next[index];
+            return index;
+        }
+    }
+    return -1;
+}
+
+
+// Function to draw a subset of the queued shapes, grouped by color.
+//
+// Parameters:
+// - SDL_Renderer* renderer: The renderer used to draw the shapes.
+// - const int* selected: For each queued command, 1 if it must be drawn, 0 to skip it.
+//
+// Implementation Details:
+// - For each selected command, the number of earlier selected commands of another color whose
+//   bounds overlap it is counted, through the overlap grid. A command can be drawn once that
+//   number reaches zero: it then enters the ready queue of its color and form.
+// - The next command drawn is a ready command of the current color (of the current form if
+//   possible). If there is none, the earliest remaining command starts a new batch; it is
+//   always ready since no command comes before it.
+// - Commands of the same color may be reordered even when they overlap: with opaque drawing
+//   the pixels they share end up the same color either way.
+//
+// Notes:
+// - The cost grows with the number of shapes sharing a cell of `DRAW_GRID_CELL_SIZE` pixels
+//   (see config.h), so thousands of small shapes spread over the screen stay cheap.
+static void drawSelectedCommands(SDL_Renderer* renderer, const int* selected) {
+    int count = draw_list_count;
+    int remaining = 0;
+
+    binCommands(selected);
+    int queue_count = numberColors(selected) * FORM_COUNT;
+    for (int q = 0; q < queue_count; q++) {
+        ready_first[q] = -1;
+    }
+
+    for (int i = 0; i < count; i++) {
+        draw_done[i] = !selected[i];
+        draw_blockers[i] = 0;
+        if (!selected[i]) {
+            continue;
+        }
+        remaining++;
+        const CellRange* cells = &draw_cells[i];
+        for (int y = cells->top; y <= cells->bottom; y++) {
+            for (int x = cells->left; x <= cells->right; x++) {
+                int cell = y * DRAW_GRID_X + x;
+                for (int k = grid_start[cell]; k < grid_start[cell + 1] && grid_bins[k] < i; k++) {
+                    int j = grid_bins[k];
+                    if (draw_list[j].color != draw_list[i].color && overlapsInCell(&draw_list[j].bounds, &draw_list[i].bounds, cell)) {
+                        draw_blockers[i]++;
+                    }
+                }
+            }
+        }
+        if (draw_blockers[i] == 0) {
+            pushReady(i);
+        }
+    }
+
+    int first_pending = 0;
+    int has_color = 0;
+    int batch_color = 0;
+    ShapeForm batch_form = FORM_LINE;
+
+    for (int drawn = 0; drawn < remaining; drawn++) {
+        while (draw_done[first_pending]) {
+            first_pending++;
+        }
+
+        // Look for a ready command continuing the current batch.
+        int next = has_color ? popReady(batch_color, batch_form) : -1;
+        if (next < 0) {
+            next = first_pending;
+            batch_color = draw_color_number[next];
+            has_color = 1;
+            draw_stats.batches++;
+        }
+        batch_form = draw_list[next].form;
+
+        drawCommand(renderer, &draw_list[next]);
+        draw_done[next] = 1;
+        draw_stats.drawn_commands++;
+
+        // The later commands of another color overlapping this one are now less blocked.
+        const CellRange* cells = &draw_cells[next];
+        for (int y = cells->top; y <= cells->bottom; y++) {
+            for (int x = cells->left; x <= cells->right; x++) {
+                int cell = y * DRAW_GRID_X + x;
+                for (int k = grid_start[cell + 1] - 1; k >= grid_start[cell] && grid_bins[k] > next; k--) {
+                    int i = grid_bins[k];
+                    if (!draw_done[i] && draw_list[i].color != draw_list[next].color
+                        && overlapsInCell(&draw_list[next].bounds, &draw_list[i].bounds, cell) && --draw_blockers[i] == 0) {
+                        pushReady(i);
+                    }
+                }
+            }
+        }
+    }
+}
+
+
+// Function to draw the queued shapes with the software rasterizer (see raster.c).
+//
+// Returns:
+// - int: 1 if the shapes were drawn, 0 if the caller must draw them with the renderer.
+//
+// Notes:
+// - The rasterizer takes at most `DRAW_LIST_CAPACITY` commands at a time; its buffer keeps the
+//   shapes of the earlier parts of the frame.
+static int rasterizeDrawList(SDL_Renderer* renderer) {
+    for (int first = 0; first < draw_list_count; first += DRAW_LIST_CAPACITY) {
+        int count = draw_list_count - first < DRAW_LIST_CAPACITY ? draw_list_count - first : DRAW_LIST_CAPACITY;
+        if (!rasterizeCommands(renderer, draw_list + first, count)) {
+            return 0; // Only fails before drawing anything (no streaming texture).
+        }
+    }
+    return 1;
+}
+
+
+// Function to draw every queued shape and empty the draw list.
+//
+// Parameters:
+// - SDL_Renderer* renderer: The renderer used to draw the shapes.
+//
+// Notes:
+// - When `LAYER_CACHE_ENABLED` or `DIRTY_RECTS_ENABLED` is set in config.h, the shapes that did
+//   not change since the previous frame are not drawn again (see below).
+// - When `SOFTWARE_RASTER_ENABLED` is set in config.h, the shapes are rasterized by the threads
+//   of raster.c instead, and `renderer` may be NULL (headless mode).
+//
+// Example Usage:
+// beginDrawFrame(renderer);
+// queueDraw(renderer, FORM_CIRCLE, &cursor1, 50, 0, 0);
+// flushDrawList(renderer);
+void flushDrawList(SDL_Renderer* renderer) {
+    if (draw_list_capacity == 0) {
+        growDrawList(); // A frame without shapes still uses the arrays of the list.
+    }
+    draw_stats.commands += draw_list_count;
+
+    if (SOFTWARE_RASTER_ENABLED && rasterizeDrawList(renderer)) {
+        draw_stats.drawn_commands += draw_list_count;
+    } else if (!(LAYER_CACHE_ENABLED || DIRTY_RECTS_ENABLED) || !flushIncremental(renderer)) {
+        for (int i = 0; i < draw_list_count; i++) {
+            draw_selected[i] = 1;
+        }
+        drawSelectedCommands(renderer, draw_selected);
+    }
+    draw_list_count = 0;
+}
+
+
+// Function to retrieve the draw statistics of the current frame.
+//
+// Returns:
+// - DrawStats: The number of commands, batches and color changes since `beginDrawFrame`.
+DrawStats getDrawStats() {
+    return draw_stats;
+}
+
+
+// ======================================================
+// LAYER CACHE AND DIRTY RECTANGLES
+// ======================================================
+
+// This section contains the incremental drawing used by `flushDrawList`. Most shapes of a
+// script do not change from one frame to the next: their cursor is not animated, selected,
+// moved, zoomed or rotated.
+//
+// - Layer cache: the unchanged shapes are rendered once into a screen-sized target texture
+//   (the layer). Only the shapes that changed are drawn on top of it.
+// - Dirty rectangles: the frame is kept in a persistent back texture. Only the rectangles
+//   covering the old and new bounds of the changed shapes are cleared and drawn again (with a
+//   clip rectangle), then the back texture is copied to the screen.
+//
+// A shape is unchanged when its command (form, size, angles and the copy of its cursor) is the
+// same as the command at the same position in the previous frame. This covers the edits done
+// by handle.c as well as animation code writing the cursor fields directly. When a shape of the
+// layer changes, or a shape stops changing, the layer is rebuilt.
+//
+// Functions in this section:
+// - flushIncremental: Draws the queued shapes using the layer cache and the dirty rectangles.
+// - clearLayerCache: Destroys the layer and back textures.
+
+
+// Function to check whether two draw commands produce the same pixels.
+static int sameCommand(const DrawCommand* a, const DrawCommand* b) {
+    return a->form == b->form && a->size == b->size && a->start_angle == b->start_angle
+        && a->end_angle == b->end_angle && a->color == b->color
+        && a->cursor.x == b->cursor.x && a->cursor.y == b->cursor.y && a->cursor.angle == b->cursor.angle
+        && a->cursor.thickness == b->cursor.thickness && a->cursor.scale == b->cursor.scale;
+}
+
+
+// Function to add a region of the screen to the dirty rectangles of the frame.
+//
+// Overlapping rectangles are merged. When more than `DIRTY_RECT_MAX` rectangles would be
+// needed, all of them are merged into their bounding rectangle.
+static void addDirtyRect(SDL_Rect rect) {
+    if (!SDL_IntersectRect(&rect, &frame_area, &rect)) {
+        return; // Off screen.
+    }
+
+    // Merge with every rectangle it overlaps, repeating since the union may overlap others.
+    int merged = 1;
+    while (merged) {
+        merged = 0;
+        for (int i = 0; i < dirty_count; i++) {
+            if (SDL_HasIntersection(&dirty_rects[i], &rect)) {
+                SDL_UnionRect(&dirty_rects[i], &rect, &rect);
+                dirty_rects[i] = dirty_rects[--dirty_count];
+                merged = 1;
+                break;
+            }
+        }
+    }
+
+    if (dirty_count == DIRTY_RECT_MAX) {
+        for (int i = 0; i < dirty_count; i++) {
+            SDL_UnionRect(&dirty_rects[i], &rect, &rect);
+        }
+        dirty_count = 0;
+    }
+    dirty_rects[dirty_count++] = rect;
+}
+
+
+// Function to create a screen-sized target texture if it does not exist yet.
+//
+// Returns:
+// - int: 1 if the texture exists, 0 if the renderer cannot render to textures.
+static int ensureScreenTexture(SDL_Renderer* renderer, SDL_Texture** texture, SDL_BlendMode blend_mode) {
+    if (*texture == NULL) {
+        *texture = SDL_CreateTexture(renderer, SDL_PIXELFORMAT_RGBA8888, SDL_TEXTUREACCESS_TARGET, SCREEN_WIDTH, SCREEN_HEIGHT);
+        if (*texture == NULL) {
+            return 0;
+        }
+        SDL_SetTextureBlendMode(*texture, blend_mode);
+    }
+    return 1;
+}
+
+
+// Function to render the unchanged shapes into the layer texture.
+//
+// Returns:
+// - int: 1 on success, 0 if the renderer cannot render to textures.
+static int rebuildLayer(SDL_Renderer* renderer) {
+    if (!ensureScreenTexture(renderer, &layer_texture, SDL_BLENDMODE_BLEND)) {
+        return 0;
+    }
+
+    SDL_Texture* previous_target = SDL_GetRenderTarget(renderer);
+    if (SDL_SetRenderTarget(renderer, layer_texture) != 0) {
+        return 0;
+    }
+    SDL_Color transparent = {0, 0, 0, 0};
+    setDrawColor(renderer, transparent);
+    SDL_RenderClear(renderer);
+    drawSelectedCommands(renderer, draw_static);
+    SDL_SetRenderTarget(renderer, previous_target);
+
+    for (int i = 0; i < draw_list_count; i++) {
+        draw_in_layer[i] = draw_static[i];
+    }
+    draw_stats.layer_rebuilds++;
+    return 1;
+}
+
+
+// Function to draw the queued shapes using the layer cache and the dirty rectangles.
+//
+// Parameters:
+// - SDL_Renderer* renderer: The renderer used to draw the shapes.
+//
+// Returns:
+// - int: 1 if the shapes were drawn, 0 if the caller must draw them directly.
+//
+// Implementation Details:
+// 1. Each command is compared with the previous frame. The old and new bounds of the changed
+//    commands become dirty rectangles. Translucent shapes are never put in the layer, since
+//    blending the layer would not give the same pixels as drawing them directly.
+// 2. The layer is rebuilt if one of its shapes changed, or an unchanged shape is not in it.
+// 3. The shapes outside the layer are selected for drawing. A cached shape overlapping an
+//    earlier selected shape is selected as well, so it stays on top. The overlaps are found
+//    through the grid of `binCommands`, so dragging one shape in a dense scene only tests the
+//    shapes sharing its cells.
+// 4. Each dirty rectangle of the back texture is cleared, receives the matching part of the
+//    layer, and the selected shapes crossing it are drawn, clipped to the rectangle.
+// 5. The back texture is copied to the screen.
+//
+// Notes:
+// - The whole frame is redrawn when the back texture is new, or when the number of queued
+//   shapes changed (a cursor was deleted), since commands can no longer be matched by position.
+// - SDL presents the whole window, so the back texture is always copied entirely; the saving
+//   is in the shapes that are not rasterized again.
+static int flushIncremental(SDL_Renderer* renderer) {
+    int count = draw_list_count;
+    if (layer_unsupported) {
+        previous_count = -1;
+        back_valid = 0;
+        return 0;
+    }
+    if (layer_renderer != renderer) {
+        clearLayerCache();
+        layer_renderer = renderer;
+    }
+
+    int same_count = (count == previous_count);
+    int rebuild = !same_count;
+    int cached = 0;
+    dirty_count = 0;
+    for (int i = 0; i < count; i++) {
+        int same = same_count && sameCommand(&draw_list[i], &previous_list[i]);
+        if (same_count && !same) {
+            addDirtyRect(previous_list[i].bounds);
+            addDirtyRect(draw_list[i].bounds);
+        }
+        draw_static[i] = LAYER_CACHE_ENABLED && same && (draw_list[i].color & 0xFF) == 0xFF;
+        if (draw_static[i] != draw_in_layer[i]) {
+            rebuild = 1;
+        }
+        cached += draw_static[i];
+    }
+
+    // Keep the comparison point for the next frame.
+    for (int i = 0; i < count; i++) {
+        previous_list[i] = draw_list[i];
+    }
+    previous_count = count;
+
+    if (cached == 0) {
+        // Nothing to cache: the layer is not used, and rebuilt once shapes stop changing.
+        for (int i = 0; i < count; i++) {
+            draw_in_layer[i] = 0;
+        }
+    } else if (rebuild && !rebuildLayer(renderer)) {
+        layer_unsupported = 1; // Stop trying: the renderer cannot render to textures.
+        return 0;
+    }
+
+    // Select the changed shapes, and the cached shapes that must stay above them. In script
+    // order, each selected shape selects the later cached shapes it overlaps, found in its cells.
+    for (int i = 0; i < count; i++) {
+        draw_selected[i] = !draw_in_layer[i];
+    }
+    if (cached > 0) {
+        binCommands(NULL);
+    }
+    for (int i = 0; i < count && cached > 0; i++) {
+        if (!draw_selected[i]) {
+            continue;
+        }
+        const CellRange* cells = &draw_cells[i];
+        for (int y = cells->top; y <= cells->bottom; y++) {
+            for (int x = cells->left; x <= cells->right; x++) {
+                int cell = y * DRAW_GRID_X + x;
+                for (int k = grid_start[cell + 1] - 1; k >= grid_start[cell] && grid_bins[k] > i; k--) {
+                    int j = grid_bins[k];
+                    if (!draw_selected[j] && SDL_HasIntersection(&draw_list[i].bounds, &draw_list[j].bounds)) {
+                        draw_selected[j] = 1;
+                    }
+                }
+            }
+        }
+    }
+
+    if (!DIRTY_RECTS_ENABLED) {
+        // Layer only: composite it over the cleared screen and draw the rest on top.
+        if (cached > 0) {
+            SDL_RenderCopy(renderer, layer_texture, &frame_area, &frame_area);
+        }
+        drawSelectedCommands(renderer, draw_selected);
+        return 1;
+    }
+
+    if (!ensureScreenTexture(renderer, &back_texture, SDL_BLENDMODE_NONE)) {
+        layer_unsupported = 1;
+        return 0;
+    }
+    if (!back_valid || !same_count) {
+        dirty_rects[0] = frame_area;
+        dirty_count = 1;
+    }
+
+    SDL_Texture* previous_target = SDL_GetRenderTarget(renderer);
+    SDL_SetRenderTarget(renderer, back_texture);
+    for (int r = 0; r < dirty_count; r++) {
+        SDL_Rect* rect = &dirty_rects[r];
+        SDL_RenderSetClipRect(renderer, rect);
+
+        // `SDL_RenderClear` ignores the clip rectangle, so the background is filled instead.
+        setDrawColor(renderer, background_color);
+        SDL_RenderFillRect(renderer, rect);
+        if (cached > 0) {
+            SDL_RenderCopy(renderer, layer_texture, rect, rect);
+        }
+
+        for (int i = 0; i < count; i++) {
+            draw_in_region[i] = draw_selected[i] && SDL_HasIntersection(&draw_list[i].bounds, rect);
+        }
+        drawSelectedCommands(renderer, draw_in_region);
+
+        draw_stats.dirty_rects++;
+        draw_stats.dirty_area += rect->w * rect->h;
+    }
+    SDL_RenderSetClipRect(renderer, NULL);
+    SDL_SetRenderTarget(renderer, previous_target);
+    back_valid = 1;
+
+    SDL_RenderCopy(renderer, back_texture, &frame_area, &frame_area);
+    return 1;
+}
+
+
+// Function to destroy the layer and back textures.
+//
+// Notes:
+// - Must be called before `SDL_DestroyRenderer`, since the textures belong to the renderer.
+void clearLayerCache() {
+    if (layer_texture != NULL) {
+        SDL_DestroyTexture(layer_texture);
+        layer_texture = NULL;
+    }
+    if (back_texture != NULL) {
+        SDL_DestroyTexture(back_texture);
+        back_texture = NULL;
+    }
+    layer_renderer = NULL;
+    layer_unsupported = 0;
+    back_valid = 0;
+    previous_count = -1;
+    for (int i = 0; i < draw_list_capacity; i++) {
+        draw_in_layer[i] = 0;
+    }
+}
@@ -0,0 +1,41 @@
+#ifndef DRAWLIST_H
+#define DRAWLIST_H
+
+#include <SDL2/SDL.h>
+#include "geometry.h"
+#include "newcursor.h"
+
+typedef struct {
+    int commands;              // Number of draw commands flushed since the start of the frame.
+    int batches;               // Number of runs of consecutive commands sharing a color.
+    int color_changes;         // Number of calls that actually reached `SDL_SetRenderDrawColor`.
+    int script_order_changes;  // Number of color changes the commands would have needed in script order.
+    int drawn_commands;        // Number of commands rasterized (the others came from the layer or back texture).
+    int layer_rebuilds;        // Number of times the layer cache was redrawn.
+    int dirty_rects;           // Number of screen regions redrawn.
+    int dirty_area;            // Number of pixels covered by the redrawn regions.
+} DrawStats;
+
+// One draw command waiting in the draw list.
+typedef struct {
+    ShapeForm form;       // The shape to draw.
+    Cursor cursor;        // Copy of the cursor at the time the command was queued.
+    int size;             // The length, side length or radius of the shape (farthest vertex of a path) before scaling.
+    int start_angle;      // The start angle (arcs), or the index of the path (paths).
+    int end_angle;        // The end angle (arcs only).
+    Uint32 color;         // The cursor's RGBA color packed into 32 bits, used to group commands.
+    SDL_Rect bounds;      // Rectangle containing every pixel of the shape, used to preserve overlaps.
+} DrawCommand;
+
+void setDrawColor(SDL_Renderer* renderer, SDL_Color color);
+void invalidateDrawColor();
+
+void beginDrawFrame(SDL_Renderer* renderer);
+void setDrawFrameSize(int width, int height);
+void queueDraw(SDL_Renderer* renderer, ShapeForm form, Cursor* cursor, int size, int startAngle, int endAngle);
+void queuePooledDraw(SDL_Renderer* renderer, ShapeForm form, const CursorPool* pool, int index, int size, int startAngle, int endAngle);
+void flushDrawList(SDL_Renderer* renderer);
+DrawStats getDrawStats();
+void clearLayerCache();
+
+#endif
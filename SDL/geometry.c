@@ -0,0 +1,469 @@
+#include "geometry.h"
+#include "config.h"
+#include <math.h>
+#include <stdlib.h>
+#include <SDL2/SDL.h>
+
+
+// ======================================================
+// GEOMETRY CACHE
+// ======================================================
+
+// This section contains the cache of tessellated shapes used by the drawing functions.
+// Circles, filled circles, filled squares and arcs are drawn point by point. The position
+// of these points relative to the cursor only depends on the form, the scaled size, the
+// thickness and (for arcs) the start and end angles, so it is computed once and reused.
+// Each frame only the cursor's rotation and translation are applied to the cached points.
+//
+// Functions in this section:
+// - getShapeGeometry: Returns the cached local-space points of a shape, computing them if needed.
+// - renderShapeGeometry: Rotates, translates and draws cached points in a single batch.
+// - getShapeBounds: Returns a rectangle containing every pixel a shape can touch.
+// - clearGeometryCache: Frees every cached shape.
+
+
+// One slot of the LRU cache.
+typedef struct {
+    int used;                 // 1 if the slot holds a shape, 0 if it is free.
+    ShapeForm form;           // Key: the form of the shape.
+    int scaled_size;          // Key: the size of the shape multiplied by the cursor's scale.
+    int thickness;            // Key: the thickness of the cursor.
+    int start_angle;          // Key: the start angle (arcs only, 0 otherwise).
+    int end_angle;            // Key: the end angle (arcs only, 0 otherwise).
+    unsigned long last_used;  // Value of `geometry_clock` the last time the slot was read.
+    ShapeGeometry geometry;   // The cached points.
+} GeometryCacheEntry;
+
+static GeometryCacheEntry geometry_cache[GEOMETRY_CACHE_SIZE];
+static unsigned long geometry_clock = 0;
+
+// Scratch buffer holding the transformed points of the shape being drawn.
+static SDL_Point* transform_buffer = NULL;
+static int transform_capacity = 0;
+
+
+// Function to append a point to a geometry under construction.
+//
+// Parameters:
+// - ShapeGeometry* geometry: The geometry receiving the point.
+// - int* capacity: The allocated capacity of `geometry->points`, grown when needed.
+// - int x, int y: The local-space coordinates of the point.
+static void appendPoint(ShapeGeometry* geometry, int* capacity, int x, int y) {
+    if (geometry->count == *capacity) {
+        *capacity = *capacity ? *capacity * 2 : 256;
+        geometry->points = realloc(geometry->points, *capacity * sizeof(SDL_Point));
+    }
+    geometry->points[geometry->count].x = x;
+    geometry->points[geometry->count].y = y;
+    geometry->count++;
+}
+
+
+// Function to round a coordinate down, treating values within 1e-9 of an integer as that integer.
+//
+// Adding a screen position to a value such as `40 * cos(90°)` (about 2.4e-15) gives back the
+// screen position exactly, so the tiny fraction must not move the point to the previous pixel.
+// Whether such a sum rounds to the integer depends on the magnitude of the screen position, so
+// a few points (well under 0.1%) can still land one pixel away from the uncached computation.
+static int floorSnapped(double value) {
+    double nearest = round(value);
+    if (fabs(value - nearest) < 1e-9) {
+        return (int)nearest;
+    }
+    return (int)floor(value);
+}
+
+
+// Function to compute the local-space points of a shape.
+//
+// This function reproduces the point generation of the drawing functions in `draw.c`
+// without the cursor's position and rotation, so the cached result can be reused for
+// every cursor sharing the same form, scaled size and thickness.
+//
+// Parameters:
+// - ShapeGeometry* geometry: The (empty) geometry to fill.
+// - ShapeForm form: The form of the shape.
+// - int scaled_size: The radius (circles, arcs) or side length (squares) after scaling.
+// - int thickness: The thickness of the cursor.
+// - int startAngle, int endAngle: The angles of the arc in degrees (ignored for other forms).
+//
+// Notes:
+// - Circle points are stored rounded down (see `floorSnapped`): for on-screen positions this gives
+//   the pixel obtained by truncating `cursor->x + r * cos(angle)`, which is what `drawCircle` used to do.
+// - Lines and squares are made of a handful of `SDL_RenderDrawLine` calls and are not cached.
+static void buildShapeGeometry(ShapeGeometry* geometry, ShapeForm form, int scaled_size, int thickness, int startAngle, int endAngle) {
+    int capacity = 0;
+    geometry->points = NULL;
+    geometry->count = 0;
+
+    if (form == FORM_CIRCLE) {
+        // Concentric circles, one per layer of thickness.
+        for (int offset = 0; offset < thickness; offset++) {
+            for (int angle = 0; angle < 360; angle++) {
+                double x = (scaled_size + offset) * cos(angle * M_PI / 180.0);
+                double y = (scaled_size + offset) * sin(angle * M_PI / 180.0);
+                appendPoint(geometry, &capacity, floorSnapped(x), floorSnapped(y));
+            }
+        }
+    } else if (form == FORM_FILLED_CIRCLE) {
+        // Every pixel of the bounding box that lies inside the circle.
+        for (int y = -scaled_size; y <= scaled_size; y++) {
+            for (int x = -scaled_size; x <= scaled_size; x++) {
+                if (x * x + y * y <= scaled_size * scaled_size) {
+                    appendPoint(geometry, &capacity, x, y);
+                }
+            }
+        }
+    } else if (form == FORM_FILLED_SQUARE) {
+        // Every pixel of the square, extended by half the thickness on each side.
+        int half_size = scaled_size / 2;
+        for (int y = -half_size - thickness / 2; y <= half_size + thickness / 2; y++) {
+            for (int x = -half_size - thickness / 2; x <= half_size + thickness / 2; x++) {
+                appendPoint(geometry, &capacity, x, y);
+            }
+        }
+    } else if (form == FORM_ARC) {
+        // Concentric arcs, sampled every 0.1 degree between the two angles.
+        for (int offset = 0; offset < thickness; offset++) {
+            for (float angle = startAngle; angle <= endAngle; angle += 0.1) {
+                int x = (scaled_size + offset) * cos(angle * M_PI / 180.0);
+                int y = (scaled_size + offset) * sin(angle * M_PI / 180.0);
+                appendPoint(geometry, &capacity, x, y);
+            }
+        }
+    }
+}
+
+
+// Function to retrieve the local-space points of a shape from the cache.
+//
+// This function looks up the shape in a small LRU cache. If it is not present, the points
+// are computed and stored in the least recently used slot, replacing its previous content.
+//
+// Parameters:
+// - ShapeForm form: The form of the shape (circle, filled circle, filled square or arc).
+// - int scaled_size: The size of the shape already multiplied by the cursor's scale.
+// - int thickness: The thickness of the cursor.
+// - int startAngle, int endAngle: The angles of the arc in degrees (pass 0 for other forms).
+//
+// Returns:
+// - const ShapeGeometry*: The cached geometry. It stays valid until the next call to
+//   `getShapeGeometry` or `clearGeometryCache`.
+//
+// Notes:
+// - The key uses the scaled size rather than the size and the scale separately, so cursors
+//   whose size and scale differ but produce the same scaled size share one entry.
+// - The cache holds `GEOMETRY_CACHE_SIZE` shapes (see config.h).
+//
+// Example Usage:
+// const ShapeGeometry* geometry = getShapeGeometry(FORM_FILLED_CIRCLE, 40, 1, 0, 0);
+const ShapeGeometry* getShapeGeometry(ShapeForm form, int scaled_size, int thickness, int startAngle, int endAngle) {
+    GeometryCacheEntry* victim = &geometry_cache[0];
+    geometry_clock++;
+
+    for (int i = 0; i < GEOMETRY_CACHE_SIZE; i++) {
+        GeometryCacheEntry* entry = &geometry_cache[i];
+        if (entry->used && entry->form == form && entry->scaled_size == scaled_size && entry->thickness == thickness
+            && entry->start_angle == startAngle && entry->end_angle == endAngle) {
+            entry->last_used = geometry_clock; // Cache hit: refresh the entry.
+            return &entry->geometry;
+        }
+        // Remember the first free slot, or else the least recently used one.
+        if (victim->used && (!entry->used || entry->last_used < victim->last_used)) {
+            victim = entry;
+        }
+    }
+
+    // Cache miss: evict the victim and compute the shape.
+    free(victim->geometry.points);
+    buildShapeGeometry(&victim->geometry, form, scaled_size, thickness, startAngle, endAngle);
+    victim->used = 1;
+    victim->form = form;
+    victim->scaled_size = scaled_size;
+    victim->thickness = thickness;
+    victim->start_angle = startAngle;
+    victim->end_angle = endAngle;
+    victim->last_used = geometry_clock;
+    return &victim->geometry;
+}
+
+
+// Function to draw cached points at a cursor's position and rotation.
+//
+// This function rotates the local-space points by the given angle, translates them to
+// (`x`, `y`) and sends all of them to the renderer with a single `SDL_RenderDrawPoints` call.
+// The drawing color must already be set on the renderer.
+//
+// Parameters:
+// - SDL_Renderer* renderer: The SDL renderer used to draw the points.
+// - const ShapeGeometry* geometry: The cached geometry returned by `getShapeGeometry`.
+// - int x, int y: The position of the cursor.
+// - int angle: The rotation of the cursor in degrees (0 skips the rotation).
+//
+// Notes:
+// - `cos` and `sin` are evaluated once per call instead of once per point.
+//
+// Example Usage:
+// renderShapeGeometry(renderer, getShapeGeometry(FORM_ARC, 50, 3, 0, 180), cursor->x, cursor->y, cursor->angle);
+void renderShapeGeometry(SDL_Renderer* renderer, const ShapeGeometry* geometry, int x, int y, int angle) {
+    if (geometry->count > transform_capacity) {
+        transform_capacity = geometry->count;
+        transform_buffer = realloc(transform_buffer, transform_capacity * sizeof(SDL_Point));
+    }
+
+    if (angle == 0) {
+        // No rotation: only translate the points.
+        for (int i = 0; i < geometry->count; i++) {
+            transform_buffer[i].x = x + geometry->points[i].x;
+            transform_buffer[i].y = y + geometry->points[i].y;
+        }
+    } else {
+        float rad_angle = angle * M_PI / 180.0; // Convert the angle to radians.
+        double cos_angle = cos(rad_angle);
+        double sin_angle = sin(rad_angle);
+        for (int i = 0; i < geometry->count; i++) {
+            int local_x = geometry->points[i].x;
+            int local_y = geometry->points[i].y;
+            transform_buffer[i].x = x + (int)(local_x * cos_angle - local_y * sin_angle);
+            transform_buffer[i].y = y + (int)(local_x * sin_angle + local_y * cos_angle);
+        }
+    }
+
+    SDL_RenderDrawPoints(renderer, transform_buffer, geometry->count);
+}
+
+
+// Function to compute a rectangle containing every pixel touched by a shape.
+//
+// Parameters:
+// - ShapeForm form: The form of the shape.
+// - int scaled_size: The length (lines), side length (squares), radius (circles, arcs) or
+//   distance of the farthest vertex (paths) after scaling.
+// - int thickness: The thickness of the cursor.
+// - int x, int y: The position of the cursor.
+// - int angle: The rotation of the cursor in degrees.
+//
+// Returns:
+// - SDL_Rect: The bounding rectangle, widened by one pixel on each side for rounding.
+//
+// Notes:
+// - The rectangle is conservative: squares use the circle enclosing every rotation, and arcs
+//   use the bounds of the full circle. It is only meant for overlap tests.
+//
+// Example Usage:
+// SDL_Rect bounds = getShapeBounds(FORM_CIRCLE, 40, 2, cursor->x, cursor->y, cursor->angle);
+SDL_Rect getShapeBounds(ShapeForm form, int scaled_size, int thickness, int x, int y, int angle) {
+    SDL_Rect bounds;
+
+    if (form == FORM_LINE) {
+        // Box around both ends of the line, widened by half the thickness.
+        float rad_angle = angle * M_PI / 180.0;
+        int x_end = x + scaled_size * cos(rad_angle);
+        int y_end = y + scaled_size * sin(rad_angle);
+        int margin = thickness / 2 + 1;
+        bounds.x = (x < x_end ? x : x_end) - margin;
+        bounds.y = (y < y_end ? y : y_end) - margin;
+        bounds.w = abs(x_end - x) + 2 * margin + 1;
+        bounds.h = abs(y_end - y) + 2 * margin + 1;
+        return bounds;
+    }
+
+    // The other shapes fit in a square centered on the cursor.
+    int extent;
+    if (form == FORM_SQUARE) {
+        extent = (int)ceil((scaled_size / 2) * M_SQRT2) + thickness;
+    } else if (form == FORM_FILLED_SQUARE) {
+        extent = (int)ceil((scaled_size / 2 + thickness / 2) * M_SQRT2);
+    } else if (form == FORM_FILLED_CIRCLE) {
+        extent = scaled_size;
+    } else {
+        extent = scaled_size + thickness;
+    }
+    extent += 1;
+
+    bounds.x = x - extent;
+    bounds.y = y - extent;
+    bounds.w = 2 * extent + 1;
+    bounds.h = 2 * extent + 1;
+    return bounds;
+}
+
+
+// Function to free every shape held by the geometry cache.
+//
+// Notes:
+// - Call it before leaving the program, or to release memory after a large scene.
+void clearGeometryCache(void) {
+    for (int i = 0; i < GEOMETRY_CACHE_SIZE; i++) {
+        free(geometry_cache[i].geometry.points);
+        geometry_cache[i].geometry.points = NULL;
+        geometry_cache[i].geometry.count = 0;
+        geometry_cache[i].used = 0;
+    }
+    free(transform_buffer);
+    transform_buffer = NULL;
+    transform_capacity = 0;
+}
+
+
+// ======================================================
+// PATHS
+// ======================================================
+
+// This section contains the polylines drawn with `FORM_PATH`. The vertices of every path of the
+// script are kept in one constant table written by the compiler; a path command stores the index
+// of its path in the `start_angle` field of the command and the distance of its farthest vertex
+// in the `size` field, so the bounds of `getShapeBounds` hold for any rotation.
+//
+// Functions in this section:
+// - setShapePaths: Sets the table of paths referenced by `FORM_PATH` commands.
+// - getShapePath: Returns a path of the table.
+// - getPathOffsetCount: Returns the number of parallel polylines drawn for a thickness.
+// - getPathPoint: Computes a vertex of a path at a cursor's position, offset for the thickness.
+// - renderShapePath: Draws a path with one `SDL_RenderDrawLines` call per parallel polyline.
+
+static const ShapePath* shape_paths = NULL;
+static int shape_path_count = 0;
+
+
+// Function to set the table of paths referenced by `FORM_PATH` commands.
+//
+// Parameters:
+// - const ShapePath* paths: The paths, usually a static table of the generated code. It is not copied.
+// - int count: The number of paths in the table.
+//
+// Example Usage:
+// static const SDL_Point path_vertices[] = {{0, 0}, {50, 0}, {50, 50}};
+// static const ShapePath script_paths[] = {{path_vertices + 0, 3}};
+// setShapePaths(script_paths, 1);
+void setShapePaths(const ShapePath* paths, int count) {
+    shape_paths = paths;
+    shape_path_count = count;
+}
+
+
+// Function to get a path of the table set by `setShapePaths`.
+//
+// Returns:
+// - const ShapePath*: The path, or NULL if `path` is not an index of the table.
+const ShapePath* getShapePath(int path) {
+    if (path < 0 || path >= shape_path_count) {
+        return NULL;
+    }
+    return &shape_paths[path];
+}
+
+
+// Function to get the number of parallel polylines drawn for a thickness.
+//
+// The offsets go from `-thickness / 2` to `thickness / 2`, like the parallel lines of `drawLine`.
+int getPathOffsetCount(int thickness) {
+    return thickness / 2 - (-thickness / 2) + 1;
+}
+
+
+// Function to compute the unit normal of the segment from vertex `from` to vertex `to`.
+//
+// Returns 0 if the two vertices are the same point, 1 otherwise.
+static int segmentNormal(const ShapePath* path, int from, int to, double* normal_x, double* normal_y) {
+    double dx = path->points[to].x - path->points[from].x;
+    double dy = path->points[to].y - path->points[from].y;
+    double length = sqrt(dx * dx + dy * dy);
+    if (length == 0) {
+        return 0;
+    }
+    // Perpendicular to the segment, on the same side as the offsets of `drawLine`.
+    *normal_x = -dy / length;
+    *normal_y = dx / length;
+    return 1;
+}
+
+
+// Function to compute a vertex of a path at a cursor's position.
+//
+// Parameters:
+// - const ShapePath* path: The path.
+// - int index: The index of the vertex.
+// - float scale: The scale of the cursor, applied to the vertices.
+// - int x, int y: The position of the cursor.
+// - double cos_angle, double sin_angle: The cosine and sine of the rotation of the cursor.
+// - int offset: The distance, in pixels, of the parallel polyline drawn for the thickness.
+//
+// Returns:
+// - SDL_Point: The vertex on screen.
+//
+// Implementation Details:
+// - At an inner vertex the offset follows the bisector of the two segments (miter join),
+//   lengthened so both parallel segments keep their distance. The lengthening is limited to
+//   twice the offset so sharp turns stay within the bounds of the shape.
+//
+// Notes:
+// - The result only depends on its parameters, so it can be called from several threads.
+SDL_Point getPathPoint(const ShapePath* path, int index, float scale, int x, int y, double cos_angle, double sin_angle, int offset) {
+    double local_x = path->points[index].x * scale;
+    double local_y = path->points[index].y * scale;
+
+    if (offset != 0) {
+        double before_x = 0, before_y = 0, after_x = 0, after_y = 0;
+        int has_before = index > 0 && segmentNormal(path, index - 1, index, &before_x, &before_y);
+        int has_after = index + 1 < path->count && segmentNormal(path, index, index + 1, &after_x, &after_y);
+        double normal_x = before_x + after_x;
+        double normal_y = before_y + after_y;
+        double length = sqrt(normal_x * normal_x + normal_y * normal_y);
+        if (length > 0) {
+            normal_x /= length;
+            normal_y /= length;
+            if (has_before && has_after) {
+                // Miter: divide by the cosine of half the turn, at most by 1/2.
+                double cosine = normal_x * after_x + normal_y * after_y;
+                double miter = 1.0 / (cosine > 0.5 ? cosine : 0.5);
+                normal_x *= miter;
+                normal_y *= miter;
+            }
+            local_x += offset * normal_x;
+            local_y += offset * normal_y;
+        }
+    }
+
+    SDL_Point point;
+    point.x = x + (int)(local_x * cos_angle - local_y * sin_angle);
+    point.y = y + (int)(local_x * sin_angle + local_y * cos_angle);
+    return point;
+}
+
+
+// Function to draw a path at a cursor's position and rotation.
+//
+// This function transforms the vertices of the path and sends them to the renderer with a
+// single `SDL_RenderDrawLines` call, once per parallel polyline of the thickness.
+// The drawing color must already be set on the renderer.
+//
+// Parameters:
+// - SDL_Renderer* renderer: The SDL renderer used to draw the path.
+// - const ShapePath* path: The path returned by `getShapePath`.
+// - float scale: The scale of the cursor.
+// - int thickness: The thickness of the cursor.
+// - int x, int y: The position of the cursor.
+// - int angle: The rotation of the cursor in degrees.
+//
+// Example Usage:
+// renderShapePath(renderer, getShapePath(0), cursor->scale, cursor->thickness, cursor->x, cursor->y, cursor->angle);
+void renderShapePath(SDL_Renderer* renderer, const ShapePath* path, float scale, int thickness, int x, int y, int angle) {
+    if (path == NULL || path->count < 2) {
+        return;
+    }
+    if (path->count > transform_capacity) {
+        transform_capacity = path->count;
+        transform_buffer = realloc(transform_buffer, transform_capacity * sizeof(SDL_Point));
+    }
+
+    float rad_angle = angle * M_PI / 180.0; // Convert the angle to radians.
+    double cos_angle = cos(rad_angle);
+    double sin_angle = sin(rad_angle);
+    for (int offset = -thickness / 2; offset <= thickness / 2; offset++) {
+        for (int i = 0; i < path->count; i++) {
+            transform_buffer[i] = getPathPoint(path, i, scale, x, y, cos_angle, sin_angle, offset);
+        }
+        SDL_RenderDrawLines(renderer, transform_buffer, path->count);
+    }
+}
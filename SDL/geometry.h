@@ -0,0 +1,38 @@
+#ifndef GEOMETRY_H
+#define GEOMETRY_H
+
+#include <SDL2/SDL.h>
+
+// Shapes that can be drawn by a cursor.
+typedef enum {
+    FORM_LINE,
+    FORM_SQUARE,
+    FORM_FILLED_SQUARE,
+    FORM_CIRCLE,
+    FORM_FILLED_CIRCLE,
+    FORM_ARC,
+    FORM_PATH
+} ShapeForm;
+
+typedef struct {
+    SDL_Point* points;    // Points of the shape relative to the cursor's position (local space, no rotation).
+    int count;            // Number of points in the `points` array.
+} ShapeGeometry;
+
+// A polyline drawn by a cursor, referenced by its index in the table given to `setShapePaths`.
+typedef struct {
+    const SDL_Point* points;  // Vertices relative to the cursor's position, before rotation and scaling.
+    int count;                // Number of vertices (at least 2 to draw anything).
+} ShapePath;
+
+const ShapeGeometry* getShapeGeometry(ShapeForm form, int scaled_size, int thickness, int startAngle, int endAngle);
+void renderShapeGeometry(SDL_Renderer* renderer, const ShapeGeometry* geometry, int x, int y, int angle);
+SDL_Rect getShapeBounds(ShapeForm form, int scaled_size, int thickness, int x, int y, int angle);
+void clearGeometryCache(void);
+void setShapePaths(const ShapePath* paths, int count);
+const ShapePath* getShapePath(int path);
+int getPathOffsetCount(int thickness);
+SDL_Point getPathPoint(const ShapePath* path, int index, float scale, int x, int y, double cos_angle, double sin_angle, int offset);
+void renderShapePath(SDL_Renderer* renderer, const ShapePath* path, float scale, int thickness, int x, int y, int angle);
+
+#endif
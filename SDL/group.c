@@ -0,0 +1,407 @@
+#include "group.h"
+#include "config.h"
+#include <math.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <SDL2/SDL.h>
+
+
+// ======================================================
+// CURSOR GROUPS
+// ======================================================
+
+// This section lets a script move and rotate a composite figure as a whole. A group has a pivot
+// and an angle, relative to its parent group (or to the screen for a root group), and contains
+// cursors and other groups:
+//
+// - Members: a cursor added to a group keeps its position and angle relative to the pivot of
+//   the group. Its place in the pool is the world transform of the group applied to them.
+// - Transforms: moving or rotating a group only changes the group and sets `GROUP_DIRTY`, so a
+//   figure of 500 shapes costs one update, however many times it moves during a step.
+// - Resolution: `resolveGroupTransforms` runs once per step, before the snapshot is published.
+//   It recomputes the cached world transform of the dirty groups and of the groups below them,
+//   and writes the positions of their member cursors only. Clean groups cost nothing.
+// - Direct changes: a member cursor moved directly (mouse, script statement, animation) keeps
+//   its new place: the change is detected when its group is next resolved, and turned into a
+//   new position relative to the group.
+//
+// The animation modes animate the root groups like cursors (the group arrays have the same
+// layout as the cursor arrays, see batch.c), while the cursors in groups follow them.
+//
+// Functions in this section:
+// - initGroup: Creates a group with its pivot at a position.
+// - addCursorToGroup: Puts a cursor in a group, keeping its place on the screen.
+// - addGroupToGroup: Puts a group in another group, keeping its place on the screen.
+// - moveGroup: Moves a group in the direction of its angle.
+// - rotateGroup: Rotates a group around its pivot.
+// - invalidateGroupTransforms: Marks every group as changed.
+// - resolveGroupTransforms: Places the cursors of the changed groups.
+// - freeGroupPool: Releases the arrays of the pool.
+
+
+// Global pool of the groups created by the script.
+GroupPool group_pool = {0};
+
+// Resolution state of each group during `resolveGroupTransforms`.
+#define GROUP_UNRESOLVED 0
+#define GROUP_UNCHANGED 1
+#define GROUP_CHANGED 2
+
+static Uint8* resolve_state = NULL;
+static int resolve_capacity = 0;
+
+
+// Function to grow the arrays of a pool so that `index` is a valid group.
+//
+// Notes:
+// - The program stops if memory runs out, like the cursor pool.
+static void reserveGroupPool(GroupPool* groups, int index) {
+    if (index < groups->capacity) {
+        return;
+    }
+    int capacity = groups->capacity ? groups->capacity : 16;
+    while (capacity <= index) {
+        capacity *= 2;
+    }
+    groups->x = realloc(groups->x, capacity * sizeof(int));
+    groups->y = realloc(groups->y, capacity * sizeof(int));
+    groups->angle = realloc(groups->angle, capacity * sizeof(int));
+    groups->parent = realloc(groups->parent, capacity * sizeof(int));
+    groups->flags = realloc(groups->flags, capacity * sizeof(Uint8));
+    groups->world_x = realloc(groups->world_x, capacity * sizeof(float));
+    groups->world_y = realloc(groups->world_y, capacity * sizeof(float));
+    groups->world_angle = realloc(groups->world_angle, capacity * sizeof(int));
+    groups->first_member = realloc(groups->first_member, capacity * sizeof(int));
+    if (!groups->x || !groups->y || !groups->angle || !groups->parent || !groups->flags || !groups->world_x
+        || !groups->world_y || !groups->world_angle || !groups->first_member) {
+        printf("Group pool allocation error for %d groups\n", capacity);
+        exit(1);
+    }
+    groups->capacity = capacity;
+}
+
+
+// Function to grow the members of a pool so that `cursor` is a valid index.
+static void reserveGroupMembers(GroupPool* groups, int cursor) {
+    if (cursor < groups->member_capacity) {
+        return;
+    }
+    int capacity = groups->member_capacity ? groups->member_capacity : 64;
+    while (capacity <= cursor) {
+        capacity *= 2;
+    }
+    groups->members = realloc(groups->members, capacity * sizeof(GroupMember));
+    if (!groups->members) {
+        printf("Group pool allocation error for %d cursors\n", capacity);
+        exit(1);
+    }
+    for (int i = groups->member_capacity; i < capacity; i++) {
+        groups->members[i].group = -1;
+        groups->members[i].next = -1;
+    }
+    groups->member_capacity = capacity;
+}
+
+
+// Function to keep an angle in [0, 360).
+static int wrapGroupAngle(int angle) {
+    angle %= 360;
+    return angle < 0 ? angle + 360 : angle;
+}
+
+
+// Function to create a group in a pool.
+//
+// Parameters:
+// - GroupPool* groups: The pool holding the group.
+// - int index: The index of the group. The pool grows if needed.
+// - int x, int y: The pivot of the group on the screen. The group rotates around it.
+//
+// Notes:
+// - A new group is a root group with an angle of 0 and no members.
+//
+// Example Usage:
+// initGroup(&group_pool, 0, 400, 300);
+void initGroup(GroupPool* groups, int index, int x, int y) {
+    reserveGroupPool(groups, index);
+    for (int i = groups->count; i < index; i++) {
+        groups->x[i] = groups->y[i] = groups->angle[i] = 0;
+        groups->parent[i] = -1;
+        groups->flags[i] = 0; // Skipped slots are never animated.
+        groups->world_x[i] = groups->world_y[i] = 0.0f;
+        groups->world_angle[i] = 0;
+        groups->first_member[i] = -1;
+    }
+    if (groups->count <= index) {
+        groups->count = index + 1;
+    }
+
+    groups->x[index] = x;
+    groups->y[index] = y;
+    groups->angle[index] = 0;
+    groups->parent[index] = -1;
+    groups->flags[index] = CURSOR_VISIBLE | GROUP_DIRTY;
+    groups->world_x[index] = (float)x;
+    groups->world_y[index] = (float)y;
+    groups->world_angle[index] = 0;
+    groups->first_member[index] = -1;
+}
+
+
+// Function to compute the world transform of a group from the cached transform of its parent.
+static void computeWorldTransform(const GroupPool* groups, int index, float* world_x, float* world_y, int* world_angle) {
+    int parent = groups->parent[index];
+    if (parent < 0) {
+        *world_x = (float)groups->x[index];
+        *world_y = (float)groups->y[index];
+        *world_angle = groups->angle[index];
+        return;
+    }
+    double radians = groups->world_angle[parent] * M_PI / 180.0;
+    float c = (float)cos(radians), s = (float)sin(radians);
+    *world_x = groups->world_x[parent] + c * groups->x[index] - s * groups->y[index];
+    *world_y = groups->world_y[parent] + s * groups->x[index] + c * groups->y[index];
+    *world_angle = wrapGroupAngle(groups->world_angle[parent] + groups->angle[index]);
+}
+
+
+// Function to express a point of the screen relative to a transform.
+static void toLocal(float origin_x, float origin_y, int angle, int x, int y, float* local_x, float* local_y) {
+    double radians = angle * M_PI / 180.0;
+    float c = (float)cos(radians), s = (float)sin(radians);
+    float dx = x - origin_x, dy = y - origin_y;
+    *local_x = c * dx + s * dy;
+    *local_y = -s * dx + c * dy;
+}
+
+
+// Function to place the member cursors of a group whose world transform changed.
+//
+// Parameters:
+// - float old_x, float old_y, int old_angle: The world transform the members were placed with.
+//
+// Implementation Details:
+// - A member whose place in the pool is not the one written last was changed directly: its
+//   position relative to the group is computed again from the old transform before it moves.
+static int placeMembers(GroupPool* groups, CursorPool* pool, int index, float old_x, float old_y, int old_angle) {
+    double radians = groups->world_angle[index] * M_PI / 180.0;
+    float c = (float)cos(radians), s = (float)sin(radians);
+    int placed = 0;
+
+    for (int m = groups->first_member[index]; m >= 0; m = groups->members[m].next) {
+        GroupMember* member = &groups->members[m];
+        if (m >= pool->count) {
+            continue;
+        }
+        if (pool->x[m] != member->placed_x || pool->y[m] != member->placed_y || pool->angle[m] != member->placed_angle) {
+            toLocal(old_x, old_y, old_angle, pool->x[m], pool->y[m], &member->local_x, &member->local_y);
+            member->local_angle = wrapGroupAngle(pool->angle[m] - old_angle);
+        }
+        pool->x[m] = (int)floorf(groups->world_x[index] + c * member->local_x - s * member->local_y + 0.5f);
+        pool->y[m] = (int)floorf(groups->world_y[index] + s * member->local_x + c * member->local_y + 0.5f);
+        pool->angle[m] = wrapGroupAngle(groups->world_angle[index] + member->local_angle);
+        member->placed_x = pool->x[m];
+        member->placed_y = pool->y[m];
+        member->placed_angle = pool->angle[m];
+        placed++;
+    }
+    return placed;
+}
+
+
+// Function to resolve a group after its parent, returning its state (see `GROUP_CHANGED`).
+static int resolveGroup(GroupPool* groups, CursorPool* pool, int index, int* placed) {
+    if (resolve_state[index] != GROUP_UNRESOLVED) {
+        return resolve_state[index];
+    }
+    int parent = groups->parent[index];
+    int parent_changed = parent >= 0 && resolveGroup(groups, pool, parent, placed) == GROUP_CHANGED;
+    if (!(groups->flags[index] & GROUP_DIRTY) && !parent_changed) {
+        resolve_state[index] = GROUP_UNCHANGED;
+        return GROUP_UNCHANGED;
+    }
+
+    float old_x = groups->world_x[index];
+    float old_y = groups->world_y[index];
+    int old_angle = groups->world_angle[index];
+    computeWorldTransform(groups, index, &groups->world_x[index], &groups->world_y[index], &groups->world_angle[index]);
+    groups->flags[index] &= ~GROUP_DIRTY;
+    *placed += placeMembers(groups, pool, index, old_x, old_y, old_angle);
+    resolve_state[index] = GROUP_CHANGED;
+    return GROUP_CHANGED;
+}
+
+
+// Function to place the cursors of the groups that changed.
+//
+// Parameters:
+// - GroupPool* groups: The groups.
+// - CursorPool* pool: The pool holding their member cursors.
+//
+// Returns:
+// - int: The number of cursors placed.
+//
+// Implementation Details:
+// - A group is resolved after its parent, so its cached world transform is computed from the
+//   new one. A group is recomputed when it is dirty or when its parent was recomputed.
+// - Only the members of the recomputed groups are written.
+//
+// Notes:
+// - Call it before publishing the cursors (`publishCursorSnapshot`): the moves and rotations of
+//   the step are then applied to the cursors once.
+//
+// Example Usage:
+// resolveGroupTransforms(&group_pool, &cursor_pool);
+int resolveGroupTransforms(GroupPool* groups, CursorPool* pool) {
+    if (groups->count > resolve_capacity) {
+        resolve_state = realloc(resolve_state, groups->capacity);
+        resolve_capacity = groups->capacity;
+    }
+    for (int i = 0; i < groups->count; i++) {
+        resolve_state[i] = GROUP_UNRESOLVED;
+    }
+    int placed = 0;
+    for (int i = 0; i < groups->count; i++) {
+        resolveGroup(groups, pool, i, &placed);
+    }
+    return placed;
+}
+
+
+// Function to take a cursor out of the member list of its group.
+static void removeMember(GroupPool* groups, int cursor) {
+    int group = groups->members[cursor].group;
+    if (group < 0) {
+        return;
+    }
+    int* link = &groups->first_member[group];
+    while (*link >= 0 && *link != cursor) {
+        link = &groups->members[*link].next;
+    }
+    if (*link == cursor) {
+        *link = groups->members[cursor].next;
+    }
+    groups->members[cursor].group = -1;
+    groups->members[cursor].next = -1;
+}
+
+
+// Function to put a cursor in a group, keeping its place on the screen.
+//
+// Parameters:
+// - GroupPool* groups: The groups.
+// - CursorPool* pool: The pool holding the cursor.
+// - int cursor: The index of the cursor. It leaves its previous group, if any.
+// - int group: The index of the group.
+//
+// Implementation Details:
+// - The groups are resolved first, so the position of the cursor relative to the group is
+//   computed with the current transform of the group.
+//
+// Example Usage:
+// addCursorToGroup(&group_pool, &cursor_pool, 3, 0);
+void addCursorToGroup(GroupPool* groups, CursorPool* pool, int cursor, int group) {
+    if (cursor < 0 || cursor >= pool->count || group < 0 || group >= groups->count) {
+        return;
+    }
+    resolveGroupTransforms(groups, pool);
+    reserveGroupMembers(groups, cursor);
+    removeMember(groups, cursor);
+
+    GroupMember* member = &groups->members[cursor];
+    member->group = group;
+    member->next = groups->first_member[group];
+    groups->first_member[group] = cursor;
+    toLocal(groups->world_x[group], groups->world_y[group], groups->world_angle[group],
+            pool->x[cursor], pool->y[cursor], &member->local_x, &member->local_y);
+    member->local_angle = wrapGroupAngle(pool->angle[cursor] - groups->world_angle[group]);
+    member->placed_x = pool->x[cursor];
+    member->placed_y = pool->y[cursor];
+    member->placed_angle = pool->angle[cursor];
+    pool->flags[cursor] |= CURSOR_GROUPED;
+}
+
+
+// Function to put a group in another group, keeping its place on the screen.
+//
+// Parameters:
+// - GroupPool* groups: The groups.
+// - CursorPool* pool: The pool holding the member cursors.
+// - int child: The index of the group to nest.
+// - int group: The index of the new parent group.
+//
+// Notes:
+// - A group cannot be put in itself or in one of its own groups; the call is then ignored with
+//   an error message.
+// - A nested group is no longer animated on its own: it follows its parent.
+void addGroupToGroup(GroupPool* groups, CursorPool* pool, int child, int group) {
+    if (child < 0 || child >= groups->count || group < 0 || group >= groups->count) {
+        return;
+    }
+    for (int ancestor = group; ancestor >= 0; ancestor = groups->parent[ancestor]) {
+        if (ancestor == child) {
+            printf("Group error : group %d cannot be put in group %d, which it contains\n", child, group);
+            return;
+        }
+    }
+    resolveGroupTransforms(groups, pool);
+
+    double radians = groups->world_angle[group] * M_PI / 180.0;
+    float c = (float)cos(radians), s = (float)sin(radians);
+    float dx = groups->world_x[child] - groups->world_x[group];
+    float dy = groups->world_y[child] - groups->world_y[group];
+    groups->x[child] = (int)floorf(c * dx + s * dy + 0.5f);
+    groups->y[child] = (int)floorf(-s * dx + c * dy + 0.5f);
+    groups->angle[child] = wrapGroupAngle(groups->world_angle[child] - groups->world_angle[group]);
+    groups->parent[child] = group;
+    groups->flags[child] |= CURSOR_GROUPED | GROUP_DIRTY;
+}
+
+
+// Function to move a group in the direction of its angle (see `movePooledCursor`).
+void moveGroup(GroupPool* groups, int index, int distance) {
+    groups->x[index] += distance * cos(groups->angle[index] * M_PI / 180.0);
+    groups->y[index] += distance * sin(groups->angle[index] * M_PI / 180.0);
+    groups->flags[index] |= GROUP_DIRTY;
+}
+
+
+// Function to rotate a group around its pivot, keeping its angle in [0, 360).
+void rotateGroup(GroupPool* groups, int index, int angle) {
+    groups->angle[index] = wrapGroupAngle(groups->angle[index] + angle);
+    groups->flags[index] |= GROUP_DIRTY;
+}
+
+
+// Function to mark every group as changed.
+//
+// Notes:
+// - Call it after changing the group arrays directly, for instance with the batch functions
+//   of batch.c.
+void invalidateGroupTransforms(GroupPool* groups) {
+    for (int i = 0; i < groups->count; i++) {
+        groups->flags[i] |= GROUP_DIRTY;
+    }
+}
+
+
+// Function to release the arrays of a pool.
+//
+// Notes:
+// - The pool is left empty and can be filled again.
+void freeGroupPool(GroupPool* groups) {
+    free(groups->x);
+    free(groups->y);
+    free(groups->angle);
+    free(groups->parent);
+    free(groups->flags);
+    free(groups->world_x);
+    free(groups->world_y);
+    free(groups->world_angle);
+    free(groups->first_member);
+    free(groups->members);
+    *groups = (GroupPool){0};
+    free(resolve_state);
+    resolve_state = NULL;
+    resolve_capacity = 0;
+}
@@ -0,0 +1,49 @@
+#ifndef GROUP_H
+#define GROUP_H
+
+#include <SDL2/SDL.h>
+#include "newcursor.h"
+
+// Flag stored in `GroupPool.flags`, next to `CURSOR_VISIBLE` and `CURSOR_GROUPED`.
+#define GROUP_DIRTY 0x4       // The transform of the group changed since its members were placed.
+
+// The place of a cursor in its group.
+typedef struct {
+    int group;            // Index of the group, -1 if the cursor is in no group.
+    int next;             // Index of the next member cursor of the same group, -1 for the last one.
+    float local_x;        // Position relative to the pivot of the group, in the frame of the group.
+    float local_y;
+    int local_angle;      // Angle relative to the group.
+    int placed_x;         // Position and angle last written to the pool, to detect direct changes.
+    int placed_y;
+    int placed_angle;
+} GroupMember;
+
+typedef struct {
+    int count;            // Number of groups in the pool (indices 0 to count - 1).
+    int capacity;         // Number of groups the arrays can hold before growing.
+    int* x;               // Pivots, in the frame of the parent group (screen for root groups).
+    int* y;
+    int* angle;           // Rotation angles in degrees, relative to the parent group.
+    int* parent;          // Index of the parent group, -1 for a root group.
+    Uint8* flags;         // CURSOR_VISIBLE (animated like a cursor), CURSOR_GROUPED (nested), GROUP_DIRTY.
+    float* world_x;       // Cached world transforms, valid while the group is not dirty.
+    float* world_y;
+    int* world_angle;
+    int* first_member;    // Index of the first member cursor, -1 if the group has none.
+    GroupMember* members; // Membership of each cursor, indexed like the cursor pool.
+    int member_capacity;  // Number of cursors `members` can hold before growing.
+} GroupPool;
+
+extern GroupPool group_pool;  // The groups used by the generated code.
+
+void initGroup(GroupPool* groups, int index, int x, int y);
+void addCursorToGroup(GroupPool* groups, CursorPool* pool, int cursor, int group);
+void addGroupToGroup(GroupPool* groups, CursorPool* pool, int child, int group);
+void moveGroup(GroupPool* groups, int index, int distance);
+void rotateGroup(GroupPool* groups, int index, int angle);
+void invalidateGroupTransforms(GroupPool* groups);
+int resolveGroupTransforms(GroupPool* groups, CursorPool* pool);
+void freeGroupPool(GroupPool* groups);
+
+#endif
@@ -1,6 +1,10 @@
 #include "handle.h"
+#include "camera.h"
 #include "config.h"
+#include "drawlist.h"
+#include "spatial.h"
 #include <math.h>
+#include <stdlib.h>
 #include <SDL2/SDL.h>
 
 
@@ -253,7 +257,8 @@ void debugSelectionArea(SDL_Renderer* renderer, Cursor* cursor) {
     }
 
     // Set the debug color to semi-transparent green.
-    SDL_SetRenderDrawColor(renderer, 0, 255, 0, 128);
+    SDL_Color debug_color = {0, 255, 0, 128};
+    setDrawColor(renderer, debug_color);
 
     // Calculate the selection area's size and boundaries.
     int scaled_size = (int)(50 * cursor->scale); // Base size of 50 units, scaled by the cursor's scale.
@@ -268,4 +273,149 @@ void debugSelectionArea(SDL_Renderer* renderer, Cursor* cursor) {
 
     // Draw the debug rectangle.
     SDL_RenderDrawRect(renderer, &rect);
-}
\ No newline at end of file
+}
+
+// ======================================================
+// POOLED CURSOR HANDLING
+// ======================================================
+
+// This section contains the counterparts of the functions above for cursors stored in a
+// `CursorPool` (see newcursor.c). The selected cursor is identified by its index.
+// Selection goes through the spatial hash grid of spatial.c, which the other functions keep
+// up to date when they change the selected cursor. The cursors are in world coordinates: the
+// mouse positions are converted with the camera (see camera.c), which `handleCameraEvent` moves.
+//
+// Functions in this section:
+// - handlePooledSelection: Identifies which pooled cursor was clicked by the user.
+// - handlePooledMovement: Moves the selected pooled cursor.
+// - handlePooledZoom: Zooms the selected pooled cursor.
+// - handlePooledDeletion: Hides the selected pooled cursor.
+// - applyRotationToPooledCursor: Rotates a pooled cursor by a specified angle.
+// - handleCameraEvent: Pans and zooms the view.
+
+
+// Global variable to track the index of the selected pooled cursor:
+int selected_index = -1;  // -1 when no cursor is selected.
+
+
+// Function to select a pooled cursor (see `handleSelection`).
+//
+// Parameters:
+// - int x, int y: The coordinates of the mouse click.
+// - const CursorPool* pool: The pool holding the cursors.
+//
+// Notes:
+// - Unlike `handleSelection`, the selection area is the bounding box of each shape the cursor
+//   draws (its real size, scale, thickness and angle), and hidden cursors cannot be selected.
+// - When shapes overlap, the cursor of the shape drawn on top is selected.
+// - Only the cursors stored near the click are tested (see `findTopmostCursor`).
+void handlePooledSelection(int x, int y, const CursorPool* pool) {
+    int world_x, world_y;
+    screenToWorld(&camera, x, y, &world_x, &world_y);
+    selected_index = findTopmostCursor(pool, world_x, world_y);
+}
+
+
+// Function to move the selected pooled cursor to a new position (see `handleMovement`).
+//
+// Notes:
+// - x and y are a position in the window; the cursor is moved to the world point under it.
+void handlePooledMovement(CursorPool* pool, int x, int y) {
+    if (selected_index >= 0) {
+        screenToWorld(&camera, x, y, &pool->x[selected_index], &pool->y[selected_index]);
+        updateSpatialCursor(pool, selected_index);
+    }
+}
+
+
+// Function to zoom in or out on the selected pooled cursor (see `handleZoom`).
+//
+// Notes:
+// - Unlike `handleZoom`, the cursor keeps its position: only its shapes grow or shrink. Zooming
+//   the whole view is done with the camera (see `handleCameraEvent`).
+void handlePooledZoom(CursorPool* pool, int zoomIn) {
+    if (selected_index >= 0) {
+        float old_scale = pool->scale[selected_index];
+        float scale = zoomIn ? old_scale + 0.1f : old_scale - 0.1f;
+        if (scale < 0.1f) {
+            scale = 0.1f; // Enforce a minimum scale limit.
+        }
+        pool->scale[selected_index] = scale;
+        updateSpatialCursor(pool, selected_index);
+    }
+}
+
+
+// Function to delete the selected pooled cursor by hiding it (see `handleDeletion`).
+void handlePooledDeletion(CursorPool* pool) {
+    if (selected_index >= 0) {
+        pool->flags[selected_index] &= ~CURSOR_VISIBLE;
+        updateSpatialCursor(pool, selected_index);  // Hidden cursors leave the grid.
+        selected_index = -1;
+    }
+}
+
+
+// Function to rotate a pooled cursor (see `applyRotationToCursor`).
+//
+// Parameters:
+// - CursorPool* pool: The pool holding the cursor.
+// - int index: The index of the cursor, or -1 to do nothing (no selection).
+// - int angle: The angle (in degrees) to add to the cursor's rotation.
+void applyRotationToPooledCursor(CursorPool* pool, int index, int angle) {
+    if (index >= 0) {
+        rotatePooledCursor(pool, index, angle);
+        updateSpatialCursor(pool, index);
+    }
+}
+
+
+// Function to pan and zoom the view with the mouse and the keyboard.
+//
+// Parameters:
+// - const SDL_Event* event: An event of the animation loop, passed before it is handled.
+//
+// Logic:
+// - Dragging with the right mouse button moves the view.
+// - The arrow keys move the view by `CAMERA_PAN_STEP` pixels.
+// - The mouse wheel zooms the view around the mouse when no cursor is selected (with a selected
+//   cursor, the wheel keeps zooming that cursor, see `handlePooledZoom`), one step per notch.
+//   Wheel events merged by the event queue carry several notches (see simulation.c).
+//
+// Notes:
+// - The event is not consumed: the animation loop still handles it.
+//
+// Example Usage:
+// handleCameraEvent(&event);
+void handleCameraEvent(const SDL_Event* event) {
+    static int pointer_x = SCREEN_WIDTH / 2;   // Last known position of the mouse in the window.
+    static int pointer_y = SCREEN_HEIGHT / 2;
+
+    switch (event->type) {
+        case SDL_MOUSEMOTION:
+            pointer_x = event->motion.x;
+            pointer_y = event->motion.y;
+            if (event->motion.state & SDL_BUTTON_RMASK) {
+                panCamera(&camera, -event->motion.xrel, -event->motion.yrel);
+            }
+            break;
+        case SDL_MOUSEWHEEL:
+            for (int notch = 0; selected_index < 0 && notch < abs(event->wheel.y); notch++) {
+                zoomCamera(&camera, pointer_x, pointer_y, event->wheel.y > 0);
+            }
+            break;
+        case SDL_KEYDOWN:
+            if (event->key.keysym.sym == SDLK_LEFT) {
+                panCamera(&camera, -CAMERA_PAN_STEP, 0);
+            } else if (event->key.keysym.sym == SDLK_RIGHT) {
+                panCamera(&camera, CAMERA_PAN_STEP, 0);
+            } else if (event->key.keysym.sym == SDLK_UP) {
+                panCamera(&camera, 0, -CAMERA_PAN_STEP);
+            } else if (event->key.keysym.sym == SDLK_DOWN) {
+                panCamera(&camera, 0, CAMERA_PAN_STEP);
+            }
+            break;
+        default:
+            break;
+    }
+}
@@ -4,6 +4,7 @@
 #include "newcursor.h"
 
 extern Cursor* selected_cursor;  // Declare the global variable as extern.
+extern int selected_index;       // Index of the selected pooled cursor, -1 if none.
 
 void handleSelection(int x, int y, Cursor** cursors, int num_cursors);
 void handleMovement(int x, int y);
@@ -12,4 +13,11 @@ void handleDeletion();
 void applyRotationToCursor(Cursor* cursor, int angle);
 void debugSelectionArea(SDL_Renderer* renderer, Cursor* cursor);
 
+void handlePooledSelection(int x, int y, const CursorPool* pool);
+void handlePooledMovement(CursorPool* pool, int x, int y);
+void handlePooledZoom(CursorPool* pool, int zoomIn);
+void handlePooledDeletion(CursorPool* pool);
+void applyRotationToPooledCursor(CursorPool* pool, int index, int angle);
+void handleCameraEvent(const SDL_Event* event);
+
 #endif
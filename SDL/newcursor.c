@@ -1,6 +1,9 @@
 #include "newcursor.h"
 #include "config.h"
 #include <math.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
 #include <SDL2/SDL.h>
 
 
@@ -148,3 +151,265 @@ void rotateCursor2(Cursor* cursor, double angle) {
         cursor->angle += 360.0;  // Normalize negative angles to positive equivalents.
     }
 }
+
+
+// ======================================================
+// CURSOR POOL
+// ======================================================
+
+// This section contains the cursor pool used by the generated code. Instead of one `Cursor`
+// variable per script cursor, every cursor lives in a set of heap-allocated arrays, one per
+// attribute (structure of arrays), and is referred to by its index. Loops over all cursors
+// then read contiguous memory, and scenes with many thousands of cursors neither overflow
+// the stack nor produce one declaration per cursor in the generated file.
+//
+// Functions in this section:
+// - initPooledCursor: Creates (or re-creates) the cursor at a given index.
+// - loadCursorTable: Creates the cursors of a constant table written by the compiler.
+// - loadPooledCursor: Returns a copy of a pooled cursor as a `Cursor`.
+// - storePooledCursor: Writes a `Cursor` back into the pool.
+// - setPooledThickness, movePooledCursor, rotatePooledCursor, rotatePooledCursor2:
+//   Same as `setThickness`, `moveCursor`, `rotateCursor` and `rotateCursor2`, by index.
+// - copyCursorPool: Copies every cursor of a pool into another pool.
+// - freeCursorPool: Releases the arrays of the pool.
+
+
+// Global pool of the cursors created by the script.
+CursorPool cursor_pool = {0};
+
+
+// Function to pack an `SDL_Color` as 0xRRGGBBAA.
+static Uint32 packCursorColor(SDL_Color color) {
+    return ((Uint32)color.r << 24) | ((Uint32)color.g << 16) | ((Uint32)color.b << 8) | color.a;
+}
+
+
+// Function to grow the arrays of a pool so that `index` is a valid slot.
+//
+// Notes:
+// - The capacity doubles, so creating N cursors one by one costs O(N) copies overall.
+// - The program stops if memory runs out, like any allocation failure at startup.
+static void reserveCursorPool(CursorPool* pool, int index) {
+    if (index < pool->capacity) {
+        return;
+    }
+    int capacity = pool->capacity ? pool->capacity : 64;
+    while (capacity <= index) {
+        capacity *= 2;
+    }
+    pool->x = realloc(pool->x, capacity * sizeof(int));
+    pool->y = realloc(pool->y, capacity * sizeof(int));
+    pool->angle = realloc(pool->angle, capacity * sizeof(int));
+    pool->scale = realloc(pool->scale, capacity * sizeof(float));
+    pool->color = realloc(pool->color, capacity * sizeof(Uint32));
+    pool->thickness = realloc(pool->thickness, capacity * sizeof(Uint16));
+    pool->flags = realloc(pool->flags, capacity * sizeof(Uint8));
+    if (!pool->x || !pool->y || !pool->angle || !pool->scale || !pool->color || !pool->thickness || !pool->flags) {
+        printf("Cursor pool allocation error for %d cursors\n", capacity);
+        exit(1);
+    }
+    pool->capacity = capacity;
+}
+
+
+// Function to create a cursor in a pool.
+//
+// This function is the pooled counterpart of `createCursor`: it initializes the slot `index`
+// with the given position, color, thickness and visibility, an angle of 0 and a scale of 1.0.
+//
+// Parameters:
+// - CursorPool* pool: The pool holding the cursor.
+// - int index: The index of the cursor. The pool grows if needed, and `pool->count` becomes
+//   at least `index + 1`.
+// - int x, int y, SDL_Color color, int thickness, int visible: As for `createCursor`.
+//
+// Notes:
+// - Slots skipped when `index` jumps ahead are created hidden.
+//
+// Example Usage:
+// initPooledCursor(&cursor_pool, 0, 200, 200, (SDL_Color){255, 0, 0, 255}, 5, 1);
+void initPooledCursor(CursorPool* pool, int index, int x, int y, SDL_Color color, int thickness, int visible) {
+    reserveCursorPool(pool, index);
+    for (int i = pool->count; i < index; i++) {
+        pool->flags[i] = 0;
+        pool->x[i] = pool->y[i] = pool->angle[i] = 0;
+        pool->scale[i] = 1.0f;
+        pool->color[i] = 0;
+        pool->thickness[i] = 0;
+    }
+    if (pool->count <= index) {
+        pool->count = index + 1;
+    }
+
+    pool->x[index] = x;
+    pool->y[index] = y;
+    pool->angle[index] = 0;
+    pool->scale[index] = 1.0f;
+    pool->color[index] = packCursorColor(color);
+    pool->thickness[index] = thickness;
+    pool->flags[index] = visible ? CURSOR_VISIBLE : 0;
+}
+
+
+// Function to create the cursors of a constant table in a pool.
+//
+// The compiler writes the cursors created by a script as a `CursorTable`: one static constant
+// array per attribute, in the layout of the pool. Loading the table copies each array with a
+// single `memcpy` instead of running one `initPooledCursor` call per cursor.
+//
+// Parameters:
+// - CursorPool* pool: The pool receiving the cursors, in the slots 0 to `table->count - 1`.
+// - const CursorTable* table: The cursors to create.
+//
+// Notes:
+// - The result is the same as calling `initPooledCursor` for every created cursor of the table:
+//   angle 0, scale 1.0, and the slots the script never created are hidden.
+// - Cursors already in the pool after the table are kept.
+//
+// Example Usage:
+// static const int xs[] = {100, 150}, ys[] = {100, 100};
+// static const Uint32 colors[] = {0xFF0000FF, 0xFF0000FF};
+// static const Uint16 thicknesses[] = {2, 2};
+// static const Uint8 flags[] = {CURSOR_VISIBLE, CURSOR_VISIBLE};
+// static const CursorTable table = {2, xs, ys, colors, thicknesses, flags};
+// loadCursorTable(&cursor_pool, &table);
+void loadCursorTable(CursorPool* pool, const CursorTable* table) {
+    if (table->count <= 0) {
+        return;
+    }
+    reserveCursorPool(pool, table->count - 1);
+    if (pool->count < table->count) {
+        pool->count = table->count;
+    }
+
+    memcpy(pool->x, table->x, table->count * sizeof(int));
+    memcpy(pool->y, table->y, table->count * sizeof(int));
+    memcpy(pool->color, table->color, table->count * sizeof(Uint32));
+    memcpy(pool->thickness, table->thickness, table->count * sizeof(Uint16));
+    memcpy(pool->flags, table->flags, table->count * sizeof(Uint8));
+    memset(pool->angle, 0, table->count * sizeof(int));
+    for (int i = 0; i < table->count; i++) {
+        pool->scale[i] = 1.0f;
+    }
+}
+
+
+// Function to read a pooled cursor as a `Cursor`.
+//
+// Parameters:
+// - const CursorPool* pool: The pool holding the cursor.
+// - int index: The index of the cursor.
+//
+// Returns:
+// - Cursor: A copy of the cursor, usable with the drawing and handling functions.
+//
+// Example Usage:
+// Cursor cursor = loadPooledCursor(&cursor_pool, 3);
+// drawCircle(renderer, &cursor, 20);
+Cursor loadPooledCursor(const CursorPool* pool, int index) {
+    Uint32 color = pool->color[index];
+    Cursor cursor;
+    cursor.x = pool->x[index];
+    cursor.y = pool->y[index];
+    cursor.angle = pool->angle[index];
+    cursor.color.r = color >> 24;
+    cursor.color.g = (color >> 16) & 0xFF;
+    cursor.color.b = (color >> 8) & 0xFF;
+    cursor.color.a = color & 0xFF;
+    cursor.thickness = pool->thickness[index];
+    cursor.visible = (pool->flags[index] & CURSOR_VISIBLE) != 0;
+    cursor.scale = pool->scale[index];
+    return cursor;
+}
+
+
+// Function to write a `Cursor` back into a pool.
+//
+// Parameters:
+// - CursorPool* pool: The pool holding the cursor.
+// - int index: The index of the cursor.
+// - const Cursor* cursor: The new attributes of the cursor.
+void storePooledCursor(CursorPool* pool, int index, const Cursor* cursor) {
+    pool->x[index] = cursor->x;
+    pool->y[index] = cursor->y;
+    pool->angle[index] = cursor->angle;
+    pool->scale[index] = cursor->scale;
+    pool->color[index] = packCursorColor(cursor->color);
+    pool->thickness[index] = cursor->thickness;
+    if (cursor->visible) {
+        pool->flags[index] |= CURSOR_VISIBLE;
+    } else {
+        pool->flags[index] &= ~CURSOR_VISIBLE;
+    }
+}
+
+
+// Function to update the thickness of a pooled cursor (see `setThickness`).
+void setPooledThickness(CursorPool* pool, int index, int newThickness) {
+    pool->thickness[index] = newThickness;
+}
+
+
+// Function to move a pooled cursor in the direction of its angle (see `moveCursor`).
+void movePooledCursor(CursorPool* pool, int index, int distance) {
+    pool->x[index] += distance * cos(pool->angle[index] * M_PI / 180.0);
+    pool->y[index] += distance * sin(pool->angle[index] * M_PI / 180.0);
+}
+
+
+// Function to rotate a pooled cursor, keeping its angle in [0, 360) (see `rotateCursor`).
+void rotatePooledCursor(CursorPool* pool, int index, int angle) {
+    pool->angle[index] = (pool->angle[index] + angle) % 360;
+    if (pool->angle[index] < 0) {
+        pool->angle[index] += 360;
+    }
+}
+
+
+// Function to rotate a pooled cursor around its own center (see `rotateCursor2`).
+void rotatePooledCursor2(CursorPool* pool, int index, double angle) {
+    Cursor cursor = loadPooledCursor(pool, index);
+    rotateCursor2(&cursor, angle);
+    pool->angle[index] = cursor.angle;
+}
+
+
+// Function to copy every cursor of a pool into another pool.
+//
+// Parameters:
+// - CursorPool* destination: The pool receiving the copy. It grows if needed.
+// - const CursorPool* source: The pool copied.
+//
+// Notes:
+// - Used to hand a snapshot of the cursors from the simulation thread to the render thread
+//   (see simulation.c).
+void copyCursorPool(CursorPool* destination, const CursorPool* source) {
+    if (source->count > 0) {
+        reserveCursorPool(destination, source->count - 1);
+        memcpy(destination->x, source->x, source->count * sizeof(int));
+        memcpy(destination->y, source->y, source->count * sizeof(int));
+        memcpy(destination->angle, source->angle, source->count * sizeof(int));
+        memcpy(destination->scale, source->scale, source->count * sizeof(float));
+        memcpy(destination->color, source->color, source->count * sizeof(Uint32));
+        memcpy(destination->thickness, source->thickness, source->count * sizeof(Uint16));
+        memcpy(destination->flags, source->flags, source->count * sizeof(Uint8));
+    }
+    destination->count = source->count;
+}
+
+
+// Function to release the arrays of a pool.
+//
+// Notes:
+// - The pool is left empty and can be filled again.
+void freeCursorPool(CursorPool* pool) {
+    free(pool->x);
+    free(pool->y);
+    free(pool->angle);
+    free(pool->scale);
+    free(pool->color);
+    free(pool->thickness);
+    free(pool->flags);
+    CursorPool empty = {0};
+    *pool = empty;
+}
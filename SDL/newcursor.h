@@ -13,10 +13,49 @@ typedef struct {
     float scale;          // Scaling factor for the size of shapes (1.0 = default size, <1.0 = smaller, >1.0 = larger).
 } Cursor;
 
+// Flags stored in `CursorPool.flags`.
+#define CURSOR_VISIBLE 0x1    // The cursor is visible (same meaning as `Cursor.visible`).
+#define CURSOR_GROUPED 0x2    // The cursor is placed by its group (see group.c), not animated on its own.
+
+typedef struct {
+    int count;            // Number of cursors in the pool (indices 0 to count - 1).
+    int capacity;         // Number of cursors the arrays can hold before growing.
+    int* x;               // Positions on the screen (center of the shapes).
+    int* y;
+    int* angle;           // Rotation angles in degrees.
+    float* scale;         // Scaling factors (1.0 = default size).
+    Uint32* color;        // RGBA colors packed as 0xRRGGBBAA.
+    Uint16* thickness;    // Thickness of lines and borders.
+    Uint8* flags;         // Combination of CURSOR_* flags.
+} CursorPool;
+
+extern CursorPool cursor_pool;  // The pool used by the generated code.
+
+// Cursors created by a script, written by the compiler as constant arrays (see loadCursorTable).
+typedef struct {
+    int count;                // Number of slots in the table (indices 0 to count - 1).
+    const int* x;             // Positions, as in `CursorPool`.
+    const int* y;
+    const Uint32* color;      // RGBA colors packed as 0xRRGGBBAA.
+    const Uint16* thickness;
+    const Uint8* flags;       // CURSOR_VISIBLE, or 0 for a hidden or never created slot.
+} CursorTable;
+
 Cursor createCursor(int x, int y, SDL_Color color, int thickness, int visible);
 void setThickness(Cursor* cursor, int newThickness);
 void moveCursor(Cursor* cursor, int distance);
 void rotateCursor(Cursor* cursor, int angle);
 void rotateCursor2(Cursor* cursor, double angle);
 
+void initPooledCursor(CursorPool* pool, int index, int x, int y, SDL_Color color, int thickness, int visible);
+void loadCursorTable(CursorPool* pool, const CursorTable* table);
+Cursor loadPooledCursor(const CursorPool* pool, int index);
+void storePooledCursor(CursorPool* pool, int index, const Cursor* cursor);
+void setPooledThickness(CursorPool* pool, int index, int newThickness);
+void movePooledCursor(CursorPool* pool, int index, int distance);
+void rotatePooledCursor(CursorPool* pool, int index, int angle);
+void rotatePooledCursor2(CursorPool* pool, int index, double angle);
+void copyCursorPool(CursorPool* destination, const CursorPool* source);
+void freeCursorPool(CursorPool* pool);
+
 #endif
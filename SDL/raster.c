@@ -0,0 +1,748 @@
+#include "raster.h"
+#include "config.h"
+#include "geometry.h"
+#include <math.h>
+#include <pthread.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+
+
+// ======================================================
+// SOFTWARE RASTERIZER
+// ======================================================
+
+// This section contains the optional software backend of the draw list, enabled with
+// `SOFTWARE_RASTER_ENABLED` in config.h. Instead of sending every shape to the `SDL_Renderer`
+// from the main thread, the shapes are rasterized by a pool of threads into a pixel buffer of
+// the size of the screen, which is uploaded once per flush.
+//
+// A flush runs in three steps:
+// 1. Setup (main thread): the shapes are converted to items, either points (circles, filled
+//    circles, filled squares, arcs) or line segments (lines, squares, paths), and binned into the
+//    screen tiles their bounds overlap, in script order.
+// 2. Transform (parallel, by groups of items): the points of each item are rotated and
+//    translated, and the segments of each item are computed.
+// 3. Rasterize (parallel, by tile): each tile draws its items in script order, keeping only the
+//    pixels inside the tile. A tile is owned by one thread, so no pixel is written twice at once
+//    and overlapping shapes end up in the same order as with the renderer.
+//
+// The pixels are the same as with the drawing functions of draw.c: the points come from the
+// same geometry cache with the same rotation, and the segments are computed with the same
+// expressions and drawn like SDL's default line drawing (clipped to the screen, then drawn
+// point by point with Bresenham's algorithm). Rotated filled squares and filled circles follow
+// the points of draw.c, not the rotated sprites of sprite.c.
+//
+// Functions in this section:
+// - beginRasterFrame: Starts a new frame, cleared with the background color.
+// - setRasterFrameSize: Sets the part of the buffer the frames are drawn into.
+// - rasterizeCommands: Rasterizes draw commands into the pixel buffer and uploads it.
+// - getRasterPixels: Returns the pixel buffer (headless mode).
+// - closeRasterBackend: Stops the threads and destroys the streaming texture.
+
+
+#define RASTER_TILES_X ((SCREEN_WIDTH + RASTER_TILE_SIZE - 1) / RASTER_TILE_SIZE)
+#define RASTER_TILES_Y ((SCREEN_HEIGHT + RASTER_TILE_SIZE - 1) / RASTER_TILE_SIZE)
+#define RASTER_TILES (RASTER_TILES_X * RASTER_TILES_Y)
+#define RASTER_ITEMS_PER_TASK 16                      // Items transformed by a thread at a time.
+#define RASTER_SOURCE_SLOTS (2 * DRAW_LIST_CAPACITY)  // Slots of the hash table of local geometries.
+
+// One line segment, end points included.
+typedef struct {
+    int x1, y1, x2, y2;
+} RasterSegment;
+
+// One shape of the flush, ready to be rasterized.
+typedef struct {
+    const DrawCommand* command; // The command the item comes from.
+    int segments;               // 1 if the item is made of segments, 0 if it is made of points.
+    int first;                  // Index of the first point or segment of the item.
+    int count;                  // Number of points or segments.
+    int source;                 // Points only: index of the first local-space point in `source_points`.
+    int scaled_size;            // Size of the shape multiplied by the cursor's scale.
+} RasterItem;
+
+// Key of a geometry copied into `source_points` during the flush.
+typedef struct {
+    ShapeForm form;
+    int scaled_size, thickness, start_angle, end_angle;
+    int first, count;
+} RasterSource;
+
+// Pixel buffer, packed as 0xRRGGBBAA like `SDL_PIXELFORMAT_RGBA8888`.
+static Uint32 raster_pixels[SCREEN_WIDTH * SCREEN_HEIGHT];
+static Uint32 raster_background = 0x000000FF;
+static int raster_clear_pending = 1;  // 1 until the buffer is cleared for the current frame.
+static int raster_width = SCREEN_WIDTH;    // Size of the frame, from the top-left corner of the buffer.
+static int raster_height = SCREEN_HEIGHT;
+
+// Per-flush data, grown when needed.
+static RasterItem* raster_items = NULL;
+static int raster_item_capacity = 0;
+static SDL_Point* raster_points = NULL;          // Transformed points of every item.
+static int raster_point_capacity = 0;
+static RasterSegment* raster_segments = NULL;    // Segments of every item.
+static int raster_segment_capacity = 0;
+static SDL_Point* source_points = NULL;          // Copies of the geometries used by the flush.
+static int source_point_capacity = 0;
+static RasterSource raster_sources[DRAW_LIST_CAPACITY];
+static int source_slots[RASTER_SOURCE_SLOTS];    // Index + 1 in `raster_sources`, 0 if free.
+static int* raster_bins = NULL;                  // Items of each tile, tile after tile.
+static int raster_bin_capacity = 0;
+static int tile_start[RASTER_TILES + 1];         // First entry of each tile in `raster_bins`.
+static int raster_item_count = 0;
+
+// Upload to the renderer.
+static SDL_Texture* raster_texture = NULL;
+static SDL_Renderer* raster_renderer = NULL;
+static int raster_unsupported = 0;  // Set when the streaming texture cannot be created.
+
+// Thread pool. The tasks of a job are handed out under `raster_mutex`.
+static pthread_t raster_threads[RASTER_THREADS];
+static int raster_thread_count = 0;
+static pthread_mutex_t raster_mutex = PTHREAD_MUTEX_INITIALIZER;
+static pthread_cond_t raster_start = PTHREAD_COND_INITIALIZER;
+static pthread_cond_t raster_done = PTHREAD_COND_INITIALIZER;
+static void (*task_function)(int) = NULL;
+static int task_count = 0;
+static int next_task = 0;
+static int tasks_done = 0;
+static int raster_generation = 0;  // Incremented for each job.
+static int raster_stop = 0;
+
+
+// Function to grow an array so that it holds at least `needed` elements.
+//
+// Notes:
+// - The program stops if memory runs out, like the cursor pool.
+static void* reserveRasterArray(void* array, int* capacity, int needed, size_t element_size) {
+    if (needed <= *capacity) {
+        return array;
+    }
+    int new_capacity = *capacity ? *capacity : 1024;
+    while (new_capacity < needed) {
+        new_capacity *= 2;
+    }
+    array = realloc(array, new_capacity * element_size);
+    if (array == NULL) {
+        printf("Software rasterizer allocation error for %d elements\n", new_capacity);
+        exit(1);
+    }
+    *capacity = new_capacity;
+    return array;
+}
+
+
+// Function to run the tasks of the current job until none is left.
+//
+// Notes:
+// - Called with `raster_mutex` locked, which is released while a task runs.
+static void runRasterTasks() {
+    while (next_task < task_count) {
+        int task = next_task++;
+        pthread_mutex_unlock(&raster_mutex);
+        task_function(task);
+        pthread_mutex_lock(&raster_mutex);
+        if (++tasks_done == task_count) {
+            pthread_cond_broadcast(&raster_done);
+        }
+    }
+}
+
+
+// Function run by each thread of the pool: waits for a job, then takes part in it.
+static void* rasterWorker(void* unused) {
+    (void)unused;
+    pthread_mutex_lock(&raster_mutex);
+    int seen_generation = raster_generation;
+    while (1) {
+        while (raster_generation == seen_generation && !raster_stop) {
+            pthread_cond_wait(&raster_start, &raster_mutex);
+        }
+        if (raster_stop) {
+            break;
+        }
+        seen_generation = raster_generation;
+        runRasterTasks();
+    }
+    pthread_mutex_unlock(&raster_mutex);
+    return NULL;
+}
+
+
+// Function to run `count` tasks on the pool, the calling thread included.
+static void runRasterJob(void (*function)(int), int count) {
+    if (raster_thread_count == 0) {
+        // Start the pool on first use; the calling thread is the last member.
+        for (int i = 0; i < RASTER_THREADS - 1; i++) {
+            if (pthread_create(&raster_threads[raster_thread_count], NULL, rasterWorker, NULL) == 0) {
+                raster_thread_count++;
+            }
+        }
+    }
+
+    pthread_mutex_lock(&raster_mutex);
+    task_function = function;
+    task_count = count;
+    next_task = 0;
+    tasks_done = 0;
+    raster_generation++;
+    pthread_cond_broadcast(&raster_start);
+    runRasterTasks();
+    while (tasks_done < task_count) {
+        pthread_cond_wait(&raster_done, &raster_mutex);
+    }
+    pthread_mutex_unlock(&raster_mutex);
+}
+
+
+// Function to copy the local-space points of a shape for the current flush.
+//
+// The geometry cache may evict a shape while later shapes of the flush are looked up, so the
+// points are copied once per distinct shape before the threads read them.
+//
+// Returns:
+// - int: The index of the copy in `raster_sources`.
+static int findRasterSource(ShapeForm form, int scaled_size, int thickness, int start_angle, int end_angle, int* source_count) {
+    unsigned int hash = (unsigned int)form * 31u + (unsigned int)scaled_size * 131u + (unsigned int)thickness * 1031u
+        + (unsigned int)start_angle * 8191u + (unsigned int)end_angle * 65537u;
+    int slot = hash % RASTER_SOURCE_SLOTS;
+    while (source_slots[slot] != 0) {
+        RasterSource* source = &raster_sources[source_slots[slot] - 1];
+        if (source->form == form && source->scaled_size == scaled_size && source->thickness == thickness
+            && source->start_angle == start_angle && source->end_angle == end_angle) {
+            return source_slots[slot] - 1;
+        }
+        slot = (slot + 1) % RASTER_SOURCE_SLOTS;
+    }
+
+    const ShapeGeometry* geometry = getShapeGeometry(form, scaled_size, thickness, start_angle, end_angle);
+    int first = *source_count ? raster_sources[*source_count - 1].first + raster_sources[*source_count - 1].count : 0;
+    source_points = reserveRasterArray(source_points, &source_point_capacity, first + geometry->count, sizeof(SDL_Point));
+    memcpy(source_points + first, geometry->points, geometry->count * sizeof(SDL_Point));
+
+    RasterSource* source = &raster_sources[*source_count];
+    source->form = form;
+    source->scaled_size = scaled_size;
+    source->thickness = thickness;
+    source->start_angle = start_angle;
+    source->end_angle = end_angle;
+    source->first = first;
+    source->count = geometry->count;
+    source_slots[slot] = ++*source_count;
+    return *source_count - 1;
+}
+
+
+// Function to compute the segments of a line, as drawn by `drawLine`.
+static void computeLineSegments(const Cursor* cursor, int length, RasterSegment* segments) {
+    int scaled_length = (int)(length * cursor->scale);
+    float rad_angle = cursor->angle * M_PI / 180.0;
+    int x_start = cursor->x;
+    int y_start = cursor->y;
+    int x_end = x_start + scaled_length * cos(rad_angle);
+    int y_end = y_start + scaled_length * sin(rad_angle);
+
+    for (int offset = -cursor->thickness / 2; offset <= cursor->thickness / 2; offset++) {
+        segments->x1 = x_start + offset * cos(rad_angle + M_PI / 2);
+        segments->y1 = y_start + offset * sin(rad_angle + M_PI / 2);
+        segments->x2 = x_end + offset * cos(rad_angle + M_PI / 2);
+        segments->y2 = y_end + offset * sin(rad_angle + M_PI / 2);
+        segments++;
+    }
+}
+
+
+// Function to compute the segments of a square outline, as drawn by `drawSquare`.
+static void computeSquareSegments(const Cursor* cursor, int size, RasterSegment* segments) {
+    int scaled_size = (int)(size * cursor->scale);
+    int half_size = scaled_size / 2;
+    int x1 = -half_size, y1 = -half_size;
+    int x2 = half_size, y2 = -half_size;
+    int x3 = half_size, y3 = half_size;
+    int x4 = -half_size, y4 = half_size;
+
+    for (int offset = 0; offset < cursor->thickness; offset++) {
+        float rad_angle = cursor->angle * M_PI / 180.0;
+        int rotated_x1 = (int)(x1 * cos(rad_angle) - y1 * sin(rad_angle)) + cursor->x - offset;
+        int rotated_y1 = (int)(x1 * sin(rad_angle) + y1 * cos(rad_angle)) + cursor->y - offset;
+        int rotated_x2 = (int)(x2 * cos(rad_angle) - y2 * sin(rad_angle)) + cursor->x + offset;
+        int rotated_y2 = (int)(x2 * sin(rad_angle) + y2 * cos(rad_angle)) + cursor->y - offset;
+        int rotated_x3 = (int)(x3 * cos(rad_angle) - y3 * sin(rad_angle)) + cursor->x + offset;
+        int rotated_y3 = (int)(x3 * sin(rad_angle) + y3 * cos(rad_angle)) + cursor->y + offset;
+        int rotated_x4 = (int)(x4 * cos(rad_angle) - y4 * sin(rad_angle)) + cursor->x - offset;
+        int rotated_y4 = (int)(x4 * sin(rad_angle) + y4 * cos(rad_angle)) + cursor->y + offset;
+
+        RasterSegment edges[4] = {
+            {rotated_x1, rotated_y1, rotated_x2, rotated_y2}, // Top edge
+            {rotated_x2, rotated_y2, rotated_x3, rotated_y3}, // Right edge
+            {rotated_x3, rotated_y3, rotated_x4, rotated_y4}, // Bottom edge
+            {rotated_x4, rotated_y4, rotated_x1, rotated_y1}  // Left edge
+        };
+        memcpy(segments, edges, sizeof(edges));
+        segments += 4;
+    }
+}
+
+
+// Function to compute the segments of a path, as drawn by `drawPath` (see `renderShapePath`).
+static void computePathSegments(const Cursor* cursor, const ShapePath* path, RasterSegment* segments) {
+    float rad_angle = cursor->angle * M_PI / 180.0;
+    double cos_angle = cos(rad_angle);
+    double sin_angle = sin(rad_angle);
+
+    for (int offset = -cursor->thickness / 2; offset <= cursor->thickness / 2; offset++) {
+        SDL_Point start = getPathPoint(path, 0, cursor->scale, cursor->x, cursor->y, cos_angle, sin_angle, offset);
+        for (int i = 1; i < path->count; i++) {
+            SDL_Point end = getPathPoint(path, i, cursor->scale, cursor->x, cursor->y, cos_angle, sin_angle, offset);
+            segments->x1 = start.x;
+            segments->y1 = start.y;
+            segments->x2 = end.x;
+            segments->y2 = end.y;
+            segments++;
+            start = end;
+        }
+    }
+}
+
+
+// Function to transform a group of items (task of the transform step).
+static void transformItems(int task) {
+    int end = (task + 1) * RASTER_ITEMS_PER_TASK;
+    if (end > raster_item_count) {
+        end = raster_item_count;
+    }
+
+    for (int i = task * RASTER_ITEMS_PER_TASK; i < end; i++) {
+        RasterItem* item = &raster_items[i];
+        const Cursor* cursor = &item->command->cursor;
+
+        if (item->segments) {
+            if (item->command->form == FORM_LINE) {
+                computeLineSegments(cursor, item->command->size, raster_segments + item->first);
+            } else if (item->command->form == FORM_PATH) {
+                if (item->count > 0) {
+                    computePathSegments(cursor, getShapePath(item->command->start_angle), raster_segments + item->first);
+                }
+            } else {
+                computeSquareSegments(cursor, item->command->size, raster_segments + item->first);
+            }
+            continue;
+        }
+
+        // Same transformation as `renderShapeGeometry`; circle outlines are never rotated.
+        const SDL_Point* local = source_points + item->source;
+        SDL_Point* points = raster_points + item->first;
+        int angle = (item->command->form == FORM_CIRCLE) ? 0 : cursor->angle;
+        if (angle == 0) {
+            for (int p = 0; p < item->count; p++) {
+                points[p].x = cursor->x + local[p].x;
+                points[p].y = cursor->y + local[p].y;
+            }
+        } else {
+            float rad_angle = angle * M_PI / 180.0;
+            double cos_angle = cos(rad_angle);
+            double sin_angle = sin(rad_angle);
+            for (int p = 0; p < item->count; p++) {
+                points[p].x = cursor->x + (int)(local[p].x * cos_angle - local[p].y * sin_angle);
+                points[p].y = cursor->y + (int)(local[p].x * sin_angle + local[p].y * cos_angle);
+            }
+        }
+    }
+}
+
+
+// Function to compute the region code of a point for `clipSegment`.
+static int segmentOutCode(int x, int y) {
+    int code = 0;
+    if (y < 0) {
+        code |= 2;                 // Above the screen.
+    } else if (y >= SCREEN_HEIGHT) {
+        code |= 1;                 // Below the screen.
+    }
+    if (x < 0) {
+        code |= 4;                 // Left of the screen.
+    } else if (x >= SCREEN_WIDTH) {
+        code |= 8;                 // Right of the screen.
+    }
+    return code;
+}
+
+
+// Function to clip a slanted segment to the screen like `SDL_IntersectRectAndLine`.
+//
+// SDL clips a line before drawing its points, which moves its first point when it starts off
+// screen; the same integer Cohen-Sutherland steps are used so the points drawn are the same.
+//
+// Returns:
+// - int: 1 if part of the segment is on screen, 0 otherwise.
+static int clipSegment(int* x1, int* y1, int* x2, int* y2) {
+    int right = SCREEN_WIDTH - 1;
+    int bottom = SCREEN_HEIGHT - 1;
+    int code1 = segmentOutCode(*x1, *y1);
+    int code2 = segmentOutCode(*x2, *y2);
+
+    while (code1 || code2) {
+        if (code1 & code2) {
+            return 0;
+        }
+        int code = code1 ? code1 : code2;
+        int x, y;
+        if (code & 2) {
+            y = 0;
+            x = *x1 + ((*x2 - *x1) * (y - *y1)) / (*y2 - *y1);
+        } else if (code & 1) {
+            y = bottom;
+            x = *x1 + ((*x2 - *x1) * (y - *y1)) / (*y2 - *y1);
+        } else if (code & 4) {
+            x = 0;
+            y = *y1 + ((*y2 - *y1) * (x - *x1)) / (*x2 - *x1);
+        } else {
+            x = right;
+            y = *y1 + ((*y2 - *y1) * (x - *x1)) / (*x2 - *x1);
+        }
+        if (code1) {
+            *x1 = x;
+            *y1 = y;
+            code1 = segmentOutCode(x, y);
+        } else {
+            *x2 = x;
+            *y2 = y;
+            code2 = segmentOutCode(x, y);
+        }
+    }
+    return 1;
+}
+
+
+// Function to draw the part of a segment inside a tile.
+//
+// Parameters:
+// - const RasterSegment* segment: The segment, end points included.
+// - Uint32 color: The packed color of the segment.
+// - int left, int top, int right, int bottom: The tile, right and bottom excluded.
+//
+// Implementation Details:
+// - Horizontal and vertical segments are spans, as SDL draws them as rectangles.
+// - Other segments are clipped to the screen, then walked with the same Bresenham steps as SDL,
+//   keeping the points inside the tile.
+static void drawSegmentInTile(const RasterSegment* segment, Uint32 color, int left, int top, int right, int bottom) {
+    int x1 = segment->x1, y1 = segment->y1, x2 = segment->x2, y2 = segment->y2;
+
+    if (x1 == x2 || y1 == y2) {
+        int min_x = x1 < x2 ? x1 : x2, max_x = x1 < x2 ? x2 : x1;
+        int min_y = y1 < y2 ? y1 : y2, max_y = y1 < y2 ? y2 : y1;
+        min_x = min_x < left ? left : min_x;
+        min_y = min_y < top ? top : min_y;
+        max_x = max_x >= right ? right - 1 : max_x;
+        max_y = max_y >= bottom ? bottom - 1 : max_y;
+        for (int y = min_y; y <= max_y; y++) {
+            for (int x = min_x; x <= max_x; x++) {
+                raster_pixels[y * SCREEN_WIDTH + x] = color;
+            }
+        }
+        return;
+    }
+
+    if (!clipSegment(&x1, &y1, &x2, &y2)) {
+        return;
+    }
+
+    int delta_x = abs(x2 - x1);
+    int delta_y = abs(y2 - y1);
+    int count, d, d_increment1, d_increment2;
+    int x_increment1, x_increment2, y_increment1, y_increment2;
+    if (delta_x >= delta_y) {
+        count = delta_x + 1;
+        d = 2 * delta_y - delta_x;
+        d_increment1 = delta_y * 2;
+        d_increment2 = (delta_y - delta_x) * 2;
+        x_increment1 = 1;
+        x_increment2 = 1;
+        y_increment1 = 0;
+        y_increment2 = 1;
+    } else {
+        count = delta_y + 1;
+        d = 2 * delta_x - delta_y;
+        d_increment1 = delta_x * 2;
+        d_increment2 = (delta_x - delta_y) * 2;
+        x_increment1 = 0;
+        x_increment2 = 1;
+        y_increment1 = 1;
+        y_increment2 = 1;
+    }
+    if (x1 > x2) {
+        x_increment1 = -x_increment1;
+        x_increment2 = -x_increment2;
+    }
+    if (y1 > y2) {
+        y_increment1 = -y_increment1;
+        y_increment2 = -y_increment2;
+    }
+
+    int x = x1, y = y1;
+    for (int i = 0; i < count; i++) {
+        if (x >= left && x < right && y >= top && y < bottom) {
+            raster_pixels[y * SCREEN_WIDTH + x] = color;
+        }
+        if (d < 0) {
+            d += d_increment1;
+            x += x_increment1;
+            y += y_increment1;
+        } else {
+            d += d_increment2;
+            x += x_increment2;
+            y += y_increment2;
+        }
+    }
+}
+
+
+// Function to rasterize the items binned into a tile (task of the rasterize step).
+static void rasterizeTile(int tile) {
+    int left = (tile % RASTER_TILES_X) * RASTER_TILE_SIZE;
+    int top = (tile / RASTER_TILES_X) * RASTER_TILE_SIZE;
+    int right = left + RASTER_TILE_SIZE > raster_width ? raster_width : left + RASTER_TILE_SIZE;
+    int bottom = top + RASTER_TILE_SIZE > raster_height ? raster_height : top + RASTER_TILE_SIZE;
+    if (left >= right || top >= bottom) {
+        return; // Outside the frame.
+    }
+
+    if (raster_clear_pending) {
+        for (int y = top; y < bottom; y++) {
+            for (int x = left; x < right; x++) {
+                raster_pixels[y * SCREEN_WIDTH + x] = raster_background;
+            }
+        }
+    }
+
+    for (int b = tile_start[tile]; b < tile_start[tile + 1]; b++) {
+        const RasterItem* item = &raster_items[raster_bins[b]];
+        Uint32 color = item->command->color;
+
+        if (item->segments) {
+            for (int s = 0; s < item->count; s++) {
+                const RasterSegment* segment = &raster_segments[item->first + s];
+                if ((segment->x1 < left && segment->x2 < left) || (segment->x1 >= right && segment->x2 >= right)
+                    || (segment->y1 < top && segment->y2 < top) || (segment->y1 >= bottom && segment->y2 >= bottom)) {
+                    continue; // The segment does not cross the tile.
+                }
+                drawSegmentInTile(segment, color, left, top, right, bottom);
+            }
+            continue;
+        }
+
+        const SDL_Point* points = raster_points + item->first;
+        for (int p = 0; p < item->count; p++) {
+            int x = points[p].x, y = points[p].y;
+            if (x >= left && x < right && y >= top && y < bottom) {
+                raster_pixels[y * SCREEN_WIDTH + x] = color;
+            }
+        }
+    }
+}
+
+
+// Function to start a new frame of the software rasterizer.
+//
+// Parameters:
+// - SDL_Color background: The color the buffer is cleared with before the first shapes.
+//
+// Notes:
+// - Called by `beginDrawFrame`.
+void beginRasterFrame(SDL_Color background) {
+    raster_background = ((Uint32)background.r << 24) | ((Uint32)background.g << 16) | ((Uint32)background.b << 8) | background.a;
+    raster_clear_pending = 1;
+}
+
+
+// Function to set the part of the pixel buffer the frames are drawn into.
+//
+// Parameters:
+// - int width, int height: The size of the frame, from the top-left corner of the buffer, at
+//   most `SCREEN_WIDTH` by `SCREEN_HEIGHT`.
+//
+// Notes:
+// - Called by `setDrawFrameSize`. The tiles outside the frame are neither cleared nor drawn,
+//   and only the frame is uploaded.
+void setRasterFrameSize(int width, int height) {
+    raster_width = width;
+    raster_height = height;
+    raster_clear_pending = 1;
+}
+
+
+// Function to rasterize draw commands into the pixel buffer and copy it to the renderer.
+//
+// Parameters:
+// - SDL_Renderer* renderer: The renderer receiving the frame, or NULL in headless mode, where the
+//   pixels are only written to the buffer (see `getRasterPixels`).
+// - const DrawCommand* commands: The commands to draw, in script order.
+// - int count: The number of commands.
+//
+// Returns:
+// - int: 1 if the commands were drawn, 0 if the caller must draw them with the renderer.
+//
+// Implementation Details:
+// - The buffer keeps the shapes of earlier flushes of the same frame, so a frame flushed in
+//   several parts (full draw list) is complete after the last upload.
+// - The buffer is uploaded through a streaming texture (`SDL_LockTexture`) covering the whole
+//   screen, copied without blending. Only the frame (see `setRasterFrameSize`) is uploaded.
+//
+// Example Usage:
+// if (!rasterizeCommands(renderer, draw_list, draw_list_count)) {
+//     // draw the commands with the renderer
+// }
+int rasterizeCommands(SDL_Renderer* renderer, const DrawCommand* commands, int count) {
+    if (raster_unsupported) {
+        return 0;
+    }
+    if (renderer != NULL && raster_renderer != renderer) {
+        if (raster_texture != NULL) {
+            SDL_DestroyTexture(raster_texture);
+        }
+        raster_texture = SDL_CreateTexture(renderer, SDL_PIXELFORMAT_RGBA8888, SDL_TEXTUREACCESS_STREAMING, SCREEN_WIDTH, SCREEN_HEIGHT);
+        if (raster_texture == NULL) {
+            raster_unsupported = 1; // Stop trying: draw with the renderer instead.
+            return 0;
+        }
+        SDL_SetTextureBlendMode(raster_texture, SDL_BLENDMODE_NONE);
+        raster_renderer = renderer;
+    }
+
+    // Setup: convert the commands to items and reserve their points and segments.
+    raster_items = reserveRasterArray(raster_items, &raster_item_capacity, count, sizeof(RasterItem));
+    memset(source_slots, 0, sizeof(source_slots));
+    int source_count = 0;
+    int point_count = 0;
+    int segment_count = 0;
+    for (int i = 0; i < count; i++) {
+        const DrawCommand* command = &commands[i];
+        RasterItem* item = &raster_items[i];
+        int thickness = command->cursor.thickness;
+        item->command = command;
+        item->scaled_size = (int)(command->size * command->cursor.scale);
+        item->segments = (command->form == FORM_LINE || command->form == FORM_SQUARE || command->form == FORM_PATH);
+
+        if (item->segments) {
+            item->first = segment_count;
+            if (command->form == FORM_LINE) {
+                int lines = thickness / 2 - (-thickness / 2) + 1; // Offsets drawn by `drawLine`.
+                item->count = lines > 0 ? lines : 0;
+            } else if (command->form == FORM_PATH) {
+                // One segment per pair of vertices, for each polyline drawn by `renderShapePath`.
+                const ShapePath* path = getShapePath(command->start_angle);
+                int lines = getPathOffsetCount(thickness);
+                item->count = (path != NULL && path->count >= 2 && lines > 0) ? lines * (path->count - 1) : 0;
+            } else {
+                item->count = thickness > 0 ? 4 * thickness : 0;
+            }
+            segment_count += item->count;
+        } else {
+            int arc = (command->form == FORM_ARC);
+            int source = findRasterSource(command->form, item->scaled_size, thickness,
+                                          arc ? command->start_angle : 0, arc ? command->end_angle : 0, &source_count);
+            item->source = raster_sources[source].first;
+            item->count = raster_sources[source].count;
+            item->first = point_count;
+            point_count += item->count;
+        }
+    }
+    raster_item_count = count;
+    raster_points = reserveRasterArray(raster_points, &raster_point_capacity, point_count, sizeof(SDL_Point));
+    raster_segments = reserveRasterArray(raster_segments, &raster_segment_capacity, segment_count, sizeof(RasterSegment));
+
+    // Setup: bin the items into the tiles their bounds overlap (counting sort, script order kept).
+    int first_tile_x[DRAW_LIST_CAPACITY], last_tile_x[DRAW_LIST_CAPACITY];
+    int first_tile_y[DRAW_LIST_CAPACITY], last_tile_y[DRAW_LIST_CAPACITY];
+    memset(tile_start, 0, sizeof(tile_start));
+    for (int i = 0; i < count; i++) {
+        SDL_Rect bounds = commands[i].bounds;
+        SDL_Rect frame = {0, 0, raster_width, raster_height};
+        if (!SDL_IntersectRect(&bounds, &frame, &bounds)) {
+            first_tile_x[i] = 1;
+            last_tile_x[i] = 0; // Off screen: in no tile.
+            first_tile_y[i] = last_tile_y[i] = 0;
+            continue;
+        }
+        first_tile_x[i] = bounds.x / RASTER_TILE_SIZE;
+        last_tile_x[i] = (bounds.x + bounds.w - 1) / RASTER_TILE_SIZE;
+        first_tile_y[i] = bounds.y / RASTER_TILE_SIZE;
+        last_tile_y[i] = (bounds.y + bounds.h - 1) / RASTER_TILE_SIZE;
+        for (int ty = first_tile_y[i]; ty <= last_tile_y[i]; ty++) {
+            for (int tx = first_tile_x[i]; tx <= last_tile_x[i]; tx++) {
+                tile_start[ty * RASTER_TILES_X + tx + 1]++;
+            }
+        }
+    }
+    for (int t = 0; t < RASTER_TILES; t++) {
+        tile_start[t + 1] += tile_start[t];
+    }
+    raster_bins = reserveRasterArray(raster_bins, &raster_bin_capacity, tile_start[RASTER_TILES], sizeof(int));
+    int tile_fill[RASTER_TILES];
+    memcpy(tile_fill, tile_start, sizeof(tile_fill));
+    for (int i = 0; i < count; i++) {
+        for (int ty = first_tile_y[i]; ty <= last_tile_y[i]; ty++) {
+            for (int tx = first_tile_x[i]; tx <= last_tile_x[i]; tx++) {
+                raster_bins[tile_fill[ty * RASTER_TILES_X + tx]++] = i;
+            }
+        }
+    }
+
+    // Transform, then rasterize, in parallel.
+    runRasterJob(transformItems, (count + RASTER_ITEMS_PER_TASK - 1) / RASTER_ITEMS_PER_TASK);
+    runRasterJob(rasterizeTile, RASTER_TILES);
+    raster_clear_pending = 0;
+
+    if (renderer != NULL) {
+        SDL_Rect frame = {0, 0, raster_width, raster_height};
+        void* pixels;
+        int pitch;
+        if (SDL_LockTexture(raster_texture, &frame, &pixels, &pitch) != 0) {
+            return 0;
+        }
+        for (int y = 0; y < raster_height; y++) {
+            memcpy((Uint8*)pixels + y * pitch, raster_pixels + y * SCREEN_WIDTH, raster_width * sizeof(Uint32));
+        }
+        SDL_UnlockTexture(raster_texture);
+        SDL_RenderCopy(renderer, raster_texture, &frame, &frame);
+    }
+    return 1;
+}
+
+
+// Function to access the pixel buffer of the software rasterizer.
+//
+// Returns:
+// - const Uint32*: `SCREEN_WIDTH * SCREEN_HEIGHT` pixels, row after row, packed as 0xRRGGBBAA.
+//   With a smaller frame size, only its top-left part is drawn.
+//
+// Notes:
+// - In headless mode (`flushDrawList(NULL)`), this is the only output of the frame.
+const Uint32* getRasterPixels() {
+    return raster_pixels;
+}
+
+
+// Function to stop the threads of the software rasterizer and destroy its texture.
+//
+// Notes:
+// - Must be called before `SDL_DestroyRenderer`, since the texture belongs to the renderer.
+void closeRasterBackend() {
+    pthread_mutex_lock(&raster_mutex);
+    raster_stop = 1;
+    pthread_cond_broadcast(&raster_start);
+    pthread_mutex_unlock(&raster_mutex);
+    for (int i = 0; i < raster_thread_count; i++) {
+        pthread_join(raster_threads[i], NULL);
+    }
+    raster_thread_count = 0;
+    raster_stop = 0;
+
+    if (raster_texture != NULL) {
+        SDL_DestroyTexture(raster_texture);
+        raster_texture = NULL;
+    }
+    raster_renderer = NULL;
+    raster_unsupported = 0;
+}
@@ -0,0 +1,13 @@
+#ifndef RASTER_H
+#define RASTER_H
+
+#include <SDL2/SDL.h>
+#include "drawlist.h"
+
+void beginRasterFrame(SDL_Color background);
+void setRasterFrameSize(int width, int height);
+int rasterizeCommands(SDL_Renderer* renderer, const DrawCommand* commands, int count);
+const Uint32* getRasterPixels();
+void closeRasterBackend();
+
+#endif
@@ -0,0 +1,528 @@
+#include "simulation.h"
+#include "camera.h"
+#include "config.h"
+#include "drawlist.h"
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+
+
+// ======================================================
+// SIMULATION AND RENDER THREADS
+// ======================================================
+
+// This section separates the simulation of a script from its drawing. The animation function
+// of the generated code (event effects through handle.c, then the animation step) runs on a
+// simulation thread, while the main thread receives the SDL events and draws the frames:
+//
+// - Events: the main thread polls SDL and forwards each event to the simulation thread through
+//   a queue (SDL only delivers events to the thread that created the window). While they wait
+//   for the next step, consecutive mouse motions and wheel turns are merged into one event, so
+//   a fast mouse costs one movement per step instead of hundreds.
+// - Snapshots: after each step, the simulation thread copies the cursor pool into one of two
+//   snapshot buffers and publishes it. The main thread draws the latest published snapshot
+//   while the simulation thread already works on the next step, writing the other buffer.
+//   The camera is copied with the cursors, so each frame is drawn with the view of its step.
+//
+// A slow frame therefore no longer delays the input handling and the animation step: the
+// simulation keeps its own rate, and the main thread simply draws fewer of its snapshots.
+//
+// Functions in this section:
+// - pollSimulationEvent: Takes the next forwarded event (simulation thread).
+// - publishCursorSnapshot: Publishes the state of the cursors after a step (simulation thread).
+// - runSimulation: Starts the simulation thread and draws its snapshots until it returns (main thread).
+// - getMergedEventCount: Returns the number of events merged into the previous ones.
+//
+// The frames can be drawn at a lower resolution on slow machines (see the RENDER SCALING section).
+
+
+static SDL_mutex* simulation_mutex = NULL;
+static SDL_cond* snapshot_published = NULL;
+
+// Events forwarded by the main thread, oldest first (circular buffer).
+static SDL_Event event_queue[SIMULATION_EVENT_QUEUE];
+static int event_head = 0;
+static int event_count = 0;
+static unsigned long received_events = 0;  // Events forwarded by the main thread.
+static unsigned long merged_events = 0;    // Events merged into the previous queued event.
+
+// Double-buffered cursor snapshots.
+static CursorPool snapshots[2];
+static Camera snapshot_cameras[2];
+static int front_snapshot = -1;        // Latest published snapshot, -1 before the first step.
+static int reading_snapshot = -1;      // Snapshot being drawn by the main thread, -1 if none.
+static int writing_snapshot = -1;      // Snapshot being written by the simulation thread, -1 if none.
+static unsigned long published_count = 0;
+static int simulation_finished = 0;
+
+static void drawSnapshot(SDL_Renderer* renderer, RenderFunction render, int snapshot);
+static void adaptRenderScale(Uint64 frame_ticks);
+static void readRenderScaleOption();
+static void clearSceneTexture();
+
+
+// Function to take the next event forwarded by the main thread.
+//
+// This function replaces `SDL_PollEvent` in the animation functions, which run on the
+// simulation thread.
+//
+// Parameters:
+// - SDL_Event* event: Receives the event.
+//
+// Returns:
+// - int: 1 if an event was taken, 0 if the queue is empty.
+//
+// Example Usage:
+// while (pollSimulationEvent(&event)) {
+//     // handle the event
+// }
+int pollSimulationEvent(SDL_Event* event) {
+    int taken = 0;
+    SDL_LockMutex(simulation_mutex);
+    if (event_count > 0) {
+        *event = event_queue[event_head];
+        event_head = (event_head + 1) % SIMULATION_EVENT_QUEUE;
+        event_count--;
+        taken = 1;
+    }
+    SDL_UnlockMutex(simulation_mutex);
+    return taken;
+}
+
+
+// Function to merge an event into the last queued event, when only their sum matters.
+//
+// Returns:
+// - int: 1 if the event was merged, 0 if it must be queued.
+//
+// Notes:
+// - Mouse motions are merged when the mouse buttons held did not change: the last position is
+//   kept and the relative movements are added.
+// - Wheel turns in the same direction are merged by adding their notches, so the handlers can
+//   still apply one zoom step per notch.
+// - Any other event between them (a click, a key) keeps them apart, so the order of the
+//   actions is preserved.
+static int mergeEvent(SDL_Event* last, const SDL_Event* event) {
+    if (last->type != event->type) {
+        return 0;
+    }
+    if (event->type == SDL_MOUSEMOTION && last->motion.state == event->motion.state) {
+        last->motion.x = event->motion.x;
+        last->motion.y = event->motion.y;
+        last->motion.xrel += event->motion.xrel;
+        last->motion.yrel += event->motion.yrel;
+        return 1;
+    }
+    if (event->type == SDL_MOUSEWHEEL && last->wheel.direction == event->wheel.direction
+        && (last->wheel.y > 0) == (event->wheel.y > 0) && (last->wheel.y < 0) == (event->wheel.y < 0)) {
+        last->wheel.x += event->wheel.x;
+        last->wheel.y += event->wheel.y;
+        return 1;
+    }
+    return 0;
+}
+
+
+// Function to check whether an event can be dropped when the queue is full.
+//
+// Returns:
+// - int: 2 for mouse motions and wheel turns, which are dropped first (a later motion
+//   supersedes them), 1 for the other events, 0 for the events that are never dropped:
+//   quitting, and the mouse buttons (a lost button-up would leave a shape dragged).
+static int dropPriority(const SDL_Event* event) {
+    switch (event->type) {
+        case SDL_MOUSEMOTION:
+        case SDL_MOUSEWHEEL:
+            return 2;
+        case SDL_QUIT:
+        case SDL_MOUSEBUTTONDOWN:
+        case SDL_MOUSEBUTTONUP:
+            return 0;
+        default:
+            return 1;
+    }
+}
+
+
+// Function to remove the oldest queued event of a drop priority (see `dropPriority`).
+//
+// Returns:
+// - int: 1 if an event was removed, 0 if no queued event has this priority.
+static int dropQueuedEvent(int priority) {
+    for (int position = 0; position < event_count; position++) {
+        if (dropPriority(&event_queue[(event_head + position) % SIMULATION_EVENT_QUEUE]) != priority) {
+            continue;
+        }
+        // The later events move back by one, so the order of the others is kept.
+        for (int p = position; p < event_count - 1; p++) {
+            event_queue[(event_head + p) % SIMULATION_EVENT_QUEUE] = event_queue[(event_head + p + 1) % SIMULATION_EVENT_QUEUE];
+        }
+        event_count--;
+        return 1;
+    }
+    return 0;
+}
+
+
+// Function to forward an event to the simulation thread.
+//
+// Returns:
+// - int: 1 if the event was forwarded (or dropped), 0 if the queue is full of events that are
+//   never dropped: the caller must offer the event again later.
+//
+// Notes:
+// - The event is merged into the last queued event when possible (see `mergeEvent`).
+// - When the queue is full, an incoming mouse motion or wheel turn is dropped. Another event
+//   takes the place of the oldest queued motion or wheel turn, or else of the oldest queued
+//   event that can be dropped (see `dropPriority`). Quitting and the mouse buttons are never
+//   dropped.
+static int pushSimulationEvent(const SDL_Event* event) {
+    SDL_LockMutex(simulation_mutex);
+    if (event_count > 0
+        && mergeEvent(&event_queue[(event_head + event_count - 1) % SIMULATION_EVENT_QUEUE], event)) {
+        received_events++;
+        merged_events++;
+        SDL_UnlockMutex(simulation_mutex);
+        return 1;
+    }
+    if (event_count == SIMULATION_EVENT_QUEUE) {
+        int priority = dropPriority(event);
+        if (priority < 2 && !dropQueuedEvent(2) && !dropQueuedEvent(1) && priority == 0) {
+            SDL_UnlockMutex(simulation_mutex);
+            return 0; // Only quits and buttons are queued: wait for the simulation thread.
+        }
+        if (event_count == SIMULATION_EVENT_QUEUE) {
+            received_events++;
+            SDL_UnlockMutex(simulation_mutex);
+            return 1; // Dropped.
+        }
+    }
+    received_events++;
+    event_queue[(event_head + event_count) % SIMULATION_EVENT_QUEUE] = *event;
+    event_count++;
+    SDL_UnlockMutex(simulation_mutex);
+    return 1;
+}
+
+
+// Function to publish the state of the cursors after a simulation step.
+//
+// Parameters:
+// - const CursorPool* pool: The cursors simulated (`cursor_pool`).
+//
+// Implementation Details:
+// - The copy goes to the snapshot the main thread is not drawing. If the main thread draws
+//   nothing, it goes to the snapshot that is not the latest, so the latest stays readable.
+// - The copy is made outside the lock; only the choice of the buffer and the publication are
+//   locked, so the main thread is never blocked by the copy of a large pool.
+//
+// Example Usage:
+// publishCursorSnapshot(&cursor_pool);
+void publishCursorSnapshot(const CursorPool* pool) {
+    SDL_LockMutex(simulation_mutex);
+    int target = (reading_snapshot >= 0) ? 1 - reading_snapshot : (front_snapshot == 0 ? 1 : 0);
+    writing_snapshot = target;
+    SDL_UnlockMutex(simulation_mutex);
+
+    copyCursorPool(&snapshots[target], pool);
+    snapshot_cameras[target] = camera;
+
+    SDL_LockMutex(simulation_mutex);
+    writing_snapshot = -1;
+    front_snapshot = target;
+    published_count++;
+    SDL_CondSignal(snapshot_published);
+    SDL_UnlockMutex(simulation_mutex);
+}
+
+
+// Function run by the simulation thread: runs the animation function, then reports its end.
+static int simulationThread(void* simulate) {
+    int result = ((SDL_ThreadFunction)simulate)(NULL);
+
+    SDL_LockMutex(simulation_mutex);
+    simulation_finished = 1;
+    SDL_CondSignal(snapshot_published);
+    SDL_UnlockMutex(simulation_mutex);
+    return result;
+}
+
+
+// Function to run a script with separate simulation and render threads.
+//
+// Parameters:
+// - SDL_Renderer* renderer: The renderer used to draw the frames.
+// - SDL_ThreadFunction simulate: The animation function of the script. It reads its events with
+//   `pollSimulationEvent`, publishes each step with `publishCursorSnapshot`, and returns when it
+//   receives `SDL_QUIT`.
+// - RenderFunction render: The function queuing the shapes of a cursor snapshot.
+//
+// Implementation Details:
+// - The calling (main) thread polls the SDL events and forwards them, then draws each newly
+//   published snapshot between `beginDrawFrame` and `flushDrawList`, and presents it. With a
+//   render scale below 1.0, the snapshot is drawn into a smaller frame first (`drawSnapshot`).
+// - While no new snapshot is available, it waits at most `SIMULATION_EVENT_WAIT` milliseconds,
+//   so events keep being forwarded.
+// - When the queue is full of events that are never dropped (see `pushSimulationEvent`), the
+//   main thread stops polling until the simulation thread takes some of them.
+//
+// Notes:
+// - Drawing (draw.c, drawlist.c, sprite.c, raster.c) only happens on the calling thread, which
+//   owns the renderer. The simulation thread only touches `cursor_pool` and handle.c.
+//
+// Example Usage:
+// runSimulation(renderer, animateDrawingsnail, queueShapes);
+void runSimulation(SDL_Renderer* renderer, SDL_ThreadFunction simulate, RenderFunction render) {
+    simulation_mutex = SDL_CreateMutex();
+    snapshot_published = SDL_CreateCond();
+    event_head = event_count = 0;
+    received_events = merged_events = 0;
+    front_snapshot = reading_snapshot = writing_snapshot = -1;
+    published_count = 0;
+    simulation_finished = 0;
+    if (simulation_mutex == NULL || snapshot_published == NULL) {
+        printf("Simulation thread error : %s\n", SDL_GetError());
+        return;
+    }
+
+    SDL_Thread* thread = SDL_CreateThread(simulationThread, "simulation", (void*)simulate);
+    if (thread == NULL) {
+        printf("Simulation thread error : %s\n", SDL_GetError());
+        SDL_DestroyCond(snapshot_published);
+        SDL_DestroyMutex(simulation_mutex);
+        return;
+    }
+
+    readRenderScaleOption();
+    unsigned long drawn_count = 0;
+    SDL_Event event;
+    int event_held = 0; // 1 while `event` waits for room in the queue.
+    while (1) {
+        // The later events wait in the queue of SDL while an event is held.
+        while (event_held || SDL_PollEvent(&event)) {
+            event_held = !pushSimulationEvent(&event);
+            if (event_held) {
+                break;
+            }
+        }
+
+        SDL_LockMutex(simulation_mutex);
+        if (simulation_finished) {
+            SDL_UnlockMutex(simulation_mutex);
+            break;
+        }
+        if (published_count == drawn_count || front_snapshot == writing_snapshot) {
+            SDL_CondWaitTimeout(snapshot_published, simulation_mutex, SIMULATION_EVENT_WAIT);
+            SDL_UnlockMutex(simulation_mutex);
+            continue;
+        }
+        reading_snapshot = front_snapshot;
+        drawn_count = published_count;
+        SDL_UnlockMutex(simulation_mutex);
+
+        Uint64 frame_start = SDL_GetPerformanceCounter();
+        drawSnapshot(renderer, render, reading_snapshot);
+        adaptRenderScale(SDL_GetPerformanceCounter() - frame_start);
+
+        SDL_LockMutex(simulation_mutex);
+        reading_snapshot = -1;
+        SDL_UnlockMutex(simulation_mutex);
+
+        SDL_RenderPresent(renderer);
+    }
+
+    SDL_WaitThread(thread, NULL);
+    clearSceneTexture();
+    if (EVENT_STATS_LOG) {
+        printf("Event stats: %lu events received, %lu merged\n", received_events, merged_events);
+    }
+    SDL_DestroyCond(snapshot_published);
+    SDL_DestroyMutex(simulation_mutex);
+    simulation_mutex = NULL;
+    snapshot_published = NULL;
+    freeCursorPool(&snapshots[0]);
+    freeCursorPool(&snapshots[1]);
+}
+
+
+// Function to return the number of events merged into the previous ones since `runSimulation`
+// started (main thread, which is the only one counting them).
+//
+// Notes:
+// - Set `EVENT_STATS_LOG` in config.h to print it, with the number of events received, when
+//   the simulation ends.
+unsigned long getMergedEventCount() {
+    return merged_events;
+}
+
+
+// ======================================================
+// RENDER SCALING
+// ======================================================
+
+// This section lowers the resolution of the frames when drawing them at the size of the window
+// is too slow. With a render scale below 1.0, the main thread draws each snapshot into the
+// top-left part of a window-sized scene texture, with every shape scaled down (`setViewScale`),
+// then stretches that part over the window. A scale of 0.5 fills a quarter of the pixels.
+//
+// - Selection: the scale starts at `RENDER_SCALE` (config.h), or at the value of the
+//   `CYDRAW_RENDER_SCALE` environment variable when it is set, for instance `0.5`. Use `auto`
+//   to adapt it, or call `setRenderScale` before `runSimulation`.
+// - Adaptation: with `RENDER_SCALE_AUTO`, the drawing time of the frames is measured. Every
+//   `RENDER_SCALE_FRAMES` frames, the scale goes down by `RENDER_SCALE_STEP` (not below
+//   `RENDER_SCALE_MIN`) if the frames took longer than `RENDER_TARGET_FRAME_MS` on average, and
+//   back up when they took less than half of it.
+// - At a scale of 1.0, the frames are drawn directly to the window, as without scaling.
+//
+// Functions in this section:
+// - setRenderScale: Selects the render scale and whether it adapts to the frame time.
+// - getRenderScale: Returns the current render scale.
+
+
+static float render_scale = RENDER_SCALE;
+static int render_scale_auto = RENDER_SCALE_AUTO;
+static SDL_Texture* scene_texture = NULL;   // Window-sized texture the scaled frames are drawn into.
+static SDL_Renderer* scene_renderer = NULL; // Renderer owning `scene_texture`.
+static int scene_unsupported = 0;           // Set when the renderer cannot render to textures.
+static Uint64 measured_ticks = 0;           // Drawing time of the frames measured since the last change.
+static int measured_frames = 0;
+
+
+// Function to keep a scale between `RENDER_SCALE_MIN` and 1.0.
+static float clampRenderScale(float scale) {
+    if (scale < RENDER_SCALE_MIN) {
+        return RENDER_SCALE_MIN;
+    }
+    return scale > 1.0f ? 1.0f : scale;
+}
+
+
+// Function to select the render scale and whether it adapts to the frame time.
+//
+// Parameters:
+// - float scale: The size of the frames relative to the window, between `RENDER_SCALE_MIN`
+//   and 1.0 (1.0 = full resolution).
+// - int automatic: Non-zero to adapt the scale to `RENDER_TARGET_FRAME_MS`, starting at `scale`.
+//
+// Notes:
+// - Call it from the main thread, for instance before `runSimulation`.
+//
+// Example Usage:
+// setRenderScale(0.5f, 0); // Draw half as wide and half as high, then stretch to the window
+void setRenderScale(float scale, int automatic) {
+    render_scale = clampRenderScale(scale);
+    render_scale_auto = automatic;
+    measured_ticks = 0;
+    measured_frames = 0;
+}
+
+
+// Function to return the current render scale (1.0 = full resolution).
+float getRenderScale() {
+    return render_scale;
+}
+
+
+// Function to read the `CYDRAW_RENDER_SCALE` environment variable, if it is set.
+//
+// Notes:
+// - `auto` turns the adaptation on from the current scale; a number selects a fixed scale.
+static void readRenderScaleOption() {
+    const char* option = getenv("CYDRAW_RENDER_SCALE");
+    if (option == NULL || option[0] == '\0') {
+        return;
+    }
+    if (strcmp(option, "auto") == 0) {
+        setRenderScale(render_scale, 1);
+        return;
+    }
+    float scale = (float)atof(option);
+    if (scale <= 0.0f) {
+        printf("Invalid CYDRAW_RENDER_SCALE : %s\n", option);
+        return;
+    }
+    setRenderScale(scale, 0);
+}
+
+
+// Function to draw a cursor snapshot, at the render scale, into the window.
+//
+// Implementation Details:
+// - At a scale below 1.0, the frame is drawn into the top-left part of `scene_texture`
+//   (`setDrawFrameSize`), then that part is stretched over the window.
+// - If the renderer cannot render to textures, the frames are drawn at full resolution.
+static void drawSnapshot(SDL_Renderer* renderer, RenderFunction render, int snapshot) {
+    float scale = render_scale;
+    if (scale < 1.0f && !scene_unsupported && (scene_texture == NULL || scene_renderer != renderer)) {
+        if (scene_texture != NULL) {
+            SDL_DestroyTexture(scene_texture);
+        }
+        SDL_SetHint(SDL_HINT_RENDER_SCALE_QUALITY, "linear");
+        scene_texture = SDL_CreateTexture(renderer, SDL_PIXELFORMAT_RGBA8888, SDL_TEXTUREACCESS_TARGET, SCREEN_WIDTH, SCREEN_HEIGHT);
+        scene_renderer = renderer;
+        if (scene_texture == NULL) {
+            scene_unsupported = 1; // Stop trying: draw at full resolution.
+        } else {
+            SDL_SetTextureBlendMode(scene_texture, SDL_BLENDMODE_NONE);
+        }
+    }
+    if (scene_texture == NULL) {
+        scale = 1.0f;
+    }
+
+    SDL_Rect frame = {0, 0, SCREEN_WIDTH, SCREEN_HEIGHT};
+    if (scale < 1.0f) {
+        frame.w = (int)(SCREEN_WIDTH * scale + 0.5f);
+        frame.h = (int)(SCREEN_HEIGHT * scale + 0.5f);
+        SDL_SetRenderTarget(renderer, scene_texture);
+    }
+
+    SDL_SetRenderDrawColor(renderer, 0, 0, 0, 255);
+    SDL_RenderClear(renderer);
+    beginDrawFrame(renderer);
+    setDrawFrameSize(frame.w, frame.h);
+    setViewCamera(&snapshot_cameras[snapshot]);
+    setViewScale(scale);
+    render(renderer, &snapshots[snapshot]);
+    flushDrawList(renderer);
+
+    if (scale < 1.0f) {
+        SDL_SetRenderTarget(renderer, NULL);
+        SDL_RenderCopy(renderer, scene_texture, &frame, NULL);
+    }
+}
+
+
+// Function to adapt the render scale to the drawing time of the frames.
+//
+// Parameters:
+// - Uint64 frame_ticks: The drawing time of the last frame, in `SDL_GetPerformanceCounter` ticks.
+static void adaptRenderScale(Uint64 frame_ticks) {
+    if (!render_scale_auto) {
+        return;
+    }
+    measured_ticks += frame_ticks;
+    measured_frames++;
+    if (measured_frames < RENDER_SCALE_FRAMES) {
+        return;
+    }
+
+    double average_ms = measured_ticks * 1000.0 / SDL_GetPerformanceFrequency() / measured_frames;
+    if (average_ms > RENDER_TARGET_FRAME_MS) {
+        render_scale = clampRenderScale(render_scale - RENDER_SCALE_STEP);
+    } else if (average_ms < RENDER_TARGET_FRAME_MS / 2.0) {
+        render_scale = clampRenderScale(render_scale + RENDER_SCALE_STEP);
+    }
+    measured_ticks = 0;
+    measured_frames = 0;
+}
+
+
+// Function to destroy the scene texture.
+static void clearSceneTexture() {
+    if (scene_texture != NULL) {
+        SDL_DestroyTexture(scene_texture);
+        scene_texture = NULL;
+    }
+    scene_renderer = NULL;
+}
@@ -0,0 +1,17 @@
+#ifndef SIMULATION_H
+#define SIMULATION_H
+
+#include <SDL2/SDL.h>
+#include "newcursor.h"
+
+typedef void (*RenderFunction)(SDL_Renderer* renderer, const CursorPool* pool);
+
+int pollSimulationEvent(SDL_Event* event);
+void publishCursorSnapshot(const CursorPool* pool);
+void runSimulation(SDL_Renderer* renderer, SDL_ThreadFunction simulate, RenderFunction render);
+unsigned long getMergedEventCount();
+
+void setRenderScale(float scale, int automatic);
+float getRenderScale();
+
+#endif
@@ -0,0 +1,305 @@
+#include "spatial.h"
+#include "config.h"
+#include <stdlib.h>
+#include <SDL2/SDL.h>
+
+
+// ======================================================
+// SPATIAL HASH GRID FOR SELECTION
+// ======================================================
+
+// This section finds the cursor under a mouse click without testing every cursor.
+//
+// - Shapes: the generated code registers every shape of the script with `addSelectableShape`,
+//   in drawing order, so the shape drawn last (on top) has the highest order.
+// - Grid: the screen is divided into square cells of `SPATIAL_CELL_SIZE` pixels. Each visible
+//   cursor is stored in the cells covered by the bounding box of its shapes, computed with
+//   `getShapeBounds` from the real size, scale, thickness and angle. The cells are hashed into
+//   `SPATIAL_HASH_BUCKETS` buckets, so the grid has no fixed extent.
+// - Updates: a cursor changed by the handlers is moved to its new cells with
+//   `updateSpatialCursor`. After an animation step, which moves many cursors,
+//   `invalidateSpatialGrid` marks the grid stale and the next click updates every cursor,
+//   only moving those whose cells changed.
+//
+// A click then only tests the cursors of a single bucket.
+//
+// Functions in this section:
+// - addSelectableShape: Registers a shape drawn by a cursor.
+// - updateSpatialCursor: Moves a cursor to the cells covered by its shapes.
+// - invalidateSpatialGrid: Marks every cursor as possibly moved.
+// - findTopmostCursor: Returns the index of the topmost cursor under a point.
+// - clearSpatialGrid: Frees the grid and the registered shapes.
+
+
+// A shape drawn by a cursor.
+typedef struct {
+    ShapeForm form;       // The shape.
+    int size;             // The size of the shape before scaling.
+    int order;            // Position of the shape in the drawing order (later shapes are on top).
+    int next;             // Index of the next shape of the same cursor, -1 for the last one.
+} SelectableShape;
+
+// The place of a cursor in the grid.
+typedef struct {
+    int first_shape;      // Index of the cursor's first shape, -1 if it draws nothing.
+    int in_grid;          // 1 if the cursor is stored in the cells below, 0 otherwise.
+    int left, top;        // First cell covered by the cursor's bounding box.
+    int right, bottom;    // Last cell covered by the cursor's bounding box.
+    SDL_Rect bounds;      // Bounding box of the cursor's shapes.
+} SpatialEntry;
+
+// The cursor indices stored in cells hashing to the same bucket.
+typedef struct {
+    int* indices;
+    int count;
+    int capacity;
+} SpatialBucket;
+
+static SelectableShape* shapes = NULL;
+static int shape_count = 0;
+static int shape_capacity = 0;
+
+static SpatialEntry* entries = NULL;
+static int entry_capacity = 0;
+
+static SpatialBucket buckets[SPATIAL_HASH_BUCKETS];
+static int grid_stale = 1;  // 1 when the cursors may have moved since the grid was updated.
+
+
+// Function to grow the entries so that `count` cursors can be stored.
+static void reserveEntries(int count) {
+    if (count <= entry_capacity) {
+        return;
+    }
+    int capacity = entry_capacity ? entry_capacity : 256;
+    while (capacity < count) {
+        capacity *= 2;
+    }
+    entries = realloc(entries, capacity * sizeof(SpatialEntry));
+    for (int i = entry_capacity; i < capacity; i++) {
+        entries[i].first_shape = -1;
+        entries[i].in_grid = 0;
+    }
+    entry_capacity = capacity;
+}
+
+
+// Function to return the cell containing a coordinate (rounding down for negative coordinates).
+static int cellOf(int coordinate) {
+    if (coordinate >= 0) {
+        return coordinate / SPATIAL_CELL_SIZE;
+    }
+    return -((-coordinate + SPATIAL_CELL_SIZE - 1) / SPATIAL_CELL_SIZE);
+}
+
+
+// Function to return the bucket of a cell.
+static SpatialBucket* bucketOf(int cell_x, int cell_y) {
+    unsigned int hash = ((unsigned int)cell_x * 73856093u) ^ ((unsigned int)cell_y * 19349663u);
+    return &buckets[hash & (SPATIAL_HASH_BUCKETS - 1)];
+}
+
+
+// Function to add a cursor index to a bucket.
+static void insertIntoBucket(SpatialBucket* bucket, int index) {
+    if (bucket->count == bucket->capacity) {
+        bucket->capacity = bucket->capacity ? bucket->capacity * 2 : 8;
+        bucket->indices = realloc(bucket->indices, bucket->capacity * sizeof(int));
+    }
+    bucket->indices[bucket->count++] = index;
+}
+
+
+// Function to remove one occurrence of a cursor index from a bucket.
+static void removeFromBucket(SpatialBucket* bucket, int index) {
+    for (int i = 0; i < bucket->count; i++) {
+        if (bucket->indices[i] == index) {
+            bucket->indices[i] = bucket->indices[--bucket->count];
+            return;
+        }
+    }
+}
+
+
+// Function to return the rectangle containing a shape, as the draw list computes it.
+static SDL_Rect selectableShapeBounds(const CursorPool* pool, int index, const SelectableShape* shape) {
+    return getShapeBounds(shape->form, (int)(shape->size * pool->scale[index]), pool->thickness[index],
+                          pool->x[index], pool->y[index], pool->angle[index]);
+}
+
+
+// Function to check whether a point lies in a rectangle.
+static int rectContains(const SDL_Rect* rect, int x, int y) {
+    return x >= rect->x && x < rect->x + rect->w && y >= rect->y && y < rect->y + rect->h;
+}
+
+
+// Function to register a shape drawn by a cursor.
+//
+// Parameters:
+// - ShapeForm form: The shape.
+// - int index: The index of the cursor in `cursor_pool`.
+// - int size: The size of the shape before scaling, as passed to `queuePooledDraw`.
+//
+// Notes:
+// - The shapes must be registered in the order they are drawn: when shapes overlap, the one
+//   registered last is selected.
+// - The grid is updated on the next call to `findTopmostCursor`.
+//
+// Example Usage:
+// addSelectableShape(FORM_CIRCLE, 0, 50);
+void addSelectableShape(ShapeForm form, int index, int size) {
+    reserveEntries(index + 1);
+    if (shape_count == shape_capacity) {
+        shape_capacity = shape_capacity ? shape_capacity * 2 : 256;
+        shapes = realloc(shapes, shape_capacity * sizeof(SelectableShape));
+    }
+
+    SelectableShape* shape = &shapes[shape_count];
+    shape->form = form;
+    shape->size = size;
+    shape->order = shape_count;
+    shape->next = entries[index].first_shape;
+    entries[index].first_shape = shape_count;
+    shape_count++;
+    grid_stale = 1;
+}
+
+
+// Function to move a cursor to the cells covered by its shapes.
+//
+// Parameters:
+// - const CursorPool* pool: The pool holding the cursor.
+// - int index: The index of the cursor, or -1 to do nothing (no selection).
+//
+// Implementation Details:
+// - The bounding box is the union of the bounds of the cursor's shapes. Hidden cursors and
+//   cursors drawing nothing are removed from the grid.
+// - When the box still covers the same cells, only the box is updated.
+//
+// Example Usage:
+// updateSpatialCursor(&cursor_pool, selected_index); // After moving the selected cursor
+void updateSpatialCursor(const CursorPool* pool, int index) {
+    if (index < 0) {
+        return;
+    }
+    reserveEntries(index + 1);
+    SpatialEntry* entry = &entries[index];
+
+    int selectable = (pool->flags[index] & CURSOR_VISIBLE) && entry->first_shape >= 0;
+    SDL_Rect bounds = {0, 0, 0, 0};
+    if (selectable) {
+        bounds = selectableShapeBounds(pool, index, &shapes[entry->first_shape]);
+        for (int s = shapes[entry->first_shape].next; s >= 0; s = shapes[s].next) {
+            SDL_Rect shape_bounds = selectableShapeBounds(pool, index, &shapes[s]);
+            SDL_UnionRect(&bounds, &shape_bounds, &bounds);
+        }
+    }
+
+    int left = cellOf(bounds.x);
+    int top = cellOf(bounds.y);
+    int right = cellOf(bounds.x + bounds.w - 1);
+    int bottom = cellOf(bounds.y + bounds.h - 1);
+    entry->bounds = bounds;
+    if (selectable && entry->in_grid && left == entry->left && top == entry->top
+        && right == entry->right && bottom == entry->bottom) {
+        return;  // Same cells: nothing to move.
+    }
+
+    if (entry->in_grid) {
+        for (int cy = entry->top; cy <= entry->bottom; cy++) {
+            for (int cx = entry->left; cx <= entry->right; cx++) {
+                removeFromBucket(bucketOf(cx, cy), index);
+            }
+        }
+        entry->in_grid = 0;
+    }
+
+    if (selectable) {
+        for (int cy = top; cy <= bottom; cy++) {
+            for (int cx = left; cx <= right; cx++) {
+                insertIntoBucket(bucketOf(cx, cy), index);
+            }
+        }
+        entry->left = left;
+        entry->top = top;
+        entry->right = right;
+        entry->bottom = bottom;
+        entry->in_grid = 1;
+    }
+}
+
+
+// Function to mark every cursor as possibly moved.
+//
+// Notes:
+// - Call it after an animation step. The cursors are moved to their new cells by the next
+//   call to `findTopmostCursor`, so the steps without a click cost nothing.
+void invalidateSpatialGrid() {
+    grid_stale = 1;
+}
+
+
+// Function to find the topmost cursor under a point.
+//
+// Parameters:
+// - const CursorPool* pool: The pool holding the cursors.
+// - int x, int y: The point, usually the position of a mouse click.
+//
+// Returns:
+// - int: The index of the cursor whose shape under the point is drawn last, or -1 if no
+//   shape contains the point.
+//
+// Implementation Details:
+// - Only the cursors of the bucket containing the point are tested, first with their bounding
+//   box, then with the bounds of each of their shapes.
+//
+// Example Usage:
+// selected_index = findTopmostCursor(&cursor_pool, event.button.x, event.button.y);
+int findTopmostCursor(const CursorPool* pool, int x, int y) {
+    if (grid_stale) {
+        for (int i = 0; i < pool->count; i++) {
+            updateSpatialCursor(pool, i);
+        }
+        grid_stale = 0;
+    }
+
+    int best_index = -1;
+    int best_order = -1;
+    const SpatialBucket* bucket = bucketOf(cellOf(x), cellOf(y));
+    for (int i = 0; i < bucket->count; i++) {
+        int index = bucket->indices[i];
+        if (!rectContains(&entries[index].bounds, x, y)) {
+            continue;
+        }
+        for (int s = entries[index].first_shape; s >= 0 && shapes[s].order > best_order; s = shapes[s].next) {
+            SDL_Rect bounds = selectableShapeBounds(pool, index, &shapes[s]);
+            if (rectContains(&bounds, x, y)) {
+                best_index = index;
+                best_order = shapes[s].order;
+                break;
+            }
+        }
+    }
+    return best_index;
+}
+
+
+// Function to free the grid and the registered shapes.
+//
+// Notes:
+// - Call it before leaving the program.
+void clearSpatialGrid() {
+    for (int i = 0; i < SPATIAL_HASH_BUCKETS; i++) {
+        free(buckets[i].indices);
+        buckets[i].indices = NULL;
+        buckets[i].count = 0;
+        buckets[i].capacity = 0;
+    }
+    free(shapes);
+    free(entries);
+    shapes = NULL;
+    entries = NULL;
+    shape_count = shape_capacity = entry_capacity = 0;
+    grid_stale = 1;
+}
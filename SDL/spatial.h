@@ -0,0 +1,14 @@
+#ifndef SPATIAL_H
+#define SPATIAL_H
+
+#include <SDL2/SDL.h>
+#include "geometry.h"
+#include "newcursor.h"
+
+void addSelectableShape(ShapeForm form, int index, int size);
+void updateSpatialCursor(const CursorPool* pool, int index);
+void invalidateSpatialGrid();
+int findTopmostCursor(const CursorPool* pool, int x, int y);
+void clearSpatialGrid();
+
+#endif
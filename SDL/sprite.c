@@ -0,0 +1,205 @@
+#include "sprite.h"
+#include "config.h"
+#include "geometry.h"
+#include "drawlist.h"
+#include <SDL2/SDL.h>
+
+
+// ======================================================
+// SPRITE CACHE
+// ======================================================
+
+// This section contains the cache of pre-rendered shape textures (sprites).
+// A circle or a filled circle looks the same whatever the cursor's angle, so it is rendered
+// once into an `SDL_Texture` and then copied to the screen with `SDL_RenderCopy`, which costs
+// one textured quad instead of thousands of points. Filled squares are rendered unrotated and
+// copied with `SDL_RenderCopyEx`, which applies the cursor's rotation on the GPU.
+//
+// Functions in this section:
+// - drawSprite: Draws a shape from its cached sprite, creating the sprite if needed.
+// - clearSpriteCache: Destroys every cached sprite.
+
+
+// One slot of the LRU cache.
+typedef struct {
+    SDL_Texture* texture;     // The pre-rendered shape, NULL if the slot is free.
+    SDL_Renderer* renderer;   // The renderer owning the texture.
+    ShapeForm form;           // Key: the form of the shape.
+    int scaled_size;          // Key: the radius or side length after scaling.
+    int thickness;            // Key: the thickness of the cursor.
+    Uint32 color;             // Key: the RGBA color packed into 32 bits.
+    int extent;               // Distance between the center of the texture and its border.
+    unsigned long last_used;  // Value of `sprite_clock` the last time the slot was read.
+} SpriteCacheEntry;
+
+static SpriteCacheEntry sprite_cache[SPRITE_CACHE_SIZE];
+static unsigned long sprite_clock = 0;
+static SDL_Renderer* checked_renderer = NULL; // Renderer whose support was last checked.
+static int sprites_unsupported = 0; // Set when the renderer cannot render to textures.
+static int max_sprite_side = 0;     // Largest texture side of the renderer, 0 if unknown.
+
+
+// Function to check once per renderer whether it can render sprites, and how large.
+//
+// Parameters:
+// - SDL_Renderer* renderer: The renderer that will own the sprites.
+static void checkSpriteSupport(SDL_Renderer* renderer) {
+    checked_renderer = renderer;
+    sprites_unsupported = !SDL_RenderTargetSupported(renderer);
+    max_sprite_side = 0;
+    SDL_RendererInfo info;
+    if (SDL_GetRendererInfo(renderer, &info) == 0 && info.max_texture_width > 0 && info.max_texture_height > 0) {
+        max_sprite_side = SDL_min(info.max_texture_width, info.max_texture_height);
+    }
+}
+
+
+// Function to render a shape into a new texture.
+//
+// This function creates a transparent target texture large enough to hold the shape and
+// draws the shape's cached points into it, centered.
+//
+// Parameters:
+// - SDL_Renderer* renderer: The renderer that will own the texture.
+// - ShapeForm form, int scaled_size, int thickness: The shape to render.
+// - SDL_Color color: The color of the shape.
+// - int extent: Distance between the center of the shape and the border of the texture.
+//
+// Returns:
+// - SDL_Texture*: The texture, or NULL if it could not be created or rendered.
+static SDL_Texture* renderSprite(SDL_Renderer* renderer, ShapeForm form, int scaled_size, int thickness, SDL_Color color, int extent) {
+    int side = 2 * extent + 1;
+    SDL_Texture* texture = SDL_CreateTexture(renderer, SDL_PIXELFORMAT_RGBA8888, SDL_TEXTUREACCESS_TARGET, side, side);
+    if (texture == NULL) {
+        return NULL;
+    }
+    SDL_SetTextureBlendMode(texture, SDL_BLENDMODE_BLEND);
+
+    // Changing the render target resets the clip rectangle, which the draw list may be using.
+    SDL_Texture* previous_target = SDL_GetRenderTarget(renderer);
+    SDL_Rect previous_clip;
+    SDL_RenderGetClipRect(renderer, &previous_clip);
+    if (SDL_SetRenderTarget(renderer, texture) != 0) {
+        SDL_DestroyTexture(texture);
+        return NULL;
+    }
+
+    // Transparent background, then the shape's points around the center of the texture.
+    SDL_Color transparent = {0, 0, 0, 0};
+    setDrawColor(renderer, transparent);
+    SDL_RenderClear(renderer);
+    setDrawColor(renderer, color);
+    renderShapeGeometry(renderer, getShapeGeometry(form, scaled_size, thickness, 0, 0), extent, extent, 0);
+
+    SDL_SetRenderTarget(renderer, previous_target);
+    if (!SDL_RectEmpty(&previous_clip)) {
+        SDL_RenderSetClipRect(renderer, &previous_clip);
+    }
+    return texture;
+}
+
+
+// Function to draw a shape using its pre-rendered sprite.
+//
+// This function looks up the sprite of the shape in a small LRU cache, renders it if it is
+// missing, and copies it centered on (`x`, `y`).
+//
+// Parameters:
+// - SDL_Renderer* renderer: The SDL renderer used to draw the sprite.
+// - ShapeForm form: FORM_CIRCLE, FORM_FILLED_CIRCLE or FORM_FILLED_SQUARE.
+// - int scaled_size: The radius (circles) or side length (squares) after scaling.
+// - int thickness: The thickness of the cursor.
+// - SDL_Color color: The color of the shape.
+// - int x, int y: The position of the cursor (center of the shape).
+// - int angle: The rotation of the cursor in degrees (only used for filled squares).
+//
+// Returns:
+// - int: 1 if the shape was drawn, 0 if the caller must draw it point by point instead.
+//
+// Notes:
+// - A renderer without target textures draws every shape point by point. Any other failure
+//   (a texture too large for the renderer, out of memory) only affects the shape being drawn.
+// - Translucent colors (alpha < 255) are not cached: the points are written without blending
+//   when drawn directly, which a blended sprite cannot reproduce.
+// - Sprites belong to the renderer that created them; call `clearSpriteCache` before
+//   destroying the renderer.
+// - The cache holds `SPRITE_CACHE_SIZE` sprites (see config.h).
+//
+// Example Usage:
+// if (!drawSprite(renderer, FORM_CIRCLE, 40, 2, cursor->color, cursor->x, cursor->y, 0)) {
+//     // fall back to drawing the points
+// }
+int drawSprite(SDL_Renderer* renderer, ShapeForm form, int scaled_size, int thickness, SDL_Color color, int x, int y, int angle) {
+    if (renderer != checked_renderer) {
+        checkSpriteSupport(renderer);
+    }
+    if (sprites_unsupported || color.a != 255) {
+        return 0;
+    }
+
+    Uint32 packed_color = ((Uint32)color.r << 24) | ((Uint32)color.g << 16) | ((Uint32)color.b << 8) | color.a;
+    SpriteCacheEntry* entry = NULL;
+    SpriteCacheEntry* victim = &sprite_cache[0];
+    sprite_clock++;
+
+    for (int i = 0; i < SPRITE_CACHE_SIZE; i++) {
+        SpriteCacheEntry* candidate = &sprite_cache[i];
+        if (candidate->texture != NULL && candidate->renderer == renderer && candidate->form == form
+            && candidate->scaled_size == scaled_size && candidate->thickness == thickness && candidate->color == packed_color) {
+            entry = candidate;
+            break;
+        }
+        // Remember the first free slot, or else the least recently used one.
+        if (victim->texture != NULL && (candidate->texture == NULL || candidate->last_used < victim->last_used)) {
+            victim = candidate;
+        }
+    }
+
+    if (entry == NULL) {
+        // Cache miss: the extent covers the outermost layer of thickness of the shape.
+        int extent = (form == FORM_FILLED_SQUARE) ? scaled_size / 2 + thickness / 2 : scaled_size + thickness;
+        if (max_sprite_side > 0 && 2 * extent + 1 > max_sprite_side) {
+            return 0; // Too large for a texture of this renderer.
+        }
+        SDL_Texture* texture = renderSprite(renderer, form, scaled_size, thickness, color, extent);
+        if (texture == NULL) {
+            return 0; // Only this shape is drawn point by point, the cache stays in use.
+        }
+        if (victim->texture != NULL) {
+            SDL_DestroyTexture(victim->texture);
+        }
+        entry = victim;
+        entry->texture = texture;
+        entry->renderer = renderer;
+        entry->form = form;
+        entry->scaled_size = scaled_size;
+        entry->thickness = thickness;
+        entry->color = packed_color;
+        entry->extent = extent;
+    }
+    entry->last_used = sprite_clock;
+
+    SDL_Rect destination = {x - entry->extent, y - entry->extent, 2 * entry->extent + 1, 2 * entry->extent + 1};
+    if (form == FORM_FILLED_SQUARE && angle != 0) {
+        SDL_RenderCopyEx(renderer, entry->texture, NULL, &destination, angle, NULL, SDL_FLIP_NONE);
+    } else {
+        SDL_RenderCopy(renderer, entry->texture, NULL, &destination);
+    }
+    return 1;
+}
+
+
+// Function to destroy every sprite held by the cache.
+//
+// Notes:
+// - Must be called before `SDL_DestroyRenderer`, since the textures belong to the renderer.
+void clearSpriteCache() {
+    for (int i = 0; i < SPRITE_CACHE_SIZE; i++) {
+        if (sprite_cache[i].texture != NULL) {
+            SDL_DestroyTexture(sprite_cache[i].texture);
+            sprite_cache[i].texture = NULL;
+        }
+    }
+    checked_renderer = NULL; // The next renderer may be another one at the same address.
+    sprites_unsupported = 0;
+}
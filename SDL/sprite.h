@@ -0,0 +1,10 @@
+#ifndef SPRITE_H
+#define SPRITE_H
+
+#include <SDL2/SDL.h>
+#include "geometry.h"
+
+int drawSprite(SDL_Renderer* renderer, ShapeForm form, int scaled_size, int thickness, SDL_Color color, int x, int y, int angle);
+void clearSpriteCache();
+
+#endif
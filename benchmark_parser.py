@@ -0,0 +1,107 @@
+import io
+import sys
+import time
+from parser import *
+from tokeniser import *
+from error import *
+from descent import *
+from incremental import copy_tables, restore_tables
+from vm import compile_program, run_bytecode
+from state import global_state
+
+# Benchmark of the hand-written scanner and parser (see descent.py) against the tables of PLY.
+#
+# The script given on the command line is parsed several times by each parser, from the same
+# symbol tables. The benchmark displays the best time of each parser, with the tokens and the
+# statements parsed per second, and checks that both wrote the same diagnostics and C
+# instructions, filled the same tables, and built programs giving the same results when run.
+#
+# Notes:
+# - The parsing includes the rules run while parsing (the `for` loops, the assignments...), the
+#   same for both parsers.
+# - The tokens and statements are counted by the scanner and parser of descent.py. A script with
+#   syntax errors is parsed again by PLY (see `DescentParser`), so only the times are displayed.
+# - Long scripts show the difference best, for instance the scenes of hundreds of thousands of
+#   lines that `python main.py --stream` compiles.
+#
+# Example Usage:
+# python benchmark_parser.py script.txt
+
+REPEAT = 10  # Parses by each parser, the best one is kept
+
+
+# Function to measure the best time of a parser over `REPEAT` parses, from the same state.
+#
+# Parameters:
+# - parser: The parser built by `yacc()`, or a `DescentParser`.
+#
+# Returns:
+# - The best time in seconds, and the program, diagnostics, C instructions, tables and errors
+#   of the last parse.
+def measure(parser):
+    tables = copy_tables()
+    instruction_count = len(parsed_data_c)
+    has_errors = global_state.has_errors
+    best_time = float('inf')
+    stderr = sys.stderr
+    for _ in range(REPEAT):
+        restore_tables(tables)
+        del parsed_data_c[instruction_count:]
+        global_state.has_errors = has_errors
+        sys.stderr = io.StringIO()
+        try:
+            start = time.perf_counter()
+            program = parser.parse(data, lexer=lexer, tracking=True)
+            best_time = min(best_time, time.perf_counter() - start)
+        finally:
+            diagnostics, sys.stderr = sys.stderr.getvalue(), stderr
+    result = (program, diagnostics, parsed_data_c[instruction_count:], copy_tables(), global_state.has_errors)
+
+    restore_tables(tables)
+    del parsed_data_c[instruction_count:]
+    global_state.has_errors = has_errors
+    return best_time, result
+
+
+# Function to run a parsed program as bytecode, from the state left by its parse.
+#
+# Returns:
+# - The C instructions written by the run and the variables it left.
+def run_result(result):
+    program, _, instructions, tables, has_errors = result
+    if has_errors or not program:
+        return None
+    restore_tables(tables)
+    parsed_data_c[:] = instructions
+    run_bytecode(compile_program(program))
+    return parsed_data_c[len(instructions):], dict(variables_number)
+
+
+def main():
+    ply_parser = yacc()
+    descent_parser = DescentParser(ply_parser)
+    ply_time, ply_result = measure(ply_parser)
+    descent_time, descent_result = measure(descent_parser)
+
+    if descent_parser.used_fallback:
+        print("The script has syntax errors: descent.py leaves it to PLY.")
+        print(f"PLY: {ply_time * 1000:.3f} ms")
+        print(f"Descent (PLY after a first pass): {descent_time * 1000:.3f} ms")
+    else:
+        tokens, statements = descent_parser.token_count, descent_parser.statement_count
+        print(f"Script: {tokens} tokens, {statements} statements")
+        for name, parse_time in (("PLY", ply_time), ("Descent", descent_time)):
+            rates = f"{tokens / parse_time:,.0f} tokens/s, {statements / parse_time:,.0f} statements/s" if parse_time > 0 else "-"
+            print(f"{name}: {parse_time * 1000:.3f} ms ({rates})")
+    print(f"Speedup: {ply_time / descent_time:.2f}x" if descent_time > 0 else "Speedup: -")
+
+    if ply_result[1:] != descent_result[1:]:
+        sys.stderr.write("Error: the parsers give different diagnostics, C instructions or tables.\n")
+        sys.exit(1)
+    if run_result(ply_result) != run_result(descent_result):
+        sys.stderr.write("Error: the programs of the parsers give different results.\n")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
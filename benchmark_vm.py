@@ -0,0 +1,105 @@
+import sys
+import time
+from parser import *
+from tokeniser import *
+from error import *
+from vm import *
+from pyengine import *
+from state import global_state
+from watchdog import check_budget
+
+# Benchmark of the bytecode (see vm.py) and of the generated Python code (see pyengine.py) against
+# the tree of nested functions built by the parser.
+#
+# The script given on the command line is parsed once, then run several times by each engine,
+# from the same variables. The benchmark displays the best time of each engine and checks that
+# all of them wrote the same C instructions and left the same variables.
+#
+# Notes:
+# - Only the execution is measured: the parsing, including the loops the parser runs while parsing,
+#   is the same for all. The time to lower the program into bytecode, and to translate and compile
+#   it into Python, is displayed apart.
+# - Loop-heavy scripts show the difference best, for instance:
+#   x = 0
+#   while x < 200000 do x = x + 1 end
+# - benchmarks/calls_in_loops.txt calls a procedure in `while`, `for` and `if` blocks: the engines
+#   must give the procedure the values of the loops, as the nested functions do.
+#
+# Example Usage:
+# python benchmark_vm.py script.txt
+# python benchmark_vm.py benchmarks/calls_in_loops.txt
+
+REPEAT = 10  # Runs of each engine, the best one is kept
+
+
+# Function to measure the best time of an engine over `REPEAT` runs, from the same state.
+#
+# Parameters:
+# - run: `run_actions`, `run_bytecode`, or a function running the generated Python code.
+# - program: The parsed program, its bytecode, or the actions called by the Python code.
+#
+# Returns:
+# - The best time in seconds, and the C instructions and variables left by the last run.
+def measure(run, program):
+    variables = dict(variables_number)
+    instruction_count = len(parsed_data_c)
+    best_time = float('inf')
+    for _ in range(REPEAT):
+        variables_number.clear()
+        variables_number.update(variables)
+        del parsed_data_c[instruction_count:]
+        start = time.perf_counter()
+        run(program)
+        best_time = min(best_time, time.perf_counter() - start)
+    result = (parsed_data_c[instruction_count:], dict(variables_number))
+
+    variables_number.clear()
+    variables_number.update(variables)
+    del parsed_data_c[instruction_count:]
+    return best_time, result
+
+
+def main():
+    parser = yacc()
+    parsed_data = parser.parse(data, lexer=lexer, tracking=True)
+    if global_state.has_errors or not parsed_data:
+        sys.exit(1)
+
+    start = time.perf_counter()
+    bytecode = compile_program(parsed_data)
+    compile_time = time.perf_counter() - start
+
+    # Compiled without the cache, to display the time of a first run
+    start = time.perf_counter()
+    source, actions = generate_python_source(parsed_data)
+    namespace = {'global_state': global_state, 'check_budget': check_budget}
+    try:
+        exec(compile(source, '<script>', 'exec'), namespace)
+    except SyntaxError as error:  # Too many nested loops, run_python uses the bytecode
+        namespace['run_script'] = None
+        print(f"Python: cannot be compiled ({error.msg})")
+    translate_time = time.perf_counter() - start
+    run_script = namespace['run_script']
+
+    tree_time, tree_result = measure(run_actions, parsed_data)
+    bytecode_time, bytecode_result = measure(run_bytecode, bytecode)
+
+    print(f"Nested functions: {tree_time * 1000:.3f} ms")
+    print(f"Bytecode: {bytecode_time * 1000:.3f} ms ({len(bytecode[0])} instructions, lowered in {compile_time * 1000:.3f} ms)")
+    engine_times = [("bytecode", bytecode_time)]
+    if run_script:
+        python_time, python_result = measure(lambda actions: run_script(variables_number, actions), actions)
+        print(f"Python: {python_time * 1000:.3f} ms ({source.count(chr(10))} lines, compiled in {translate_time * 1000:.3f} ms)")
+        engine_times.append(("Python", python_time))
+    for name, engine_time in engine_times:
+        print(f"Speedup ({name}): {tree_time / engine_time:.2f}x" if engine_time > 0 else f"Speedup ({name}): -")
+    if tree_result != bytecode_result:
+        sys.stderr.write("Error: the bytecode and the nested functions give different results.\n")
+        sys.exit(1)
+    if run_script and tree_result != python_result:
+        sys.stderr.write("Error: the Python code and the nested functions give different results.\n")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,487 @@
+import io
+import re
+import sys
+from ply.lex import LexError
+from parser import *
+from tokeniser import *
+from state import global_state
+
+# Module to parse the scripts with a hand-written scanner and recursive-descent parser
+# (`python main.py --parser=descent <file>`), instead of the LALR tables of PLY.
+#
+# PLY tries the rules of tokeniser.py through its own master regex and drives the rules of
+# parser.py through generic tables, with a lot of work per token. Here a single regex
+# (`TOKEN_PATTERN`) finds the tokens, and one method per kind of statement follows the grammar
+# of parser.py, calling its rules (`p_statement_movement`...) with the same symbols, so the
+# program and the diagnostics are the same.
+#
+# Logic:
+# 1. `Scanner` reads the tokens. A name already known is typed from the tables of tokeniser.py;
+#    a new name goes through `t_id_cursor`, which declares it from its context.
+# 2. `Descent` recognizes the script and records the reductions in the order in which PLY runs
+#    them: PLY reads the token after a rule before running it, and so does `Descent`. The
+#    diagnostics of the scanner are recorded at their place between the reductions.
+# 3. If the whole script is valid, `DescentParser` runs the rules of the recorded reductions,
+#    writing the diagnostics between them, and returns the program.
+# 4. Otherwise, the names declared by the scanner are forgotten and the script is parsed again
+#    by PLY, whose error recovery and error rules (see error.py) write the diagnostics.
+#
+# Notes:
+# - Recognizing before running is possible because the types of the tokens only depend on the
+#   text and on the names already read, never on the rules run: nothing is run before the
+#   script is known to be valid, so there is nothing to undo when PLY takes over.
+# - A `program` is built as one list, where `p_program` concatenates a list per statement.
+#
+# Example Usage:
+# parser = DescentParser(yacc())
+# parsed_data = parser.parse(data, lexer=lexer, tracking=True)
+
+# Spaces, newlines and comments, numbers, names, then the characters of the other tokens
+TOKEN_PATTERN = re.compile(r'([ \t\n]+|\#.*)|(\d+)|([a-zA-Z][a-zA-Z0-9_]*)|([-+*/%(),=<>])')
+IGNORED, NUMBER, NAME = 1, 2, 3
+SYMBOLS = {'=': 'equal', '>': 'greater', '<': 'less', ',': 'comma', '+': 'plus', '-': 'minus',
+           '*': 'times', '/': 'dividedby', '%': 'modulo', '(': 'lp', ')': 'rp'}
+
+# Tokens starting a statement, besides those of the error rules (see error.py)
+STATEMENT_STARTS = frozenset({'id_number', 'id_cursor', 'id_group', 'move', 'set', 'draw', 'mode',
+                              'rotate', 'add', 'if', 'for', 'while', 'procedure', 'call'})
+COMPARISONS = ('less', 'greater', 'equal')
+
+# Rules of the assignments with an operator, by operator
+ARITHMETIC_RULES = {
+    'plus': p_statement_assign_expression_plus,
+    'minus': p_statement_assign_expression_minus,
+    'times': p_statement_assign_expression_times,
+    'dividedby': p_statement_assign_expression_dividedby,
+    'modulo': p_statement_assign_expression_modulo,
+}
+
+# Symbols after the first ones of the statements, as in the rules of parser.py
+COLOR = 'with lp number_or_id comma number_or_id comma number_or_id comma number_or_id comma number_or_id comma number_or_id rp'.split()
+CURSOR_CREATION = 'at lp number_or_id comma number_or_id rp'.split() + COLOR
+CURSOR_ARRAY_CREATION = 'array lp number_or_id rp at lp number_or_id comma number_or_id rp by lp coordinate comma coordinate rp'.split() + COLOR
+GROUP_CREATION = 'equal create group at lp number_or_id comma number_or_id rp'.split()
+LOOP_HEADER = 'id_number in lp number_or_id comma number_or_id rp do'.split()
+
+
+# Class of a token, or of a symbol reduced by a rule, as PLY gives them to the rules.
+class Symbol:
+    __slots__ = ('type', 'value', 'lexpos', 'lexer')
+
+    def __init__(self, type, value, lexpos, lexer=None):
+        self.type = type
+        self.value = value
+        self.lexpos = lexpos
+        self.lexer = lexer
+
+
+# Class of the `p` argument of a rule: `p[n]` is the value of the n-th symbol, `p[0]` the result.
+class Reduction:
+    __slots__ = ('slice',)
+
+    def __init__(self, symbols):
+        self.slice = symbols
+
+    def __getitem__(self, n):
+        if isinstance(n, slice):
+            return [symbol.value for symbol in self.slice[n]]
+        return self.slice[n].value
+
+    def __setitem__(self, n, value):
+        self.slice[n].value = value
+
+    def __len__(self):
+        return len(self.slice)
+
+    def lexpos(self, n):
+        return self.slice[n].lexpos
+
+
+# Builds the list of the statements of a program, as `p_program` does without its recursion.
+def reduce_program(p):
+    p[0] = p[1:]
+
+
+class UnexpectedToken(Exception):
+    pass
+
+
+# Class of the scanner, reading the tokens of `lexer.lexdata` from `lexer.lexpos` to `lexer.lexlen`.
+#
+# It takes the place of the PLY lexer for the rules of tokeniser.py (`lexdata`, `lexpos`, `skip`),
+# and gives the tokens PLY would give.
+#
+# Parameters:
+# - lexer: The PLY lexer, holding the text to parse.
+# - reductions: The list of the reductions of `Descent`, where the diagnostics are recorded.
+class Scanner:
+    def __init__(self, lexer, reductions):
+        self.lexdata = lexer.lexdata
+        self.lexpos = lexer.lexpos
+        self.lexlen = lexer.lexlen
+        self.reductions = reductions
+        self.declared_names = []  # Names declared by `t_id_cursor`, in order
+        self.token_count = 0
+        self.end = Symbol('$end', None, self.lexlen)
+
+    def skip(self, n):
+        self.lexpos += n
+
+    def token(self):
+        lexdata = self.lexdata
+        while self.lexpos < self.lexlen:
+            start = self.lexpos
+            match = TOKEN_PATTERN.match(lexdata, start)
+            if match is None:
+                token = self.call_rule(t_error, Symbol('error', lexdata[start:], start, self))
+                if self.lexpos == start:  # Corrected without skipping the character, as PLY does
+                    raise LexError(f"Scanning error. Illegal character '{lexdata[start]}'", lexdata[start:])
+                continue
+            self.lexpos = match.end()
+            kind = match.lastindex
+            if kind == IGNORED:
+                continue
+            text = match.group()
+            if kind == NAME:
+                # The order of `t_id_cursor`
+                token_type = reserved.get(text)
+                if token_type is None:
+                    if text in cursor_positions:
+                        token_type = 'id_cursor'
+                    elif text in variables_number:
+                        token_type = 'id_number'
+                    elif text in procedure_parameters:
+                        pass  # Typed by `t_id_cursor`, as it may be a variable declared after the procedure
+                    elif text in variables_group:
+                        token_type = 'id_group'
+                    elif text in variables_procedure:
+                        token_type = 'id_procedure'
+                    if token_type is None:
+                        token = self.declare(text, start)
+                        if token is None:
+                            continue  # Not recognized, and skipped
+                        self.token_count += 1
+                        return token
+                token = Symbol(token_type, text, start)
+            elif kind == NUMBER:
+                token = Symbol('number', int(text), start)
+            else:
+                token = Symbol(SYMBOLS[text], text, start)
+            self.token_count += 1
+            return token
+        return self.end
+
+    # Function to type a new name with `t_id_cursor`, keeping the names it declares.
+    def declare(self, name, start):
+        table_sizes = len(variables_cursor) + len(variables_number) + len(variables_group) + len(variables_procedure)
+        token = self.call_rule(t_id_cursor, Symbol('id_cursor', name, start, self))
+        if table_sizes != len(variables_cursor) + len(variables_number) + len(variables_group) + len(variables_procedure):
+            self.declared_names.append(name)
+        return token
+
+    # Function to call a rule of tokeniser.py, recording its diagnostics among the reductions.
+    def call_rule(self, rule, token):
+        stderr, sys.stderr = sys.stderr, io.StringIO()
+        try:
+            return rule(token)
+        finally:
+            diagnostics, sys.stderr = sys.stderr.getvalue(), stderr
+            if diagnostics:
+                self.reductions.append((None, diagnostics))
+
+    # Function to forget the names declared, before PLY reads the text again.
+    def forget_names(self):
+        for name in reversed(self.declared_names):
+            if name in cursor_positions:
+                del cursor_positions[name]
+                variables_cursor.pop()
+            variables_number.pop(name, None)
+            if variables_group and variables_group[-1] == name:
+                variables_group.pop()
+            if variables_procedure and variables_procedure[-1] == name:
+                variables_procedure.pop()
+        procedure_parameters.clear()  # The parameters of a procedure left open
+        cursor_parameters.clear()
+
+
+# Class of the recursive-descent parser, recording the reductions of a valid script.
+#
+# Each method reads one symbol of the grammar of parser.py. The current token (`self.token`) is
+# always read: like PLY, the token after the last symbol of a rule is read before the rule.
+#
+# Notes:
+# - Raises `UnexpectedToken` at the first token that cannot follow, where PLY would recover.
+class Descent:
+    def __init__(self, scanner):
+        self.next_token = scanner.token
+        self.reductions = scanner.reductions  # (rule, symbols), or (None, diagnostics)
+        self.statement_count = 0
+        self.token = self.next_token()
+
+    def shift(self):
+        token = self.token
+        self.token = self.next_token()
+        return token
+
+    def expect(self, token_type):
+        token = self.token
+        if token.type != token_type:
+            raise UnexpectedToken(token)
+        self.token = self.next_token()
+        return token
+
+    # Function to record a rule and its symbols, after the first one, `symbols[0]` being the result.
+    def reduce(self, rule, name, symbols):
+        result = symbols[0] = Symbol(name, None, symbols[1].lexpos)
+        self.reductions.append((rule, symbols))
+        return result
+
+    # Function to read the symbols of a rule, from a list of their names.
+    def read(self, symbols, names):
+        for name in names:
+            if name == 'number_or_id':
+                symbols.append(self.number_or_id())
+            elif name == 'coordinate':
+                symbols.append(self.coordinate())
+            else:
+                symbols.append(self.expect(name))
+        return symbols
+
+    def parse(self):
+        program = self.program()
+        if self.token.type != '$end':
+            raise UnexpectedToken(self.token)
+        return program
+
+    def program(self):
+        symbols = [None, self.statement()]
+        while self.token.type in STATEMENT_STARTS:
+            symbols.append(self.statement())
+        return self.reduce(reduce_program, 'program', symbols)
+
+    def statement(self):
+        read_statement = self.STATEMENTS.get(self.token.type)
+        if read_statement is None:
+            raise UnexpectedToken(self.token)
+        self.statement_count += 1
+        return read_statement(self)
+
+    def number_or_id(self):
+        token = self.token
+        if token.type != 'number' and token.type != 'id_number':
+            raise UnexpectedToken(token)
+        self.token = self.next_token()
+        return Symbol('number_or_id', token.value, token.lexpos)
+
+    def coordinate(self):
+        if self.token.type == 'minus':
+            lexpos = self.shift().lexpos
+            return Symbol('coordinate', (-1, self.number_or_id().value), lexpos)
+        value = self.number_or_id()
+        return Symbol('coordinate', (1, value.value), value.lexpos)
+
+    # `<id_number> = <number_or_id>` or `<id_number> = <id_number> <operator> <number>`
+    def assignment(self):
+        symbols = [None, self.shift(), self.expect('equal')]
+        if self.token.type == 'id_number':
+            source = self.shift()
+            rule = ARITHMETIC_RULES.get(self.token.type)
+            if rule is not None:
+                symbols += (source, self.shift(), self.expect('number'))
+                return self.reduce(rule, 'statement', symbols)
+            symbols.append(Symbol('number_or_id', source.value, source.lexpos))
+        else:
+            symbols.append(self.number_or_id())
+        return self.reduce(p_statement_assign_number, 'statement', symbols)
+
+    def cursor_creation(self):
+        symbols = self.read([None, self.shift()], ('equal', 'create', 'cursor'))
+        if self.token.type == 'array':
+            return self.reduce(p_statement_creation_cursor_array, 'statement', self.read(symbols, CURSOR_ARRAY_CREATION))
+        return self.reduce(p_statement_creation_cursor, 'statement', self.read(symbols, CURSOR_CREATION))
+
+    def group_creation(self):
+        return self.reduce(p_statement_creation_group, 'statement', self.read([None, self.shift()], GROUP_CREATION))
+
+    # `move` or `rotate`, of a cursor or of a group
+    def transform(self):
+        symbols = [None, self.shift()]
+        if self.token.type == 'id_group':
+            rule = p_statement_group_transform
+        elif self.token.type == 'id_cursor':
+            rule = p_statement_movement if symbols[1].type == 'move' else p_statement_rotation
+        else:
+            raise UnexpectedToken(self.token)
+        symbols.append(self.shift())
+        return self.reduce(rule, 'statement', self.read(symbols, ('by', 'number_or_id')))
+
+    def thickness(self):
+        symbols = [None, self.shift()]
+        return self.reduce(p_statement_thickness_changing, 'statement', self.read(symbols, ('id_cursor', 'thickness', 'at', 'number_or_id')))
+
+    def draw(self):
+        symbols = [None, self.shift(), self.expect('lp')]
+        shape = self.token.type
+        if shape == 'form':
+            rule = p_statement_drawing_not_arc
+            self.read(symbols, ('form', 'comma', 'number_or_id'))
+        elif shape == 'arc':
+            rule = p_statement_drawing_arc
+            self.read(symbols, ('arc', 'comma', 'number_or_id', 'comma', 'number_or_id', 'comma', 'number_or_id'))
+        elif shape == 'path':
+            rule = p_statement_drawing_path
+            symbols += (self.shift(), self.expect('comma'), self.vertex_list())
+        else:
+            raise UnexpectedToken(self.token)
+        return self.reduce(rule, 'statement', self.read(symbols, ('rp', 'with', 'id_cursor')))
+
+    def vertex_list(self):
+        lexpos = self.token.lexpos
+        vertices = [self.vertex()]
+        while self.token.type == 'comma':
+            self.shift()
+            vertices.append(self.vertex())
+        return Symbol('vertex_list', vertices, lexpos)
+
+    def vertex(self):
+        self.expect('lp')
+        x = self.coordinate()
+        self.expect('comma')
+        y = self.coordinate()
+        self.expect('rp')
+        return (x.value, y.value)
+
+    def animation_mode(self):
+        return self.reduce(p_statement_animation_mode, 'statement', [None, self.shift(), self.expect('animation')])
+
+    def group_add(self):
+        symbols = [None, self.shift()]
+        if self.token.type != 'id_cursor' and self.token.type != 'id_group':
+            raise UnexpectedToken(self.token)
+        symbols.append(self.shift())
+        return self.reduce(p_statement_group_add, 'statement', self.read(symbols, ('to', 'id_group')))
+
+    def condition(self):
+        symbols = [None, self.number_or_id()]
+        if self.token.type not in COMPARISONS:
+            raise UnexpectedToken(self.token)
+        symbols += (self.shift(), self.number_or_id())
+        return self.reduce(p_condition, 'condition', symbols)
+
+    def if_statement(self):
+        symbols = [None, self.shift(), self.condition(), self.expect('then'), self.program()]
+        if self.token.type == 'else':
+            symbols += (self.shift(), self.program())
+        symbols.append(self.expect('fi'))
+        return self.reduce(p_statement_condition, 'statement', symbols)
+
+    def for_loop(self):
+        symbols = self.read([None, self.shift()], LOOP_HEADER)
+        symbols += (self.program(), self.expect('rof'))
+        return self.reduce(p_statement_loop, 'statement', symbols)
+
+    def while_loop(self):
+        symbols = [None, self.shift(), self.condition(), self.expect('do'), self.program(), self.expect('end')]
+        return self.reduce(p_statement_while, 'statement', symbols)
+
+    def procedure(self):
+        header = [None, self.shift(), self.expect('id_procedure'), self.expect('lp')]
+        if self.token.type != 'rp':
+            lexpos = self.token.lexpos
+            parameters = [self.parameter()]
+            while self.token.type == 'comma':
+                self.shift()
+                parameters.append(self.parameter())
+            header.append(Symbol('parameter_list', parameters, lexpos))
+        header += (self.expect('rp'), self.expect('do'))
+        symbols = [None, self.reduce(p_procedure_header, 'procedure_header', header), self.program(), self.expect('end')]
+        procedure_parameters.clear()  # After the token after `end`, which PLY reads before ending the procedure
+        cursor_parameters.clear()
+        return self.reduce(p_statement_procedure, 'statement', symbols)
+
+    def parameter(self):
+        if self.token.type == 'cursor':
+            self.shift()
+            return (self.expect('id_cursor').value, 'cursor')
+        return (self.expect('id_number').value, 'number')
+
+    def call(self):
+        symbols = [None, self.shift(), self.expect('id_procedure'), self.expect('lp')]
+        if self.token.type != 'rp':
+            lexpos = self.token.lexpos
+            arguments = [self.argument()]
+            while self.token.type == 'comma':
+                self.shift()
+                arguments.append(self.argument())
+            symbols.append(Symbol('argument_list', arguments, lexpos))
+        symbols.append(self.expect('rp'))
+        return self.reduce(p_statement_call, 'statement', symbols)
+
+    def argument(self):
+        if self.token.type == 'id_cursor':
+            return ('cursor', self.shift().value)
+        return ('number', self.number_or_id().value)
+
+    # Method reading each kind of statement, by its first token
+    STATEMENTS = {
+        'id_number': assignment,
+        'id_cursor': cursor_creation,
+        'id_group': group_creation,
+        'move': transform,
+        'rotate': transform,
+        'set': thickness,
+        'draw': draw,
+        'mode': animation_mode,
+        'add': group_add,
+        'if': if_statement,
+        'for': for_loop,
+        'while': while_loop,
+        'procedure': procedure,
+        'call': call,
+    }
+
+
+# Class of the parser of `--parser=descent`, used as the parser built by `yacc()`.
+#
+# Parameters:
+# - fallback: The parser built by `yacc()`, parsing the scripts with errors.
+#
+# Example Usage:
+# parser = DescentParser(yacc())
+# parsed_data = parser.parse(data, lexer=lexer, tracking=True)
+class DescentParser:
+    def __init__(self, fallback):
+        self.fallback = fallback
+        # Of the last script parsed, for benchmark_parser.py
+        self.token_count = self.statement_count = 0
+        self.used_fallback = False
+
+    # Function to parse a text, or, without `input`, the text of the lexer, as the PLY parser does.
+    #
+    # Returns:
+    # - The program, the list of the actions of the statements.
+    def parse(self, input=None, lexer=lexer, **options):
+        if input is not None:
+            lexer.input(input)
+        has_errors = global_state.has_errors
+        reductions = []
+        scanner = Scanner(lexer, reductions)
+        try:
+            descent = Descent(scanner)
+            program = descent.parse()
+        except (UnexpectedToken, LexError):
+            program = None
+        self.used_fallback = program is None
+        if self.used_fallback:
+            # PLY reads the text again, for its error recovery and diagnostics
+            scanner.forget_names()
+            global_state.has_errors = has_errors
+            return self.fallback.parse(input, lexer=lexer, **options)
+        self.token_count, self.statement_count = scanner.token_count, descent.statement_count
+
+        for rule, symbols in reductions:
+            if rule is None:
+                sys.stderr.write(symbols)  # Diagnostics of the scanner
+            else:
+                rule(Reduction(symbols))
+        return program.value
@@ -25,7 +25,7 @@ from state import global_state
 # 3. Sets `global_state.has_errors` to `True` to signal that an error occurred.
 #
 # Notes:
-# - The function relies on `find_error_line`, `data`, `line_offsets`, and `global_state`.
+# - The function relies on `find_error_line`, the input of `lexer`, `line_offsets`, and `global_state`.
 # - Detailed suggestions for common language constructs, such as statements, loops, and conditions,
 #   aim to improve the user's understanding of the language syntax.
 #
@@ -40,7 +40,7 @@ def p_error(p):
     
     if p:
 
-        line_number, line_content = find_error_line(data, line_offsets, p.lexpos)
+        line_number, line_content = find_error_line(lexer.lexdata, line_offsets, p.lexpos)  # The text being parsed
         
         sys.stderr.write(f"Syntax error on line {line_number}: unexpected element '{p.value}'.\n")
 
@@ -58,13 +58,26 @@ def p_error(p):
             sys.stderr.write("Suggested correction: check the complete structure of the 'draw' statement.\n")
             sys.stderr.write("Usage :\n")
             sys.stderr.write("- 'draw (<form>, <size>) with <cursor>'.\n")
-            sys.stderr.write("Forms: circle | square | line | filledcircle | filledsquare | arc.\n")
-            sys.stderr.write("Warning, 'arc' has a different usage.: \n")
+            sys.stderr.write("Forms: circle | square | line | filledcircle | filledsquare | arc | path.\n")
+            sys.stderr.write("Warning, 'arc' and 'path' have a different usage.: \n")
             sys.stderr.write("- 'draw (arc, <size>, <start angle>, <end angle>) with <cursor>'.\n")
+            sys.stderr.write("- 'draw (path, (<x>, <y>), (<x>, <y>), ...) with <cursor>'.\n")
         if p.value == "cursor" or "cursor" in line_content:
             sys.stderr.write("Suggested correction: check the complete structure of the 'create cursor' statement.\n")
             sys.stderr.write("Usage :\n")
             sys.stderr.write("- '<id_cursor> equal create cursor at (<number or id_number>, <number or id_number>) with (<number or id_number>, <number or id_number>, <number or id_number>, <number or id_number>, <number or id_number>, <number or id_number>)'.\n")
+        if p.value == "array" or "array" in line_content:
+            sys.stderr.write("Suggested correction: check the complete structure of the 'create cursor array' statement.\n")
+            sys.stderr.write("Usage :\n")
+            sys.stderr.write("- '<id_cursor> equal create cursor array (<count>) at (<x>, <y>) by (<step x>, <step y>) with (<r>, <g>, <b>, <a>, <thickness>, <visibility>)'.\n")
+        if p.value == "procedure" or "procedure" in line_content:
+            sys.stderr.write("Suggested correction: check the complete structure of the procedure definition.\n")
+            sys.stderr.write("Usage :\n")
+            sys.stderr.write("- 'procedure <name> (cursor <id_cursor>, <id_number>, ...) do <program> end'\n")
+        if p.value == "call" or "call" in line_content:
+            sys.stderr.write("Suggested correction: check the complete structure of the procedure call.\n")
+            sys.stderr.write("Usage :\n")
+            sys.stderr.write("- 'call <name> (<id_cursor or number_or_id>, ...)'\n")
         if p.value == "create" or "create" in line_content:
             sys.stderr.write("Suggested correction: check the complete structure of the 'create cursor' statement.\n")
             sys.stderr.write("Usage :\n")
@@ -75,9 +88,10 @@ def p_error(p):
             sys.stderr.write("- '<id_cursor> equal create cursor at (<number or id_number>, <number or id_number>) with (<number or id_number>, <number or id_number>, <number or id_number>, <number or id_number>, <number or id_number>, <number or id_number>)'.\n")
             sys.stderr.write("Or :\n")
             sys.stderr.write("- 'draw (<form>, <size>) with <cursor>'.\n")
-            sys.stderr.write("Forms: circle | square | line | filledcircle | filledsquare | arc.\n")
-            sys.stderr.write("Warning, 'arc' has a different usage.: \n")
+            sys.stderr.write("Forms: circle | square | line | filledcircle | filledsquare | arc | path.\n")
+            sys.stderr.write("Warning, 'arc' and 'path' have a different usage.: \n")
             sys.stderr.write("- 'draw (arc, <size>, <start angle>, <end angle>) with <cursor>'.\n")
+            sys.stderr.write("- 'draw (path, (<x>, <y>), (<x>, <y>), ...) with <cursor>'.\n")
         if p.value == "if" or "if" in line_content:
             sys.stderr.write("Suggested correction: check the complete structure of the condition statement.\n")
             sys.stderr.write("Two possibilities :\n")
@@ -96,6 +110,15 @@ def p_error(p):
             sys.stderr.write("Suggested correction: check the complete structure of the 'rotate' statement.\n")
             sys.stderr.write("Usage :\n")
             sys.stderr.write("- 'rotate <id_cursor> by <angle>'.\n")
+        if p.value == "group" or "group" in line_content:
+            sys.stderr.write("Suggested correction: check the complete structure of the group statement.\n")
+            sys.stderr.write("Usage :\n")
+            sys.stderr.write("- '<id_group> equal create group at (<number or id_number>, <number or id_number>)'.\n")
+            sys.stderr.write("- 'move <id_group> by <number>' or 'rotate <id_group> by <angle>'.\n")
+        if p.value == "add" or "add" in line_content:
+            sys.stderr.write("Suggested correction: check the complete structure of the 'add' statement.\n")
+            sys.stderr.write("Usage :\n")
+            sys.stderr.write("- 'add <id_cursor> to <id_group>' or 'add <id_group> to <id_group>'.\n")
         if p.value == "then" or "then" in line_content:
             sys.stderr.write("Suggested correction: check the complete structure of the condition statement.\n")
             sys.stderr.write("Two possibilities :\n")
@@ -202,7 +225,7 @@ def p_statement_movement_errors(p):
         global_state.has_errors = True
 
     # Case2 : Command with a number but without`id_cursor`
-    elif len(p) == 3 and p[1] == 'move' and (isinstance(p[2], (int)) or isinstance(p[2], (str))):
+    elif len(p) == 3 and p[1] == 'move' and (isinstance(p[2], (int)) or (isinstance(p[2], (str)) and p[2] not in cursor_positions)):
         number = resolve_value(p[2])
         sys.stderr.write(f"Syntax error on line {line_number}: 'id_cursor' missing before the number '{number}'.\n")
         sys.stderr.write(f"Suggested correction: 'move <id_cursor> by {p[2]}'.\n")
@@ -221,14 +244,7 @@ def p_statement_movement_errors(p):
         global_state.has_errors = True
 
     # Case 5 : Command out of order
-    elif len(p) == 5 and (
-        (p[1] == 'id_cursor' and p[2] == 'by' and p[3] == 'move') or
-        (p[1] == 'by' and p[2] == 'id_cursor' and p[3] == 'move') or
-        (p[1] == 'move' and p[2] == 'by' and p[3] == 'id_cursor') or
-        (p[1] == 'number_or_id' and p[2] == 'by' and p[3] == 'move') or
-        (p[1] == 'by' and p[2] == 'number_or_id' and p[3] == 'move') or
-        (p[1] == 'id_cursor' and p[2] == 'move' and p[3] == 'by')
-    ):
+    elif len(p) == 5:  # The other productions of 4 symbols, in an incorrect order
         
         sys.stderr.write(f"Syntax error on line {line_number}: command in an incorrect order '{' '.join(str(x) for x in p[1:])}'.\n")
         sys.stderr.write(f"Suggested correction: 'move <id_cursor> by <number>'.\n")
@@ -263,7 +279,7 @@ def p_statement_movement_errors(p):
 # Suggested correction: check the complete structure of the 'draw' instruction.
 # Usage:
 # - 'draw (<form>, <size>) with <cursor>'.
-# Forms: circle | square | line | filledcircle | filledsquare | arc.
+# Forms: circle | square | line | filledcircle | filledsquare | arc | path.
 
 def p_statement_drawing_not_arc_error(p):
     '''statement : draw 
@@ -279,6 +295,8 @@ def p_statement_drawing_not_arc_error(p):
                  | draw lp arc comma number_or_id comma error comma number_or_id rp with id_cursor
                  | draw lp arc comma number_or_id comma number_or_id comma error rp with id_cursor
                  | draw lp arc comma number_or_id comma number_or_id comma number_or_id rp error
+                 | draw lp path comma error rp with id_cursor
+                 | draw lp path comma vertex_list rp error
                  | draw lp error error error rp with id_cursor
                  | draw lp form comma error error rp with id_cursor
                  | draw lp form error rp error id_cursor'''
@@ -291,9 +309,10 @@ def p_statement_drawing_not_arc_error(p):
         sys.stderr.write("Suggested correction: check the complete structure of the 'draw' instruction.\n")
         sys.stderr.write("Usage :\n")
         sys.stderr.write("- 'draw (<form>, <size>) with <curseur>'.\n")
-        sys.stderr.write("Forms: circle | square | line | filledcircle | filledsquare | arc.\n")
-        sys.stderr.write("Warning, 'arc' has a different usage. \n")
+        sys.stderr.write("Forms: circle | square | line | filledcircle | filledsquare | arc | path.\n")
+        sys.stderr.write("Warning, 'arc' and 'path' have a different usage. \n")
         sys.stderr.write("- 'draw (arc, <size>, <start angle>, <end angle>) with <curseur>'.\n")
+        sys.stderr.write("- 'draw (path, (<x>, <y>), (<x>, <y>), ...) with <curseur>'.\n")
         return
     
     if len(p) <= 6 and p[1] == 'draw':
@@ -301,9 +320,10 @@ def p_statement_drawing_not_arc_error(p):
         sys.stderr.write("Suggested correction: check the complete structure of the 'draw' instruction.\n")
         sys.stderr.write("Usage :\n")
         sys.stderr.write("- 'draw (<form>, <size>) with <curseur>'.\n")
-        sys.stderr.write("Forms: circle | square | line | filledcircle | filledsquare | arc.\n")
-        sys.stderr.write("Warning, 'arc' has a different usage. \n")
+        sys.stderr.write("Forms: circle | square | line | filledcircle | filledsquare | arc | path.\n")
+        sys.stderr.write("Warning, 'arc' and 'path' have a different usage. \n")
         sys.stderr.write("- 'draw (arc, <size>, <start angle>, <end angle>) with <curseur>'.\n")
+        sys.stderr.write("- 'draw (path, (<x>, <y>), (<x>, <y>), ...) with <curseur>'.\n")
         return
 
 
@@ -313,9 +333,10 @@ def p_statement_drawing_not_arc_error(p):
         sys.stderr.write("Suggested correction: check the complete structure of the 'draw' instruction.\n")
         sys.stderr.write("Usage :\n")
         sys.stderr.write("- 'draw (<form>, <size>) with <curseur>'.\n")
-        sys.stderr.write("Forms: circle | square | line | filledcircle | filledsquare | arc.\n")
-        sys.stderr.write("Warning, 'arc' has a different usage. \n")
+        sys.stderr.write("Forms: circle | square | line | filledcircle | filledsquare | arc | path.\n")
+        sys.stderr.write("Warning, 'arc' and 'path' have a different usage. \n")
         sys.stderr.write("- 'draw (arc, <size>, <start angle>, <end angle>) with <curseur>'.\n")
+        sys.stderr.write("- 'draw (path, (<x>, <y>), (<x>, <y>), ...) with <curseur>'.\n")
 
     elif len(p) >= 8 and p[5] == 'error':
         sys.stderr.write(f"Syntax error on line {line_number}: invalid or missing size for '{p[3]}'.\n")
@@ -341,24 +362,28 @@ def p_statement_drawing_not_arc_error(p):
         sys.stderr.write("Suggested correction: check the complete structure of the 'draw arc' instruction.\n")
         sys.stderr.write("Usage :\n")
         sys.stderr.write("- 'draw (arc, <size>, <start angle>, <end angle>) with <curseur>'.\n")
+        sys.stderr.write("- 'draw (path, (<x>, <y>), (<x>, <y>), ...) with <curseur>'.\n")
 
     elif len(p) == 10 and p[7] == 'error':
         sys.stderr.write(f"Syntax error on line {line_number}: invalid or missing start angle after the size.\n")
         sys.stderr.write("Suggested correction: check the complete structure of the 'draw arc' instruction.\n")
         sys.stderr.write("Usage :\n")
         sys.stderr.write("- 'draw (arc, <size>, <start angle>, <end angle>) with <curseur>'.\n")
+        sys.stderr.write("- 'draw (path, (<x>, <y>), (<x>, <y>), ...) with <curseur>'.\n")
 
     elif len(p) == 10 and p[9] == 'error':
         sys.stderr.write(f"Syntax error on line {line_number}: invalid or missing end angle after the start angle.\n")
         sys.stderr.write("Suggested correction: check the complete structure of the 'draw arc' instruction.\n")
         sys.stderr.write("Usage :\n")
         sys.stderr.write("- 'draw (arc, <size>, <start angle>, <end angle>) with <curseur>'.\n")
+        sys.stderr.write("- 'draw (path, (<x>, <y>), (<x>, <y>), ...) with <curseur>'.\n")
 
     elif len(p) == 12 and p[12] == 'error':
         sys.stderr.write(f"Syntax error on line {line_number}: invalid or missing cursor after 'with'.\n")
         sys.stderr.write("Suggested correction: check the complete structure of the 'draw arc' instruction.\n")
         sys.stderr.write("Usage :\n")
         sys.stderr.write("- 'draw (arc, <size>, <start angle>, <end angle>) with <curseur>'.\n")
+        sys.stderr.write("- 'draw (path, (<x>, <y>), (<x>, <y>), ...) with <curseur>'.\n")
 
     global_state.has_errors = True
 
@@ -419,36 +444,42 @@ def p_statement_rotation_error(p):
         sys.stderr.write(f"Syntax error on line {line_number}: Unexpected error token after 'rotate'.\n")
         sys.stderr.write("Suggested correction: Check the syntax after 'rotate'. Expected a cursor.\n")
         sys.stderr.write("Usage example: 'rotate <cursor> by <angle>'.\n")
+        global_state.has_errors = True
     
     # Case 3: 'rotate id_cursor' (cursor is missing angle or 'by')
     elif len(p) == 3 and p[2] == 'id_cursor':
         sys.stderr.write(f"Syntax error on line {line_number}: Missing angle value after cursor.\n")
         sys.stderr.write("Suggested correction: After the cursor, you must specify 'by' and an angle.\n")
         sys.stderr.write("Usage example: 'rotate <cursor> by <angle>'.\n")
+        global_state.has_errors = True
     
     # Case 4: 'rotate id_cursor error' (invalid cursor name)
     elif len(p) == 4 and p[3] == 'error':
         sys.stderr.write(f"Syntax error on line {line_number}: Invalid cursor name '{p[2]}'.\n")
         sys.stderr.write("Suggested correction: Ensure the cursor name is valid.\n")
         sys.stderr.write("Usage example: 'rotate <valid_cursor> by <angle>'.\n")
+        global_state.has_errors = True
     
     # Case 5: 'rotate id_cursor by' (missing angle after 'by')
     elif len(p) == 4 and p[3] == 'by':
         sys.stderr.write(f"Syntax error on line {line_number}: Missing angle after 'by' for cursor '{p[2]}'.\n")
         sys.stderr.write("Suggested correction: You need to provide an angle after 'by'.\n")
         sys.stderr.write("Usage example: 'rotate <cursor> by <angle>'.\n")
+        global_state.has_errors = True
     
     # Case 6: 'rotate id_cursor by error' (invalid angle after 'by')
     elif len(p) == 5 and p[4] == 'error':
         sys.stderr.write(f"Syntax error on line {line_number}: Invalid angle value for cursor '{p[2]}'.\n")
         sys.stderr.write("Suggested correction: Ensure the angle is a valid number.\n")
         sys.stderr.write("Usage example: 'rotate <cursor> by <valid_angle>'.\n")
+        global_state.has_errors = True
     
     # Case 7: 'rotate id_cursor number_or_id' (missing 'by' keyword)
     elif len(p) == 4 and p[3] != 'by':
         sys.stderr.write(f"Syntax error on line {line_number}: Missing 'by' keyword after cursor '{p[2]}'.\n")
         sys.stderr.write("Suggested correction: Include the 'by' keyword before specifying the angle.\n")
         sys.stderr.write("Usage example: 'rotate <cursor> by <angle>'.\n")
+        global_state.has_errors = True
     
     # Case 5: Command in the wrong order (rotate)
     elif len(p) == 5 and (
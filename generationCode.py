@@ -1,3 +1,34 @@
+import re
+from itertools import chain
+
+# Regular expression matching a procedure call of the parsed program (see `p_statement_call`).
+PROCEDURE_CALL = r"\bprocedure_(\w+)\(([^)]*)\);"
+
+# Size of the buffer of the generated file: the many small writes reach the disk in large blocks.
+OUTPUT_BUFFER_SIZE = 1 << 20
+
+# Function to turn the procedure calls of a parsed instruction into calls of one C function of the procedures.
+#
+# Each procedure is written as three C functions (see `generate_c_code`): `_setup` applies its
+# movements, rotations and thickness, `_selection` registers its shapes for the mouse and `_shapes`
+# queues its shapes in the current frame.
+#
+# Parameters:
+# - line: The parsed instruction, such as `procedure_tile(0, 40); // Call tile`.
+# - part: 'setup', 'selection' or 'shapes'.
+#
+# Example Usage:
+# procedure_call("procedure_tile(0, 40); // Call tile", "shapes")
+# returns "procedure_tile_shapes(renderer, pool, 0, 40); // Call tile"
+def procedure_call(line, part):
+    def replace(call):
+        arguments = ['renderer', 'pool'] if part == 'shapes' else []
+        if call.group(2):
+            arguments.append(call.group(2))
+        return f"procedure_{call.group(1)}_{part}({', '.join(arguments)});"
+    return re.sub(PROCEDURE_CALL, replace, line)
+
+
 # Function to generate C code from a parsed program.
 #
 # This function takes a parsed representation of a program and generates a C file (`generated_code.c`)
@@ -6,102 +37,288 @@
 #
 # Parameters:
 # - parsed_program: A list of strings representing the parsed lines of the program.
+# - parsed_paths: The vertex lists of the paths, in the order of their index (see `path_index`).
+# - parsed_procedures: The parameters and instructions of each procedure (see `p_statement_procedure`).
 #
 # Logic:
 # 1. Categorizes instructions into creation, movement, rotation, thickness, drawing, and animation commands.
-# 2. Extracts cursor names and creates a table for managing cursors.
+# 2. Collects the cursor creations, which fill the global `cursor_pool` (see newcursor.c), and the
+#    group creations, which fill the global `group_pool` (see group.c). The cursors are written as
+#    the constant `script_cursors` table, loaded with one copy per attribute by `loadCursorTable`,
+#    instead of one `initPooledCursor` call each.
 # 3. Writes a C file with:
 #    - Header inclusions for required modules.
-#    - Cursor creation, movement, and drawing instructions.
-#    - Animation modes for different behaviors.
-#    - A `main` function to initialize SDL, run animations, and clean up resources.
+#    - Cursor creation and movement instructions, written once in the `setupCursors` helper called
+#      by every animation mode, and the shapes to draw, written as the `script_shapes` table that
+#      `queueShapes` culls to the view of the camera (see camera.c). The vertices of the paths are
+#      written in one constant table, registered with `setShapePaths` (see geometry.c).
+#    - Three C functions per procedure, called where the script calls the procedure: `_setup` in
+#      `setupCursors`, `_selection` with the selectable shapes and `_shapes` in `queueShapes`, so
+#      the generated code grows with the procedures, not with the number of calls.
+#    - Animation modes for different behaviors. They run on a simulation thread and publish a
+#      snapshot of the cursors after each step (see simulation.c). The root groups are animated
+#      like cursors, and the cursors of the groups that changed are placed before each snapshot.
+#    - A `main` function to initialize SDL, run the selected mode with `runSimulation`, and clean up
+#      resources. The main thread queues the shapes of each snapshot between `beginDrawFrame` and
+#      `flushDrawList`, so the runtime draws them grouped by color (see drawlist.c).
 #
 # Notes:
 # - The function supports various animation modes (e.g., `animateDrawingsnail`, `animateDrawingbond`).
 # - Cursor operations like movement, rotation, and zoom are implemented for interactivity.
+# - Cursors are referenced by their index in `cursor_pool`, so the generated code declares no
+#   per-cursor variable and the per-cursor animation state is allocated on the heap.
 # - Default fallback behavior uses the `animateDrawing` function if no specific mode is set.
 # - Generated code assumes an SDL2 environment with necessary dependencies.
 #
 # Example Usage:
 # parsed_program = [
-#     "createCursor = cursor1",
-#     "drawCircle(cursor1, 50, 50, 20)",
+#     "initPooledCursor(&cursor_pool, 0, 50, 50, (SDL_Color){255, 0, 0, 255}, 1, 1); // Create cursor cursor1",
+#     "queuePooledDraw(renderer, FORM_CIRCLE, pool, 0, 20, 0, 0); // Draw a circle",
 #     "animateDrawingsnail"
 # ]
 # generate_c_code(parsed_program)
-def generate_c_code(parsed_program):
-    cursor_creation_instructions = []
-    movement_and_rotation_and_thickness_instructions = []
-    drawing_instructions = []
-    current_animation_mode = None  # Will contain the last animation mode instruction
-    cursor_names = []
-
+def generate_c_code(parsed_program, parsed_paths=(), parsed_procedures=None):
+    sections = CodeSections()
     for line in parsed_program:
-        if "createCursor" in line:
-            parts = line.split("=", 1)
-            cursor_name = parts[0].strip().split()[-1]  # Takes the last word before the "="
-            cursor_creation_instructions.append(line)
-            cursor_names.append(cursor_name)
-        elif "moveCursor" in line or "rotateCursor" in line or "setThickness" in line:
-            movement_and_rotation_and_thickness_instructions.append(line)
-        elif "drawCircle" in line or "drawSquare" in line or "drawLine" in line or "drawArc" in line or "drawFilledCircle" in line or "drawFilledSquare" in line:
-            drawing_instructions.append(line)
+        sections.add(line)
+    write_c_code(sections, parsed_paths, parsed_procedures)
+
+
+# Class to sort the instructions of a parsed program into the sections of the generated code.
+#
+# The instructions are added one at a time, so a program can be sorted while it is parsed. The
+# sections are lists, or the containers made by `new_section`, which need `append`, `len` and
+# iteration (see `SpooledSection` in streaming.py).
+#
+# Example Usage:
+# sections = CodeSections()
+# sections.add("queuePooledDraw(renderer, FORM_CIRCLE, pool, 0, 20, 0, 0); // Draw a circle")
+# write_c_code(sections)
+class CodeSections:
+    def __init__(self, new_section=list):
+        self.cursor_creation_instructions = new_section()
+        self.movement_and_rotation_and_thickness_instructions = new_section()
+        # A shape drawn several times is registered once, at its last (topmost) position: the
+        # shapes are kept in the order of their last addition
+        self.selectable_shapes = {}
+        self.script_shapes = new_section()  # Rows of the `script_shapes` table (see camera.c)
+        self.script_cursors = {}  # Rows of the `script_cursors` table, by index in the pool (see newcursor.c)
+        self.procedure_shapes = new_section()  # Procedure calls queuing shapes, with the number of table rows before them
+        self.current_animation_mode = None  # Will contain the last animation mode instruction
+
+    def add_selectable_shape(self, line):
+        self.selectable_shapes.pop(line, None)
+        self.selectable_shapes[line] = None
+
+    def add(self, line):
+        cursor = re.match(r"initPooledCursor\(&cursor_pool, (\d+), (-?\d+), (-?\d+), \(SDL_Color\)\{(-?\d+), (-?\d+), (-?\d+), (-?\d+)\}, (-?\d+), (-?\d+)\);", line)
+        if re.search(PROCEDURE_CALL, line):
+            # A procedure call is split between the setup, the selectable shapes and the frame
+            self.movement_and_rotation_and_thickness_instructions.append(procedure_call(line, 'setup'))
+            self.add_selectable_shape(procedure_call(line, 'selection'))
+            self.procedure_shapes.append((len(self.script_shapes), procedure_call(line, 'shapes')))
+        elif cursor:
+            # The cursors are created from a constant table; a re-created cursor keeps its last values
+            x, y, r, g, b, a, thickness, visible = (int(value) for value in cursor.groups()[1:])
+            color = ((r & 0xFF) << 24) | ((g & 0xFF) << 16) | ((b & 0xFF) << 8) | (a & 0xFF)
+            self.script_cursors[int(cursor.group(1))] = (x, y, color, thickness & 0xFFFF, 1 if visible else 0)
+        elif "initPooledCursor" in line or "initGroup" in line:
+            self.cursor_creation_instructions.append(line)
+        elif ("movePooledCursor" in line or "rotatePooledCursor" in line or "setPooledThickness" in line
+              or "moveGroup" in line or "rotateGroup" in line or "ToGroup" in line):
+            # Group members are added in script order, after the creations (see group.c)
+            self.movement_and_rotation_and_thickness_instructions.append(line)
+        elif "queuePooledDraw" in line:
+            # The shape is registered for selection (see spatial.c) and drawn from a table (see camera.c)
+            shape = re.match(r"queuePooledDraw\(renderer, (FORM_\w+), pool, (\d+), (-?\d+), (-?\d+), (-?\d+)\);\s*(//.*)?", line)
+            if shape:
+                self.add_selectable_shape(f"addSelectableShape({shape.group(1)}, {shape.group(2)}, {shape.group(3)});")
+                self.script_shapes.append(f"{{{shape.group(1)}, {shape.group(2)}, {shape.group(3)}, {shape.group(4)}, {shape.group(5)}}}, {shape.group(6) or ''}".rstrip())
         elif "animateDrawingsnail" in line or "animateDrawingbond" in line or "animateRotation2" in line:
-            current_animation_mode = line  # Replaces the previous mode
+            self.current_animation_mode = line  # Replaces the previous mode
 
-    cursor_table_declaration = f"Cursor* cursors[] = {{\n    " + ",\n    ".join(f"&{name}" for name in cursor_names) + "\n};"
 
-    with open("./SDL/generated_code.c", "w") as f:
+# Function to write the C file from the sections of a program (see `CodeSections`).
+#
+# Parameters:
+# - sections: The instructions of the program, sorted by `CodeSections`.
+# - parsed_paths, parsed_procedures: As for `generate_c_code`.
+def write_c_code(sections, parsed_paths=(), parsed_procedures=None):
+    cursor_creation_instructions = sections.cursor_creation_instructions
+    movement_and_rotation_and_thickness_instructions = sections.movement_and_rotation_and_thickness_instructions
+    script_shapes = sections.script_shapes
+    script_cursors = sections.script_cursors
+    procedure_shapes = sections.procedure_shapes
+    current_animation_mode = sections.current_animation_mode
+
+    with open("./SDL/generated_code.c", "w", buffering=OUTPUT_BUFFER_SIZE) as f:
+        f.write('#include "camera.h"\n')
         f.write('#include "config.h"\n')
         f.write('#include "draw.h"\n')
+        f.write('#include "drawlist.h"\n')
+        f.write('#include "geometry.h"\n')
+        f.write('#include "group.h"\n')
         f.write('#include "handle.h"\n')
-        f.write('#include "newcursor.h"\n\n')
-
-        # Writing the bounce mode
-
-
-        f.write('void animateDrawingsnail(SDL_Renderer* renderer) {\n')
-        
-        # Add instructions for creation cursor
+        f.write('#include "newcursor.h"\n')
+        f.write('#include "batch.h"\n')
+        f.write('#include "raster.h"\n')
+        f.write('#include "simulation.h"\n')
+        f.write('#include "spatial.h"\n')
+        f.write('#include "sprite.h"\n')
+        f.write('#include <stdlib.h>\n\n')
+
+        # The cursors are written as constant columns, copied into the pool in one go (see newcursor.c)
+        if script_cursors:
+            rows = [script_cursors.get(index, (0, 0, 0, 0, 0)) for index in range(max(script_cursors) + 1)]
+            columns = [  # Type, name, values and number of values per line
+                ('int', 'x', [str(row[0]) for row in rows], 16),
+                ('int', 'y', [str(row[1]) for row in rows], 16),
+                ('Uint32', 'color', [f'0x{row[2]:08X}' for row in rows], 8),
+                ('Uint16', 'thickness', [str(row[3]) for row in rows], 16),
+                ('Uint8', 'flags', ['CURSOR_VISIBLE' if row[4] else '0' for row in rows], 8),
+            ]
+            f.write('// Cursors of the script, by index in the pool: one constant array per attribute.\n')
+            for c_type, name, values, per_line in columns:
+                f.write(f'static const {c_type} script_cursor_{name}[] = {{\n')
+                for start in range(0, len(values), per_line):
+                    f.write(f'    {", ".join(values[start:start + per_line])},\n')
+                f.write('};\n')
+            f.write(f'static const CursorTable script_cursors = {{{len(rows)}, script_cursor_x, script_cursor_y, '
+                    'script_cursor_color, script_cursor_thickness, script_cursor_flags};\n\n')
+
+        # Each procedure is written once, as C functions taking its parameters
+        for name, (parameters, lines) in (parsed_procedures or {}).items():
+            setup_lines, selection_lines, shape_lines = [], [], []
+            for line in lines:
+                if re.search(PROCEDURE_CALL, line):
+                    setup_lines.append(procedure_call(line, 'setup'))
+                    selection_lines.append(procedure_call(line, 'selection'))
+                    shape_lines.append(procedure_call(line, 'shapes'))
+                elif "queuePooledDraw" in line:
+                    shape_lines.append(line)
+                    shape = re.match(r"queuePooledDraw\(renderer, (FORM_\w+), pool, (\w+), (-?\w+), ", line)
+                    if shape:
+                        selection_lines.append(f"addSelectableShape({shape.group(1)}, {shape.group(2)}, {shape.group(3)});")
+                else:
+                    setup_lines.append(line)
+            c_parameters = ', '.join(f'int arg_{parameter}' for parameter, kind in parameters)
+            header = ', '.join(f'cursor {parameter}' if kind == 'cursor' else parameter for parameter, kind in parameters)
+            f.write(f'// Procedure {name} ({header}): movements, rotations and thickness, applied by setupCursors.\n')
+            f.write(f'static void procedure_{name}_setup({c_parameters or "void"}) {{\n')
+            for line in setup_lines:
+                f.write(f'    {line}\n')
+            f.write('}\n\n')
+            f.write(f'// Procedure {name}: shapes that can be selected with the mouse, in drawing order.\n')
+            f.write(f'static void procedure_{name}_selection({c_parameters or "void"}) {{\n')
+            for line in selection_lines:
+                f.write(f'    {line}\n')
+            f.write('}\n\n')
+            f.write(f'// Procedure {name}: shapes queued in each frame, from a snapshot of the cursors.\n')
+            f.write(f'static void procedure_{name}_shapes(SDL_Renderer* renderer, const CursorPool* pool{", " if c_parameters else ""}{c_parameters}) {{\n')
+            for line in shape_lines:
+                f.write(f'    {line}\n')
+            f.write('}\n\n')
+
+        # The script instructions are written once, in helper functions shared by the animation modes.
+        f.write('// Creates the cursors of the script and applies their movements, rotations and thickness.\n')
+        f.write('static void setupCursors(void) {\n')
+        if script_cursors:
+            f.write('    loadCursorTable(&cursor_pool, &script_cursors); // Create the cursors of the script\n')
         for line in cursor_creation_instructions:
-            f.write(f"{line}\n")
-        f.write("\n")
-
-        # Add the cursor table
-        f.write(f"{cursor_table_declaration}\n\n")
-
-        # Adding rotation/movement instructions
+            f.write(f'    {line}\n')
+        f.write('\n')
         f.write('    // Movement and rotation instructions\n')
         for line in movement_and_rotation_and_thickness_instructions:
             f.write(f'    {line}\n')
+        f.write('    resolveGroupTransforms(&group_pool, &cursor_pool); // Place the cursors of the groups\n')
         f.write('\n')
+        f.write('    // Shapes that can be selected with the mouse, in drawing order\n')
+        for line in sections.selectable_shapes:
+            f.write(f'    {line}\n')
+        f.write('}\n\n')
+
+        # The vertices of all the paths are stored once, in a single constant table (see geometry.c)
+        if parsed_paths:
+            f.write('// Vertices of the paths of the script, relative to the cursor drawing them.\n')
+            f.write('static const SDL_Point path_vertices[] = {\n')
+            for index, vertices in enumerate(parsed_paths):
+                points = ', '.join(f'{{{x}, {y}}}' for x, y in vertices)
+                f.write(f'    {points}, // Path {index}\n')
+            f.write('};\n\n')
+            f.write('// Paths of the script: first vertex and number of vertices.\n')
+            f.write('static const ShapePath script_paths[] = {\n')
+            first = 0
+            for vertices in parsed_paths:
+                f.write(f'    {{path_vertices + {first}, {len(vertices)}}},\n')
+                first += len(vertices)
+            f.write('};\n\n')
+
+        # The shapes are written as a table, so only those in the view are queued (see camera.c)
+        if script_shapes:
+            f.write('// Shapes of the script, in drawing order: form, cursor, size, start and end angles.\n')
+            f.write('static const ScriptShape script_shapes[] = {\n')
+            for row in script_shapes:
+                f.write(f'    {row}\n')
+            f.write('};\n\n')
+        f.write('// Queues the shapes of the script visible in the current frame, from a snapshot of the cursors.\n')
+        f.write('static void queueShapes(SDL_Renderer* renderer, const CursorPool* pool) {\n')
+        # The rows of the table are queued in runs, between the shapes of the procedure calls
+        first_row = 0
+        for row, call in chain(procedure_shapes, [(len(script_shapes), None)]):
+            if row > first_row:
+                table = 'script_shapes' if first_row == 0 else f'script_shapes + {first_row}'
+                f.write(f'    queueVisibleShapes(renderer, pool, {table}, {row - first_row});\n')
+                first_row = row
+            if call:
+                f.write(f'    {call}\n')
+        f.write('}\n\n')
+
+        # Writing the bounce mode
+
+
+        f.write('static int animateDrawingsnail(void* data) {\n')
+        
+        f.write('    setupCursors();\n\n')
         
-        f.write('    int num_cursors = sizeof(cursors) / sizeof(cursors[0]);\n\n')
+        f.write('    int num_cursors = cursor_pool.count;\n\n')
         f.write('    // Base positions for animation\n')
-        f.write('    int base_x[num_cursors];\n')
-        f.write('    int base_y[num_cursors];\n')
-        f.write('    for (int i = 0; i < num_cursors; i++) {\n')
-        f.write('        base_x[i] = cursors[i]->x;\n')
-        f.write('        base_y[i] = cursors[i]->y;\n')
-        f.write('    }\n\n')
-        f.write('    double angles[num_cursors]; // Angles for each cursor\n')
+        f.write('    int* base_x = malloc(num_cursors * sizeof(int));\n')
+        f.write('    int* base_y = malloc(num_cursors * sizeof(int));\n')
         f.write('    for (int i = 0; i < num_cursors; i++) {\n')
-        f.write('        angles[i] = i * (2 * M_PI / num_cursors); // Distribute cursors evenly\n')
+        f.write('        base_x[i] = cursor_pool.x[i];\n')
+        f.write('        base_y[i] = cursor_pool.y[i];\n')
         f.write('    }\n\n')
+        f.write('    // Starting angle of each cursor on its path, distributed evenly\n')
+        f.write('    double* start_cos = malloc(num_cursors * sizeof(double));\n')
+        f.write('    double* start_sin = malloc(num_cursors * sizeof(double));\n')
+        f.write('    prepareSnailBatch(start_cos, start_sin, num_cursors);\n')
+        f.write('    // The root groups follow the same paths, around their pivots\n')
+        f.write('    int num_groups = group_pool.count;\n')
+        f.write('    int* group_base_x = malloc(num_groups * sizeof(int));\n')
+        f.write('    int* group_base_y = malloc(num_groups * sizeof(int));\n')
+        f.write('    for (int g = 0; g < num_groups; g++) {\n')
+        f.write('        group_base_x[g] = group_pool.x[g];\n')
+        f.write('        group_base_y[g] = group_pool.y[g];\n')
+        f.write('    }\n')
+        f.write('    double* group_start_cos = malloc(num_groups * sizeof(double));\n')
+        f.write('    double* group_start_sin = malloc(num_groups * sizeof(double));\n')
+        f.write('    prepareSnailBatch(group_start_cos, group_start_sin, num_groups);\n')
+        f.write('    double phase = 0; // Angle travelled by every cursor since the start\n\n')
         f.write('    int radius = 50; // Radius for animation\n')
         f.write('    int running = 1;\n')
         f.write('    int is_moving = 0; // Indicator for movement\n')
         f.write('    SDL_Event event;\n\n')
         f.write('    while (running) {\n')
-        f.write('        while (SDL_PollEvent(&event)) {\n')
+        f.write('        while (pollSimulationEvent(&event)) {\n')
+        f.write('            handleCameraEvent(&event); // Pan and zoom the view\n')
         f.write('            switch (event.type) {\n')
         f.write('                case SDL_QUIT:\n')
         f.write('                    running = 0;\n')
         f.write('                    break;\n\n')
         f.write('                case SDL_MOUSEBUTTONDOWN:\n')
         f.write('                    if (event.button.button == SDL_BUTTON_LEFT) {\n')
-        f.write('                        handleSelection(event.button.x, event.button.y, cursors, num_cursors);\n')
-        f.write('                        if (selected_cursor) {\n')
+        f.write('                        handlePooledSelection(event.button.x, event.button.y, &cursor_pool);\n')
+        f.write('                        if (selected_index >= 0) {\n')
         f.write('                            is_moving = 1; // Activate movement mode\n')
         f.write('                        } else {\n')
         f.write('                            is_moving = 0; // No cursor selected\n')
@@ -113,40 +330,37 @@ def generate_c_code(parsed_program):
         f.write('                    if (event.button.button == SDL_BUTTON_LEFT) {\n')
         f.write('                        is_moving = 0; // Stop movement\n\n')
         f.write('                        // Update base positions for the selected cursor\n')
-        f.write('                        if (selected_cursor) {\n')
-        f.write('                            for (int i = 0; i < num_cursors; i++) {\n')
-        f.write('                                if (cursors[i] == selected_cursor) {\n')
-        f.write('                                    base_x[i] = selected_cursor->x;\n')
-        f.write('                                    base_y[i] = selected_cursor->y;\n')
-        f.write('                                    break;\n')
-        f.write('                                }\n')
-        f.write('                            }\n')
+        f.write('                        if (selected_index >= 0) {\n')
+        f.write('                            base_x[selected_index] = cursor_pool.x[selected_index];\n')
+        f.write('                            base_y[selected_index] = cursor_pool.y[selected_index];\n')
         f.write('                        }\n')
         f.write('                    }\n')
         f.write('                    break;\n\n')
 
         f.write('                case SDL_MOUSEMOTION:\n')
-        f.write('                    if (is_moving && selected_cursor) {\n')
-        f.write('                        handleMovement(event.motion.x, event.motion.y);\n')
+        f.write('                    if (is_moving && selected_index >= 0) {\n')
+        f.write('                        handlePooledMovement(&cursor_pool, event.motion.x, event.motion.y);\n')
         f.write('                    }\n')
         f.write('                    break;\n\n')
 
         f.write('                case SDL_MOUSEWHEEL:\n')
-        f.write('                    if (selected_cursor) { // Only zoom if a cursor is selected\n')
-        f.write('                        handleZoom(event.wheel.y > 0);\n')
+        f.write('                    if (selected_index >= 0) { // Only zoom if a cursor is selected\n')
+        f.write('                        for (int notch = 0; notch < abs(event.wheel.y); notch++) { // Merged wheel events\n')
+        f.write('                            handlePooledZoom(&cursor_pool, event.wheel.y > 0);\n')
+        f.write('                        }\n')
         f.write('                    }\n')
         f.write('                    break;\n\n')
 
         f.write('                case SDL_KEYDOWN:\n')
-        f.write('                    if (selected_cursor) { // Ensure actions only apply to a selected cursor\n')
+        f.write('                    if (selected_index >= 0) { // Ensure actions only apply to a selected cursor\n')
         f.write('                        if (event.key.keysym.sym == SDLK_r) { // Rotate clockwise\n')
-        f.write('                            applyRotationToCursor(selected_cursor, 15);\n')
+        f.write('                            applyRotationToPooledCursor(&cursor_pool, selected_index, 15);\n')
         f.write('                        }\n')
         f.write('                        if (event.key.keysym.sym == SDLK_e) { // Rotate counterclockwise\n')
-        f.write('                            applyRotationToCursor(selected_cursor, -15);\n')
+        f.write('                            applyRotationToPooledCursor(&cursor_pool, selected_index, -15);\n')
         f.write('                        }\n')
         f.write('                        if (event.key.keysym.sym == SDLK_DELETE) { // Delete the selected shape\n')
-        f.write('                            handleDeletion();\n')
+        f.write('                            handlePooledDeletion(&cursor_pool);\n')
         f.write('                        }\n')
         f.write('                    }\n')
         f.write('                    break;\n\n')
@@ -156,36 +370,39 @@ def generate_c_code(parsed_program):
         f.write('            }\n')
         f.write('        }\n\n')
 
-        f.write('        SDL_SetRenderDrawColor(renderer, 0, 0, 0, 255);\n')
-        f.write('        SDL_RenderClear(renderer);\n\n')
-
-        f.write('        // Animation and display of cursors\n')
-        f.write('        for (int i = 0; i < num_cursors; i++) {\n')
-        f.write('            if (cursors[i]->visible) {\n')
-        f.write('                // Calculate the animated position\n')
-        f.write('                int anim_x = base_x[i] + radius * cos(angles[i]);\n')
-        f.write('                int anim_y = base_y[i] + radius * sin(angles[i]);\n\n')
-
-        f.write('                // Rotate the shape\n')
-        f.write('                rotateCursor(cursors[i], 10);\n\n')
-
-        f.write('                // Update animated position only if not being moved\n')
-        f.write('                if (!is_moving || cursors[i] != selected_cursor) {\n')
-        f.write('                    cursors[i]->x = anim_x;\n')
-        f.write('                    cursors[i]->y = anim_y;\n')
-        f.write('                }\n')
-        f.write('            }\n')
-        f.write('            // Advance the angle for animation\n')
-        f.write('            angles[i] += 0.05;\n')
+        f.write('        // Animation of cursors, all at once (see batch.c)\n')
+        f.write('        int held = is_moving && selected_index >= 0; // The cursor being moved keeps its position\n')
+        f.write('        int held_x = held ? cursor_pool.x[selected_index] : 0;\n')
+        f.write('        int held_y = held ? cursor_pool.y[selected_index] : 0;\n')
+        f.write('        updateSnailBatch(cursor_pool.x, cursor_pool.y, cursor_pool.flags, base_x, base_y,\n')
+        f.write('                         start_cos, start_sin, num_cursors, radius, phase);\n')
+        f.write('        rotateBatch(cursor_pool.angle, cursor_pool.flags, num_cursors, 10);\n')
+        f.write('        updateSnailBatch(group_pool.x, group_pool.y, group_pool.flags, group_base_x, group_base_y,\n')
+        f.write('                         group_start_cos, group_start_sin, num_groups, radius, phase);\n')
+        f.write('        rotateBatch(group_pool.angle, group_pool.flags, num_groups, 10);\n')
+        f.write('        invalidateGroupTransforms(&group_pool); // The groups moved\n')
+        f.write('        resolveGroupTransforms(&group_pool, &cursor_pool);\n')
+        f.write('        if (held) {\n')
+        f.write('            cursor_pool.x[selected_index] = held_x;\n')
+        f.write('            cursor_pool.y[selected_index] = held_y;\n')
         f.write('        }\n')
+        f.write('        invalidateSpatialGrid(); // The cursors moved\n')
+        f.write('        // Advance the angle for animation\n')
+        f.write('        phase += 0.05;\n\n')
 
-        for line in drawing_instructions:
-            f.write(f'{line}\n')
-        f.write('\n')
-
-        f.write('        SDL_RenderPresent(renderer);\n')
+        f.write('        // Hand the new state of the cursors to the render thread\n')
+        f.write('        publishCursorSnapshot(&cursor_pool);\n')
         f.write('        SDL_Delay(50);\n')
-        f.write('    }\n')
+        f.write('    }\n\n')
+        f.write('    free(base_x);\n')
+        f.write('    free(base_y);\n')
+        f.write('    free(start_cos);\n')
+        f.write('    free(start_sin);\n')
+        f.write('    free(group_base_x);\n')
+        f.write('    free(group_base_y);\n')
+        f.write('    free(group_start_cos);\n')
+        f.write('    free(group_start_sin);\n')
+        f.write('    return 0;\n')
         f.write('}\n\n')
 
 
@@ -195,87 +412,85 @@ def generate_c_code(parsed_program):
 
         # Writing the bounce mode
 
-        f.write('void animateDrawingbond(SDL_Renderer* renderer) {\n')
+        f.write('static int animateDrawingbond(void* data) {\n')
         
-        #Add the cursor creation instructions
-        for line in cursor_creation_instructions:
-            f.write(f"{line}\n")
-        f.write("\n")
-
-        # Add the cursor table
-        f.write(f"{cursor_table_declaration}\n\n")
+        f.write('    setupCursors();\n\n')
 
-        #Adding rotation/movement instructions
-        f.write('    // Movement instructions and rotation instructions\n')
-        for line in movement_and_rotation_and_thickness_instructions:
-            f.write(f'    {line};\n')
-        f.write('\n')
-
-        f.write('    int num_cursors = sizeof(cursors) / sizeof(cursors[0]);\n\n')
+        f.write('    int num_cursors = cursor_pool.count;\n\n')
         f.write('    // Initialize individual speeds for each cursor\n')
-        f.write('    int dx[num_cursors];\n')
-        f.write('    int dy[num_cursors];\n')
+        f.write('    int* dx = malloc(num_cursors * sizeof(int));\n')
+        f.write('    int* dy = malloc(num_cursors * sizeof(int));\n')
         f.write('    for (int i = 0; i < num_cursors; i++) {\n')
         f.write('        dx[i] = (i % 2 == 0) ? 5 : -5;  // Alternating initial direction\n')
         f.write('        dy[i] = (i % 2 == 0) ? 5 : -5;\n')
+        f.write('    }\n')
+        f.write('    // The root groups bounce like cursors\n')
+        f.write('    int num_groups = group_pool.count;\n')
+        f.write('    int* group_dx = malloc(num_groups * sizeof(int));\n')
+        f.write('    int* group_dy = malloc(num_groups * sizeof(int));\n')
+        f.write('    for (int g = 0; g < num_groups; g++) {\n')
+        f.write('        group_dx[g] = (g % 2 == 0) ? 5 : -5;\n')
+        f.write('        group_dy[g] = (g % 2 == 0) ? 5 : -5;\n')
         f.write('    }\n\n')
         f.write('    int running = 1;\n')
         f.write('    SDL_Event event;\n\n')
         f.write('    while (running) {\n')
-        f.write('        while (SDL_PollEvent(&event)) {\n')
+        f.write('        while (pollSimulationEvent(&event)) {\n')
+        f.write('            handleCameraEvent(&event); // Pan and zoom the view\n')
         f.write('            switch (event.type) {\n')
         f.write('                case SDL_QUIT:\n')
         f.write('                    running = 0;\n')
         f.write('                    break;\n')
         f.write('                case SDL_MOUSEBUTTONDOWN:\n')
         f.write('                    if (event.button.button == SDL_BUTTON_LEFT) {\n')
-        f.write('                        handleSelection(event.button.x, event.button.y, cursors, num_cursors);\n')
+        f.write('                        handlePooledSelection(event.button.x, event.button.y, &cursor_pool);\n')
         f.write('                    }\n')
         f.write('                    break;\n')
         f.write('                case SDL_MOUSEMOTION:\n')
         f.write('                    if (event.motion.state & SDL_BUTTON_LMASK) {\n')
-        f.write('                        handleMovement(event.motion.x, event.motion.y);\n')
+        f.write('                        handlePooledMovement(&cursor_pool, event.motion.x, event.motion.y);\n')
         f.write('                    }\n')
         f.write('                    break;\n')
         f.write('                case SDL_MOUSEWHEEL:\n')
-        f.write('                    handleZoom(event.wheel.y > 0);\n')
+        f.write('                    for (int notch = 0; notch < abs(event.wheel.y); notch++) { // Merged wheel events\n')
+        f.write('                        handlePooledZoom(&cursor_pool, event.wheel.y > 0);\n')
+        f.write('                    }\n')
         f.write('                    break;\n')
         f.write('                case SDL_KEYDOWN:\n')
         f.write('                    if (event.key.keysym.sym == SDLK_r) {\n')
-        f.write('                        applyRotationToCursor(selected_cursor, 15);\n')
+        f.write('                        applyRotationToPooledCursor(&cursor_pool, selected_index, 15);\n')
         f.write('                    }\n')
         f.write('                    if (event.key.keysym.sym == SDLK_e) {\n')
-        f.write('                        applyRotationToCursor(selected_cursor, -15);\n')
+        f.write('                        applyRotationToPooledCursor(&cursor_pool, selected_index, -15);\n')
         f.write('                    }\n')
         f.write('                    if (event.key.keysym.sym == SDLK_DELETE) {\n')
-        f.write('                        handleDeletion();\n')
+        f.write('                        handlePooledDeletion(&cursor_pool);\n')
         f.write('                    }\n')
         f.write('                    break;\n')
         f.write('                default:\n')
         f.write('                    break;\n')
         f.write('            }\n')
         f.write('        }\n\n')
-        f.write('        SDL_SetRenderDrawColor(renderer, 0, 0, 0, 255);\n')
-        f.write('        SDL_RenderClear(renderer);\n\n')
-        f.write('        for (int i = 0; i < num_cursors; i++) {\n')
-        f.write('            if (cursors[i]->visible) {\n')
-        f.write('                if (cursors[i]->x <= 0 || cursors[i]->x >= SCREEN_WIDTH) dx[i] = -dx[i];\n')
-        f.write('                if (cursors[i]->y <= 0 || cursors[i]->y >= SCREEN_HEIGHT) dy[i] = -dy[i];\n\n')
-        f.write('                cursors[i]->x += dx[i];\n')
-        f.write('                cursors[i]->y += dy[i];\n\n')
-        f.write('                rotateCursor(cursors[i], 10);\n')
-        f.write('           }\n')
-        f.write('       }\n')
+        f.write('        // Bounce and rotate the cursors, all at once (see batch.c)\n')
+        f.write('        updateBounceBatch(cursor_pool.x, cursor_pool.y, dx, dy, cursor_pool.flags, num_cursors,\n')
+        f.write('                          SCREEN_WIDTH, SCREEN_HEIGHT);\n')
+        f.write('        rotateBatch(cursor_pool.angle, cursor_pool.flags, num_cursors, 10);\n')
+        f.write('        updateBounceBatch(group_pool.x, group_pool.y, group_dx, group_dy, group_pool.flags, num_groups,\n')
+        f.write('                          SCREEN_WIDTH, SCREEN_HEIGHT);\n')
+        f.write('        rotateBatch(group_pool.angle, group_pool.flags, num_groups, 10);\n')
+        f.write('        invalidateGroupTransforms(&group_pool); // The groups moved\n')
+        f.write('        resolveGroupTransforms(&group_pool, &cursor_pool);\n')
+        f.write('        invalidateSpatialGrid(); // The cursors moved\n\n')
         
-        f.write('        // Drawing instructions\n')
-        for line in drawing_instructions:
-            f.write(f'        {line};\n')
-        f.write('\n')
-
-    
-        f.write('        SDL_RenderPresent(renderer);\n')
+        f.write('        // Hand the new state of the cursors to the render thread\n')
+        f.write('        publishCursorSnapshot(&cursor_pool);\n')
         f.write('        SDL_Delay(100);\n')
-        f.write('        }\n')
+        f.write('        }\n\n')
+        f.write('    free(dx);\n')
+        f.write('    free(dy);\n')
+        f.write('    free(group_dx);\n')
+        f.write('    free(group_dy);\n')
+        f.write('    return 0;\n')
         f.write('    }\n\n\n')
 
 
@@ -285,78 +500,63 @@ def generate_c_code(parsed_program):
 
         # Adding function Rotation2
 
-        f.write('void animateRotation2(SDL_Renderer* renderer) {\n')
+        f.write('static int animateRotation2(void* data) {\n')
         f.write('    // Defining cursors with different drawing types\n')
         
-        # adding instructions cursor creation
-        for line in cursor_creation_instructions:
-            f.write(f"{line}\n")
-        f.write("\n")
-
-        # Adding cursor table
-        f.write(f"{cursor_table_declaration}\n\n")
-
-        #Adding rotation / movement instructions
-        f.write('    // movement and rotation instructions\n')
-        for line in movement_and_rotation_and_thickness_instructions:
-            f.write(f'    {line}\n')
-        f.write('\n')
+        f.write('    setupCursors();\n\n')
 
-        f.write('    int num_cursors = sizeof(cursors) / sizeof(cursors[0]);\n\n')
+        f.write('    int num_cursors = cursor_pool.count;\n\n')
         f.write('    int running = 1;\n')
         f.write('    SDL_Event event;\n\n')
         f.write('    while (running) {\n')
-        f.write('        while (SDL_PollEvent(&event)) {\n')
+        f.write('        while (pollSimulationEvent(&event)) {\n')
+        f.write('            handleCameraEvent(&event); // Pan and zoom the view\n')
         f.write('            switch (event.type) {\n')
         f.write('                case SDL_QUIT:\n')
         f.write('                    running = 0;\n')
         f.write('                    break;\n')
         f.write('                case SDL_MOUSEBUTTONDOWN:\n')
         f.write('                    if (event.button.button == SDL_BUTTON_LEFT) {\n')
-        f.write('                        handleSelection(event.button.x, event.button.y, cursors, num_cursors);\n')
+        f.write('                        handlePooledSelection(event.button.x, event.button.y, &cursor_pool);\n')
         f.write('                    }\n')
         f.write('                    break;\n')
         f.write('                case SDL_MOUSEMOTION:\n')
         f.write('                    if (event.motion.state & SDL_BUTTON_LMASK) {\n')
-        f.write('                        handleMovement(event.motion.x, event.motion.y);\n')
+        f.write('                        handlePooledMovement(&cursor_pool, event.motion.x, event.motion.y);\n')
         f.write('                    }\n')
         f.write('                    break;\n')
         f.write('                case SDL_MOUSEWHEEL:\n')
-        f.write('                    handleZoom(event.wheel.y > 0);\n')
+        f.write('                    for (int notch = 0; notch < abs(event.wheel.y); notch++) { // Merged wheel events\n')
+        f.write('                        handlePooledZoom(&cursor_pool, event.wheel.y > 0);\n')
+        f.write('                    }\n')
         f.write('                    break;\n')
         f.write('                case SDL_KEYDOWN:\n')
         f.write('                    if (event.key.keysym.sym == SDLK_r) {\n')
-        f.write('                        applyRotationToCursor(selected_cursor, 15);\n')
+        f.write('                        applyRotationToPooledCursor(&cursor_pool, selected_index, 15);\n')
         f.write('                    }\n')
         f.write('                    if (event.key.keysym.sym == SDLK_e) {\n')
-        f.write('                        applyRotationToCursor(selected_cursor, -15);\n')
+        f.write('                        applyRotationToPooledCursor(&cursor_pool, selected_index, -15);\n')
         f.write('                    }\n')
         f.write('                    if (event.key.keysym.sym == SDLK_DELETE) {\n')
-        f.write('                        handleDeletion();\n')
+        f.write('                        handlePooledDeletion(&cursor_pool);\n')
         f.write('                    }\n')
         f.write('                    break;\n')
         f.write('                default:\n')
         f.write('                    break;\n')
         f.write('            }\n')
         f.write('        }\n\n')
-        f.write('        // Clear the screen\n')
-        f.write('        SDL_SetRenderDrawColor(renderer, 0, 0, 0, 255);\n')
-        f.write('        SDL_RenderClear(renderer);\n\n')
-        f.write('        // Draw the shapes in rotation\n')
-        f.write('        for (int i = 0; i < num_cursors; i++) {\n')
-        f.write('            if (cursors[i]->visible) {\n')
-        f.write('                rotateCursor2(cursors[i], 10); // Specific rotation for animateRotation2\n\n')
-        f.write('            }\n')
-        f.write('        }\n')
-
-        f.write('        // Drawing instructions \n')
-        for line in drawing_instructions:
-            f.write(f'        {line};\n')
-        f.write('\n')
-
-        f.write('        SDL_RenderPresent(renderer);\n')
+        f.write('        // Rotate the shapes\n')
+        f.write('        rotateBatch(cursor_pool.angle, cursor_pool.flags, num_cursors, 10); // Same as rotatePooledCursor2 on every cursor\n')
+        f.write('        rotateBatch(group_pool.angle, group_pool.flags, group_pool.count, 10); // The groups turn around their pivots\n')
+        f.write('        invalidateGroupTransforms(&group_pool);\n')
+        f.write('        resolveGroupTransforms(&group_pool, &cursor_pool);\n')
+        f.write('        invalidateSpatialGrid(); // The shapes turned\n\n')
+
+        f.write('        // Hand the new state of the cursors to the render thread\n')
+        f.write('        publishCursorSnapshot(&cursor_pool);\n')
         f.write('        SDL_Delay(100);\n')
         f.write('    }\n')
+        f.write('    return 0;\n')
         f.write('}\n\n')  
 
 
@@ -365,54 +565,43 @@ def generate_c_code(parsed_program):
 
 
         # Addind function animateDrawing
-        f.write('void animateDrawing(SDL_Renderer* renderer) {\n')
-
-        #adding functions cursor rotation
-        for line in cursor_creation_instructions:
-            f.write(f"{line}\n")
-        f.write("\n")
-
-        # Adding the cursor table
-        f.write(f"{cursor_table_declaration}\n\n")
-
-        #Adding rotation/movement instructions
-        f.write('    // movement and rotation instructions \n')
-        for line in movement_and_rotation_and_thickness_instructions:
-            f.write(f'    {line}\n')
-        f.write('\n')
+        f.write('static int animateDrawing(void* data) {\n')
 
-        f.write('    int num_cursors = sizeof(cursors) / sizeof(cursors[0]);\n\n')
+        f.write('    setupCursors();\n\n')
 
         f.write('    int running = 1;\n')
         f.write('    while (running) {\n')
         f.write('        SDL_Event event;\n')
-        f.write('        while (SDL_PollEvent(&event)) {\n')
+        f.write('        while (pollSimulationEvent(&event)) {\n')
+        f.write('            handleCameraEvent(&event); // Pan and zoom the view\n')
         f.write('            switch (event.type) {\n')
         f.write('                case SDL_QUIT:\n')
         f.write('                    running = 0;\n')
         f.write('                    break;\n')
         f.write('                case SDL_MOUSEBUTTONDOWN:\n')
         f.write('                    if (event.button.button == SDL_BUTTON_LEFT) {\n')
-        f.write('                        handleSelection(event.button.x, event.button.y, cursors, num_cursors);\n')
+        f.write('                        handlePooledSelection(event.button.x, event.button.y, &cursor_pool);\n')
         f.write('                    }\n')
         f.write('                    break;\n')
         f.write('                case SDL_MOUSEMOTION:\n')
         f.write('                    if (event.motion.state & SDL_BUTTON_LMASK) {\n')
-        f.write('                        handleMovement(event.motion.x, event.motion.y);\n')
+        f.write('                        handlePooledMovement(&cursor_pool, event.motion.x, event.motion.y);\n')
         f.write('                    }\n')
         f.write('                    break;\n')
         f.write('                case SDL_MOUSEWHEEL:\n')
-        f.write('                    handleZoom(event.wheel.y > 0);\n')
+        f.write('                    for (int notch = 0; notch < abs(event.wheel.y); notch++) { // Merged wheel events\n')
+        f.write('                        handlePooledZoom(&cursor_pool, event.wheel.y > 0);\n')
+        f.write('                    }\n')
         f.write('                    break;\n')
         f.write('                case SDL_KEYDOWN:\n')
         f.write('                    if (event.key.keysym.sym == SDLK_r) { // Rotate clockwise when \'R\' is pressed.\n')
-        f.write('                        applyRotationToCursor(selected_cursor, 15);\n')
+        f.write('                        applyRotationToPooledCursor(&cursor_pool, selected_index, 15);\n')
         f.write('                    }\n')
         f.write('                    if (event.key.keysym.sym == SDLK_e) { // Rotate counterclockwise when \'E\' is pressed.\n')
-        f.write('                        applyRotationToCursor(selected_cursor, -15);\n')
+        f.write('                        applyRotationToPooledCursor(&cursor_pool, selected_index, -15);\n')
         f.write('                    }\n')
         f.write('                    if (event.key.keysym.sym == SDLK_DELETE) { // Delete the selected shape.\n')
-        f.write('                        handleDeletion();\n')
+        f.write('                        handlePooledDeletion(&cursor_pool);\n')
         f.write('                    }\n')
         f.write('                    break;\n')
         f.write('                default:\n')
@@ -420,17 +609,12 @@ def generate_c_code(parsed_program):
         f.write('            }\n')
         f.write('        }\n\n')
 
-        f.write('        // Clear the screen\n')
-        f.write('        SDL_SetRenderDrawColor(renderer, 0, 0, 0, 255);\n')
-        f.write('        SDL_RenderClear(renderer);\n\n')
-
-        f.write('        // Drawing instructions\n')
-        for line in drawing_instructions:
-            f.write(f'        {line};\n')
-        f.write('\n')
-
-        f.write('        SDL_RenderPresent(renderer);\n')
+        f.write('        // Hand the state of the cursors to the render thread\n')
+        f.write('        resolveGroupTransforms(&group_pool, &cursor_pool); // Only the groups that changed\n')
+        f.write('        publishCursorSnapshot(&cursor_pool);\n')
+        f.write('        SDL_Delay(16);\n')
         f.write('    }\n')
+        f.write('    return 0;\n')
         f.write('}\n\n')
 
         # Adding the main
@@ -456,15 +640,28 @@ def generate_c_code(parsed_program):
         f.write('        return 1;\n')
         f.write('    }\n\n')
 
+        if parsed_paths:
+            f.write('    // Paths drawn by the script\n')
+            f.write(f'    setShapePaths(script_paths, {len(parsed_paths)});\n\n')
+
         # Adding animation mode
-        f.write('    // Animation mode\n')
+        # The animation mode runs on the simulation thread, the main thread draws its snapshots
+        animation_function = "animateDrawing"
         if current_animation_mode:
-            f.write(f"    {current_animation_mode}\n\n")
-        else:
-            f.write(f"      animateDrawing(renderer);")
+            animation_function = current_animation_mode.split("(")[0].strip()
+        f.write('    // Animation mode\n')
+        f.write(f"    runSimulation(renderer, {animation_function}, queueShapes);\n\n")
 
 
         f.write('    // Clean up and exit\n')
+        f.write('    clearGeometryCache();\n')
+        f.write('    clearSpriteCache();\n')
+        f.write('    clearLayerCache();\n')
+        f.write('    closeRasterBackend();\n')
+        f.write('    clearSpatialGrid();\n')
+        f.write('    clearViewCulling();\n')
+        f.write('    freeCursorPool(&cursor_pool);\n')
+        f.write('    freeGroupPool(&group_pool);\n')
         f.write('    SDL_DestroyRenderer(renderer);\n')
         f.write('    SDL_DestroyWindow(window);\n')
         f.write('    SDL_Quit();\n\n')
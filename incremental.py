@@ -0,0 +1,337 @@
+import hashlib
+import io
+import marshal
+import os
+import re
+import sys
+from parser import *
+from tokeniser import *
+from state import global_state
+
+# Module to check a script statement by statement, reusing the results of the statements that
+# did not change since the previous check.
+#
+# Checking a script (`python main.py --check <file>`) parses it for its diagnostics without
+# running it. The source is split at the lines starting a top-level statement, and each chunk is
+# parsed in place (the positions, so the line numbers, stay those of the whole file). A chunk
+# changes the tables filled while parsing (`SYMBOL_TABLES`) and writes diagnostics: both are
+# stored in a cache, keyed by the hash of the text of the chunk, the values of the number
+# variables it names, and a fingerprint of the other contents of the tables before it. On the next
+# check, a chunk found in the cache is not parsed: its changes to the tables are replayed in
+# order, and its diagnostics are written again, moved to its new line.
+#
+# Logic:
+# 1. `split_statements` finds the chunks.
+# 2. `check_script` looks up each chunk in the cache and replays its changes.
+# 3. A chunk that is not found is parsed; its changes (`table_changes`) and diagnostics are stored.
+#    From the first chunk with errors, the rest of the script is parsed at once, as by a run: the
+#    parser recovers from a syntax error by skipping tokens, over the statements after it.
+# 4. The fingerprint after a chunk is computed from the fingerprint before it and the changes of
+#    the chunk, without the values of the number variables. Editing a statement that declares
+#    nothing (a shape, a move, a new value...) keeps the following chunks in the cache, except
+#    the ones reading a variable whose value changed.
+#
+# Notes:
+# - The cache is stored in `__pycache__/checks`, one file per script, with the entries used by the
+#   last check. It is discarded when the compiler changes (`COMPILER_VERSION`).
+# - Only the diagnostics are checked: running the script still parses it entirely, since the
+#   actions built by the parser are nested functions, which cannot be stored.
+# - The rest of the script after a syntax error is stored as one entry, parsed again when any of
+#   its statements changes.
+#
+# Example Usage:
+# has_errors = check_script(parser, data, file_path)
+
+# Tables filled while parsing, whose changes are replayed for the chunks found in the cache.
+SYMBOL_TABLES = {
+    'variables_cursor': variables_cursor,
+    'cursor_positions': cursor_positions,
+    'cursor_slots': cursor_slots,
+    'variables_number': variables_number,
+    'variables_group': variables_group,
+    'cursor_arrays': cursor_arrays,
+    'variables_procedure': variables_procedure,
+    'cursor_parameters': cursor_parameters,
+    'procedure_parameters': procedure_parameters,
+    'script_paths': script_paths,
+    'script_procedures': script_procedures,
+    'procedure_signatures': procedure_signatures,
+    'group_parents': group_parents,
+    'procedure_stack': procedure_stack,
+}
+
+# First word of a line starting a top-level statement: a keyword, or a variable followed by `=`.
+STATEMENT_START = re.compile(r'\s*(?:(?:draw|move|rotate|set|add|mode|if|for|while|procedure|call)\b|[a-zA-Z][a-zA-Z0-9_]*\s*=)')
+BLOCK_WORD = re.compile(r'\b(?:if|while|for|procedure|fi|end|rof)\b')
+BLOCK_CLOSERS = ('fi', 'end', 'rof')
+IDENTIFIER = re.compile(r'[a-zA-Z][a-zA-Z0-9_]*')
+LINE_NUMBER = re.compile(r"(on line '?)(\d+)")
+
+CACHE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '__pycache__', 'checks')
+
+
+# Function to compute the version of the compiler, the hash of the modules producing a result.
+#
+# Parameters:
+# - modules: The file names of the modules, next to this one.
+def compiler_version(*modules):
+    digest = hashlib.sha256()
+    for module in modules:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), module), 'rb') as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+COMPILER_VERSION = compiler_version('tokeniser.py', 'parser.py', 'error.py', 'descent.py', 'incremental.py')  # Modules producing the diagnostics
+
+
+# Function to group the lines of a script into chunks of top-level statements.
+#
+# Parameters:
+# - lines: The lines of the script with their line endings, as a list or an open file.
+#
+# Returns:
+# - A generator of the chunks, as (line, lines): the number of their first line and their lines.
+#
+# Logic:
+# - A chunk ends before a line starting a statement, if no block (`if`, `while`, `for`,
+#   `procedure`) and no parenthesis is open at that line. Blank and comment lines stay with the
+#   statement before them.
+#
+# Notes:
+# - Only the lines of the current chunk are kept, so a file is read as the chunks are used (see
+#   streaming.py).
+def statement_lines(lines):
+    chunk = []
+    depth = parentheses = 0
+    start_line = 1
+    for line_number, line in enumerate(lines, 1):
+        code = line.split('#', 1)[0]
+        if chunk and depth == 0 and parentheses <= 0 and STATEMENT_START.match(code):
+            yield start_line, chunk
+            chunk, start_line = [], line_number
+        for word in BLOCK_WORD.findall(code):
+            depth = max(depth - 1, 0) if word in BLOCK_CLOSERS else depth + 1  # A stray `end` closes nothing
+        parentheses += code.count('(') - code.count(')')
+        chunk.append(line)
+    if chunk:
+        yield start_line, chunk
+
+
+# Function to split a source into chunks of top-level statements (see `statement_lines`).
+#
+# Parameters:
+# - source: The text of the script.
+#
+# Returns:
+# - The list of the chunks, as (start, end, line): their offsets in the source and their first line.
+#
+# Example Usage:
+# `split_statements("x = 1\nwhile x < 3 do\nx = x + 1\nend\n")` returns `[(0, 6, 1), (6, 35, 2)]`.
+def split_statements(source):
+    chunks = []
+    offset = 0
+    for line, lines in statement_lines(source.splitlines(keepends=True)):
+        end = offset + sum(map(len, lines))
+        chunks.append((offset, end, line))
+        offset = end
+    return chunks
+
+
+# Function to move the line numbers of diagnostics, written for a chunk at another line.
+def shift_lines(diagnostics, shift):
+    return LINE_NUMBER.sub(lambda match: f"{match.group(1)}{int(match.group(2)) + shift}", diagnostics)
+
+
+# Function to describe the changes made to the symbol tables since a copy of them.
+#
+# Parameters:
+# - before: The copies of the tables, by name (see `copy_tables`).
+#
+# Returns:
+# - A tuple of (name, change) pairs for the tables that changed, where a change is:
+#   - for a dictionary, the new or changed items and the removed keys;
+#   - for a set, the added and removed names, sorted;
+#   - for a list, the items appended, or the whole list if it changed otherwise.
+# - The same changes without the values of the number variables, only the names declared or
+#   removed, for the fingerprint.
+def table_changes(before):
+    changes = []
+    declarations = []
+    for name, table in SYMBOL_TABLES.items():
+        previous = before[name]
+        if table == previous:
+            continue
+        if isinstance(table, dict):
+            changed = {key: value for key, value in table.items() if key not in previous or previous[key] != value}
+            change = ('items', changed, [key for key in previous if key not in table])
+        elif isinstance(table, set):
+            change = ('names', sorted(table - previous), sorted(previous - table))
+        elif table[:len(previous)] == previous:
+            change = ('extend', table[len(previous):])
+        else:
+            change = ('replace', list(table))
+        changes.append((name, change))
+        if table is variables_number:
+            change = ('names', [key for key in table if key not in previous], change[2])
+            if not change[1] and not change[2]:
+                continue  # Only new values
+        declarations.append((name, change))
+    return tuple(changes), tuple(declarations)
+
+
+# Function to replay the changes of a chunk found in the cache (see `table_changes`).
+def apply_changes(changes):
+    for name, (kind, *change) in changes:
+        table = SYMBOL_TABLES[name]
+        if kind == 'items':
+            changed, removed = change
+            for key in removed:
+                del table[key]
+            table.update(changed)
+        elif kind == 'names':
+            added, removed = change
+            table.difference_update(removed)
+            table.update(added)
+        elif kind == 'extend':
+            table.extend(change[0])
+        else:
+            table[:] = change[0]
+
+
+def copy_tables():
+    return {name: table.copy() for name, table in SYMBOL_TABLES.items()}
+
+
+# Function to put back the tables copied by `copy_tables`.
+def restore_tables(tables):
+    for name, table in SYMBOL_TABLES.items():
+        if isinstance(table, list):
+            table[:] = tables[name]
+        else:
+            table.clear()
+            table.update(tables[name])
+
+
+# Function to parse a chunk in place, in the whole source given to the lexer.
+#
+# Returns:
+# - The entry of the chunk in the cache: its changes to the tables (see `table_changes`), the
+#   diagnostics it wrote, its first line, whether it has errors, and the fingerprint after it.
+#
+# Notes:
+# - The diagnostics are written by the caller, or here if the parse is stopped (by the watchdog...).
+def parse_chunk(parser, source, start, end, line, fingerprint):
+    before = copy_tables()
+    del parsed_data_c[:]  # The C instructions written while parsing are not kept by a check
+    global_state.has_errors = False
+    lexer.input(source)
+    lexer.lexpos, lexer.lexlen = start, end
+    stderr, sys.stderr = sys.stderr, io.StringIO()
+    try:
+        parser.parse(lexer=lexer, tracking=True)
+    except BaseException:
+        stderr.write(sys.stderr.getvalue())
+        raise
+    finally:
+        diagnostics, sys.stderr = sys.stderr.getvalue(), stderr
+    changes, declarations = table_changes(before)
+    if declarations:
+        fingerprint = hashlib.blake2b(f'{fingerprint}{declarations!r}'.encode(), digest_size=16).hexdigest()
+    return changes, diagnostics, line, global_state.has_errors, fingerprint
+
+
+# Function to compute the key of a chunk in the cache, from its text and the state before it.
+def chunk_key(text, fingerprint):
+    # A chunk only reads the values of the number variables it names
+    values = [(name, variables_number[name]) for name in sorted(set(IDENTIFIER.findall(text))) if name in variables_number]
+    return hashlib.blake2b(f'{text}{values!r}'.encode(), digest_size=16).hexdigest() + fingerprint
+
+
+# Function to write the diagnostics of an entry, and to replay its changes to the tables if it
+# comes from the cache.
+def replay_entry(entry, line, cached):
+    changes, diagnostics, cached_line, _, _ = entry
+    if diagnostics and cached_line != line:
+        diagnostics = shift_lines(diagnostics, line - cached_line)
+    sys.stderr.write(diagnostics)
+    if cached:
+        apply_changes(changes)
+
+
+def cache_path(file_path):
+    key = hashlib.sha256(os.path.abspath(file_path).encode()).hexdigest()[:32]
+    return os.path.join(CACHE_DIRECTORY, f'{key}.{sys.implementation.cache_tag}.bin')
+
+
+def load_cache(file_path):
+    try:
+        with open(cache_path(file_path), 'rb') as file:
+            version, entries = marshal.load(file)
+    except (OSError, EOFError, ValueError, TypeError):
+        return {}
+    return entries if version == COMPILER_VERSION else {}
+
+
+def save_cache(file_path, entries):
+    path = cache_path(file_path)
+    try:
+        os.makedirs(CACHE_DIRECTORY, exist_ok=True)
+        with open(path + '.tmp', 'wb') as file:
+            marshal.dump((COMPILER_VERSION, entries), file)
+        os.replace(path + '.tmp', path)  # Never leaves a partly written file
+    except OSError:
+        pass  # The next check parses the whole script again
+
+
+# Function to check a script, parsing only the chunks that are not in the cache.
+#
+# Parameters:
+# - parser: The parser built by `yacc()`.
+# - source: The text of the script.
+# - file_path: The path of the script, which names its cache.
+#
+# Returns:
+# - `True` if the script has errors. The diagnostics are written to the standard error stream,
+#   and the symbol tables hold the state after the whole script.
+def check_script(parser, source, file_path):
+    cache = load_cache(file_path)
+    used_entries = {}
+    fingerprint = 'start'
+    has_errors = False
+    parsed_count = 0
+    chunks = split_statements(source) or [(0, len(source), 1)]  # An empty script is an error too
+
+    for index, (start, end, line) in enumerate(chunks):
+        key = chunk_key(source[start:end], fingerprint)
+        entry = cache.get(key)
+        parsed = entry is None
+        if parsed:
+            tables = copy_tables()
+            entry = parse_chunk(parser, source, start, end, line, fingerprint)
+            if entry[3]:
+                restore_tables(tables)  # Replaced by the parse of the rest of the script
+        used_entries[key] = entry
+
+        if entry[3]:
+            # The diagnostics of a run: the rest of the script, parsed at once
+            key = chunk_key(source[start:], fingerprint)
+            entry = cache.get(key)
+            parsed = entry is None
+            if parsed:
+                entry = parse_chunk(parser, source, start, len(source), line, fingerprint)
+                parsed_count += len(chunks) - index
+            used_entries[key] = entry
+            replay_entry(entry, line, not parsed)
+            has_errors = True
+            break
+
+        parsed_count += parsed
+        replay_entry(entry, line, not parsed)
+        fingerprint = entry[4]
+
+    global_state.has_errors = has_errors
+    if parsed_count or len(used_entries) != len(cache):
+        save_cache(file_path, used_entries)
+    print(f"Checked {len(chunks)} statements ({parsed_count} parsed, {len(chunks) - parsed_count} from the cache).")
+    return has_errors
@@ -0,0 +1,152 @@
+import hashlib
+import marshal
+import os
+import sys
+import time
+from incremental import compiler_version
+from state import global_state
+
+# Module to store the optimized program of a script, so an unchanged script skips the parsing.
+#
+# Running a script tokenizes, parses and runs it, then optimizes the C instructions it wrote,
+# before the generation of the C code. For the same source and the same compiler, the result is
+# always the same: the optimized instructions (with the creations of the cursors and the
+# animation mode), the paths and procedures of the script, the report of the optimization passes,
+# the variables left by the run and the warnings written to the standard error stream. This
+# module stores them with `marshal` in `__pycache__/programs`, keyed by the hash of the source
+# and of the compiler, and loads them instead of parsing the script again.
+#
+# Logic:
+# 1. `load_program` looks for the entry of the source. An entry whose run needed more loop
+#    iterations or more seconds than the budgets of this run is ignored, so the script is parsed
+#    again and stopped by the watchdog as before.
+# 2. Otherwise main.py parses and runs the script, recording the diagnostics it writes
+#    (`DiagnosticRecorder`), and `save_program` stores the result.
+# 3. After each save, `evict_cache_files` removes the least recently used entries beyond
+#    `MAX_CACHE_ENTRIES` entries or `MAX_CACHE_BYTES` bytes. Loading an entry marks it as used.
+#
+# Notes:
+# - Only the runs without errors are stored: a script with errors exits before the optimization.
+# - The cache is disabled with `--no-cache`, and ignored if it cannot be read or written.
+#
+# Example Usage:
+# program = load_program(data)
+# if program is None:
+#     ... parse, run and optimize the script ...
+#     save_program(data, (iterations_used(), seconds_used(), recorder.getvalue(), optimized_program, report, script_paths, script_procedures, variables_number))
+
+MAX_CACHE_ENTRIES = 64  # Programs kept in the cache
+MAX_CACHE_BYTES = 32 * 1024 * 1024  # Total size of the files of the cache
+
+CACHE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '__pycache__', 'programs')
+
+# Modules producing the optimized program
+PROGRAM_VERSION = compiler_version('main.py', 'state.py', 'tokeniser.py', 'parser.py', 'error.py', 'descent.py', 'vm.py',
+                                   'pyengine.py', 'watchdog.py', 'optimizer.py', 'ircache.py')
+
+
+# Class to write the diagnostics to a stream while keeping a copy of them.
+class DiagnosticRecorder:
+    def __init__(self, stream):
+        self.stream = stream
+        self.parts = []
+
+    def write(self, text):
+        self.parts.append(text)
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def getvalue(self):
+        return ''.join(self.parts)
+
+
+# Function to count the loop iterations run since `start_watchdog` (see watchdog.py).
+#
+# Notes:
+# - The watchdog takes the iterations from the budget `CHECK_INTERVAL` at a time: the ones taken
+#   but not run are still in the countdown, and the first iteration is taken from a countdown of 1.
+def iterations_used():
+    return global_state.iteration_budget_limit - global_state.iteration_budget - global_state.iteration_countdown + 1
+
+
+# Function to measure the seconds spent since `start_watchdog`, parsing included.
+def seconds_used():
+    return time.perf_counter() - (global_state.deadline - global_state.time_budget_limit)
+
+
+def cache_path(source):
+    key = hashlib.sha256(f'{PROGRAM_VERSION}\n{source}'.encode()).hexdigest()[:32]
+    # The format of `marshal` depends on the Python version
+    return os.path.join(CACHE_DIRECTORY, f'{key}.{sys.implementation.cache_tag}.bin')
+
+
+# Function to load the program stored for a source.
+#
+# Parameters:
+# - source: The text of the script.
+#
+# Returns:
+# - The tuple given to `save_program`, or None if the source is not in the cache or if its run
+#   would exceed the iteration or time budget of this one.
+def load_program(source):
+    path = cache_path(source)
+    try:
+        with open(path, 'rb') as file:
+            version, program = marshal.load(file)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if version != PROGRAM_VERSION:
+        return None
+    if program[0] > global_state.iteration_budget_limit or program[1] > global_state.time_budget_limit:
+        return None
+    try:
+        os.utime(path)  # Most recently used
+    except OSError:
+        pass
+    return program
+
+
+# Function to store the program of a source, then to bound the size of the cache.
+#
+# Parameters:
+# - source: The text of the script.
+# - program: The iterations run, the seconds spent, the diagnostics, the optimized instructions, the report of the
+#   optimization passes, the paths, the procedures and the variables of the script.
+def save_program(source, program):
+    path = cache_path(source)
+    try:
+        os.makedirs(CACHE_DIRECTORY, exist_ok=True)
+        with open(path + '.tmp', 'wb') as file:
+            marshal.dump((PROGRAM_VERSION, program), file)
+        os.replace(path + '.tmp', path)  # Never leaves a partly written file
+        evict_cache_files(CACHE_DIRECTORY, MAX_CACHE_ENTRIES, MAX_CACHE_BYTES)
+    except (OSError, ValueError):
+        pass  # The next run parses the script again
+
+
+# Function to remove the least recently used files of a cache beyond its bounds.
+#
+# Parameters:
+# - directory: The directory of the cache, holding one `.bin` file per entry.
+# - max_entries: The number of files kept.
+# - max_bytes: The total size of the files kept.
+#
+# Notes:
+# - A file is used when it is written or read: the readers update its modification time.
+# - Also bounds the code objects of pyengine.py.
+def evict_cache_files(directory, max_entries, max_bytes):
+    entries = []
+    for entry in os.scandir(directory):
+        if entry.name.endswith('.bin'):
+            status = entry.stat()
+            entries.append((status.st_mtime, status.st_size, entry.path))
+    entries.sort(reverse=True)  # Most recently used first
+    kept_count = kept_size = 0
+    for _, size, path in entries:
+        if kept_count < max_entries and kept_size + size <= max_bytes:
+            kept_count += 1
+            kept_size += size
+        else:
+            os.remove(path)  # An entry too large for the cache does not remove the others
@@ -1,11 +1,90 @@
 from parser import *
 from generationCode import *
+from optimizer import *
+from vm import *
+from pyengine import *
+from watchdog import *
+from incremental import *
+from ircache import *
+from streaming import *
+from descent import *
 from CompilerExecuter import *
 from tokeniser import *
 from error import *
 from state import global_state
 
 
+# Function to read an option `--<name>=<value>` of the command line.
+#
+# Parameters:
+# - name: The name of the option.
+# - default: The value when the option is not given.
+# - convert: The function converting the text of the value, raising `ValueError` if it is invalid.
+#
+# Returns:
+# - The converted value, or `default`. Exits with an error code if the value is invalid.
+def read_option(name, default, convert=str):
+    value = next((argument.split('=', 1)[1] for argument in sys.argv[1:] if argument.startswith(f'--{name}=')), None)
+    if value is None:
+        return default
+    try:
+        return convert(value)
+    except ValueError:
+        sys.stderr.write(f"Error: invalid value '{value}' for --{name}.\n")
+        sys.exit(1)
+
+
+# Function to restrict a conversion of `read_option` to the values above 0.
+def positive(convert):
+    def convert_positive(value):
+        value = convert(value)
+        if value <= 0:
+            raise ValueError(value)
+        return value
+    return convert_positive
+
+
+# Function to build the parser chosen with `--parser=<name>`.
+#
+# Parameters:
+# - front_end: 'ply', the LALR parser of PLY, or 'descent', the hand-written parser (see descent.py).
+def build_parser(front_end):
+    parser = yacc()  # Also the parser of the scripts with errors, for its error rules (see error.py)
+    return DescentParser(parser) if front_end == 'descent' else parser
+
+
+# Function to parse, run and optimize the script, as the cache of programs stores it (see ircache.py).
+#
+# Parameters:
+# - engine: 'bytecode' or 'python', the engine running the instructions.
+# - front_end: 'ply' or 'descent', the parser of the script (see `build_parser`).
+#
+# Returns:
+# - The iterations run, the seconds spent, the diagnostics written, the optimized instructions, the
+#   report of the optimization passes, the paths, the procedures and the variables of the script.
+def parse_and_optimize(engine, front_end):
+    parser = build_parser(front_end)
+    recorder = sys.stderr = DiagnosticRecorder(sys.stderr)  # The diagnostics of the script only
+    parsed_data = parser.parse(data, lexer=lexer, tracking=True)
+
+    if global_state.has_errors:
+        sys.exit(1)
+
+    if parsed_data:
+        for statement in parsed_data:
+            if not callable(statement):  # Check if the instruction is executable
+                sys.stderr.write(f"Invalid instruction detected : {statement}\n")
+                sys.exit(1)
+        if engine == 'python':
+            run_python(parsed_data)  # Execution of instructions as generated Python code (see pyengine.py)
+        else:
+            run_bytecode(compile_program(parsed_data))  # Execution of instructions (see vm.py)
+    sys.stderr = recorder.stream
+    optimized_program, optimization_report = optimize_program(parsed_data_c)
+    return (iterations_used(), seconds_used(), recorder.getvalue(), optimized_program, optimization_report,
+            script_paths, script_procedures, variables_number)
+
+
 # Main function to parse input data, execute parsed instructions, and generate/compile C code.
 #
 # This function coordinates the parsing of input data, handles potential errors, executes valid
@@ -15,16 +94,26 @@ from state import global_state
 # - None.
 #
 # Logic:
-# 1. Initializes a parser instance using the yacc() function.
-# 2. Parses the input data using the provided lexer with error tracking enabled.
+# 1. Sets the budgets of the loops of the script (`--max-iterations=<n>`, `--max-seconds=<s>`,
+#    see watchdog.py) and initializes a parser instance using the yacc() function, or, with
+#    `--parser=descent`, the hand-written parser falling back to it (see descent.py).
+# 2. Parses the input data using the provided lexer with error tracking enabled. With `--check`,
+#    only checks the script, reusing the statements unchanged since the last check (see
+#    incremental.py), and exits.
+#    With `--stream`, reads, parses, runs and writes the script one statement at a time (see
+#    streaming.py), then goes to step 6. Otherwise, loads the optimized program stored for the
+#    same script and compiler (see ircache.py) and goes to step 6, unless `--no-cache` is given.
 # 3. Checks for errors in the global state:
 #    - If errors are detected, exits the program with a status code of 1.
 # 4. Processes the parsed data:
-#    - Iterates through each statement in the parsed output.
-#    - If a statement is executable (callable), it executes the statement directly.
+#    - Checks that each statement in the parsed output is executable (callable).
 #    - If a statement is invalid, writes an error message to the standard error stream and exits with status 1.
-# 5. Calls external helper functions to:
-#    - Generate a C file from the parsed data.
+#    - Lowers the statements into bytecode and runs it (see vm.py), or, with `--engine=python`,
+#      translates them into a Python function and runs it (see pyengine.py).
+# 5. Runs the optimization passes over the parsed data and displays how many instructions each
+#    pass removed (see optimizer.py), and stores the optimized program in the cache.
+# 6. Calls external helper functions to:
+#    - Generate a C file from the optimized data.
 #    - Compile and execute the generated C program.
 #
 # Notes:
@@ -38,24 +127,47 @@ from state import global_state
 
 def main():
 
-    parser = yacc()
-    parsed_data = parser.parse(data, lexer=lexer, tracking=True)
-    
-    
+    # Engine running the instructions, chosen with `--engine=<name>`
+    engine = read_option('engine', 'bytecode')
+    if engine not in ('bytecode', 'python'):
+        sys.stderr.write(f"Error: unknown engine '{engine}', expected 'bytecode' or 'python'.\n")
+        sys.exit(1)
 
-    if global_state.has_errors:
-        sys.exit(1) 
+    # Parser of the script, chosen with `--parser=<name>`
+    front_end = read_option('parser', 'ply')
+    if front_end not in ('ply', 'descent'):
+        sys.stderr.write(f"Error: unknown parser '{front_end}', expected 'ply' or 'descent'.\n")
+        sys.exit(1)
 
+    # Budgets of the loops, counted from here since the parser already runs the `for` loops
+    start_watchdog(read_option('max-iterations', DEFAULT_ITERATION_BUDGET, positive(int)),
+                   read_option('max-seconds', DEFAULT_TIME_BUDGET, positive(float)))
 
-    if parsed_data:
-        for statement in parsed_data:
-            if callable(statement):  # Check if the instruction is executable
-                statement()  # Execution of instructions
-            else:
-                sys.stderr.write("Invalid instruction detected :", statement) 
-                sys.exit(1) 
+    # `--check`: only the diagnostics, parsing the statements changed since the last check
+    if '--check' in sys.argv[1:]:
+        sys.exit(1 if check_script(build_parser(front_end), data, file_path) else 0)
+
+    # `--stream`: a very large script, read, parsed and run one statement at a time
+    if '--stream' in sys.argv[1:]:
+        stream_script(build_parser(front_end), file_path)
+        compile_and_run_c()
+        display_variables()
+        return
+
+    # A script run before with the same compiler goes straight to the generation of the C code
+    program = None if '--no-cache' in sys.argv[1:] else load_program(data)
+    if program is None:
+        program = parse_and_optimize(engine, front_end)
+        if '--no-cache' not in sys.argv[1:]:
+            save_program(data, program)
+    else:
+        sys.stderr.write(program[2])  # The warnings of the run
+        variables_number.update(program[7])
+
+    _, _, _, optimized_program, optimization_report, paths, procedures, _ = program
+    display_optimization_report(optimization_report)
     # Générer le fichier C
-    generate_c_code(parsed_data_c)
+    generate_c_code(optimized_program, paths, procedures)
     compile_and_run_c()
     
 
@@ -0,0 +1,316 @@
+import re
+
+# Module to optimize the parsed program before the generation of the C code.
+#
+# The parser writes one C instruction per script instruction (see `parsed_data_c`). This module
+# runs a few passes over these instructions, each removing the ones that cannot change what the
+# generated program draws, and reports how many instructions each pass removed.
+#
+# Passes, in order:
+# - fold_constants: Normalizes the rotation angles, removes the movements by 0 and the rotations
+#   by a multiple of 360, and writes the loops over one cursor as a single instruction.
+# - merge_transforms: Merges the consecutive rotations, and movements, of the same cursors or group.
+# - remove_dead_thickness: Removes the thickness changes overwritten later, and writes the others
+#   in the creation of the cursor when possible.
+# - remove_hidden_draws: Removes the shapes drawn with cursors created with a visibility of 0.
+# - remove_duplicate_draws: Removes the shapes drawn again, identically, later in the script.
+#
+# Notes:
+# - The passes rely on the order of the generated code (see `generate_c_code`): the cursors and
+#   groups are created first, then the movements, rotations and thickness are applied in script
+#   order, and only then are the shapes drawn, from the final state of the cursors.
+# - The instructions of the procedures are not optimized, and a procedure call is treated as if
+#   it could change every cursor and group.
+#
+# Example Usage:
+# optimized_program, report = optimize_program(parsed_data_c)
+# display_optimization_report(report)
+
+# Regular expressions matching the instructions written by the parser.
+CURSOR_TRANSFORM = re.compile(r"(?:for \(int i = (\d+); i < (\d+); i\+\+\) )?(movePooledCursor|rotatePooledCursor|setPooledThickness)\(&cursor_pool, (i|\d+), (-?\d+)\); // (.*)")
+GROUP_TRANSFORM = re.compile(r"(moveGroup|rotateGroup)\(&group_pool, (\d+), (-?\d+)\); // (.*)")
+CURSOR_CREATION = re.compile(r"initPooledCursor\(&cursor_pool, (\d+), (-?\d+), (-?\d+), \(SDL_Color\)\{(-?\d+), (-?\d+), (-?\d+), (-?\d+)\}, (-?\d+), (-?\d+)\);.*")
+GROUP_CREATION = re.compile(r"initGroup\(&group_pool, (\d+), .*")
+GROUP_MEMBERSHIP = re.compile(r"(?:for \(int i = (\d+); i < (\d+); i\+\+\) )?add(Cursor|Group)ToGroup\(&group_pool, &cursor_pool, (i|\d+), (\d+)\);.*")
+SHAPE_DRAW = re.compile(r"queuePooledDraw\(renderer, FORM_\w+, pool, (\d+), .*")
+PROCEDURE_CALL = re.compile(r".*\bprocedure_\w+\(.*")
+
+
+# Function to read a movement, rotation or thickness instruction.
+#
+# Parameters:
+# - line: An instruction of the parsed program.
+#
+# Returns:
+# - A dictionary with the C function, the pool ('cursor' or 'group'), the range of indices
+#   `first` to `last - 1` it applies to, its value and its comment, or None for another instruction.
+#
+# Example Usage:
+# read_transform("for (int i = 2; i < 5; i++) movePooledCursor(&cursor_pool, i, 3); // Move row")
+# returns {'function': 'movePooledCursor', 'pool': 'cursor', 'first': 2, 'last': 5, 'value': 3, 'comment': 'Move row'}
+def read_transform(line):
+    cursor = CURSOR_TRANSFORM.fullmatch(line)
+    if cursor:
+        loop_start, loop_end, function, index, value, comment = cursor.groups()
+        if (loop_start is None) != (index != 'i'):
+            return None
+        first, last = (int(loop_start), int(loop_end)) if loop_start else (int(index), int(index) + 1)
+        return {'function': function, 'pool': 'cursor', 'first': first, 'last': last, 'value': int(value), 'comment': comment}
+    group = GROUP_TRANSFORM.fullmatch(line)
+    if group:
+        function, index, value, comment = group.groups()
+        return {'function': function, 'pool': 'group', 'first': int(index), 'last': int(index) + 1, 'value': int(value), 'comment': comment}
+    return None
+
+
+# Function to write back an instruction read by `read_transform`, looping over the range if needed.
+def write_transform(transform):
+    function, value, comment = transform['function'], transform['value'], transform['comment']
+    if transform['pool'] == 'group':
+        return f"{function}(&group_pool, {transform['first']}, {value}); // {comment}"
+    if transform['last'] - transform['first'] == 1:
+        return f"{function}(&cursor_pool, {transform['first']}, {value}); // {comment}"
+    return f"for (int i = {transform['first']}; i < {transform['last']}; i++) {function}(&cursor_pool, i, {value}); // {comment}"
+
+
+# Function to fold the constant values of the movements and rotations.
+#
+# Logic:
+# 1. Brings the angle of each rotation in [0, 360), as `rotatePooledCursor` and `rotateGroup` do.
+# 2. Removes the movements by 0 and the rotations by a multiple of 360, which change nothing.
+# 3. Writes the loops over a single cursor (arrays of one cursor) as one instruction.
+#
+# Example Usage:
+# fold_constants(["rotatePooledCursor(&cursor_pool, 0, 370); // Rotate c", "movePooledCursor(&cursor_pool, 0, 0); // Move c"])
+# returns ["rotatePooledCursor(&cursor_pool, 0, 10); // Rotate c"]
+def fold_constants(program):
+    folded = []
+    for line in program:
+        transform = read_transform(line)
+        if transform is None:
+            folded.append(line)
+            continue
+        if transform['first'] >= transform['last']:
+            continue  # Loop over no cursor
+        if transform['function'] in ('rotatePooledCursor', 'rotateGroup'):
+            transform['value'] %= 360
+        if transform['value'] == 0 and transform['function'] != 'setPooledThickness':
+            continue
+        folded.append(write_transform(transform))
+    return folded
+
+
+# Function to merge the consecutive movements and rotations of the same cursors or group.
+#
+# Two transforms are consecutive when no instruction between them reads or changes the position
+# or the angle of their cursors: the thickness changes, the shapes and the transforms of other
+# cursors do not count.
+#
+# Logic:
+# 1. Rotations are merged by adding their angles, modulo 360.
+# 2. Movements are merged by adding their distances, only when the angle of every cursor moved
+#    is known to be 0 at compile time. The coordinates are integers (see `movePooledCursor`), so
+#    two movements in another direction are rounded twice and cannot be replaced by one.
+# 3. The angles start at 0 when the cursors and groups are created. They become unknown after
+#    a procedure call or an unknown instruction, and for the members of a group, which are placed
+#    by the group.
+# 4. A merge giving a movement by 0 or a rotation by 0 removes both instructions.
+#
+# Example Usage:
+# merge_transforms(["rotatePooledCursor(&cursor_pool, 0, 15); // Rotate c",
+#                   "setPooledThickness(&cursor_pool, 0, 3); // Set the thickness of c",
+#                   "rotatePooledCursor(&cursor_pool, 0, 30); // Rotate c"])
+# returns the rotation by 45 followed by the thickness change.
+def merge_transforms(program):
+    angles = {}
+    for line in program:
+        cursor = CURSOR_CREATION.fullmatch(line)
+        group = GROUP_CREATION.fullmatch(line)
+        if cursor:
+            angles[('cursor', int(cursor.group(1)))] = 0
+        elif group:
+            angles[('group', int(group.group(1)))] = 0
+
+    merged = []
+    pending = {}  # Position in `merged` of the last transform of each range, while it can be merged
+    for line in program:
+        transform = read_transform(line)
+        if transform is None or transform['function'] == 'setPooledThickness':
+            if not (transform or SHAPE_DRAW.fullmatch(line) or CURSOR_CREATION.fullmatch(line)
+                    or GROUP_CREATION.fullmatch(line)):
+                membership = GROUP_MEMBERSHIP.fullmatch(line)
+                if membership:
+                    # The cursor or group is now placed by its group, whose transforms resolve every group
+                    pool = 'cursor' if membership.group(3) == 'Cursor' else 'group'
+                    first = int(membership.group(1) or membership.group(4))
+                    last = int(membership.group(2) or first + 1)
+                    for index in range(first, last):
+                        angles.pop((pool, index), None)
+                else:
+                    angles.clear()
+                pending.clear()
+            merged.append(line)
+            continue
+
+        pool, first, last = transform['pool'], transform['first'], transform['last']
+        indices = [(pool, index) for index in range(first, last)]
+        rotation = transform['function'] in ('rotatePooledCursor', 'rotateGroup')
+        can_merge = rotation or all(angles.get(index) == 0 for index in indices)
+        if rotation:
+            for index in indices:
+                if index in angles:
+                    angles[index] = (angles[index] + transform['value']) % 360
+        previous = pending.get((pool, first, last))
+        if previous is not None and read_transform(merged[previous])['function'] == transform['function']:
+            if can_merge:
+                merged_transform = read_transform(merged[previous])
+                merged_transform['value'] += transform['value']
+                if rotation:
+                    merged_transform['value'] %= 360
+                if merged_transform['value'] == 0:
+                    merged[previous] = None
+                    del pending[(pool, first, last)]
+                else:
+                    merged[previous] = write_transform(merged_transform)
+                continue
+
+        for other in list(pending):
+            if other[0] == pool and other[1] < last and first < other[2]:
+                del pending[other]
+        merged.append(line)
+        pending[(pool, first, last)] = len(merged) - 1
+    return [line for line in merged if line is not None]
+
+
+# Function to remove the thickness changes that cannot be seen.
+#
+# Logic:
+# 1. Going backwards, removes each `setPooledThickness` whose cursors all get another thickness
+#    later. Nothing reads the thickness before the shapes are drawn, so only the last one counts.
+# 2. Going forwards, until the first procedure call, writes each remaining thickness in the
+#    creation of its cursors and removes it: the cursors are created before any other instruction.
+#
+# Example Usage:
+# remove_dead_thickness(["initPooledCursor(&cursor_pool, 0, 50, 50, (SDL_Color){255, 0, 0, 255}, 1, 1); // Create cursor c",
+#                        "setPooledThickness(&cursor_pool, 0, 3); // Set the thickness of c",
+#                        "setPooledThickness(&cursor_pool, 0, 4); // Set the thickness of c"])
+# returns ["initPooledCursor(&cursor_pool, 0, 50, 50, (SDL_Color){255, 0, 0, 255}, 4, 1); // Create cursor c"]
+def remove_dead_thickness(program):
+    live = list(program)
+    overwritten = set()  # Cursors getting another thickness later
+    for position in reversed(range(len(live))):
+        transform = read_transform(live[position])
+        if transform and transform['function'] == 'setPooledThickness':
+            indices = set(range(transform['first'], transform['last']))
+            if indices <= overwritten:
+                live[position] = None
+            overwritten |= indices
+        elif not (transform or SHAPE_DRAW.fullmatch(live[position]) or CURSOR_CREATION.fullmatch(live[position])
+                  or GROUP_CREATION.fullmatch(live[position]) or GROUP_MEMBERSHIP.fullmatch(live[position])
+                  or PROCEDURE_CALL.fullmatch(live[position])):
+            overwritten.clear()
+
+    creations = {}  # Position of the last creation of each cursor
+    for position, line in enumerate(live):
+        cursor = CURSOR_CREATION.fullmatch(line or '')
+        if cursor:
+            creations[int(cursor.group(1))] = position
+    for position, line in enumerate(live):
+        if line is None:
+            continue
+        transform = read_transform(line)
+        if transform is None:
+            if SHAPE_DRAW.fullmatch(line) or CURSOR_CREATION.fullmatch(line) or GROUP_CREATION.fullmatch(line) \
+                    or GROUP_MEMBERSHIP.fullmatch(line):
+                continue
+            break  # A procedure may change the thickness too
+        indices = range(transform['first'], transform['last'])
+        if transform['function'] != 'setPooledThickness' or not 0 <= transform['value'] <= 65535 \
+                or any(index not in creations for index in indices):
+            continue
+        for index in indices:
+            creation = CURSOR_CREATION.fullmatch(live[creations[index]])
+            line = live[creations[index]]
+            live[creations[index]] = f"{line[:creation.start(8)]}{transform['value']}{line[creation.end(8):]}"
+        live[position] = None
+    return [line for line in live if line is not None]
+
+
+# Function to remove the shapes drawn with cursors created with a visibility of 0.
+#
+# Notes:
+# - A hidden cursor never becomes visible (the runtime can only hide a cursor, see handle.c), so
+#   its shapes are neither drawn nor selectable.
+def remove_hidden_draws(program):
+    visibility = {}
+    for line in program:
+        cursor = CURSOR_CREATION.fullmatch(line)
+        if cursor:
+            visibility[int(cursor.group(1))] = int(cursor.group(9))
+    return [line for line in program
+            if not (SHAPE_DRAW.fullmatch(line) and visibility.get(int(SHAPE_DRAW.fullmatch(line).group(1))) == 0)]
+
+
+# Function to remove the shapes drawn again, identically, later in the script.
+#
+# Notes:
+# - The shapes are drawn from the final state of the cursors, so two identical instructions draw
+#   the same pixels. The last one is kept, as it is drawn over the shapes between them.
+# - Only the shapes of opaque cursors (alpha of 255) are removed: a translucent shape drawn twice
+#   is blended twice.
+def remove_duplicate_draws(program):
+    alpha = {}
+    for line in program:
+        cursor = CURSOR_CREATION.fullmatch(line)
+        if cursor:
+            alpha[int(cursor.group(1))] = int(cursor.group(7))
+    drawn = set()
+    kept = []
+    for line in reversed(program):
+        shape = SHAPE_DRAW.fullmatch(line)
+        if shape and alpha.get(int(shape.group(1))) == 255:
+            instruction = line.split(' //')[0]
+            if instruction in drawn:
+                continue
+            drawn.add(instruction)
+        kept.append(line)
+    kept.reverse()
+    return kept
+
+
+# Passes run by `optimize_program`, in order, with the name used in the report.
+OPTIMIZATION_PASSES = [
+    ('constant folding', fold_constants),
+    ('transform merging', merge_transforms),
+    ('thickness dead stores', remove_dead_thickness),
+    ('draws of hidden cursors', remove_hidden_draws),
+    ('duplicate draws', remove_duplicate_draws),
+]
+
+
+# Function to run the optimization passes over a parsed program.
+#
+# Parameters:
+# - parsed_program: A list of strings representing the parsed lines of the program (`parsed_data_c`).
+#
+# Returns:
+# - The optimized list of instructions, and the report: the name of each pass with the number of
+#   instructions it removed.
+#
+# Example Usage:
+# optimized_program, report = optimize_program(parsed_data_c)
+# generate_c_code(optimized_program, script_paths, script_procedures)
+def optimize_program(parsed_program):
+    report = []
+    for name, optimization_pass in OPTIMIZATION_PASSES:
+        optimized_program = optimization_pass(parsed_program)
+        report.append((name, len(parsed_program) - len(optimized_program)))
+        parsed_program = optimized_program
+    return parsed_program, report
+
+
+# Function to display the number of instructions removed by each optimization pass.
+def display_optimization_report(report):
+    print("Optimization passes:")
+    for name, removed in report:
+        print(f"- {name}: {removed} instruction{'' if removed == 1 else 's'} removed")
@@ -1,5 +1,8 @@
+import math
+import operator
 from tokeniser import *
 from state import global_state
+from watchdog import count_iteration
 
 
 # ----------------------------------------
@@ -38,6 +41,45 @@ def p_program(p):
     else:  # Recursive case: a statement followed by a program
         p[0] = [p[1]] + p[2]
 
+# Function to describe an action to the bytecode compiler (see vm.py).
+#
+# The actions stay callable, so the parser can still run them while parsing (loops, procedures),
+# and the compiler reads the description to lower them into bytecode instead of calling them.
+#
+# Parameters:
+# - action: The nested function built by a grammar rule.
+# - instruction: The kind of the action followed by its operands, such as
+#   `('arithmetic', 'x', 'y', operator.add, 5)` for `x = y + 5`.
+#
+# Example Usage:
+# p[0] = lower_action(assign_expression_p, 'arithmetic', variable_name, source_variable, operator.add, increment)
+def lower_action(action, *instruction):
+    action.instruction = instruction
+    return action
+
+# Function to build the action of a statement with errors, which does nothing: the script is not
+# run, but the statements of a procedure are run while parsing (see `p_statement_procedure`).
+def ignored_action():
+    def action():
+        pass
+    return lower_action(action, 'nop')
+
+# Function to report the procedure parameters used by an assignment, whose values are only known
+# when the procedure is called.
+#
+# Parameters:
+# - p: A yacc parsing object containing tokens and parsing state, with `equal` as its second symbol.
+# - names: The variables assigned and read by the statement.
+#
+# Returns:
+# - `True` if the statement uses a parameter.
+def uses_parameter(p, *names):
+    if not any(isinstance(name, str) and name in procedure_parameters for name in names):
+        return False
+    global_state.has_errors = True
+    sys.stderr.write(f"Error on line {find_line(line_offsets, p.lexpos(2))}: an assignment cannot use a procedure parameter, assignments are evaluated by the compiler.\n")
+    return True
+
 # Detects if the value is a number and assigns it directly
 def p_number_or_id_number(p):
     'number_or_id : number'
@@ -80,11 +122,14 @@ def p_statement_assign_expression_plus(p):
     variable_name = p[1]
     source_variable = p[3]
     increment = p[5] 
+    if uses_parameter(p, variable_name, source_variable):
+        p[0] = ignored_action()
+        return
     
     def assign_expression_p(variable_name=variable_name, source_variable=source_variable, increment=increment):
         variables_number[variable_name] = variables_number.get(source_variable, 0) + increment
         
-    p[0] = assign_expression_p
+    p[0] = lower_action(assign_expression_p, 'arithmetic', variable_name, source_variable, operator.add, increment)
 
 
 # Function to parse and handle assignment statements with subtraction.
@@ -118,13 +163,16 @@ def p_statement_assign_expression_minus(p):
     variable_name = p[1]
     source_variable = p[3]
     increment = p[5] 
+    if uses_parameter(p, variable_name, source_variable):
+        p[0] = ignored_action()
+        return
 
  
     def assign_expression(variable_name=variable_name, source_variable=source_variable, increment=increment):  
             variables_number[variable_name] = variables_number.get(source_variable, 0) - increment
 
     
-    p[0] = assign_expression
+    p[0] = lower_action(assign_expression, 'arithmetic', variable_name, source_variable, operator.sub, increment)
 
 
 # Function to parse and handle assignment statements with multiplication.
@@ -158,12 +206,15 @@ def p_statement_assign_expression_times(p):
     variable_name = p[1]
     source_variable = p[3]
     increment = p[5] 
+    if uses_parameter(p, variable_name, source_variable):
+        p[0] = ignored_action()
+        return
  
     def assign_expression(variable_name=variable_name, source_variable=source_variable, increment=increment):  
             variables_number[variable_name] = variables_number.get(source_variable, 0) * increment
 
     
-    p[0] = assign_expression
+    p[0] = lower_action(assign_expression, 'arithmetic', variable_name, source_variable, operator.mul, increment)
 
 
 # Function to parse and handle assignment statements with division.
@@ -201,6 +252,9 @@ def p_statement_assign_expression_dividedby(p):
     variable_name = p[1]
     source_variable = p[3]
     increment = p[5] 
+    if uses_parameter(p, variable_name, source_variable):
+        p[0] = ignored_action()
+        return
     
     if increment == 0:
         sys.stderr.write("Error: You can't divide by 0")
@@ -211,7 +265,7 @@ def p_statement_assign_expression_dividedby(p):
             variables_number[variable_name] = variables_number.get(source_variable, 0) // increment
 
     
-        p[0] = assign_expression
+        p[0] = lower_action(assign_expression, 'arithmetic', variable_name, source_variable, operator.floordiv, increment)
 
 
 # Function to parse and handle assignment statements with modulo operation.
@@ -249,6 +303,9 @@ def p_statement_assign_expression_modulo(p):
     variable_name = p[1]
     source_variable = p[3]
     increment = p[5] 
+    if uses_parameter(p, variable_name, source_variable):
+        p[0] = ignored_action()
+        return
 
     if increment == 0 :
         sys.stderr.write("Error: '%' cannot be followed by zero")
@@ -259,7 +316,7 @@ def p_statement_assign_expression_modulo(p):
             variables_number[variable_name] = variables_number.get(source_variable, 0) % increment
 
 
-        p[0] = assign_expression
+        p[0] = lower_action(assign_expression, 'arithmetic', variable_name, source_variable, operator.mod, increment)
 
 
 # Function to display the current states of global variables.
@@ -325,6 +382,9 @@ def p_statement_assign_number(p):
     'statement : id_number equal number_or_id'
     variable_name = p[1]
     value = p[3]
+    if uses_parameter(p, variable_name, value):
+        p[0] = ignored_action()
+        return
     variables_number[variable_name] = value 
 
     def assign_action(variable_name=variable_name, value=value):       
@@ -332,7 +392,7 @@ def p_statement_assign_number(p):
         value=value
 
 
-    p[0] = assign_action
+    p[0] = lower_action(assign_action, 'nop')  # Assigned while parsing
 
 
 # Function to parse and handle cursor movement statements.
@@ -349,7 +409,8 @@ def p_statement_assign_number(p):
 # 2. Resolves the distance value using the `resolve_value` function to handle variables or constants.
 # 3. Defines a nested function `move_action` to:
 #    - Generate a C instruction for moving the cursor using the format:
-#      `moveCursor(&<cursor_id>, <distance_value>);`
+#      `movePooledCursor(&cursor_pool, <index>, <distance_value>);`, where `<index>` is the
+#      index of the cursor in the pool (see `cursor_index`).
 #    - Append the generated instruction to the `parsed_data_c` list.
 # 4. Assigns the nested function to `p[0]` for deferred execution.
 #
@@ -361,7 +422,7 @@ def p_statement_assign_number(p):
 # Example Usage:
 # Input: `move cursor1 by 10`
 # Parsing generates a function that appends:
-# `moveCursor(&cursor1, 10);` to `parsed_data_c`.
+# `movePooledCursor(&cursor_pool, 0, 10); // Move cursor1` to `parsed_data_c`.
 
 def p_statement_movement(p):
     '''
@@ -371,7 +432,7 @@ def p_statement_movement(p):
     distance_value = resolve_value(p[4])
 
     def move_action():
-        instruction_c = f"moveCursor(&{cursor_id},{distance_value});"
+        instruction_c = pooled_instruction(cursor_id, lambda index: f"movePooledCursor(&cursor_pool, {index}, {distance_value}); // Move {cursor_id}")
         parsed_data_c.append(instruction_c)
     
     p[0] = move_action
@@ -391,7 +452,7 @@ def p_statement_movement(p):
 # 2. Resolves the thickness value using the `resolve_value` function to handle variables or constants.
 # 3. Defines a nested function `thickness_action` to:
 #    - Generate a C instruction for changing the cursor's thickness using the format:
-#      `setThickness(&<cursor_id>, <thickness_value>);`
+#      `setPooledThickness(&cursor_pool, <index>, <thickness_value>);`
 #    - Append the generated instruction to the `parsed_data_c` list.
 # 4. Assigns the nested function to `p[0]` for deferred execution.
 #
@@ -403,7 +464,7 @@ def p_statement_movement(p):
 # Example Usage:
 # Input: `set cursor1 thickness at 5`
 # Parsing generates a function that appends:
-# `setThickness(&cursor1, 5);` to `parsed_data_c`.
+# `setPooledThickness(&cursor_pool, 0, 5); // Set the thickness of cursor1` to `parsed_data_c`.
 
 def p_statement_thickness_changing(p):
     '''
@@ -413,7 +474,7 @@ def p_statement_thickness_changing(p):
     thickness_value = resolve_value(p[5])
 
     def thickness_action():
-        instruction_c = f"setThickness(&{cursor_id},{thickness_value});"
+        instruction_c = pooled_instruction(cursor_id, lambda index: f"setPooledThickness(&cursor_pool, {index}, {thickness_value}); // Set the thickness of {cursor_id}")
         parsed_data_c.append(instruction_c)
     
     p[0] = thickness_action
@@ -442,19 +503,26 @@ def p_statement_thickness_changing(p):
 # - This function assumes the existence of:
 #   - A global `variables_cursor` list to track cursor identifiers.
 #   - A `resolve_value` function to handle variables or constants for parameter resolution.
-# - The actual action to append the instruction (e.g., to `parsed_data_c`) is not yet included in this function.
+# - The cursor is created in the slot of the C `cursor_pool` given by `cursor_index`, so the
+#   generated code refers to it by index instead of declaring a `Cursor` variable.
 
 # Example Usage:
 # Input: `cursor1 = create cursor at (10, 20) with (255, 0, 0, 0, 255, 0, 5, 1)`
-# Parsing resolves the parameters and ensures `cursor1` is tracked in `variables_cursor`.
+# Parsing resolves the parameters, ensures `cursor1` is tracked in `variables_cursor`, and generates:
+# `initPooledCursor(&cursor_pool, 0, 10, 20, (SDL_Color){255, 0, 0, 0}, 255, 0); // Create cursor cursor1`
 
 def p_statement_creation_cursor(p):
     '''
     statement : id_cursor equal create cursor at lp number_or_id comma number_or_id rp with lp number_or_id comma number_or_id comma number_or_id comma number_or_id comma number_or_id comma number_or_id rp
     '''
     cursor_id = p[1]
-    if cursor_id not in variables_cursor:
-        variables_cursor.append(cursor_id)
+    if cursor_id not in cursor_positions:
+        add_cursor(cursor_id)
+    if cursor_id in cursor_arrays:
+        line_number = find_line(line_offsets, p.lexpos(1))
+        global_state.has_errors = True
+        sys.stderr.write(f"Error on line {line_number}: '{cursor_id}' is a cursor array and cannot be re-created as a single cursor.\n")
+    check_outside_procedure(p, 'cursors')
 
     # Resolving parameters with possible mix
     coord_x = resolve_value(p[7])
@@ -469,13 +537,82 @@ def p_statement_creation_cursor(p):
     # Action to execute
     def create_cursor_action():
         instruction_c = (
-            f"Cursor {cursor_id} = createCursor({coord_x}, {coord_y}, (SDL_Color){{{rgb_1}, {rgb_2}, {rgb_3}, {rgb_4}}}, {thickness}, {visibility});"
+            f"initPooledCursor(&cursor_pool, {cursor_index(cursor_id)}, {coord_x}, {coord_y}, (SDL_Color){{{rgb_1}, {rgb_2}, {rgb_3}, {rgb_4}}}, {thickness}, {visibility}); // Create cursor {cursor_id}"
         )
         parsed_data_c.append(instruction_c)
 
     p[0] = create_cursor_action
 
 
+# Function to parse and handle cursor array creation statements.
+#
+# This function processes statements of the form:
+# `<cursor_id> = create cursor array (<count>) at (<x>, <y>) by (<dx>, <dy>) with (<r>, <g>, <b>, <a>, <thickness>, <visibility>)`.
+# It creates `<count>` cursors in consecutive slots of the pool, the cursor `k` at
+# (`<x> + k * <dx>`, `<y> + k * <dy>`), all with the same color, thickness and visibility.
+#
+# Parameters:
+# - p: A yacc parsing object containing tokens and parsing state.
+#
+# Logic:
+# 1. Resolves the parameters and records the number of cursors in `cursor_arrays`, so every
+#    later use of the name gets consecutive slots (see `cursor_index`).
+# 2. Defines a nested function `create_cursor_array_action` appending one `initPooledCursor`
+#    instruction per cursor to `parsed_data_c`.
+# 3. Assigns the nested function to `p[0]` for deferred execution.
+#
+# Notes:
+# - The creations are not written one by one in the C code: `generate_c_code` gathers every
+#   `initPooledCursor` instruction in the constant `script_cursors` table (see SDL/newcursor.c).
+# - Drawing with a cursor array draws the shape with each of its cursors. Moving, rotating,
+#   setting the thickness or adding a cursor array to a group applies to each of its cursors.
+# - A cursor array keeps its size: it cannot be re-created with another number of cursors.
+#
+# Example Usage:
+# Input: `row = create cursor array (3) at (100, 100) by (50, 0) with (255, 0, 0, 255, 2, 1)`
+# Parsing generates a function that appends three instructions to `parsed_data_c`, the last being:
+# `initPooledCursor(&cursor_pool, 2, 200, 100, (SDL_Color){255, 0, 0, 255}, 2, 1); // Create cursor row[2]`
+
+def p_statement_creation_cursor_array(p):
+    '''
+    statement : id_cursor equal create cursor array lp number_or_id rp at lp number_or_id comma number_or_id rp by lp coordinate comma coordinate rp with lp number_or_id comma number_or_id comma number_or_id comma number_or_id comma number_or_id comma number_or_id rp
+    '''
+    cursor_id = p[1]
+    count = resolve_value(p[7])
+    coord_x = resolve_value(p[11])
+    coord_y = resolve_value(p[13])
+    step_x = resolve_coordinate(p[17])
+    step_y = resolve_coordinate(p[19])
+    rgb_1 = resolve_value(p[23])
+    rgb_2 = resolve_value(p[25])
+    rgb_3 = resolve_value(p[27])
+    rgb_4 = resolve_value(p[29])
+    thickness = resolve_value(p[31])
+    visibility = resolve_value(p[33])
+
+    check_outside_procedure(p, 'cursors')
+    line_number = find_line(line_offsets, p.lexpos(1))
+    if not isinstance(count, int) or count < 1:
+        global_state.has_errors = True
+        sys.stderr.write(f"Error on line {line_number}: the cursor array '{cursor_id}' needs at least one cursor.\n")
+        count = 1
+    if cursor_arrays.get(cursor_id, count) != count:
+        global_state.has_errors = True
+        sys.stderr.write(f"Error on line {line_number}: the cursor array '{cursor_id}' already exists with another number of cursors.\n")
+    if cursor_id not in cursor_positions:
+        add_cursor(cursor_id)
+    set_cursor_array(cursor_id, count)
+
+    def create_cursor_array_action():
+        for k, index in enumerate(cursor_indices(cursor_id)):
+            instruction_c = (
+                f"initPooledCursor(&cursor_pool, {index}, {coord_x + k * step_x}, {coord_y + k * step_y}, (SDL_Color){{{rgb_1}, {rgb_2}, {rgb_3}, {rgb_4}}}, {thickness}, {visibility}); // Create cursor {cursor_id}[{k}]"
+            )
+            parsed_data_c.append(instruction_c)
+
+    p[0] = create_cursor_array_action
+
+
 # Function to parse and handle shape drawing statements (excluding arcs).
 #
 # This function processes statements of the form:
@@ -490,8 +627,8 @@ def p_statement_creation_cursor(p):
 # 1. Extracts the shape type, size parameter, and cursor identifier from the parsing object.
 # 2. Defines a nested function `draw_action_not_arc` to:
 #    - Resolve the size parameter using the `resolve_value` function.
-#    - Generate a C instruction for the specified shape and size using the corresponding function:
-#      - `drawCircle`, `drawSquare`, `drawLine`, `drawFilledSquare`, or `drawFilledCircle`.
+#    - Generate a C instruction queuing the specified shape and size in the draw list, using
+#      `queuePooledDraw` with `FORM_CIRCLE`, `FORM_SQUARE`, `FORM_LINE`, `FORM_FILLED_SQUARE` or `FORM_FILLED_CIRCLE`.
 #    - Append the generated C instruction to the `parsed_data_c` list.
 # 3. Assigns the nested function to `p[0]` for deferred execution.
 #
@@ -499,13 +636,15 @@ def p_statement_creation_cursor(p):
 # - This function assumes the existence of:
 #   - A global `parsed_data_c` list to store C instructions.
 #   - A `resolve_value` function to handle variables or constants for size resolution.
-# - The function supports a variety of shapes, each mapped to a specific C function.
+# - The function supports a variety of shapes, each mapped to a `ShapeForm` of the C runtime.
+# - The shapes are queued rather than drawn, so the runtime can group them by color (see drawlist.c).
+# - `pool` is the snapshot of the cursors drawn by the render thread (see simulation.c).
 # - The nested function structure allows deferred execution of the drawing logic.
 #
 # Example Usage:
 # Input: `draw (circle, 10) with cursor1`
 # Parsing generates a function that appends:
-# `drawCircle(renderer, &cursor1, 10); // Draw a circle` to `parsed_data_c`.
+# `queuePooledDraw(renderer, FORM_CIRCLE, pool, 0, 10, 0, 0); // Draw a circle with cursor1` to `parsed_data_c`.
 
 def p_statement_drawing_not_arc(p):
     'statement : draw lp form comma number_or_id rp with id_cursor'
@@ -517,20 +656,23 @@ def p_statement_drawing_not_arc(p):
         
         current_size = resolve_value(size)
 
-        if form == 'circle':
-            instruction_c = f'drawCircle(renderer, &{cursor_id}, {current_size}); // Draw a circle'
-        elif form == 'square':
-            current_size = resolve_value(size)
-            instruction_c = f'drawSquare(renderer, &{cursor_id}, {current_size}); // Draw a square'
-        elif form == 'line':
-            instruction_c = f'drawLine(renderer, &{cursor_id}, {current_size}); // Draw a line'
-        elif form == 'filledsquare':
-            instruction_c = f'drawFilledSquare(renderer, &{cursor_id}, {current_size}); // Draw a filled square'
-        elif form == 'filledcircle':
-            instruction_c = f'drawFilledCircle(renderer, &{cursor_id}, {current_size}); // Draw a filled circle'
-        parsed_data_c.append(instruction_c)
-
-    p[0] = draw_action_not_arc  
+        # One shape per cursor of a cursor array, each a row of the shape table
+        for index in cursor_indices(cursor_id):
+            if form == 'circle':
+                instruction_c = f'queuePooledDraw(renderer, FORM_CIRCLE, pool, {index}, {current_size}, 0, 0); // Draw a circle with {cursor_id}'
+            elif form == 'square':
+                current_size = resolve_value(size)
+                instruction_c = f'queuePooledDraw(renderer, FORM_SQUARE, pool, {index}, {current_size}, 0, 0); // Draw a square with {cursor_id}'
+            elif form == 'line':
+                instruction_c = f'queuePooledDraw(renderer, FORM_LINE, pool, {index}, {current_size}, 0, 0); // Draw a line with {cursor_id}'
+            elif form == 'filledsquare':
+                instruction_c = f'queuePooledDraw(renderer, FORM_FILLED_SQUARE, pool, {index}, {current_size}, 0, 0); // Draw a filled square with {cursor_id}'
+            elif form == 'filledcircle':
+                instruction_c = f'queuePooledDraw(renderer, FORM_FILLED_CIRCLE, pool, {index}, {current_size}, 0, 0); // Draw a filled circle with {cursor_id}'
+            parsed_data_c.append(instruction_c)
+
+    # The size is read when the action runs, so it can follow the variable of a loop
+    p[0] = lower_action(draw_action_not_arc, 'reads', [size])
 
 
 # Function to parse and handle arc drawing statements.
@@ -550,8 +692,8 @@ def p_statement_drawing_not_arc(p):
 #    - `end_angle`: The ending angle of the arc in degrees.
 #    - `cursor_id`: The cursor identifier to use.
 # 2. Defines a nested function `draw_action_arc` to:
-#    - Generate a C instruction for drawing the arc using the format:
-#      `drawArc(renderer, &<cursor_id>, <size>, <start_angle>, <end_angle>);`
+#    - Generate a C instruction queuing the arc in the draw list using the format:
+#      `queuePooledDraw(renderer, FORM_ARC, pool, <index>, <size>, <start_angle>, <end_angle>);`
 #    - Append the generated instruction to the `parsed_data_c` list.
 # 3. Assigns the nested function to `p[0]` for deferred execution.
 #
@@ -564,7 +706,7 @@ def p_statement_drawing_not_arc(p):
 # Example Usage:
 # Input: `draw (arc, 50, 0, 90) with cursor1`
 # Parsing generates a function that appends:
-# `drawArc(renderer, &cursor1, 50, 0, 90);` to `parsed_data_c`.
+# `queuePooledDraw(renderer, FORM_ARC, pool, 0, 50, 0, 90); // Draw an arc with cursor1` to `parsed_data_c`.
 
 def p_statement_drawing_arc(p):
     'statement : draw lp arc comma number_or_id comma number_or_id comma number_or_id rp with id_cursor'
@@ -574,11 +716,104 @@ def p_statement_drawing_arc(p):
     cursor_id = p[12]
     
     def draw_action_arc():
-        instruction_c = f'drawArc(renderer, &{cursor_id}, {size}, {start_angle}, {end_angle});'
-        parsed_data_c.append(instruction_c)
+        for index in cursor_indices(cursor_id):
+            instruction_c = f'queuePooledDraw(renderer, FORM_ARC, pool, {index}, {size}, {start_angle}, {end_angle}); // Draw an arc with {cursor_id}'
+            parsed_data_c.append(instruction_c)
     
     p[0] = draw_action_arc
 
+# Function to parse and handle path drawing statements.
+#
+# This function processes statements of the form:
+# `draw (path, (<x>, <y>), (<x>, <y>), ...) with <cursor>`.
+# It resolves the vertices of the path, stores them once in the path table and generates the
+# corresponding C instruction for drawing the path.
+#
+# Parameters:
+# - p: A yacc parsing object containing tokens and parsing state.
+#
+# Logic:
+# 1. Extracts the vertex list and the cursor identifier from the parsing object.
+# 2. Defines a nested function `draw_action_path` to:
+#    - Resolve every coordinate, relative to the position of the cursor.
+#    - Store the vertices with `path_index`, which returns the index of the path in the table.
+#    - Generate a C instruction queuing the path in the draw list using the format:
+#      `queuePooledDraw(renderer, FORM_PATH, pool, <index>, <extent>, <path>, 0);`
+#      where `<extent>` is the distance of the farthest vertex, used for the bounds of the path.
+#    - Append the generated instruction to the `parsed_data_c` list.
+# 3. Assigns the nested function to `p[0]` for deferred execution.
+#
+# Notes:
+# - The whole path is drawn with a single `SDL_RenderDrawLines` call (see `drawPath` in draw.c),
+#   instead of one call per `draw (line, ...)` statement.
+# - The vertices are resolved when the action runs, so a path drawn in a loop follows its variables.
+#
+# Example Usage:
+# Input: `draw (path, (0, 0), (50, 0), (50, -50)) with cursor1`
+# Parsing generates a function that appends:
+# `queuePooledDraw(renderer, FORM_PATH, pool, 0, 71, 0, 0); // Draw a path with cursor1` to `parsed_data_c`.
+
+def p_statement_drawing_path(p):
+    'statement : draw lp path comma vertex_list rp with id_cursor'
+    vertex_list = p[5]
+    cursor_id = p[8]
+    line_number = find_line(line_offsets, p.lexpos(1))
+
+    def draw_action_path():
+        vertices = []
+        for x, y in vertex_list:
+            if x[1] in procedure_parameters or y[1] in procedure_parameters:
+                global_state.has_errors = True
+                sys.stderr.write(f"Error on line {line_number}: the vertices of a path cannot be procedure parameters.\n")
+                return
+            vertex = (resolve_coordinate(x), resolve_coordinate(y))
+            if not all(isinstance(value, int) for value in vertex):
+                return  # Undefined variable, already reported by `resolve_value`
+            vertices.append(vertex)
+        extent = max(math.ceil(math.hypot(x, y)) for x, y in vertices)
+        path = path_index(vertices)
+        for index in cursor_indices(cursor_id):
+            instruction_c = f'queuePooledDraw(renderer, FORM_PATH, pool, {index}, {extent}, {path}, 0); // Draw a path with {cursor_id}'
+            parsed_data_c.append(instruction_c)
+
+    # The vertices are read when the action runs, so they can follow the variable of a loop
+    p[0] = lower_action(draw_action_path, 'reads', [value for vertex in vertex_list for sign, value in vertex])
+
+# Builds the list of vertices of a path, in order.
+def p_vertex_list(p):
+    '''vertex_list : vertex
+                   | vertex comma vertex_list'''
+    if len(p) == 2:
+        p[0] = [p[1]]
+    else:
+        p[0] = [p[1]] + p[3]
+
+# A vertex is a pair of coordinates relative to the cursor.
+def p_vertex(p):
+    'vertex : lp coordinate comma coordinate rp'
+    p[0] = (p[2], p[4])
+
+# A coordinate is a number or a numeric variable, possibly negated, resolved by `resolve_coordinate`.
+def p_coordinate(p):
+    '''coordinate : number_or_id
+                  | minus number_or_id'''
+    if len(p) == 2:
+        p[0] = (1, p[1])
+    else:
+        p[0] = (-1, p[2])
+
+# Resolves a coordinate of a path vertex to its value, or to the error message of `resolve_value`.
+def resolve_coordinate(coordinate):
+    sign, value = coordinate
+    value = resolve_value(value)
+    return sign * value if isinstance(value, int) else value
+
+# Reports an error if the statement of `p` is in the body of a procedure, where `what` cannot be created.
+def check_outside_procedure(p, what):
+    if procedure_stack:
+        global_state.has_errors = True
+        sys.stderr.write(f"Error on line {find_line(line_offsets, p.lexpos(1))}: {what} cannot be created inside procedure '{procedure_stack[-1]}'.\n")
+
 # Function to parse and handle animation mode statements.
 
 # This function processes statements of the form:
@@ -639,7 +874,7 @@ def p_statement_animation_mode(p):
 # 2. Resolves the angle using the `resolve_value` function to handle variables or constants.
 # 3. Defines a nested function `rotation_action` to:
 #    - Generate a C instruction for rotating the cursor using the format:
-#      `rotateCursor(&<cursor_name>, <angle>);`
+#      `rotatePooledCursor(&cursor_pool, <index>, <angle>);`
 #    - Append the generated instruction to the `parsed_data_c` list.
 # 4. Assigns the nested function to `p[0]` for deferred execution.
 
@@ -652,7 +887,7 @@ def p_statement_animation_mode(p):
 # Example Usage:
 # Input: `rotate cursor1 by 90`
 # Parsing generates a function that appends:
-# `rotateCursor(&cursor1, 90);` to `parsed_data_c`.
+# `rotatePooledCursor(&cursor_pool, 0, 90); // Rotate cursor1` to `parsed_data_c`.
 
 def p_statement_rotation(p):
     'statement : rotate id_cursor by number_or_id'
@@ -661,12 +896,162 @@ def p_statement_rotation(p):
     angle = resolve_value(p[4])
 
     def rotation_action():
-        instruction_c = f'rotateCursor(&{cursor_name},{angle});'
+        instruction_c = pooled_instruction(cursor_name, lambda index: f'rotatePooledCursor(&cursor_pool, {index}, {angle}); // Rotate {cursor_name}')
         parsed_data_c.append(instruction_c)
     
     p[0] = rotation_action
 
 
+# Function to parse and handle group creation statements.
+#
+# This function processes statements of the form:
+# `<group_id> = create group at (<x>, <y>)`, where `(<x>, <y>)` is the pivot of the group.
+# A group gathers cursors (and other groups) into a figure that moves and rotates as a whole.
+#
+# Parameters:
+# - p: A yacc parsing object containing tokens and parsing state.
+#
+# Logic:
+# 1. Extracts the group identifier and ensures it is tracked in `variables_group`.
+# 2. Resolves the coordinates of the pivot using the `resolve_value` function.
+# 3. Defines a nested function `create_group_action` to:
+#    - Generate a C instruction creating the group in the slot of the C `group_pool` given by
+#      `group_index`: `initGroup(&group_pool, <index>, <x>, <y>);`
+#    - Append the generated instruction to the `parsed_data_c` list.
+# 4. Assigns the nested function to `p[0]` for deferred execution.
+#
+# Notes:
+# - The group rotates around its pivot. Its transform is cached by the runtime (see SDL/group.c),
+#   so moving a group only updates the group, and its cursors are placed once per frame.
+#
+# Example Usage:
+# Input: `body = create group at (400, 300)`
+# Parsing generates a function that appends:
+# `initGroup(&group_pool, 0, 400, 300); // Create group body` to `parsed_data_c`.
+
+def p_statement_creation_group(p):
+    'statement : id_group equal create group at lp number_or_id comma number_or_id rp'
+    group_id = p[1]
+    if group_id not in variables_group:
+        variables_group.append(group_id)
+    check_outside_procedure(p, 'groups')
+    coord_x = resolve_value(p[7])
+    coord_y = resolve_value(p[9])
+
+    def create_group_action():
+        instruction_c = f"initGroup(&group_pool, {group_index(group_id)}, {coord_x}, {coord_y}); // Create group {group_id}"
+        parsed_data_c.append(instruction_c)
+
+    p[0] = create_group_action
+
+
+# Function to parse and handle statements adding a cursor or a group to a group.
+#
+# This function processes statements of the form:
+# `add <cursor> to <group>` or `add <group> to <group>`.
+# The added cursor or group keeps its place on the screen, and then follows the group.
+#
+# Parameters:
+# - p: A yacc parsing object containing tokens and parsing state.
+#
+# Logic:
+# 1. Extracts the added member and the group from the parsing object.
+# 2. For a group, follows the parents of the target group in `group_parents`, and reports an error
+#    if the added group is one of them: it would contain itself. Otherwise records its new parent.
+# 3. Defines a nested function `add_action` to:
+#    - Generate `addCursorToGroup(&group_pool, &cursor_pool, <cursor>, <group>);` for a cursor,
+#      or `addGroupToGroup(&group_pool, &cursor_pool, <child>, <group>);` for a group.
+#    - Append the generated instruction to the `parsed_data_c` list.
+# 4. Assigns the nested function to `p[0]` for deferred execution.
+#
+# Notes:
+# - A group added to itself, directly or through another group, is reported as an error.
+# - `group_parents` follows the `add` statements in the order of the script, whatever the
+#   conditions and loops around them. The runtime checks the groups again when they are added
+#   (see `addGroupToGroup` in SDL/group.c), so a cycle only made by the run is still refused.
+#
+# Example Usage:
+# Input: `add c to body`
+# Parsing generates a function that appends:
+# `addCursorToGroup(&group_pool, &cursor_pool, 0, 0); // Add c to body` to `parsed_data_c`.
+
+group_parents = {}  # Group of each group added to another group, in the order of the script
+
+def p_statement_group_add(p):
+    '''statement : add id_cursor to id_group
+                 | add id_group to id_group'''
+    member_id = p[2]
+    group_id = p[4]
+    is_group = p.slice[2].type == 'id_group'
+
+    if is_group:
+        ancestor = group_id
+        while ancestor is not None and ancestor != member_id:
+            ancestor = group_parents.get(ancestor)
+        if ancestor is None:
+            group_parents[member_id] = group_id
+        else:
+            line_number = find_line(line_offsets, p.lexpos(1))
+            global_state.has_errors = True
+            if member_id == group_id:
+                sys.stderr.write(f"Error on line {line_number}: group '{group_id}' cannot be added to itself.\n")
+            else:
+                sys.stderr.write(f"Error on line {line_number}: group '{member_id}' cannot be added to group '{group_id}', which it contains.\n")
+
+    def add_action():
+        if is_group:
+            instruction_c = f"addGroupToGroup(&group_pool, &cursor_pool, {group_index(member_id)}, {group_index(group_id)}); // Add {member_id} to {group_id}"
+        else:
+            instruction_c = pooled_instruction(member_id, lambda index: f"addCursorToGroup(&group_pool, &cursor_pool, {index}, {group_index(group_id)}); // Add {member_id} to {group_id}")
+        parsed_data_c.append(instruction_c)
+
+    p[0] = add_action
+
+
+# Function to parse and handle group movement and rotation statements.
+#
+# This function processes statements of the form:
+# `move <group> by <distance>` and `rotate <group> by <angle>`, the group counterparts of the
+# cursor statements: the whole figure moves in the direction of the group's angle, or turns
+# around the pivot of the group.
+#
+# Parameters:
+# - p: A yacc parsing object containing tokens and parsing state.
+#
+# Logic:
+# 1. Extracts the keyword, the group identifier and the value from the parsing object.
+# 2. Resolves the value using the `resolve_value` function.
+# 3. Defines a nested function `group_transform_action` to:
+#    - Generate `moveGroup(&group_pool, <index>, <distance>);` or
+#      `rotateGroup(&group_pool, <index>, <angle>);`
+#    - Append the generated instruction to the `parsed_data_c` list.
+# 4. Assigns the nested function to `p[0]` for deferred execution.
+#
+# Notes:
+# - Only the group is updated: its cursors are placed by the runtime when they are drawn.
+#
+# Example Usage:
+# Input: `rotate body by 90`
+# Parsing generates a function that appends:
+# `rotateGroup(&group_pool, 0, 90); // Rotate body` to `parsed_data_c`.
+
+def p_statement_group_transform(p):
+    '''statement : move id_group by number_or_id
+                 | rotate id_group by number_or_id'''
+    keyword = p[1]
+    group_id = p[2]
+    value = resolve_value(p[4])
+
+    def group_transform_action():
+        if keyword == 'move':
+            instruction_c = f"moveGroup(&group_pool, {group_index(group_id)}, {value}); // Move {group_id}"
+        else:
+            instruction_c = f"rotateGroup(&group_pool, {group_index(group_id)}, {value}); // Rotate {group_id}"
+        parsed_data_c.append(instruction_c)
+
+    p[0] = group_transform_action
+
+
 # Function to parse and handle conditions in statements.
 
 # This function processes conditions of the form:
@@ -679,7 +1064,7 @@ def p_statement_rotation(p):
 # Logic:
 # 1. Extracts the components of the condition from the parsing object:
 #    - `variable_name`: The name of the variable to evaluate.
-#    - `operator`: The comparison operator (`<`, `>`, or `=`).
+#    - `comparison`: The comparison operator (`<`, `>`, or `=`).
 #    - `value`: The numeric value to compare against.
 # 2. Defines a nested function `condition` to:
 #    - Evaluate the condition based on the operator:
@@ -688,7 +1073,8 @@ def p_statement_rotation(p):
 #      - `=`: Returns `True` if the variable's value is equal to the specified value.
 #    - If the variable does not exist in `variables_number`, its value is treated as 0.
 # 3. Prints the condition for debugging purposes.
-# 4. Assigns the nested function to `p[0]` for deferred execution.
+# 4. Assigns the nested function to `p[0]` for deferred execution, described to the bytecode
+#    compiler with the comparison as a function of the `operator` module (see vm.py).
 
 # Notes:
 # - This function assumes the existence of a global `variables_number` dictionary to store variable values.
@@ -705,19 +1091,22 @@ def p_condition(p):
                  | number_or_id greater number_or_id
                  | number_or_id equal number_or_id'''
     variable_name = p[1]  # Capture the variable name
-    operator = p[2]       # Capture the operator (<, >, =)
+    comparison = p[2]     # Capture the operator (<, >, =)
     value = p[3]          # Capture the numeric value
+    if variable_name in procedure_parameters or value in procedure_parameters:
+        global_state.has_errors = True
+        sys.stderr.write(f"Error on line {find_line(line_offsets, p.lexpos(2))}: a condition cannot use a procedure parameter, conditions are evaluated by the compiler.\n")
 
     # Define a callable function to evaluate the condition
     def condition():
-        if operator == '<':
+        if comparison == '<':
             return variables_number.get(variable_name, 0) < value
-        elif operator == '>':
+        elif comparison == '>':
             return variables_number.get(variable_name, 0) > value
-        elif operator == '=':
+        elif comparison == '=':
             return variables_number.get(variable_name, 0) == value
 
-    p[0] = condition
+    p[0] = lower_action(condition, 'compare', variable_name, {'<': operator.lt, '>': operator.gt, '=': operator.eq}[comparison], value)
 
 
 # Function to parse and handle conditional statements.
@@ -788,7 +1177,7 @@ def p_statement_condition(p):
                     if callable(statement):
                         statement()
 
-    p[0] = condition_action
+    p[0] = lower_action(condition_action, 'if', condition_func, p[4], p[6] if len(p) == 8 else [])
 
 
 # Function to parse and handle 'for' loop statements.
@@ -806,7 +1195,8 @@ def p_statement_condition(p):
 # 2. Resolves the start and end values using the `resolve_value` function.
 # 3. Prints debugging information to indicate the start and progress of the loop.
 # 4. Defines a nested function `execute_loop` to:
-#    - Iterate over the range [start, end] (inclusive).
+#    - Iterate over the range [start, end] (inclusive), counting each iteration against the budget
+#      of the script (see watchdog.py).
 #    - Assign the current iteration value to the loop variable in `variables_number`.
 #    - Execute each statement in the loop body for the current iteration.
 #    - Print debugging information for each iteration and upon loop completion.
@@ -839,8 +1229,21 @@ def p_statement_loop(p):
     'statement : for id_number in lp number_or_id comma number_or_id rp do program rof'
     loop_var = p[2]
     start, end, body = resolve_value(p[5]), resolve_value(p[7]), p[10]
+    if not isinstance(start, int) or not isinstance(end, int):
+        # Undefined variable (already reported) or procedure parameter
+        if p[5] in procedure_parameters or p[7] in procedure_parameters:
+            global_state.has_errors = True
+            sys.stderr.write(f"Error on line {find_line(line_offsets, p.lexpos(1))}: the bounds of a loop cannot be procedure parameters.\n")
+        start, end = 0, -1
+    if loop_var in procedure_parameters:
+        global_state.has_errors = True
+        sys.stderr.write(f"Error on line {find_line(line_offsets, p.lexpos(1))}: the variable of a loop cannot be a procedure parameter.\n")
+        start, end = 0, -1
+
+    line = find_line(line_offsets, p.lexpos(1))
 
     for i in range(start, end + 1):
+        count_iteration('for', line, i - start)  # Stops a runaway script (see watchdog.py)
         variables_number[loop_var] = i
 
         for stmt in body:
@@ -849,12 +1252,13 @@ def p_statement_loop(p):
     def execute_loop():
 
         for i in range(start, end + 1):
+            count_iteration('for', line, i - start)
             variables_number[loop_var] = i
 
             for stmt in body:
                 stmt()
 
-    p[0] = execute_loop
+    p[0] = lower_action(execute_loop, 'for', loop_var, start, end, body, line)
 
 
 # Function to parse and handle 'while' loop statements.
@@ -873,7 +1277,8 @@ def p_statement_loop(p):
 #    - `body`: A list of statements to execute for each iteration.
 # 2. Defines a nested function `execute_while` to:
 #    - Continuously evaluate the condition using `condition()`.
-#    - If the condition is `True`, execute each statement in the loop body.
+#    - If the condition is `True`, count the iteration against the budget of the script
+#      (see watchdog.py), then execute each statement in the loop body.
 #    - If the condition is `False`, exit the loop.
 # 3. Prints debugging information to indicate the start, progress, and termination of the loop.
 # 4. Assigns the nested function to `p[0]` for deferred execution.
@@ -898,23 +1303,231 @@ def p_statement_while(p):
     'statement : while condition do program end'
     
     condition, body = p[2], p[4]  # Correct order of condition and body
+    line = find_line(line_offsets, p.lexpos(1))
 
     def execute_while():
         
         #Executes the while loop. The loop checks the condition and iterates over the body
-        #until the condition returns False.
+        #until the condition returns False, or until the budget of the script runs out.
         
+        iterations = 0
 
         while True:
             if not condition():  # Check the condition
 
                 break  # Exit the loop if the condition is False
             else:
+                count_iteration('while', line, iterations)  # Stops a runaway script (see watchdog.py)
+                iterations += 1
 
                 for stmt in body:  # Execute each statement in the body
                     stmt()
 
     # Store the function for later execution
-    p[0] = execute_while
+    p[0] = lower_action(execute_while, 'while', condition, body, line)
+
+
+
+
+# Function to parse and handle procedure definitions.
+#
+# This function processes statements of the form:
+# `procedure <name> (cursor <c>, <n>, ...) do <program> end`.
+# A parameter preceded by `cursor` is a cursor, the others are numbers (sizes, distances, angles...).
+# The body is compiled once into C functions taking the parameters, instead of being copied at
+# every call (see `p_statement_call` and `generate_c_code`).
+#
+# Parameters:
+# - p: A yacc parsing object containing tokens and parsing state.
+#
+# Logic:
+# 1. `p_procedure_header` runs before the body is parsed: it records the signature of the
+#    procedure and makes its parameters resolve to the names of the C parameters (see
+#    `procedure_parameters`), so the body instructions use them instead of pool indices or values.
+# 2. Once the body is parsed, its statements are executed and the C instructions they produce are
+#    moved from `parsed_data_c` to `script_procedures`.
+# 3. The parameters are cleared, and `p[0]` receives an action with nothing left to do.
+#
+# Notes:
+# - The procedure is compiled where it is defined: the global number variables used by the body
+#   take their value at the definition.
+# - A parameter can be used as the cursor of `draw`, `move`, `rotate` and `set ... thickness`, as
+#   the size of a shape and as a distance, angle or thickness. Conditions, assignments, loops and
+#   path vertices are evaluated by the compiler and cannot use parameters, and the body cannot
+#   create cursors or groups.
+# - The parameters are only known from the header to the `end` of the procedure (see
+#   `procedure_parameters` and `cursor_parameters`), not as variables of the script: a cursor
+#   parameter takes no slot in the cursor pool, and its name can be given to a cursor or a number
+#   after the procedure.
+# - A procedure can call the procedures defined before it, but not itself.
+#
+# Example Usage:
+# Input:
+# ```
+# procedure tile (cursor c, s) do
+#     draw (square, s) with c
+#     move c by s
+# end
+# ```
+# Parsing stores in `script_procedures`:
+# `'tile': ([('c', 'cursor'), ('s', 'number')], ['queuePooledDraw(renderer, FORM_SQUARE, pool, arg_c, arg_s, 0, 0); // Draw a square with c', 'movePooledCursor(&cursor_pool, arg_c, arg_s); // Move c'])`
+
+procedure_signatures = {}  # Parameters of each procedure parsed so far
+procedure_stack = []       # Procedure whose body is being parsed
+
+def p_statement_procedure(p):
+    'statement : procedure_header program end'
+    name, parameters, first_instruction = p[1]
+    body = p[2]
+
+    for stmt in body:
+        stmt()
+    script_procedures[name] = (parameters, parsed_data_c[first_instruction:])
+    del parsed_data_c[first_instruction:]
+
+    procedure_parameters.clear()
+    cursor_parameters.clear()
+    procedure_stack.pop()
+
+    def procedure_action():
+        pass  # Compiled while parsing
+
+    p[0] = lower_action(procedure_action, 'nop')
+
+def p_procedure_header(p):
+    '''procedure_header : procedure id_procedure lp parameter_list rp do
+                        | procedure id_procedure lp rp do'''
+    name = p[2]
+    parameters = p[4] if len(p) == 7 else []
+    line_number = find_line(line_offsets, p.lexpos(1))
+
+    if procedure_stack:
+        global_state.has_errors = True
+        sys.stderr.write(f"Error on line {line_number}: procedure '{name}' cannot be defined inside procedure '{procedure_stack[-1]}'.\n")
+    if name in procedure_signatures:
+        global_state.has_errors = True
+        sys.stderr.write(f"Error on line {line_number}: procedure '{name}' is already defined.\n")
+    names = [parameter for parameter, kind in parameters]
+    if len(set(names)) != len(names):
+        global_state.has_errors = True
+        sys.stderr.write(f"Error on line {line_number}: procedure '{name}' has two parameters with the same name.\n")
+
+    procedure_signatures[name] = parameters
+    procedure_stack.append(name)
+    procedure_parameters.clear()
+    procedure_parameters.update({parameter: f'arg_{parameter}' for parameter in names})
+    # Instructions produced while the body is parsed (by `for` loops) belong to the procedure
+    p[0] = (name, parameters, len(parsed_data_c))
+
+# Builds the list of parameters of a procedure, as (name, 'cursor' or 'number') pairs.
+def p_parameter_list(p):
+    '''parameter_list : parameter
+                      | parameter comma parameter_list'''
+    if len(p) == 2:
+        p[0] = [p[1]]
+    else:
+        p[0] = [p[1]] + p[3]
+
+# A parameter is a cursor (`cursor c`) or a number (`n`).
+def p_parameter(p):
+    '''parameter : cursor id_cursor
+                 | id_number'''
+    if len(p) == 3:
+        p[0] = (p[2], 'cursor')
+    else:
+        p[0] = (p[1], 'number')
+
+
+# Function to parse and handle procedure calls.
+#
+# This function processes statements of the form:
+# `call <name> (<cursor or number>, ...)`, with one argument per parameter of the procedure.
+#
+# Parameters:
+# - p: A yacc parsing object containing tokens and parsing state.
+#
+# Logic:
+# 1. Checks the arguments against the signature of the procedure: a cursor for each cursor
+#    parameter, a number or numeric variable for each number parameter.
+# 2. Defines a nested function `call_action` to:
+#    - Resolve the arguments: the pool index of the cursors and the value of the numbers.
+#    - Generate the C instruction `procedure_<name>(<arguments>);`, which `generate_c_code` turns
+#      into calls of the C functions of the procedure.
+#    - Append the generated instruction to the `parsed_data_c` list.
+# 3. Assigns the nested function to `p[0]` for deferred execution, described as reading its number
+#    arguments, so the engines store the values of the loops before calling it (see vm.py).
+#
+# Notes:
+# - Calling a procedure with a cursor array calls it once for each cursor of the array, in a
+#   one-line C loop (see `pooled_instruction`).
+#
+# Example Usage:
+# Input: `call tile (cursor1, 40)`
+# Parsing generates a function that appends:
+# `procedure_tile(0, 40); // Call tile` to `parsed_data_c`.
+
+def p_statement_call(p):
+    '''statement : call id_procedure lp argument_list rp
+                 | call id_procedure lp rp'''
+    name = p[2]
+    arguments = p[4] if len(p) == 6 else []
+    line_number = find_line(line_offsets, p.lexpos(1))
+    parameters = procedure_signatures.get(name, [])
+
+    valid = True
+    if name in procedure_stack:
+        valid = False
+        sys.stderr.write(f"Error on line {line_number}: procedure '{name}' cannot call itself.\n")
+    elif len(arguments) != len(parameters):
+        valid = False
+        sys.stderr.write(f"Error on line {line_number}: procedure '{name}' takes {len(parameters)} arguments, {len(arguments)} given.\n")
+    else:
+        for (parameter, kind), (argument_kind, argument) in zip(parameters, arguments):
+            if kind != argument_kind:
+                valid = False
+                sys.stderr.write(f"Error on line {line_number}: parameter '{parameter}' of procedure '{name}' expects a {kind}.\n")
+    if not valid:
+        global_state.has_errors = True
+
+    def call_action():
+        if not valid:
+            return
+        # A cursor array argument calls the procedure for each of its cursors
+        array = next((argument for kind, argument in arguments
+                      if kind == 'cursor' and argument in cursor_arrays and argument not in procedure_parameters), None)
+
+        def instruction(index):
+            values = []
+            for kind, argument in arguments:
+                if argument == array:
+                    values.append(str(index))
+                elif kind == 'cursor':
+                    values.append(str(cursor_index(argument)))
+                else:
+                    values.append(str(resolve_value(argument)))
+            return f"procedure_{name}({', '.join(values)}); // Call {name}"
+
+        if array is None:
+            instruction_c = instruction(None)
+        else:
+            instruction_c = pooled_instruction(array, instruction)
+        parsed_data_c.append(instruction_c)
+
+    p[0] = lower_action(call_action, 'reads', [argument for kind, argument in arguments if kind == 'number'])
+
+# Builds the list of arguments of a call, as ('cursor' or 'number', value) pairs.
+def p_argument_list(p):
+    '''argument_list : argument
+                     | argument comma argument_list'''
+    if len(p) == 2:
+        p[0] = [p[1]]
+    else:
+        p[0] = [p[1]] + p[3]
 
+def p_argument_cursor(p):
+    'argument : id_cursor'
+    p[0] = ('cursor', p[1])
 
+def p_argument_number(p):
+    'argument : number_or_id'
+    p[0] = ('number', p[1])
@@ -0,0 +1,215 @@
+import hashlib
+import marshal
+import operator
+import os
+import sys
+from tokeniser import variables_number
+from state import global_state
+from watchdog import check_budget
+from vm import compile_program, run_bytecode
+from ircache import evict_cache_files
+
+# Module to run the parsed program as generated Python code.
+#
+# An alternative to the bytecode of vm.py for the scripts spending their time in loops, such as
+# parameter sweeps. The program is translated into the source of one Python function, in which
+# the variables are local variables and the loops are native `for` and `while` loops, then
+# compiled once with `compile`. CPython runs the loops at its own speed, without a call per
+# statement or a dispatch per instruction.
+#
+# Logic:
+# 1. `generate_python_source` reads the description of each action (see `lower_action` in
+#    parser.py) and writes the matching Python statements. The actions writing C instructions
+#    are called, from the tuple of actions given to the function.
+# 2. `load_script_function` compiles the source, or loads the code object compiled for the same
+#    source from the cache (`CACHE_DIRECTORY`), keyed by the SHA-256 of the source. The cache
+#    keeps the `MAX_CACHED_SCRIPTS` most recently used scripts (see `evict_cache_files`).
+# 3. The function loads the variables from `variables_number`, runs, and writes them back. It
+#    counts the iterations of the loops against the budget of the script (see watchdog.py).
+#
+# Notes:
+# - The variables are renamed `var_<name>`, so no name of a script can be a Python keyword.
+# - The actions reading number variables when they run (the shapes of a variable size, the
+#   procedure calls) are described as 'reads' by the parser: the local variables they read are
+#   stored in `variables_number` before calling them. The other actions are called as they are.
+# - CPython limits the number of nested loops in one function (20). A deeper script cannot be
+#   compiled, and is run as bytecode instead (see `run_python`).
+#
+# Example Usage:
+# run_python(parsed_data)
+
+# Python operator written for each function of the `operator` module used by the parser.
+OPERATORS = {
+    operator.add: '+', operator.sub: '-', operator.mul: '*', operator.floordiv: '//', operator.mod: '%',
+    operator.lt: '<', operator.gt: '>', operator.eq: '==',
+}
+
+# Directory of the compiled scripts, next to the compiled modules of the compiler.
+CACHE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '__pycache__', 'scripts')
+MAX_CACHED_SCRIPTS = 256  # Compiled scripts kept in the cache
+MAX_SCRIPT_CACHE_BYTES = 16 * 1024 * 1024  # Total size of the files of the cache
+
+compiled_scripts = {}  # Code objects already loaded by this process, by hash of their source
+
+
+# Function to translate a parsed program into the source of a Python function.
+#
+# Parameters:
+# - statements: The list of actions returned by the parser.
+#
+# Returns:
+# - The source of the function `run_script(variables_number, actions)`, and the tuple of the
+#   actions it calls, in the order of their index.
+#
+# Example Usage:
+# `x = 0 while x < 3 do x = x + 1 end` gives:
+# def run_script(variables_number, actions):
+#     countdown = global_state.iteration_countdown
+#     var_x = variables_number.get('x', 0)
+#     iterations_0 = 0
+#     while var_x < 3:
+#         countdown -= 1
+#         if not countdown:
+#             countdown = check_budget('while', 1, iterations_0)
+#         iterations_0 += 1
+#         var_x = var_x + 1
+#     global_state.iteration_countdown = countdown
+#     variables_number['x'] = var_x
+def generate_python_source(statements):
+    actions = []
+    names = []  # Variables of the script, in order of first use
+    loop_count = [0]
+
+    def local(name):
+        if name not in names:
+            names.append(name)
+        return f'var_{name}'
+
+    def condition(action):
+        _, left, function, right = action.instruction
+        # A number on the left reads as 0, as `variables_number.get` does for a key that is not a name
+        return f"{local(left) if isinstance(left, str) else '0'} {OPERATORS[function]} {right!r}"
+
+    def call(action):
+        actions.append(action)
+        return f'action_{len(actions) - 1}()'
+
+    def count_iteration(padding, kind, line, iterations):
+        # The same countdown as `count_iteration` in watchdog.py, on a local variable
+        return [f'{padding}countdown -= 1',
+                f'{padding}if not countdown:',
+                f'{padding}    countdown = check_budget({kind!r}, {line}, {iterations})']
+
+    def block(statements, indent):
+        lines = []
+        padding = '    ' * indent
+        for statement in statements:
+            instruction = getattr(statement, 'instruction', None)
+            kind = instruction[0] if instruction else 'call'
+            if kind == 'call':
+                lines.append(padding + call(statement))
+            elif kind == 'arithmetic':
+                _, target, source, function, constant = instruction
+                lines.append(f'{padding}{local(target)} = {local(source)} {OPERATORS[function]} {constant!r}')
+            elif kind == 'reads':
+                # The action reads the current values, for instance the variables of a loop
+                for name in instruction[1]:
+                    if isinstance(name, str) and name in variables_number:
+                        lines.append(f'{padding}variables_number[{name!r}] = {local(name)}')
+                lines.append(padding + call(statement))
+            elif kind == 'if':
+                _, condition_action, then_block, else_block = instruction
+                lines.append(f'{padding}if {condition(condition_action)}:')
+                lines.extend(block(then_block, indent + 1))
+                if else_block:
+                    lines.append(f'{padding}else:')
+                    lines.extend(block(else_block, indent + 1))
+            elif kind == 'for':
+                _, variable, start, end, body, line = instruction
+                counter = f'counter_{loop_count[0]}'  # As `range`, the body cannot change the iterations
+                loop_count[0] += 1
+                lines.append(f'{padding}for {counter} in range({start}, {end + 1}):')
+                lines.extend(count_iteration(padding + '    ', 'for', line, f'{counter} - {start}'))
+                lines.append(f'{padding}    {local(variable)} = {counter}')
+                lines.extend(block(body, indent + 1))
+            elif kind == 'while':
+                _, condition_action, body, line = instruction
+                counter = f'iterations_{loop_count[0]}'
+                loop_count[0] += 1
+                lines.append(f'{padding}{counter} = 0')
+                lines.append(f'{padding}while {condition(condition_action)}:')
+                lines.extend(count_iteration(padding + '    ', 'while', line, counter))
+                lines.append(f'{padding}    {counter} += 1')
+                lines.extend(block(body, indent + 1))
+            # 'nop': the action did its work while parsing
+        return lines or [padding + 'pass']
+
+    body = block(statements, 1)
+    source = ['def run_script(variables_number, actions):']
+    if actions:
+        source.append(f"    {', '.join(f'action_{index}' for index in range(len(actions)))}, = actions")
+    source.append('    countdown = global_state.iteration_countdown')
+    source.extend(f'    var_{name} = variables_number.get({name!r}, 0)' for name in names)
+    source.extend(body)
+    source.append('    global_state.iteration_countdown = countdown')
+    source.extend(f'    variables_number[{name!r}] = var_{name}' for name in names if name in variables_number)
+    return '\n'.join(source) + '\n', tuple(actions)
+
+
+# Function to compile the source of a script function, or to load it from the cache.
+#
+# Parameters:
+# - source: The source written by `generate_python_source`.
+#
+# Returns:
+# - The function `run_script`.
+#
+# Notes:
+# - The code objects are stored with `marshal`, whose format depends on the Python version, so
+#   the name of the file contains the cache tag of the interpreter (such as `cpython-311`).
+# - A cache that cannot be read or written is ignored: the source is compiled again.
+# - Loading a file marks it as recently used; writing one removes the least recently used
+#   files beyond `MAX_CACHED_SCRIPTS` files or `MAX_SCRIPT_CACHE_BYTES` bytes.
+def load_script_function(source):
+    key = hashlib.sha256(source.encode()).hexdigest()
+    code = compiled_scripts.get(key)
+    if code is None:
+        path = os.path.join(CACHE_DIRECTORY, f'{key}.{sys.implementation.cache_tag}.bin')
+        try:
+            with open(path, 'rb') as file:
+                code = marshal.load(file)
+            os.utime(path)  # Most recently used
+        except (OSError, EOFError, ValueError, TypeError):
+            if code is None:
+                code = compile(source, f'<script {key[:12]}>', 'exec')
+                try:
+                    os.makedirs(CACHE_DIRECTORY, exist_ok=True)
+                    with open(path + '.tmp', 'wb') as file:
+                        marshal.dump(code, file)
+                    os.replace(path + '.tmp', path)  # Never leaves a partly written file
+                    evict_cache_files(CACHE_DIRECTORY, MAX_CACHED_SCRIPTS, MAX_SCRIPT_CACHE_BYTES)
+                except OSError:
+                    pass
+        compiled_scripts[key] = code
+    namespace = {'global_state': global_state, 'check_budget': check_budget}
+    exec(code, namespace)
+    return namespace['run_script']
+
+
+# Function to run a parsed program as generated Python code.
+#
+# Logic:
+# 1. Translates the program and loads its function (see `load_script_function`).
+# 2. If CPython cannot compile it (too many nested loops), runs the program as bytecode.
+# 3. Calls the function with `variables_number` and the actions of the program.
+#
+# Example Usage:
+# run_python(parsed_data)
+def run_python(statements):
+    source, actions = generate_python_source(statements)
+    try:
+        run_script = load_script_function(source)
+    except (SyntaxError, RecursionError, MemoryError):
+        run_bytecode(compile_program(statements))
+        return
+    run_script(variables_number, actions)
@@ -17,6 +17,7 @@
 # Notes:
 # - This design centralizes the management of global states, reducing duplication and ensuring consistency.
 # - The `has_errors` flag is initialized as `False` and can be updated based on application logic.
+# - The budgets of the loops are unlimited until `start_watchdog` sets them (see watchdog.py).
 #
 # Example Usage:
 # # Accessing the shared global state
@@ -25,6 +26,12 @@
 class GlobalState:
     def __init__(self):
         self.has_errors = False
+        # Budgets of the loops of the script (see watchdog.py)
+        self.iteration_budget = float('inf')  # Iterations left, besides the countdown
+        self.iteration_countdown = 1  # Iterations left until the next check of the budgets
+        self.deadline = float('inf')  # Value of `time.perf_counter()` at which the loops stop
+        self.iteration_budget_limit = None  # Budgets given to `start_watchdog`, for the diagnostic
+        self.time_budget_limit = None
 
 # Create a unique instance of GlobalState to be shared across modules.
 global_state = GlobalState()
\ No newline at end of file
@@ -0,0 +1,181 @@
+import io
+import marshal
+import sys
+import tempfile
+from parser import *
+from tokeniser import *
+from generationCode import CodeSections, write_c_code
+from incremental import IDENTIFIER, statement_lines, shift_lines
+from optimizer import fold_constants, display_optimization_report
+from vm import compile_program, run_bytecode
+from state import global_state
+
+# Module to compile very large scripts with a memory that does not grow with their number of
+# statements (`python main.py --stream <file>`).
+#
+# Without it, main.py reads the whole script, lists the offsets of all its lines, builds the
+# actions of all its statements, and keeps every C instruction in `parsed_data_c` until the code
+# is generated. Here the script is read from the file in blocks, one top-level statement at a
+# time (see `statement_lines` in incremental.py). Each statement is parsed alone, run, and its C
+# instructions are sorted into the sections of the generated code (see `CodeSections`), which
+# are kept in temporary files. The C file is written from these files at the end.
+#
+# Logic:
+# 1. `stream_script` parses each statement with the offsets of its own lines, and writes its
+#    diagnostics moved to the line of the statement in the file (see `shift_lines`).
+# 2. Unless a statement had errors, the statement is run as bytecode (see vm.py). The C
+#    instructions written while parsing it (the `for` loops) and while running it are folded
+#    (see `fold_constants`) and stored in two `SpooledSection`s, so the code keeps the order of
+#    main.py: the instructions written while parsing the script, then those written by its run.
+# 3. The values of the number variables changed by the runs are kept in `run_values`, only read
+#    by the runs: the statements after them are parsed with the values known while parsing, as
+#    main.py parses the whole script before running it.
+# 4. At the end, the instructions are sorted into the sections of the code, written to their own
+#    temporary files, then copied into the C file (see `write_c_code`).
+#
+# Notes:
+# - The memory still grows with the names of the script (cursors, variables, procedures, paths)
+#   and with its distinct selectable shapes, but not with its statements or instructions.
+# - Each statement runs before the next one is parsed, where main.py runs the script with the
+#   values left by the whole parse. A variable read or changed by a run cannot be assigned again
+#   while parsing the statements after it: the script is stopped with an error asking to run it
+#   without `--stream`. The paths are numbered in the order of the file, so their table can differ.
+# - Only the constant folding is run: the other optimization passes need the whole program.
+# - The statements are always run as bytecode: generated Python code would be compiled again
+#   for each statement.
+# - A statement is parsed alone, so a syntax error does not spread to the statements after it.
+#
+# Example Usage:
+# stream_script(yacc(), file_path)
+
+READ_BUFFER_SIZE = 1 << 20  # Bytes read from the script at a time
+SPOOL_BUFFER_SIZE = 1 << 16  # Bytes buffered by each temporary file
+
+run_values = {}  # Values of the number variables used by the runs, by name
+
+
+# Class of a list kept in a temporary file, for the sections of the code (see `CodeSections`).
+#
+# The items, strings or tuples of strings and numbers, are written with `marshal` as they are
+# appended, and read back in order by iterating.
+#
+# Example Usage:
+# section = SpooledSection()
+# section.append("movePooledCursor(&cursor_pool, 0, 10); // Move c")
+# for line in section: ...
+class SpooledSection:
+    def __init__(self):
+        self.file = tempfile.TemporaryFile(buffering=SPOOL_BUFFER_SIZE)
+        self.count = 0
+
+    def append(self, item):
+        marshal.dump(item, self.file)
+        self.count += 1
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        self.file.seek(0)  # Writes the buffer first
+        for _ in range(self.count):
+            yield marshal.load(self.file)
+        self.file.seek(0, io.SEEK_END)  # The next items are appended
+
+
+# Function to run the statements of a program with the values of the variables left by the runs
+# before it, keeping its changes in `run_values`.
+#
+# Notes:
+# - A run only writes the variables known while parsing (see `run_bytecode`), which are put back
+#   for the parsing of the next statement.
+def run_statements(statements):
+    bytecode = compile_program(statements)
+    names = [key for key in bytecode[1] if isinstance(key, str) and key in variables_number]
+    parsed_values = [variables_number[name] for name in names]
+    for name in names:
+        variables_number[name] = run_values.get(name, variables_number[name])
+    run_bytecode(bytecode)
+    for name, value in zip(names, parsed_values):
+        run_values[name] = variables_number[name]
+        variables_number[name] = value
+
+
+# Function to parse and run one statement, read from the file.
+#
+# Parameters:
+# - parser: The parser built by `yacc()`.
+# - text: The lines of the statement.
+# - line: The line of the statement in the file.
+# - run: Whether to run the statement, `False` once the script has errors.
+#
+# Returns:
+# - The C instructions written while parsing, those written while running, and whether the
+#   statement has errors.
+def stream_statement(parser, text, line, run):
+    line_offsets[:] = count_lines(text)  # Only the lines of the statement (see `find_line`)
+    del parsed_data_c[:]
+    global_state.has_errors = False
+    # The variables used by the runs before, which the parse of the statement could assign
+    used_values = [(name, variables_number.get(name)) for name in set(IDENTIFIER.findall(text)) if name in run_values]
+    stderr, sys.stderr = sys.stderr, io.StringIO()
+    try:
+        statements = parser.parse(text, lexer=lexer, tracking=True)
+        for name, value in used_values:
+            if variables_number.get(name) != value:
+                sys.stderr.write(f"Error on line 1: '{name}' is assigned while parsing after a statement run with it, "
+                                 "which main.py runs with the new value. Run the script without --stream.\n")
+                global_state.has_errors = True
+        parsed_instructions = parsed_data_c[:]
+        del parsed_data_c[:]
+        if run and statements and not global_state.has_errors:
+            for statement in statements:
+                if not callable(statement):  # Check if the instruction is executable, as main.py
+                    sys.stderr.write(f"Invalid instruction detected on line 1: {statement}\n")
+                    global_state.has_errors = True
+                    break
+            else:
+                run_statements(statements)
+        return parsed_instructions, parsed_data_c[:], global_state.has_errors
+    finally:
+        # Also written when the watchdog stops the script
+        diagnostics, sys.stderr = sys.stderr.getvalue(), stderr
+        sys.stderr.write(shift_lines(diagnostics, line - 1))
+
+
+# Function to compile a script one statement at a time, and to write its C file.
+#
+# Parameters:
+# - parser: The parser built by `yacc()`.
+# - file_path: The path of the script.
+#
+# Notes:
+# - Exits with status 1, without writing the C file, if the script has errors.
+#
+# Example Usage:
+# stream_script(yacc(), "scene.txt")
+def stream_script(parser, file_path):
+    parsed_instructions, run_instructions = SpooledSection(), SpooledSection()
+    instruction_count = 0
+    has_errors = False
+    with open(file_path, "r", buffering=READ_BUFFER_SIZE) as file:
+        for line, lines in statement_lines(file):
+            parsed, run, statement_has_errors = stream_statement(parser, ''.join(lines), line, not has_errors)
+            has_errors = has_errors or statement_has_errors
+            if has_errors:
+                continue  # Still parsed, for the diagnostics
+            instruction_count += len(parsed) + len(run)
+            for instruction in fold_constants(parsed):
+                parsed_instructions.append(instruction)
+            for instruction in fold_constants(run):
+                run_instructions.append(instruction)
+    global_state.has_errors = has_errors
+    if has_errors:
+        sys.exit(1)
+    variables_number.update(run_values)  # The values after the run of the script, as in main.py
+
+    sections = CodeSections(SpooledSection)
+    for instructions in (parsed_instructions, run_instructions):
+        for instruction in instructions:
+            sections.add(instruction)
+    display_optimization_report([('constant folding', instruction_count - len(parsed_instructions) - len(run_instructions))])
+    write_c_code(sections, script_paths, script_procedures)
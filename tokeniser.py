@@ -1,6 +1,8 @@
 from ply.lex import *
 from ply.yacc import *
+import re
 import sys
+from bisect import bisect_right
 from difflib import get_close_matches
 from state import global_state
 
@@ -10,29 +12,35 @@ from state import global_state
 # correct usage, checks if the file exists, and reads its contents for further processing.
 #
 # Logic:
-# 1. Verifies that exactly one argument is passed (the file path).
+# 1. Verifies that exactly one argument, besides the options starting with `--`, is passed (the file path).
 #    - If not, prints usage instructions and exits with an error code.
 # 2. Attempts to open and read the specified file.
 #    - If the file does not exist, prints an error message and exits with a different error code.
 #
 # Notes:
-# - The script expects to be run as `python main.py <file>` where `<file>` is the path to the input file.
+# - The script expects to be run as `python main.py [options] <file>` where `<file>` is the path
+#   to the input file. The options (`--check`, `--engine=bytecode|python`, `--max-iterations=<n>`,
+#   `--max-seconds=<s>`,
+#   `--no-cache`, `--parser=ply|descent`, `--stream`) are read by main.py.
 # - Error codes:
 #   - `1`: Incorrect usage (missing or extra arguments).
 #   - `2`: File not found.
 #
 # Example Usage:
-# - Correct: `python main.py input.txt`
+# - Correct: `python main.py input.txt` or `python main.py --engine=python input.txt`
 # - Incorrect: `python main.py` or `python main.py input.txt extra_arg`
-if len(sys.argv) != 2:
-    sys.stderr.write("Usage: python main.py <file>") # Inform the user of the correct usage.
+file_arguments = [argument for argument in sys.argv[1:] if not argument.startswith('--')]
+if len(file_arguments) != 1:
+    sys.stderr.write("Usage: python main.py [--check] [--engine=bytecode|python] [--max-iterations=<n>] [--max-seconds=<s>] [--no-cache] [--parser=ply|descent] [--stream] <file>") # Inform the user of the correct usage.
     sys.exit(1) # Exit with an error code for incorrect usage.
 
-file_path = sys.argv[1] # Retrieve the file path from command-line arguments.
+file_path = file_arguments[0] # Retrieve the file path from command-line arguments.
 try:
     # Attempt to open and read the specified file.
     with open(file_path, "r") as file:
-        data = file.read() # Read the file's content into the `data` variable.
+        # Read the file's content into the `data` variable, or, with `--stream`, leave it to
+        # streaming.py (`--check` reads the whole file)
+        data = '' if '--stream' in sys.argv[1:] and '--check' not in sys.argv[1:] else file.read()
 except FileNotFoundError:
     # Handle the case where the file does not exist.
     sys.stderr.write(f"Error: file '{file_path}' not found.") # Inform the user of the missing file.
@@ -134,10 +142,8 @@ def find_line(line_offsets, lexpos):
     Returns:
     - int: The line number containing the character position.
     """
-    for i, offset in enumerate(line_offsets):
-        if lexpos < offset:
-            return i + 1
-    return len(line_offsets)
+    # The offsets are sorted: a binary search keeps large scripts fast to parse and check
+    return min(bisect_right(line_offsets, lexpos) + 1, len(line_offsets))
 
 
 
@@ -154,6 +160,7 @@ reserved = {
     'draw': 'draw',
     'create': 'create',
     'cursor': 'cursor',
+    'array': 'array',
     'at': 'at',
     'with': 'with',
     'set': 'set',
@@ -171,6 +178,13 @@ reserved = {
     'by': 'by',
     'rotate': 'rotate',
     'mode': 'mode',
+    # groups
+    'group': 'group',
+    'add': 'add',
+    'to': 'to',
+    # procedures
+    'procedure': 'procedure',
+    'call': 'call',
     # Forms
     'circle': 'form',
     'filledcircle':'form',
@@ -178,6 +192,7 @@ reserved = {
     'filledsquare':'form',
     'line': 'form',
     'arc':'arc',
+    'path':'path',
     # animation mode
     'snail': 'animation',
     'bounce':'animation',
@@ -186,7 +201,7 @@ reserved = {
 
 # Tokens list
 tokens = (
-    'number', 'comma', 'equal', 'id_cursor', 'id_number','plus','minus','greater','less', 
+    'number', 'comma', 'equal', 'id_cursor', 'id_number', 'id_group', 'id_procedure', 'plus','minus','greater','less', 
     'dividedby', 'modulo', 'times', 'form', 'lp', 'rp'
 ) + tuple(reserved.values())
 
@@ -209,9 +224,35 @@ t_ignore = ' \t'
 # To ignore empty or blank lines
 t_ignore_comment = r'\#.*'
 
+# Text read after an unknown name to tell what it is being assigned: the `=` and the start of
+# the value, long enough for `create cursor`. Matching it in place does not copy the rest of the file.
+ASSIGNMENT = re.compile(r'\s*=\s*(.{0,13})', re.DOTALL)
+
+# Function to tell whether a name is being declared: followed by `= create cursor`, `= create group`
+# or `= <number>`, the contexts in which `t_id_cursor` declares an unknown name.
+def declares_name(t):
+    assignment = ASSIGNMENT.match(t.lexer.lexdata, t.lexer.lexpos)
+    if not assignment:
+        return False
+    after_equals = assignment.group(1)
+    return after_equals[:1].isdigit() or after_equals.startswith(('create cursor', 'create group'))
+
 # Table of defined variables
 variables_cursor = []
+cursor_positions = {}  # Position of each name in `variables_cursor`, to find a cursor without scanning the list
+cursor_slots = []  # Slot in the cursor pool of the first names of `variables_cursor` (see `cursor_index`)
 variables_number = {}
+variables_group = []
+cursor_arrays = {}  # Number of cursors of each cursor array, by name
+variables_procedure = []
+cursor_parameters = set()  # Cursor parameters of the procedure being parsed, which take no slot in the cursor pool
+procedure_parameters = {}  # Parameters of the procedure being compiled: name -> name of the C parameter
+
+# Table of the vertex lists drawn with `draw (path, ...)`, written as a constant table in the C code
+script_paths = []
+
+# Procedures of the script, compiled to C functions: name -> (parameters, instructions of the body)
+script_procedures = {}
 
 # Handles newlines and updates line number
 def t_newline(t):
@@ -260,9 +301,11 @@ def correct_keyword(word, word_list):
 #
 # Logic:
 # 1. Matches identifiers against reserved keywords.
-# 2. Checks if the identifier is a known cursor or number variable.
+# 2. Checks if the identifier is a known cursor, number or group variable, or a procedure.
 # 3. For unknown variables:
-#    - Analyzes the context after an `=` to determine if it represents a new cursor or number.
+#    - In a procedure header, declares the procedure or one of its parameters, known until the `end` of
+#      the procedure (see `procedure_parameters` and `cursor_parameters`).
+#    - Analyzes the context after an `=` to determine if it represents a new cursor, group or number.
 #    - If valid, assigns the correct type and appends it to the appropriate list.
 #    - Otherwise, searches for a similar keyword and suggests corrections.
 # 4. Handles lexical errors by displaying error messages with suggestions and marking the error state.
@@ -280,27 +323,55 @@ def t_id_cursor(t):
     if t.value in reserved:
         t.type = reserved[t.value]
         return t
-    elif t.value in variables_cursor:
+    elif t.value in cursor_positions:
         t.type = 'id_cursor'
         return t
     elif t.value in variables_number:
         t.type = 'id_number'
         return t
+    elif t.value in procedure_parameters and not declares_name(t):
+        # Parameter of the procedure being parsed. A variable of the same name declared just after
+        # the `end`, which PLY reads before ending the procedure, is declared below instead
+        t.type = 'id_cursor' if t.value in cursor_parameters else 'id_number'
+        return t
+    elif t.value in variables_group:
+        t.type = 'id_group'
+        return t
+    elif t.value in variables_procedure:
+        t.type = 'id_procedure'
+        return t
     else:
+        # Context verification in a procedure header: `procedure <name> (cursor <c>, <n>) do`
+        line_start = t.lexer.lexdata.rfind('\n', 0, t.lexpos) + 1
+        before = t.lexer.lexdata[line_start:t.lexpos]
+        if re.match(r'\s*procedure\b', before):
+            if re.fullmatch(r'\s*procedure\s+', before):
+                variables_procedure.append(t.value)  # New procedure
+                t.type = 'id_procedure'
+                return t
+            # New parameter, until the end of the procedure
+            procedure_parameters[t.value] = f'arg_{t.value}'
+            if re.search(r'\bcursor\s+$', before):
+                cursor_parameters.add(t.value)
+                t.type = 'id_cursor'
+            else:
+                t.type = 'id_number'
+            return t
         # Context verification after `=`
-        next_pos = t.lexer.lexpos
-        lexdata = t.lexer.lexdata
-        if next_pos < len(lexdata) and lexdata[next_pos:].lstrip().startswith('='):
-            equals_pos = lexdata.find('=', next_pos)
-            if equals_pos != -1:
-                after_equals = lexdata[equals_pos + 1:].lstrip()
-                if after_equals.startswith('create cursor'):
-                    variables_cursor.append(t.value)  # New cursor
-                    t.type = 'id_cursor'
-                    return t
-                elif after_equals and after_equals[0].isdigit():
-                    # calling `t_id_number` in a numerical context
-                    return t_id_number(t)
+        assignment = ASSIGNMENT.match(t.lexer.lexdata, t.lexer.lexpos)
+        if assignment:
+            after_equals = assignment.group(1)
+            if after_equals.startswith('create cursor'):
+                add_cursor(t.value)  # New cursor
+                t.type = 'id_cursor'
+                return t
+            elif after_equals.startswith('create group'):
+                variables_group.append(t.value)  # New group
+                t.type = 'id_group'
+                return t
+            elif after_equals and after_equals[0].isdigit():
+                # calling `t_id_number` in a numerical context
+                return t_id_number(t)
         # Error handling
 
         # Check if the word is close to an existing keyword-
@@ -342,27 +413,27 @@ def t_id_number(t):
     if t.value in reserved:
         t.type = reserved[t.value]
         return t
-    elif t.value in variables_cursor:
+    elif t.value in cursor_positions:
         t.type = 'id_cursor'
         return t
     elif t.value in variables_number:
         t.type = 'id_number'
         return t
+    elif t.value in variables_group:
+        t.type = 'id_group'
+        return t
     else:
         # context verification after `=`
-        next_pos = t.lexer.lexpos
-        lexdata = t.lexer.lexdata
-        if next_pos < len(lexdata) and lexdata[next_pos:].lstrip().startswith('='):
-            equals_pos = lexdata.find('=', next_pos)
-            if equals_pos != -1:
-                after_equals = lexdata[equals_pos + 1:].lstrip()
-                if after_equals and after_equals[0].isdigit():
-                    variables_number[t.value] = None  # New numeric variable
-                    t.type = 'id_number'
-                    return t
-                elif after_equals.startswith('create cursor'):
-                    # calling `t_id_cursor` in a cursor context
-                    return t_id_cursor(t)
+        assignment = ASSIGNMENT.match(t.lexer.lexdata, t.lexer.lexpos)
+        if assignment:
+            after_equals = assignment.group(1)
+            if after_equals and after_equals[0].isdigit():
+                variables_number[t.value] = None  # New numeric variable
+                t.type = 'id_number'
+                return t
+            elif after_equals.startswith('create cursor') or after_equals.startswith('create group'):
+                # calling `t_id_cursor` in a cursor or group context
+                return t_id_cursor(t)
         # errors management 
 
         # Check if the word is similar to an existing keyword
@@ -466,6 +537,8 @@ def t_error(t):
 # Logic:
 # 1. Checks if the input `value` is a string and exists in the `variables_number` dictionary.
 #    - If found, returns the corresponding numeric value.
+#    - In the body of a procedure, a number parameter gives the name of the parameter of the
+#      generated C function instead (see `procedure_parameters`).
 # 2. If the input is a string but not defined:
 #    - Logs an error message with the line number and variable name.
 #    - Marks the global error state as `True`.
@@ -493,7 +566,9 @@ def resolve_value(value):
     - An error message if the variable is undefined.
     """
 
-    if isinstance(value, str) and value in variables_number:
+    if isinstance(value, str) and value in procedure_parameters:
+        return procedure_parameters[value]  # Parameter of the C function of a procedure
+    elif isinstance(value, str) and value in variables_number:
         return variables_number[value]
     elif isinstance(value, str):  # Undefined variable
 
@@ -503,5 +578,112 @@ def resolve_value(value):
         return f"Error on line '{line_number}': variable '{value}' not defined.\n Please define '{value}' as a numeric variable."
     return value  # If it is a number
 
+# Utility function to add a name to `variables_cursor`.
+def add_cursor(cursor_id):
+    cursor_positions[cursor_id] = len(variables_cursor)
+    variables_cursor.append(cursor_id)
+
+# Utility function to set the number of cursors of a cursor array.
+#
+# Notes:
+# - The slots of the cursors after the array move (see `cursor_index`), so they are computed again.
+def set_cursor_array(cursor_id, count):
+    cursor_arrays[cursor_id] = count
+    del cursor_slots[cursor_positions[cursor_id] + 1:]
+
+# Utility function to find the index of a cursor in the generated cursor pool.
+#
+# Cursors are stored in the `cursor_pool` of the C runtime (see SDL/newcursor.c) and referenced
+# by index. The cursors take their slots in the order of `variables_cursor`, which only grows, so a
+# cursor keeps the same index for the whole script. A cursor array takes one slot per cursor
+# (see `cursor_arrays`) and its index is the slot of its first cursor. In the body of a procedure,
+# a cursor parameter gives the name of the parameter of the generated C function instead.
+#
+# Parameters:
+# - cursor_id: The name of the cursor or cursor array.
+#
+# Notes:
+# - The slots are computed once, in the order of `variables_cursor`, and kept in `cursor_slots`:
+#   finding a cursor does not go through the cursors before it, which made large scripts quadratic.
+#
+# Example Usage:
+# - With `variables_cursor == ["c", "d"]`, `cursor_index("d")` returns `1`.
+# - With `variables_cursor == ["row", "d"]` and `cursor_arrays == {"row": 10}`, `cursor_index("d")` returns `10`.
+def cursor_index(cursor_id):
+    if cursor_id in procedure_parameters:
+        return procedure_parameters[cursor_id]  # Parameter of the C function of a procedure
+    if cursor_id not in cursor_positions:
+        add_cursor(cursor_id)
+    position = cursor_positions[cursor_id]
+    while len(cursor_slots) <= position:
+        if not cursor_slots:
+            cursor_slots.append(0)
+            continue
+        name = variables_cursor[len(cursor_slots) - 1]  # The slots of a name follow those of the name before it
+        cursor_slots.append(cursor_slots[-1] + cursor_arrays.get(name, 1))
+    return cursor_slots[position]
+
+# Utility function to list the pool indices of a cursor, or of every cursor of a cursor array.
+#
+# Example Usage:
+# - With `cursor_arrays == {"row": 3}` and `row` first in `variables_cursor`, `cursor_indices("row")` is `range(0, 3)`.
+def cursor_indices(cursor_id):
+    first = cursor_index(cursor_id)
+    if cursor_id in procedure_parameters:
+        return [first]
+    return range(first, first + cursor_arrays.get(cursor_id, 1))
+
+# Utility function to write an instruction applied to a cursor, or to every cursor of a cursor array.
+#
+# Parameters:
+# - cursor_id: The name of the cursor or cursor array.
+# - instruction: A function returning the C instruction for a given index (a number or a C expression).
+#
+# Logic:
+# - For a single cursor, returns the instruction for its index.
+# - For a cursor array, returns a one-line `for` loop over its slots, so the size of the generated
+#   code does not depend on the number of cursors.
+#
+# Example Usage:
+# - `pooled_instruction("row", lambda index: f"movePooledCursor(&cursor_pool, {index}, 10);")` returns
+#   `for (int i = 0; i < 10; i++) movePooledCursor(&cursor_pool, i, 10);` for an array of 10 cursors.
+def pooled_instruction(cursor_id, instruction):
+    indices = cursor_indices(cursor_id)
+    if cursor_id not in cursor_arrays or cursor_id in procedure_parameters:
+        return instruction(indices[0])
+    return f"for (int i = {indices.start}; i < {indices.stop}; i++) {instruction('i')}"
+
+# Utility function to find the index of a group in the generated group pool.
+#
+# Groups are stored in the `group_pool` of the C runtime (see SDL/group.c) and referenced by
+# index, like cursors (see `cursor_index`).
+#
+# Parameters:
+# - group_id: The name of the group.
+#
+# Example Usage:
+# - With `variables_group == ["body", "arm"]`, `group_index("arm")` returns `1`.
+def group_index(group_id):
+    if group_id not in variables_group:
+        variables_group.append(group_id)
+    return variables_group.index(group_id)
+
+# Utility function to find the index of a vertex list in the generated path table.
+#
+# The vertices of every path are written once, in the `script_paths` table of the generated code
+# (see SDL/geometry.c), and the draw commands reference them by index. A path drawn several times
+# with the same vertices, for example in a loop, is stored once.
+#
+# Parameters:
+# - vertices: The (x, y) tuples of the path.
+#
+# Example Usage:
+# - With `script_paths == [((0, 0), (50, 0))]`, `path_index([(0, 0), (50, 0)])` returns `0`.
+def path_index(vertices):
+    vertices = tuple(vertices)
+    if vertices not in script_paths:
+        script_paths.append(vertices)
+    return script_paths.index(vertices)
+
 # Lexer construction
 lexer = lex()
\ No newline at end of file
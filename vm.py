@@ -0,0 +1,212 @@
+from tokeniser import variables_number
+from state import global_state
+from watchdog import check_budget
+
+# Module to run the parsed program as bytecode.
+#
+# The parser builds the program as a tree of nested functions (see parser.py). Running the tree
+# calls one Python function per statement, per condition and per variable access, and every
+# condition compares its operator string again. This module lowers the tree once into a flat
+# list of instructions, with the variables in numbered slots and the operators bound to functions
+# of the `operator` module, then runs the list in a single dispatch loop.
+#
+# Instructions (tuples starting with their opcode, padded with None to 6 fields):
+# - ARITHMETIC (target, source, function, constant): `slots[target] = function(slots[source], constant)`.
+# - CALL (action): Calls an action of the parser, which writes C instructions in `parsed_data_c`.
+# - CALL_READING (action, variables): Copies the slots of `variables`, pairs of a name and a slot,
+#   to `variables_number`, then calls an action reading them (shapes whose size is a variable).
+# - JUMP (target): Continues at the instruction `target`.
+# - JUMP_UNLESS (function, slot, value, target): Jumps to `target` unless `function(slots[slot], value)` is true.
+# - WHILE_START (function, slot, value, exit, counter): Starts a `while` loop if `function(slots[slot], value)`
+#   is true, or jumps to `exit`.
+# - WHILE_NEXT (function, slot, value, body, counter): Jumps back to `body` while the condition is true.
+# - FOR_START (counter, variable, start, end, exit): Starts a loop, or jumps to `exit` if it is empty.
+# - FOR_NEXT (counter, variable, end, body): Goes to the next value of the loop, jumping back to `body`.
+# - STOP: Ends the program. It is the last instruction, so the loop does not compare `pc` to the end.
+#
+# Notes:
+# - The slots are loaded from `variables_number` before running and written back after, so the
+#   actions called by the bytecode and `display_variables` see the same values as with the tree.
+# - A `for` loop counts in a slot of its own, as `range` does: the body can change the variable
+#   of the loop without changing the number of iterations.
+# - The loops count their iterations against the budget of the script (see watchdog.py). The key
+#   of the slot counting a loop holds its kind and line, for the diagnostic.
+#
+# Example Usage:
+# run_bytecode(compile_program(parsed_data))
+
+ARITHMETIC, CALL, CALL_READING, JUMP, JUMP_UNLESS, WHILE_START, WHILE_NEXT, FOR_START, FOR_NEXT, STOP = range(10)
+
+
+# Function to lower a parsed program into bytecode.
+#
+# Parameters:
+# - statements: The list of actions returned by the parser.
+#
+# Returns:
+# - The bytecode: the list of instructions and the list of the keys of the slots, the name of a
+#   variable, or a tuple for the counters of the loops and the constants.
+#
+# Logic:
+# 1. Reads the description of each action (see `lower_action` in parser.py).
+# 2. Lowers the arithmetic, the conditions and the loops into instructions, with jumps to the
+#    instructions written after them, patched once the blocks are lowered.
+# 3. Keeps the other actions, which only write C instructions, as calls.
+#
+# Example Usage:
+# `x = 0 while x < 3 do x = x + 1 end` is lowered into:
+# [(WHILE_START, lt, 1, 3, 3, 0), (ARITHMETIC, 1, 1, add, 1), (WHILE_NEXT, lt, 1, 3, 1, 0)]
+def compile_program(statements):
+    code = []
+    slots = {}  # Slot of each key
+
+    def slot(key):
+        if key not in slots:
+            slots[key] = len(slots)
+        return slots[key]
+
+    def operand(value):
+        # A variable is read from its slot; a number on the left of a condition reads as 0, as
+        # `variables_number.get` does for a key that is not a name.
+        return slot(value) if isinstance(value, str) else slot(('constant', 0))
+
+    def compile_block(block):
+        for statement in block:
+            instruction = getattr(statement, 'instruction', None)
+            if instruction is None:
+                code.append((CALL, statement))
+                continue
+            kind = instruction[0]
+            if kind == 'arithmetic':
+                _, target, source, function, constant = instruction
+                code.append((ARITHMETIC, slot(target), slot(source), function, constant))
+            elif kind == 'reads':
+                # Undefined names are left to the action, which reports them
+                variables = tuple((name, slot(name)) for name in instruction[1]
+                                  if isinstance(name, str) and name in variables_number)
+                code.append((CALL_READING, statement, variables) if variables else (CALL, statement))
+            elif kind == 'if':
+                _, condition, then_block, else_block = instruction
+                _, left, function, right = condition.instruction
+                skip = len(code)
+                code.append(None)
+                compile_block(then_block)
+                if else_block:
+                    end = len(code)
+                    code.append(None)
+                    code[skip] = (JUMP_UNLESS, function, operand(left), right, len(code))
+                    compile_block(else_block)
+                    code[end] = (JUMP, len(code))
+                else:
+                    code[skip] = (JUMP_UNLESS, function, operand(left), right, len(code))
+            elif kind == 'for':
+                _, variable, start, end, body, line = instruction
+                counter = slot(('for', line, start, len(code)))
+                start_position = len(code)
+                code.append(None)
+                compile_block(body)
+                code.append((FOR_NEXT, counter, slot(variable), end, start_position + 1))
+                code[start_position] = (FOR_START, counter, slot(variable), start, end, len(code))
+            elif kind == 'while':
+                _, condition, body, line = instruction
+                _, left, function, right = condition.instruction
+                counter = slot(('while', line, len(code)))
+                start_position = len(code)
+                code.append(None)
+                compile_block(body)
+                code.append((WHILE_NEXT, function, operand(left), right, start_position + 1, counter))
+                code[start_position] = (WHILE_START, function, operand(left), right, len(code), counter)
+            # 'nop': the action did its work while parsing
+
+    compile_block(statements)
+    # Every instruction has 6 fields, so the dispatch loop unpacks them in one step
+    code.append((STOP,))
+    return [instruction + (None,) * (6 - len(instruction)) for instruction in code], list(slots)
+
+
+# Function to run a program lowered by `compile_program`.
+#
+# Logic:
+# 1. Loads the slots from `variables_number` (0 for the constants, the counters and unknown names).
+# 2. Runs the instructions from the first one until `STOP`, counting the iterations of the loops
+#    in a local copy of the countdown of the watchdog.
+# 3. Writes the variables and the countdown back.
+#
+# Example Usage:
+# run_bytecode(compile_program(parsed_data))
+def run_bytecode(bytecode):
+    code, keys = bytecode
+    slots = [variables_number.get(key, 0) if isinstance(key, str) else 0 for key in keys]
+    countdown = global_state.iteration_countdown
+    pc = 0
+    while True:
+        opcode, a, b, c, d, e = code[pc]
+        if opcode == ARITHMETIC:
+            slots[a] = c(slots[b], d)
+            pc += 1
+        elif opcode == WHILE_NEXT:
+            if a(slots[b], c):
+                countdown -= 1
+                slots[e] += 1
+                if not countdown:
+                    countdown = check_budget(*keys[e][:2], slots[e])
+                pc = d
+            else:
+                pc += 1
+        elif opcode == JUMP_UNLESS:
+            pc = pc + 1 if a(slots[b], c) else d
+        elif opcode == FOR_NEXT:
+            value = slots[a] + 1
+            if value <= c:
+                countdown -= 1
+                if not countdown:
+                    countdown = check_budget('for', keys[a][1], value - keys[a][2])
+                slots[a] = slots[b] = value
+                pc = d
+            else:
+                pc += 1
+        elif opcode == CALL:
+            a()
+            pc += 1
+        elif opcode == CALL_READING:
+            for name, index in b:
+                variables_number[name] = slots[index]
+            a()
+            pc += 1
+        elif opcode == WHILE_START:
+            if a(slots[b], c):
+                countdown -= 1
+                slots[e] = 0
+                if not countdown:
+                    countdown = check_budget(*keys[e][:2], 0)
+                pc += 1
+            else:
+                pc = d
+        elif opcode == FOR_START:
+            if d < c:
+                pc = e
+            else:
+                countdown -= 1
+                if not countdown:
+                    countdown = check_budget('for', keys[a][1], 0)
+                slots[a] = slots[b] = c
+                pc += 1
+        elif opcode == JUMP:
+            pc = a
+        else:  # STOP
+            break
+
+    global_state.iteration_countdown = countdown
+    for key, value in zip(keys, slots):
+        if isinstance(key, str) and key in variables_number:
+            variables_number[key] = value
+
+
+# Function to run a parsed program by calling its actions, as the tree of nested functions.
+#
+# Notes:
+# - This is how the programs were run before the bytecode. It is kept as the reference for
+#   benchmark_vm.py, which checks that the engines give the same C instructions and variables.
+def run_actions(statements):
+    for statement in statements:
+        statement()
@@ -0,0 +1,83 @@
+import sys
+import time
+from state import global_state
+
+# Module to stop the scripts whose loops run too long.
+#
+# A `while` loop whose condition never changes, or loops with huge bounds, would keep main.py
+# running forever. Every engine (the nested functions of parser.py, vm.py and pyengine.py) counts
+# the iterations of the loops against a budget shared by the whole script, and checks the time
+# spent every `CHECK_INTERVAL` iterations. When a budget runs out, the script is stopped with a
+# diagnostic naming the line of the loop and the number of iterations it completed.
+#
+# Logic:
+# 1. `start_watchdog` sets the budgets in `global_state` before the parsing, since the parser
+#    already runs the `for` loops (and the `while` loops inside them).
+# 2. Each iteration decrements `global_state.iteration_countdown` (or a local copy of it), the
+#    iterations left until the next check. The engines only handle this small number.
+# 3. When the countdown reaches 0, `check_budget` stops the script if no iteration remains in the
+#    budget or if the deadline has passed, or takes the next `CHECK_INTERVAL` iterations from the
+#    budget.
+#
+# Notes:
+# - Without `start_watchdog` (benchmark_vm.py), the budgets are unlimited (see state.py).
+# - Exit code `3` tells a stopped script from an invalid one (`1`).
+#
+# Example Usage:
+# start_watchdog(DEFAULT_ITERATION_BUDGET, DEFAULT_TIME_BUDGET)
+
+DEFAULT_ITERATION_BUDGET = 10_000_000  # Iterations of all the loops of a script
+DEFAULT_TIME_BUDGET = 10.0  # Seconds spent by the loops of a script, parsing included
+CHECK_INTERVAL = 4096  # Iterations between two readings of the clock
+
+
+# Function to set the budgets of the script.
+#
+# Parameters:
+# - iteration_budget: The number of loop iterations the script can run.
+# - time_budget: The number of seconds the script can run, from now.
+def start_watchdog(iteration_budget, time_budget):
+    global_state.iteration_budget_limit = iteration_budget
+    global_state.time_budget_limit = time_budget
+    global_state.iteration_budget = iteration_budget
+    # The first iteration checks the budgets, the one after the last allowed stops the script
+    global_state.iteration_countdown = 1
+    global_state.deadline = time.perf_counter() + time_budget
+
+
+# Function to stop the script if its budget is exhausted, called when the countdown reaches 0.
+#
+# Parameters:
+# - kind: 'while' or 'for'.
+# - line: The line of the loop.
+# - iterations: The number of iterations the loop completed.
+#
+# Returns:
+# - The new countdown: the iterations the engine can run before the next check.
+def check_budget(kind, line, iterations):
+    if not global_state.iteration_budget:
+        budget = f"the iteration budget ({plural(global_state.iteration_budget_limit, 'iteration')}) is exhausted"
+    elif time.perf_counter() > global_state.deadline:
+        budget = f"the time budget ({global_state.time_budget_limit:g} s) is exhausted"
+    else:
+        countdown = min(CHECK_INTERVAL, global_state.iteration_budget)
+        global_state.iteration_budget -= countdown
+        return countdown
+    sys.stderr.write(f"Error on line {line}: the '{kind}' loop was stopped after {plural(iterations, 'iteration')}, {budget}.\n")
+    global_state.has_errors = True
+    sys.exit(3)
+
+
+# Function to write a count followed by its noun, in the plural unless the count is 1.
+def plural(count, noun):
+    return f"{count} {noun}{'' if count == 1 else 's'}"
+
+
+# Function to count an iteration of a loop run by the nested functions of the parser.
+#
+# Parameters:
+# - kind, line, iterations: As for `check_budget`.
+def count_iteration(kind, line, iterations):
+    global_state.iteration_countdown -= 1
+    if not global_state.iteration_countdown:
+        global_state.iteration_countdown = check_budget(kind, line, iterations)